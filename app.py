@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, send_file
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, send_file, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -7,18 +7,27 @@ from datetime import datetime, timedelta, time as dt_time
 import os
 import secrets
 import json
-import copy
+import heapq
 import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 import atexit
 from pytz import timezone, utc
 from dotenv import load_dotenv
 from dateutil.parser import isoparse # 新增導入
-from config import LEVEL_ORDER, DEPARTMENT_STRUCTURE, UNIT_TO_MAIN_DEPT_MAP, UserLevel, TodoStatus, TodoType, MeetingTaskStatus, MeetingTaskType, LOGIN_ATTEMPTS_LIMIT, ACCOUNT_LOCK_MINUTES
-from sqlalchemy import func, MetaData, or_ # 新增導入 func, MetaData, or_
+from config import LEVEL_ORDER, DEPARTMENT_STRUCTURE, UNIT_TO_MAIN_DEPT_MAP, UserLevel, TodoStatus, TodoType, MeetingTaskStatus, MeetingTaskType, HistoryEntityType, MailOutboxStatus, CacheVersionName, ExportFormat, LOGIN_ATTEMPTS_LIMIT, ACCOUNT_LOCK_MINUTES, MAIL_OUTBOX_WORKERS, SCHEDULED_NOTIFICATION_GRACE_MINUTES, SchedulerMode, SCHEDULER_MODE, SCHEDULER_LEADER_ELECTION, SCHEDULER_LEASE_NAME, SCHEDULER_JOBSTORE, HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE_MAX, LISTING_PAGE_SIZE, LISTING_PAGE_SIZE_MAX
+from sqlalchemy import func, MetaData, or_, and_, select, literal, union_all # 新增導入 func, MetaData, or_
 from mail_service import send_mail # 匯入郵件服務
-from scheduler import init_app_scheduler # 導入排程器初始化函數
+from mail_outbox import enqueue_mail, start_mail_outbox_workers # 郵件寄件匣
+from rate_limiter import mail_rate_limiter # 郵件 API 限速器
+from scheduler import init_app_scheduler, wake_scheduled_notifications, wake_report_schedules # 導入排程器初始化函數
+from version_cache import track_model_changes # 以版本號驗證的快取
+from permission_index import PERMISSION_FIELDS, MANAGER_LEVELS, SECTION_LEVELS, get_permission_index # 可存取、可指派的使用者索引
+from org_tree import ORG_MEMBER_FIELDS, get_org_tree, track_task_counters, get_task_counts, with_task_counts # 首頁組織圖快取與任務數
+from pagination import encode_cursor, decode_cursor, parse_limit, decode_key, keyset_after, split_page # 游標分頁
+from job_runs import summarize_job_runs # 排程工作執行紀錄
+from todo_export import build_export_query, iter_export_rows, to_ndjson, to_csv # 串流匯出
 from report_service import generate_and_send_weekly_report # 導入報告服務
+from db_engine import get_engine_profile, build_engine_options, register_sqlite_pragmas # SQLite 引擎設定
 
 # ReportLab 相關導入
 from reportlab.lib.pagesizes import letter
@@ -41,8 +50,11 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 instance_path = os.path.join(basedir, 'instance')
 if not os.path.exists(instance_path):
     os.makedirs(instance_path)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(instance_path, 'todo_system.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///' + os.path.join(instance_path, 'todo_system.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLite 引擎設定檔 (WAL、busy_timeout、mmap 與連線池大小)，可用 DB_ENGINE_PROFILE 切換
+db_engine_profile = get_engine_profile(os.getenv('DB_ENGINE_PROFILE'))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(app.config['SQLALCHEMY_DATABASE_URI'], db_engine_profile)
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False
 
@@ -59,6 +71,8 @@ naming_convention = {
 }
 db = SQLAlchemy(app, metadata=MetaData(naming_convention=naming_convention))
 migrate = Migrate(app, db, render_as_batch=True) # 初始化 Flask-Migrate
+with app.app_context():
+    register_sqlite_pragmas(db.engine, db_engine_profile)
 
 # 註冊中文字體
 pdfmetrics.registerFont(TTFont('NotoSansCJKtc', 'NotoSansTC-Regular.ttf')) # 假設字體檔案在專案根目錄
@@ -166,6 +180,12 @@ class User(db.Model):
     manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # 直屬主管ID
     
     todos = db.relationship('Todo', backref='user', lazy=True, cascade='all, delete-orphan', foreign_keys='Todo.user_id')
+
+    # 報告與權限範圍查詢以 unit / department / level 篩選使用者
+    __table_args__ = (
+        db.Index('ix_user_unit_department', 'unit', 'department'),
+        db.Index('ix_user_level', 'level'),
+    )
     
     def set_password(self, password):
         """設置密碼雜湊"""
@@ -202,34 +222,7 @@ class User(db.Model):
         # 自己的資料總是可以存取
         if self.user_key == target_user_key:
             return True
-        
-        target_user = User.query.filter_by(user_key=target_user_key).first()
-        if not target_user:
-            return False # 目標使用者不存在
-
-        current_level_value = LEVEL_ORDER.get(self.level, 0)
-        target_level_value = LEVEL_ORDER.get(target_user.level, 0)
-
-        # 系統管理員 (Admin) 可以看所有人
-        if self.level == UserLevel.ADMIN.value:
-            return True
-
-        # 製造中心-協理 (Executive Manager) 可以看自己部門及下級
-        if self.level == UserLevel.EXECUTIVE_MANAGER.value:
-            return (target_user.department == self.department) or \
-                   (target_level_value < current_level_value)
-
-        # 廠長、經理、副理 (Plant Manager, Manager, Assistant Manager) 只能看自己單位的人員
-        if self.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            return target_user.department == self.unit
-
-        # 課長、副課長 (Section Chief, Deputy Section Chief) 只能看自己單位以下的人員
-        if self.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            return (target_user.department == self.department and target_user.unit == self.unit) and \
-                   (target_level_value < current_level_value)
-        
-        # 其他層級 (組長、作業員) 只能看自己的資料 (已在開頭處理)
-        return False
+        return get_permission_index(db, User, CacheVersion).can_view_key(self, target_user_key)
     
     def can_modify_todo(self, todo):
         """檢查是否可以修改待辦事項"""
@@ -238,62 +231,11 @@ class User(db.Model):
             return True
         
         # 上級可以修改下級的待辦事項
-        todo_owner = db.session.get(User, todo.user_id)
-        if todo_owner:
-            return self.can_access_user_data(todo_owner.user_key)
-        
-        return False
+        return get_permission_index(db, User, CacheVersion).can_view_id(self, todo.user_id)
 
     def can_assign_to(self, target_user):
-        """檢查當前使用者是否可以指派任務給目標使用者"""
-        level_hierarchy = LEVEL_ORDER
-
-        current_level_value = level_hierarchy.get(self.level, 0)
-        target_level_value = level_hierarchy.get(target_user.level, 0)
-
-        # 管理員可以指派給任何人 (除了其他管理員)
-        if self.level == UserLevel.ADMIN.value:
-            return target_user.level != UserLevel.ADMIN.value
-
-        # 製造中心-協理可以指派給任何人 (除了管理員)
-        if self.level == UserLevel.EXECUTIVE_MANAGER.value:
-            return target_user.level != UserLevel.ADMIN.value
-
-        # 廠長、經理、副理的指派邏輯
-        if self.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            # 必須是層級低於自己的
-            if target_level_value >= current_level_value:
-                return False
-            # 不能指派給管理員或協理
-            if target_user.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
-                return False
-
-            # 檢查目標使用者是否在當前使用者所管理的範圍內
-            # 對於這些角色，self.unit 代表他們所管理的部門或廠區
-            managed_scope = self.unit 
-            
-            # 目標使用者的部門必須與當前使用者所管理的範圍相符
-            return target_user.department == managed_scope
-
-        # 課長可以指派給自己單位內的下級 (副課長、組長、作業員)
-        if self.level == UserLevel.SECTION_CHIEF.value:
-            return (self.department == target_user.department and self.unit == target_user.unit) and \
-                   target_level_value < current_level_value
-
-        # 副課長可以指派給自己單位內的下級 (組長、作業員)
-        if self.level == UserLevel.DEPUTY_SECTION_CHIEF.value:
-            return (self.department == target_user.department and self.unit == target_user.unit) and \
-                   target_level_value < current_level_value
-
-        # 組長可以指派給自己
-        if self.level == UserLevel.TEAM_LEADER.value and self.id == target_user.id:
-            return True
-
-        # 作業員沒有指派權限
-        if self.level == UserLevel.STAFF.value:
-            return False
-        
-        return False
+        """檢查當前使用者是否可以指派任務給目標使用者 (規則見 permission_index.can_assign)"""
+        return get_permission_index(db, User, CacheVersion).can_assign(self, target_user)
 
     def get_main_department(self):
         """根據用戶的部門和單位，判斷其所屬的主要管理部門"""
@@ -321,6 +263,11 @@ class Meeting(db.Model):
     attendees = db.relationship('MeetingAttendee', backref='meeting', lazy=True, cascade='all, delete-orphan')
     discussion_items = db.relationship('DiscussionItem', backref='meeting', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_meeting_meeting_date', 'meeting_date'),
+        db.Index('ix_meeting_subject_meeting_date', 'subject', 'meeting_date'),
+    )
+
 class MeetingAttendee(db.Model):
     meeting_id = db.Column(db.Integer, db.ForeignKey('meeting.id'), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
@@ -346,14 +293,24 @@ class Todo(db.Model):
     todo_type = db.Column(db.String(20), nullable=False)  # 'current' or 'next'
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     assigned_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # 指派人
-    history_log = db.Column(db.Text, nullable=True) # JSON-encoded list of event dictionaries
+    history_log = db.Column(db.Text, nullable=True) # 舊版 JSON 履歷，已改存於 TodoEvent，不再寫入
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     due_date = db.Column(db.DateTime, nullable=False) # 新增預計完成日期，不允許空白
+    completed_at = db.Column(db.DateTime, nullable=True) # 狀態改為已完成的時間，改回其他狀態時清除
     meeting_task_id = db.Column(db.Integer, db.ForeignKey('meeting_task.id'), nullable=True) # 連結到會議任務
 
     assigned_by = db.relationship('User', foreign_keys=[assigned_by_user_id], backref='assigned_todos', lazy=True)
 
+    # 複合索引對應實際的查詢形狀：個人面板/報告、逾期與到期提醒、每週轉移與歸檔
+    __table_args__ = (
+        db.Index('ix_todo_user_type_status_due', 'user_id', 'todo_type', 'status', 'due_date'),
+        db.Index('ix_todo_due_date_status', 'due_date', 'status'),
+        db.Index('ix_todo_type_due_date', 'todo_type', 'due_date'),
+        db.Index('ix_todo_status_type', 'status', 'todo_type'),
+        db.Index('ix_todo_meeting_task_id', 'meeting_task_id'),
+    )
+
 class ArchivedTodo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     original_todo_id = db.Column(db.Integer, nullable=False) # Original ID from Todo table
@@ -363,11 +320,17 @@ class ArchivedTodo(db.Model):
     todo_type = db.Column(db.String(20), nullable=False) # Should be 'current' when archived
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     assigned_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
-    history_log = db.Column(db.Text, nullable=True)
+    history_log = db.Column(db.Text, nullable=True) # 舊版 JSON 履歷，已改存於 TodoEvent，不再寫入
     created_at = db.Column(db.DateTime, nullable=False) # Original creation time
     updated_at = db.Column(db.DateTime, nullable=False) # Original last update time
     archived_at = db.Column(db.DateTime, default=datetime.utcnow) # When it was archived
     due_date = db.Column(db.DateTime, nullable=True) # 新增預計完成日期
+    completed_at = db.Column(db.DateTime, nullable=True) # 完成時間 (由 Todo 複製)
+
+    __table_args__ = (
+        db.Index('ix_archived_todo_archived_user_status', 'archived_at', 'user_id', 'status'),
+        db.Index('ix_archived_todo_user_archived', 'user_id', 'archived_at'),
+    )
 
 class MeetingTask(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -384,7 +347,7 @@ class MeetingTask(db.Model):
     status = db.Column(db.String(50), nullable=False, default=MeetingTaskStatus.UNASSIGNED.value) # 會議任務狀態
     is_assigned_to_todo = db.Column(db.Boolean, default=False) # 追蹤項目是否已指派到 Todo
     todo_id = db.Column(db.Integer, db.ForeignKey('todo.id'), unique=True, nullable=True) # 連結到 Todo 任務
-    history_log = db.Column(db.Text, nullable=True) # JSON-encoded list of event dictionaries
+    history_log = db.Column(db.Text, nullable=True) # 舊版 JSON 履歷，已改存於 TodoEvent，不再寫入
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -398,6 +361,216 @@ class MeetingTask(db.Model):
     # 關聯到 Todo 模型
     todo = db.relationship('Todo', foreign_keys=[todo_id], backref='meeting_task_link', uselist=False)
 
+    __table_args__ = (
+        db.Index('ix_meeting_task_assignee_type_status', 'assigned_to_user_id', 'task_type', 'status'),
+        db.Index('ix_meeting_task_type_status', 'task_type', 'status'),
+        db.Index('ix_meeting_task_meeting_id', 'meeting_id'),
+    )
+
+class TodoEvent(db.Model):
+    """
+    待辦事項 / 歸檔任務 / 會議任務的履歷事件 (只新增不修改)。
+
+    取代原本存在 history_log 欄位中的 JSON 陣列：新增事件只需一次 INSERT，
+    讀取時依 (entity_type, entity_id, timestamp) 索引分頁取出。
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False) # HistoryEntityType
+    entity_id = db.Column(db.Integer, nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # UTC
+    actor = db.Column(db.Text, nullable=True) # JSON-encoded dict
+    details = db.Column(db.Text, nullable=True) # JSON-encoded dict
+
+    __table_args__ = (
+        db.Index('ix_todo_event_entity_timestamp', 'entity_type', 'entity_id', 'timestamp', 'id'),
+    )
+
+    @classmethod
+    def record(cls, entity_type, entity_id, event_type, actor=None, details=None, timestamp=None):
+        """
+        新增一筆履歷事件，不需讀取既有履歷。
+
+        Args:
+            entity_type (HistoryEntityType): 事件所屬的實體類型
+            entity_id (int): 實體 ID (新建立的實體需先 flush 取得 ID)
+            event_type (str): 事件類型，例如 'status_changed'
+            actor (dict, optional): 執行者 {'id', 'name', 'user_key'}
+            details (dict, optional): 事件內容
+            timestamp (datetime, optional): 事件時間，預設為現在
+
+        Returns:
+            TodoEvent: 已加入 session 的事件
+        """
+        timestamp = timestamp or datetime.now(utc)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(utc).replace(tzinfo=None)
+        event = cls(
+            entity_type=HistoryEntityType(entity_type).value,
+            entity_id=entity_id,
+            event_type=event_type,
+            timestamp=timestamp,
+            actor=json.dumps(actor) if actor is not None else None,
+            details=json.dumps(details) if details is not None else None
+        )
+        db.session.add(event)
+        return event
+
+    def copy_to(self, entity_type, entity_id):
+        """將同一事件複製到另一個實體 (例如 Todo 的狀態變更同步到 MeetingTask)"""
+        event = TodoEvent(
+            entity_type=HistoryEntityType(entity_type).value,
+            entity_id=entity_id,
+            event_type=self.event_type,
+            timestamp=self.timestamp,
+            actor=self.actor,
+            details=self.details
+        )
+        db.session.add(event)
+        return event
+
+    def to_history_entry(self):
+        """相容舊 history_log 格式的序列化結果"""
+        return {
+            'event_type': self.event_type,
+            'timestamp': utc.localize(self.timestamp).isoformat() if self.timestamp else None,
+            'actor': json.loads(self.actor) if self.actor else None,
+            'details': json.loads(self.details) if self.details else {}
+        }
+
+    @classmethod
+    def history_query(cls, entity_type, entity_id):
+        return cls.query.filter_by(
+            entity_type=HistoryEntityType(entity_type).value, entity_id=entity_id
+        ).order_by(cls.timestamp, cls.id)
+
+    @classmethod
+    def history_for(cls, entity_type, entity_id, limit=None, offset=0):
+        """
+        取得單一實體的履歷 (依時間排序)，可分頁。
+
+        Returns:
+            list: 與舊 history_log 相同格式的事件字典列表
+        """
+        query = cls.history_query(entity_type, entity_id)
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return [event.to_history_entry() for event in query.all()]
+
+    @classmethod
+    def history_for_many(cls, entity_type, entity_ids):
+        """
+        一次查詢多個實體的履歷，避免列表頁逐筆查詢。
+
+        Returns:
+            dict: {entity_id: [事件字典, ...]}，沒有履歷的實體不會出現在結果中
+        """
+        histories = {}
+        entity_ids = list(set(entity_ids))
+        if not entity_ids:
+            return histories
+        events = cls.query.filter(
+            cls.entity_type == HistoryEntityType(entity_type).value,
+            cls.entity_id.in_(entity_ids)
+        ).order_by(cls.entity_id, cls.timestamp, cls.id).all()
+        for event in events:
+            histories.setdefault(event.entity_id, []).append(event.to_history_entry())
+        return histories
+
+    @classmethod
+    def history_counts(cls, entity_type, entity_ids):
+        """
+        一次查詢多個實體的履歷筆數 (不載入事件內容)。
+
+        Returns:
+            dict: {entity_id: 筆數}，沒有履歷的實體不會出現在結果中
+        """
+        entity_ids = list(set(entity_ids))
+        if not entity_ids:
+            return {}
+        return dict(db.session.execute(
+            select(cls.entity_id, func.count())
+            .where(cls.entity_type == HistoryEntityType(entity_type).value, cls.entity_id.in_(entity_ids))
+            .group_by(cls.entity_id)
+        ).all())
+
+    @classmethod
+    def history_page(cls, entity_type, entity_id, limit, after=None):
+        """
+        以 (timestamp, id) 為鍵分頁取得單一實體的履歷，成本與頁數深度無關。
+
+        Args:
+            limit (int): 每頁筆數
+            after (tuple, optional): 上一頁最後一筆的 (timestamp, id)
+
+        Returns:
+            tuple: (事件字典列表, 最後一筆的 (timestamp, id)；沒有下一頁時為 None)
+        """
+        query = cls.history_query(entity_type, entity_id)
+        if after is not None:
+            after_timestamp, after_id = after
+            query = query.filter(or_(
+                cls.timestamp > after_timestamp,
+                and_(cls.timestamp == after_timestamp, cls.id > after_id)
+            ))
+        events = query.limit(limit + 1).all()
+        has_more = len(events) > limit
+        events = events[:limit]
+        last = (events[-1].timestamp, events[-1].id) if has_more else None
+        return [event.to_history_entry() for event in events], last
+
+    @classmethod
+    def move(cls, from_type, from_id, to_type, to_id):
+        """將履歷轉移到另一個實體 (例如 Todo 歸檔為 ArchivedTodo)"""
+        cls.query.filter_by(
+            entity_type=HistoryEntityType(from_type).value, entity_id=from_id
+        ).update(
+            {'entity_type': HistoryEntityType(to_type).value, 'entity_id': to_id},
+            synchronize_session=False
+        )
+
+    @classmethod
+    def delete_for(cls, entity_type, entity_id):
+        """刪除實體時一併刪除其履歷，避免 SQLite 重用 ID 時接到舊履歷"""
+        cls.query.filter_by(
+            entity_type=HistoryEntityType(entity_type).value, entity_id=entity_id
+        ).delete(synchronize_session=False)
+
+    @classmethod
+    def delete_for_many(cls, entity_type, entity_ids):
+        """與 delete_for 相同，一次刪除多個實體的履歷"""
+        entity_ids = list(set(entity_ids))
+        if not entity_ids:
+            return
+        cls.query.filter(
+            cls.entity_type == HistoryEntityType(entity_type).value,
+            cls.entity_id.in_(entity_ids)
+        ).delete(synchronize_session=False)
+
+class MailOutbox(db.Model):
+    """郵件寄件匣：請求處理只寫入此表，由背景 worker 發送、重試與標記 dead"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    mail_to = db.Column(db.String(500), nullable=False)
+    mail_cc = db.Column(db.String(500), nullable=False, default='')
+    status = db.Column(db.String(20), nullable=False, default=MailOutboxStatus.PENDING.value)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    is_digest = db.Column(db.Boolean, nullable=False, default=False) # 彙整通知：同一收件人合併成一封發送
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # 下次可發送時間 (退避)
+    claimed_at = db.Column(db.DateTime, nullable=True) # worker 認領時間
+    claimed_by = db.Column(db.String(32), nullable=True) # 認領 token
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_mail_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_mail_outbox_digest_recipient', 'is_digest', 'mail_to', 'status'),
+    )
+
 class ReportSchedule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -407,9 +580,88 @@ class ReportSchedule(db.Model):
     schedule_time = db.Column(db.Time, nullable=False)
     last_sent_at = db.Column(db.DateTime, nullable=True)
     require_next_week_tasks = db.Column(db.Boolean, default=False, nullable=False) # 新增欄位
+    next_fire_at = db.Column(db.DateTime, nullable=True) # 下次檢查/發送時間 (UTC)
     
     manager = db.relationship('User', foreign_keys=[manager_id], backref=db.backref('report_schedules', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_report_schedule_active_next_fire', 'is_active', 'next_fire_at'),
+    )
+
+    def compute_next_fire_at(self, now=None):
+        """
+        計算下次發送時間：本週的排程時間尚未發送過則為該時間 (可能已過，表示現在就該發送)，
+        否則為下一次的星期與時間。
+
+        Returns:
+            datetime: naive UTC
+        """
+        taiwan_tz = timezone('Asia/Taipei')
+        now = (now or datetime.now(utc)).astimezone(taiwan_tz)
+        days_ahead = (self.schedule_day - now.weekday()) % 7
+        fire_at = taiwan_tz.localize(datetime.combine(now.date() + timedelta(days=days_ahead), self.schedule_time))
+        if fire_at <= now:
+            last_sent_at = self.last_sent_at
+            if last_sent_at is not None and last_sent_at.tzinfo is None:
+                last_sent_at = utc.localize(last_sent_at)
+            if last_sent_at is not None and last_sent_at >= fire_at:
+                fire_at = taiwan_tz.localize(datetime.combine(fire_at.date() + timedelta(days=7), self.schedule_time))
+        return fire_at.astimezone(utc).replace(tzinfo=None)
+
+    def refresh_next_fire_at(self, now=None):
+        self.next_fire_at = self.compute_next_fire_at(now)
+        return self.next_fire_at
+
+class CacheVersion(db.Model):
+    """程序內快取的版本號：資料異動時遞增，讀取快取前比對版本判斷是否需要重新載入"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class UserTaskCounter(db.Model):
+    """每位使用者的本週任務數：Todo 寫入時在同一個交易中更新 (見 org_tree.py)，首頁不必讀取所有任務"""
+    user_id = db.Column(db.Integer, primary_key=True) # User.id；不設外鍵，刪除使用者時隨其任務一併更新
+    current_total = db.Column(db.Integer, nullable=False, default=0)
+    current_completed = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+class SchedulerLease(db.Model):
+    """排程器租約：只有持有未過期租約的程序執行排程工作 (見 scheduler_lease.py)"""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(200), nullable=False) # 主機:PID:隨機字串
+    acquired_at = db.Column(db.DateTime, nullable=False)
+    heartbeat_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class RateLimitBucket(db.Model):
+    """跨程序共用的限速器狀態 (見 rate_limiter.py)：剩餘 token 與最後補充時間"""
+    name = db.Column(db.String(50), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False) # epoch 秒，與補充速率直接相乘
+
+class JobCheckpoint(db.Model):
+    """批次排程工作的進度：每批提交時一併更新，中斷後同一批次 (run_key) 從 position 之後繼續"""
+    name = db.Column(db.String(100), primary_key=True) # 工作名稱
+    run_key = db.Column(db.String(50), nullable=True) # 批次識別，例如歸檔的週一日期
+    position = db.Column(db.Integer, nullable=False, default=0) # 最後一個已處理的 ID
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+class JobRun(db.Model):
+    """排程工作的執行紀錄：每次執行 (或錯過) 寫入一筆，用來觀察耗時與處理量隨資料成長的變化"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False) # JobRunStatus
+    started_at = db.Column(db.DateTime, nullable=False) # UTC；錯過的執行為預定時間
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    rows_scanned = db.Column(db.Integer, nullable=False, default=0)
+    mails_queued = db.Column(db.Integer, nullable=False, default=0) # 加入寄件匣 (或直接交給郵件 API) 的郵件數，不代表已寄達
+    error = db.Column(db.Text, nullable=True)
+    misfired = db.Column(db.Boolean, nullable=False, default=False) # 超過 misfire_grace_time 而未執行
+
+    __table_args__ = (
+        db.Index('ix_job_run_started', 'started_at'),
+    )
+
 class ScheduledNotification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) # Creator of the notification
@@ -422,12 +674,91 @@ class ScheduledNotification(db.Model):
     weekly_day = db.Column(db.Integer, nullable=True) # 0-6 for Mon-Sun, for weekly schedules
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     last_sent_at = db.Column(db.DateTime, nullable=True)
+    next_fire_at = db.Column(db.DateTime, nullable=True) # 下次發送時間 (UTC)，建立、編輯與發送後重新計算；None 表示不再發送
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = db.relationship('User', foreign_keys=[user_id], backref='created_notifications', lazy=True)
 
-init_app_scheduler(app, db, User, Todo, ArchivedTodo, MeetingTask, Meeting, ScheduledNotification, ReportSchedule) # Initialize scheduler after models are defined
+    __table_args__ = (
+        db.Index('ix_scheduled_notification_active_next_fire', 'is_active', 'next_fire_at'),
+    )
+
+    def recipient_ids(self):
+        """收件人 ID 列表 (依設定順序)"""
+        return [int(uid) for uid in self.recipient_user_ids.split(',') if uid.strip()]
+
+    def compute_next_fire_at(self, now=None):
+        """
+        計算下次發送時間
+
+        one_time 在指定日期時間發送一次 (已發送或錯過寬限時間即不再發送)；
+        weekly 取 now 之後最近一次的星期與時間。
+
+        Args:
+            now (datetime, optional): 基準時間 (aware)，預設為目前時間
+
+        Returns:
+            datetime: 下次發送時間 (naive UTC)，不再發送時為 None
+        """
+        if self.specific_time is None:
+            return None
+        taiwan_tz = timezone('Asia/Taipei')
+        now = (now or datetime.now(utc)).astimezone(taiwan_tz)
+
+        if self.schedule_type == 'one_time':
+            if self.specific_date is None:
+                return None
+            fire_at = taiwan_tz.localize(datetime.combine(self.specific_date, self.specific_time))
+            if self.last_sent_at:
+                last_sent_at = self.last_sent_at if self.last_sent_at.tzinfo else utc.localize(self.last_sent_at)
+                if last_sent_at >= fire_at:
+                    return None
+            if fire_at < now - timedelta(minutes=SCHEDULED_NOTIFICATION_GRACE_MINUTES):
+                return None
+        elif self.schedule_type == 'weekly':
+            if self.weekly_day is None:
+                return None
+            days_ahead = (self.weekly_day - now.weekday()) % 7
+            fire_at = taiwan_tz.localize(datetime.combine(now.date() + timedelta(days=days_ahead), self.specific_time))
+            if fire_at <= now:
+                fire_at = taiwan_tz.localize(datetime.combine(fire_at.date() + timedelta(days=7), self.specific_time))
+        else:
+            return None
+        return fire_at.astimezone(utc).replace(tzinfo=None)
+
+    def refresh_next_fire_at(self, now=None):
+        self.next_fire_at = self.compute_next_fire_at(now)
+        return self.next_fire_at
+
+# 排程模式：web 模式不啟動排程器，由獨立的 scheduler_worker.py 執行排程工作
+# flask CLI (flask db upgrade、flask shell 等) 匯入 app 只為執行指令，未明確設定時預設為 web 模式且不啟動郵件 worker，
+# 不參與排程 leader 選舉
+running_flask_cli = os.getenv('FLASK_RUN_FROM_CLI') == 'true'
+scheduler_mode = os.getenv('SCHEDULER_MODE', SchedulerMode.WEB.value if running_flask_cli else SCHEDULER_MODE)
+scheduler_leader_election = scheduler_mode == SchedulerMode.WORKER.value or \
+    os.getenv('SCHEDULER_LEADER_ELECTION', '1' if SCHEDULER_LEADER_ELECTION else '0') == '1'
+app_scheduler = None
+if scheduler_mode != SchedulerMode.WEB.value:
+    app_scheduler = init_app_scheduler(
+        app, db, User, Todo, ArchivedTodo, MeetingTask, Meeting, ScheduledNotification, ReportSchedule, TodoEvent, MailOutbox, CacheVersion, SchedulerLease, JobCheckpoint, JobRun, UserTaskCounter,
+        leader_election=scheduler_leader_election, jobstore=os.getenv('SCHEDULER_JOBSTORE', SCHEDULER_JOBSTORE)
+    ) # Initialize scheduler after models are defined
+# 使用者的單位或在職狀態變更時，讓「單位 -> 使用者」快取失效
+track_model_changes(db, CacheVersion, CacheVersionName.USER_DIRECTORY.value, User, attributes=('unit', 'is_active'))
+# 使用者的組織圖欄位變更時讓首頁組織圖快取失效；Todo 寫入時更新本週任務數
+track_model_changes(db, CacheVersion, CacheVersionName.ORG_TREE.value, User, attributes=ORG_MEMBER_FIELDS)
+track_task_counters(db, Todo, UserTaskCounter)
+# 使用者的職級、部門、單位等欄位變更時讓權限索引失效
+track_model_changes(db, CacheVersion, CacheVersionName.USER_PERMISSIONS.value, User, attributes=PERMISSION_FIELDS)
+# 郵件 API 限速器改為所有程序共用 (Web 程序、排程程序與各自的寄件匣 worker 合計不超過設定速率)
+with app.app_context():
+    mail_rate_limiter.use_database(db.engine, RateLimitBucket.__table__)
+start_mail_outbox_workers(app, db, MailOutbox, int(os.getenv('MAIL_OUTBOX_WORKERS', 0 if running_flask_cli else MAIL_OUTBOX_WORKERS))) # 啟動郵件寄件匣 worker
+
+def queue_mail(subject, body, mail_to, mail_cc="", digest=False):
+    """將通知郵件加入寄件匣，隨目前交易一起提交，由背景 worker 發送 (digest=True 時與同收件人的通知合併)"""
+    return enqueue_mail(db, MailOutbox, subject, body, mail_to, mail_cc=mail_cc, digest=digest)
 
 # 認證裝飾器
 def login_required(f):
@@ -643,8 +974,10 @@ def report_settings():
                         schedule_time=schedule_time,
                         require_next_week_tasks=require_next_week_tasks # Save the new setting
                     )
+                    new_schedule.refresh_next_fire_at()
                     db.session.add(new_schedule)
                     db.session.commit()
+                    wake_report_schedules(new_schedule.next_fire_at)
                     flash(f'已成功為「{department_unit}」新增週報排程！', 'success')
             except Exception as e:
                 db.session.rollback()
@@ -705,8 +1038,10 @@ def edit_report_schedule(schedule_id):
                 schedule_to_edit.schedule_day = int(schedule_day)
                 schedule_to_edit.schedule_time = dt_time.fromisoformat(schedule_time_str)
                 schedule_to_edit.require_next_week_tasks = require_next_week_tasks
+                schedule_to_edit.refresh_next_fire_at()
                 
                 db.session.commit()
+                wake_report_schedules(schedule_to_edit.next_fire_at)
                 flash('排程已成功更新！', 'success')
                 return redirect(url_for('report_settings'))
             except Exception as e:
@@ -764,7 +1099,11 @@ def toggle_report_schedule(schedule_id):
 
     try:
         schedule.is_active = not schedule.is_active
+        if schedule.is_active:
+            schedule.refresh_next_fire_at()
         db.session.commit()
+        if schedule.is_active:
+            wake_report_schedules(schedule.next_fire_at)
         return jsonify({'message': '排程狀態已更新', 'is_active': schedule.is_active}), 200
     except Exception as e:
         db.session.rollback()
@@ -790,134 +1129,14 @@ def send_report_now(schedule_id):
         return jsonify({'error': f'手動發送報告時發生錯誤: {str(e)}'}), 500
 
 
-def _build_organization_structure(all_users, user_todos_map, user_overdue_map, director):
-    # 定義組織階層的順序，用於排序
-    level_order = LEVEL_ORDER
-
-    # 定義新的組織結構，以四大部門為基礎 (使用深複製)
-    department_structure = copy.deepcopy(DEPARTMENT_STRUCTURE)
-
-    # 輔助對應表：將資料庫中的單位(課)對應到四大部門
-    unit_to_main_dept_map = UNIT_TO_MAIN_DEPT_MAP
-
-    # 將 director 加入組織結構
-    if director:
-        main_dept_name = None
-        if director.department == '製造中心':
-            if director.unit in ['第一廠', '第三廠', '採購物流部', '品保部']:
-                main_dept_name = director.unit
-            elif director.unit in unit_to_main_dept_map:
-                main_dept_name = unit_to_main_dept_map[director.unit]
-        elif director.department in ['第一廠', '第三廠', '採購物流部', '品保部']:
-            main_dept_name = director.department
-
-        if main_dept_name and main_dept_name in department_structure:
-            department_structure[main_dept_name]['management_team'].append(director)
-
-    for user in all_users:
-        # 如果當前用戶是協理，則跳過，因為協理已在前面處理過
-        if director and user.user_key == director.user_key:
-            continue
-        user_current_todos = user_todos_map.get(user.id, [])
-        user.total_tasks = len(user_current_todos)
-        user.completed_tasks = sum(1 for todo in user_current_todos if todo.status == TodoStatus.COMPLETED.value)
-        user.overdue_tasks = user_overdue_map.get(user.id, 0) # 獲取逾期任務計數
-
-        main_dept_name = None
-        
-        # 根據用戶的部門和單位，判斷其所屬的主要部門
-        if user.department == '製造中心':
-            if user.unit in ['第一廠', '第三廠', '採購物流部', '品保部']:
-                main_dept_name = user.unit  # 廠長/經理級別，直接歸屬到四大部門
-            elif user.unit in unit_to_main_dept_map:
-                main_dept_name = unit_to_main_dept_map[user.unit] # 課級或以下，歸屬到對應的廠
-        elif user.department in ['第一廠', '第三廠', '採購物流部', '品保部']:
-            main_dept_name = user.department # 如果部門本身就是四大部門之一，直接使用部門名稱
-
-        if not main_dept_name or main_dept_name not in department_structure:
-            continue
-
-        # 將用戶放入對應的結構中
-        dept_data = department_structure[main_dept_name]
-
-        # 1. 分配部門主管 (廠長/經理/副理)
-        if user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            # 避免重複添加 director
-            if user.user_key != director.user_key if director else False:
-                dept_data['management_team'].append(user)
-        
-        # 2. 分配單位(課)內成員
-        elif user.unit:
-            unit_name = user.unit
-            if unit_name not in dept_data['units']:
-                dept_data['units'][unit_name] = {'management_team': [], 'leaders': [], 'staff': []}
-            
-            unit_data = dept_data['units'][unit_name]
-            if user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-                unit_data['management_team'].append(user)
-            elif user.level == UserLevel.TEAM_LEADER.value:
-                unit_data['leaders'].append(user)
-            elif user.level == UserLevel.STAFF.value:
-                unit_data['staff'].append(user)
-        
-        # 3. 分配部門內無明確單位的成員 (主要針對品保部/採購部)
-        else:
-            unit_name = "部門直屬"
-            if unit_name not in dept_data['units']:
-                dept_data['units'][unit_name] = {'management_team': [], 'leaders': [], 'staff': []}
-            
-            # 將非主管級別的用戶放入
-            if user.level not in [UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-                 dept_data['units'][unit_name]['staff'].append(user)
-
-
-    # 對每個部門和單位內的成員進行排序
-    for dept_data in department_structure.values():
-        dept_data['management_team'].sort(key=lambda x: LEVEL_ORDER.get(x.level, 99))
-        for unit_data in dept_data['units'].values():
-            unit_data['management_team'].sort(key=lambda x: LEVEL_ORDER.get(x.level, 99))
-            unit_data['leaders'].sort(key=lambda x: LEVEL_ORDER.get(x.level, 99))
-            unit_data['staff'].sort(key=lambda x: LEVEL_ORDER.get(x.level, 99))
-    
-    return department_structure
-
 @app.route('/')
 @login_required
 def index():
     current_user = get_current_user()
-    
-    # 優化 N+1 查詢：一次性獲取所有使用者的本週任務
-    all_current_todos = Todo.query.filter_by(todo_type=TodoType.CURRENT.value).all()
-    user_todos_map = {}
-    for todo in all_current_todos:
-        if todo.user_id not in user_todos_map:
-            user_todos_map[todo.user_id] = []
-        user_todos_map[todo.user_id].append(todo)
-
-    # 新增：一次性獲取所有逾期任務
-    # 獲取今天的開始時間 (UTC)
-    today_start_of_day_utc = datetime.now(utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    overdue_todos = Todo.query.filter(
-        Todo.due_date < today_start_of_day_utc, # 逾期任務不包含今天
-        Todo.status != TodoStatus.COMPLETED.value
-    ).all()
-    user_overdue_map = {}
-    for todo in overdue_todos:
-        if todo.user_id not in user_overdue_map:
-            user_overdue_map[todo.user_id] = 0
-        user_overdue_map[todo.user_id] += 1
-
-    # 最高層級主管 (製造中心-協理)
-    director = User.query.filter_by(level=UserLevel.EXECUTIVE_MANAGER.value).first()
-    if director:
-        director_current_todos = user_todos_map.get(director.id, [])
-        director.total_tasks = len(director_current_todos)
-        director.completed_tasks = sum(1 for todo in director_current_todos if todo.status == TodoStatus.COMPLETED.value)
-        director.overdue_tasks = user_overdue_map.get(director.id, 0)
-    
-    all_users = User.query.filter(User.level != UserLevel.ADMIN.value).all()
 
-    departments = _build_organization_structure(all_users, user_todos_map, user_overdue_map, director)
+    # 組織圖 (人員排列) 只在使用者資料異動時重建；任務數讀取預先累計的計數表
+    director, departments = get_org_tree(db, User, CacheVersion)
+    director, departments = with_task_counts(director, departments, get_task_counts(db, Todo, UserTaskCounter))
 
     return render_template('index.html', 
                            director=director, 
@@ -953,6 +1172,8 @@ def get_user_detail(user_key):
             ),
             Todo.due_date
         ).all()
+    # 面板只回傳履歷筆數，完整履歷在使用者展開任務時由 /api/todo/<id>/history 分頁載入
+    history_counts = TodoEvent.history_counts(HistoryEntityType.TODO, [t.id for t in current_todos + next_todos])
     
     def format_todo(todo):
         assigned_by_info = None
@@ -969,16 +1190,7 @@ def get_user_detail(user_key):
             'description': todo.description,
             'status': todo.status,
             'due_date': todo.due_date.isoformat() if todo.due_date else None, # 包含 due_date
-            'history_log': [
-                {
-                    **entry, 
-                    'timestamp': (lambda ts: 
-                        (utc.localize(datetime.fromisoformat(ts)) if datetime.fromisoformat(ts).tzinfo is None else datetime.fromisoformat(ts))
-                        .astimezone(timezone('Asia/Taipei')).strftime('%Y/%m/%d %H:%M')
-                    )(entry['timestamp']) if 'timestamp' in entry and entry['timestamp'] else entry.get('timestamp')
-                }
-                for entry in json.loads(todo.history_log)
-            ] if todo.history_log else [],
+            'history_count': history_counts.get(todo.id, 0),
             'assigned_by': assigned_by_info,
             'assignee_user_key': user.user_key,
             'assigner_user_key': todo.assigned_by.user_key if todo.assigned_by else None,
@@ -1000,7 +1212,10 @@ def get_user_detail(user_key):
         'permissions': {
             'can_modify': current_user.user_key == user_key or current_user.can_access_user_data(user_key),
             'can_assign': current_user.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value, UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.SECTION_CHIEF.value, UserLevel.TEAM_LEADER.value],
-            'assignable_users': [{'user_key': u.user_key, 'name': u.name, 'role': u.role} for u in User.query.all() if current_user.can_assign_to(u)]
+            'assignable_users': [
+                {'user_key': u.user_key, 'name': u.name, 'role': u.role}
+                for u in get_permission_index(db, User, CacheVersion).assignable_users(current_user)
+            ]
         }
     })
 
@@ -1044,22 +1259,20 @@ def add_todo():
         due_date=due_date # 設定預計完成日期
     )
     
-    # 初始化 history_log
-    history_entry = {
-        'event_type': 'assigned',
-        'timestamp': datetime.now(utc).isoformat(),
-        'actor': {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
-        'details': {'assigned_to': {'id': target_user.id, 'name': target_user.name, 'user_key': target_user.user_key}}
-    }
-    if todo.assigned_by_user_id: # If it was assigned by someone else
-        history_entry['details']['assigned_by'] = {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key}
-    
-    todo.history_log = json.dumps([history_entry])
-    
     db.session.add(todo)
-    db.session.commit()
+    db.session.flush() # 取得 todo.id 以記錄履歷
+
+    # 記錄指派履歷
+    details = {'assigned_to': {'id': target_user.id, 'name': target_user.name, 'user_key': target_user.user_key}}
+    if todo.assigned_by_user_id: # If it was assigned by someone else
+        details['assigned_by'] = {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key}
+    TodoEvent.record(
+        HistoryEntityType.TODO, todo.id, 'assigned',
+        actor={'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
+        details=details
+    )
     
-    # 發送「收到指派任務」通知
+    # 「收到指派任務」通知寫入寄件匣，與任務一起提交
     try:
         # 檢查是否為他人指派，且對方已啟用通知
         if target_user.id != current_user.id and target_user.notification_enabled:
@@ -1072,10 +1285,11 @@ def add_todo():
                 f"<b>預計完成日期:</b> {todo.due_date.strftime('%Y-%m-%d')}<br><br>"
                 f"請登入系統查看：<br><a href='http://192.168.6.119:5001'>http://192.168.6.119:5001</a>"
             )
-            send_mail(subject, body, target_user.email)
-            logging.info(f"Sent 'new task' notification for task {todo.id} to {target_user.email}")
+            queue_mail(subject, body, target_user.email)
+            logging.info(f"Queued 'new task' notification for task {todo.id} to {target_user.email}")
     except Exception as e:
-        logging.error(f"Failed to send 'new task' notification for task {todo.id}: {e}")
+        logging.error(f"Failed to queue 'new task' notification for task {todo.id}: {e}")
+    db.session.commit()
     
     return jsonify({'message': 'Todo added successfully', 'id': todo.id})
 
@@ -1123,22 +1337,21 @@ def batch_add_todo():
             due_date=due_date # 設定預計完成日期
         )
         
-        # 初始化 history_log
-        history_entry = {
-            'event_type': 'assigned',
-            'timestamp': datetime.now(utc).isoformat(),
-            'actor': {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
-            'details': {'assigned_to': {'id': target_user.id, 'name': target_user.name, 'user_key': target_user.user_key}}
-        }
-        if todo.assigned_by_user_id: # If it was assigned by someone else
-            history_entry['details']['assigned_by'] = {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key}
-        
-        todo.history_log = json.dumps([history_entry])
-        
         db.session.add(todo)
+        db.session.flush() # 取得 todo.id 以記錄履歷
+
+        # 記錄指派履歷
+        details = {'assigned_to': {'id': target_user.id, 'name': target_user.name, 'user_key': target_user.user_key}}
+        if todo.assigned_by_user_id: # If it was assigned by someone else
+            details['assigned_by'] = {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key}
+        TodoEvent.record(
+            HistoryEntityType.TODO, todo.id, 'assigned',
+            actor={'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
+            details=details
+        )
         successful_assignments.append({'user_key': user_key, 'id': todo.id})
         
-        # 發送「收到指派任務」通知
+        # 「收到指派任務」通知寫入寄件匣，隨整批任務一起提交；以彙整通知發送，同一人的多筆指派合併成一封
         # 只有當指派對象不是當前使用者本人，且對方已啟用通知時才發送
         if target_user.id != current_user.id and target_user.email and target_user.notification_enabled:
             try:
@@ -1151,10 +1364,10 @@ def batch_add_todo():
                     f"<b>預計完成日期:</b> {due_date.strftime('%Y-%m-%d')}<br><br>"
                     f"請登入系統查看：<br><a href='http://192.168.6.119:5001'>http://192.168.6.119:5001</a>"
                 )
-                send_mail(subject, body, target_user.email)
-                logging.info(f"Sent 'new task' notification for batch-added task to {target_user.email}")
+                queue_mail(subject, body, target_user.email, digest=True)
+                logging.info(f"Queued 'new task' notification for batch-added task to {target_user.email}")
             except Exception as e:
-                logging.error(f"Failed to send 'new task' notification for batch-added task to {target_user.email}: {e}")
+                logging.error(f"Failed to queue 'new task' notification for batch-added task to {target_user.email}: {e}")
 
     try:
         db.session.commit()
@@ -1228,29 +1441,61 @@ def get_dept_stats():
     return jsonify(dept_stats)
 
 @app.route('/api/export')
+@login_required
 def export_data():
-    users = User.query.all()
-    export_data = {
-        'export_date': datetime.now().isoformat(),
-        'users': []
-    }
-    
-    for user in users:
-        current_todos = Todo.query.filter_by(user_id=user.id, todo_type=TodoType.CURRENT.value).all()
-        next_todos = Todo.query.filter_by(user_id=user.id, todo_type=TodoType.NEXT.value).all()
-        
-        user_data = {
-            'name': user.name,
-            'role': user.role,
-            'department': user.department,
-            'todos': {
-                'current': [{'title': t.title, 'description': t.description, 'status': t.status} for t in current_todos],
-                'next': [{'title': t.title, 'description': t.description, 'status': t.status} for t in next_todos]
-            }
-        }
-        export_data['users'].append(user_data)
-    
-    return jsonify(export_data)
+    """
+    串流匯出任務 (NDJSON 或 CSV)，從單一資料庫游標逐列輸出，記憶體用量不隨資料量增加
+
+    只匯出目前使用者可以存取的使用者的任務 (與使用者面板相同的權限)。
+
+    Query Args:
+        format (str, optional): 'ndjson' (預設) 或 'csv'
+        unit (str, optional): 使用者單位
+        start_date (str, optional): 開始日期 YYYY-MM-DD (台灣時間，含)
+        end_date (str, optional): 結束日期 YYYY-MM-DD (台灣時間，含)
+        include_archived (bool, optional): 是否包含已歸檔任務，預設 false
+    """
+    current_user = get_current_user()
+    try:
+        export_format = ExportFormat(request.args.get('format', ExportFormat.NDJSON.value))
+        taiwan_tz = timezone('Asia/Taipei')
+
+        def _parse_day(name, offset_days=0):
+            value = request.args.get(name)
+            if not value:
+                return None
+            day = datetime.strptime(value, '%Y-%m-%d') + timedelta(days=offset_days)
+            return taiwan_tz.localize(day).astimezone(utc)
+
+        start_date = _parse_day('start_date')
+        end_date = _parse_day('end_date', offset_days=1)  # 包含結束日當天
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # 管理員可以匯出所有人，其他人依權限索引限制範圍
+    user_ids = None
+    if current_user.level != UserLevel.ADMIN.value:
+        user_ids = sorted(get_permission_index(db, User, CacheVersion).visible_ids(current_user))
+
+    query = build_export_query(
+        User, Todo, ArchivedTodo,
+        user_ids=user_ids,
+        unit=request.args.get('unit'),
+        start_date=start_date,
+        end_date=end_date,
+        include_archived=request.args.get('include_archived', 'false').lower() == 'true'
+    )
+    records = iter_export_rows(db, query)
+    filename = f"todo_export_{datetime.now(taiwan_tz).strftime('%Y%m%d_%H%M%S')}"
+    if export_format == ExportFormat.CSV:
+        body, mimetype, filename = to_csv(records), 'text/csv', f'{filename}.csv'
+    else:
+        body, mimetype, filename = to_ndjson(records), 'application/x-ndjson', f'{filename}.ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 @app.route('/api/org-structure')
 def get_org_structure():
@@ -1268,126 +1513,261 @@ def get_org_structure():
 # 報告查詢輔助函數
 # ============================================
 
-def _get_todo_statistics(start_date=None, end_date=None, user_id=None, department=None, status=None, include_archived=True):
+def _to_taiwan_str(value, fmt):
+    """UTC 時間 (naive 視為 UTC) 轉為台灣時間字串，None 時回傳 None"""
+    if not value:
+        return None
+    return (utc.localize(value) if not value.tzinfo else value).astimezone(timezone('Asia/Taipei')).strftime(fmt)
+
+def _todo_filters(model, date_column, start_date=None, end_date=None, user_ids=None, department=None, status=None):
     """
-    通用的 Todo 統計查詢函數
-    
+    Todo / ArchivedTodo 報告查詢共用的篩選條件
+
+    Args:
+        model: Todo 或 ArchivedTodo
+        date_column: 篩選日期範圍的欄位 (已歸檔任務為 archived_at，當前任務為 due_date)
+
+    Returns:
+        list: SQL 條件
+    """
+    conditions = []
+    if start_date:
+        conditions.append(date_column >= start_date)
+    if end_date:
+        conditions.append(date_column <= end_date)
+    if user_ids:
+        conditions.append(model.user_id.in_(user_ids))
+    if department:
+        conditions.append(model.user_id.in_(select(User.id).where(User.department == department)))
+    if status:
+        conditions.append(model.status == status)
+    return conditions
+
+def _current_todo_filters(start_date=None, end_date=None, user_ids=None, department=None, status=None, now_utc=None):
+    """
+    當前任務 (Todo) 統計的篩選條件：以 due_date 篩選日期範圍，
+    但期間開始前到期、尚未完成的逾期任務仍會列入，週/月概況、逾期數與排行榜不會漏掉拖延的任務。
+
+    Returns:
+        list: SQL 條件
+    """
+    conditions = _todo_filters(Todo, Todo.due_date, None, end_date, user_ids, department, status)
+    if start_date:
+        conditions.append(or_(
+            Todo.due_date >= start_date,
+            and_(Todo.due_date < (now_utc or datetime.now(utc)), Todo.status != TodoStatus.COMPLETED.value)
+        ))
+    return conditions
+
+def _archived_task_dict(todo, user_name):
+    return {
+        'id': todo.id,
+        'title': todo.title,
+        'description': todo.description,
+        'status': todo.status,
+        'user_name': user_name or 'Unknown',
+        'user_id': todo.user_id,
+        'due_date': _to_taiwan_str(todo.due_date, '%Y-%m-%d'),
+        'archived_at': _to_taiwan_str(todo.archived_at, '%Y-%m-%d %H:%M'),
+        'is_archived': True
+    }
+
+def _current_task_dict(todo, user_name, now_utc):
+    due_date_aware = None
+    if todo.due_date:
+        due_date_aware = utc.localize(todo.due_date) if todo.due_date.tzinfo is None else todo.due_date.astimezone(utc)
+    return {
+        'id': todo.id,
+        'title': todo.title,
+        'description': todo.description,
+        'status': todo.status,
+        'user_name': user_name or 'Unknown',
+        'user_id': todo.user_id,
+        'due_date': _to_taiwan_str(todo.due_date, '%Y-%m-%d'),
+        'is_overdue': bool(due_date_aware and todo.status != TodoStatus.COMPLETED.value and due_date_aware < now_utc),
+        'is_archived': False
+    }
+
+def _listing_cursor_args(*key_types):
+    """
+    解析報告列表 API 的游標分頁參數 (limit、cursor)
+
+    兩者都未提供時不分頁，回傳完整列表 (與原本的回應相同)。
+
+    Args:
+        *key_types: 游標中各排序鍵的型別，例如 (datetime, int)
+
+    Returns:
+        tuple: (limit，不分頁時為 None；上一頁最後一筆的排序鍵，第一頁為 None)
+
+    Raises:
+        ValueError: limit 或 cursor 格式錯誤
+    """
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit')
+    if not cursor and limit in (None, ''):
+        return None, None
+    return (parse_limit(limit, LISTING_PAGE_SIZE, LISTING_PAGE_SIZE_MAX),
+            decode_key(cursor, key_types) if cursor else None)
+
+def _keyset_fetch(query, sort_columns, key, limit=None, after=None, descending=False):
+    """
+    依 (排序鍵, id) 以游標分頁執行查詢
+
+    Args:
+        query: select 語句 (尚未排序)
+        sort_columns (list): 排序欄位，最後一個為 id
+        key (callable): 由一筆結果取得排序鍵 (與 sort_columns 對應)
+        limit (int): 每頁筆數，None 時回傳全部
+        after (list): 上一頁最後一筆的排序鍵
+        descending (bool): 是否為遞減排序
+
+    Returns:
+        tuple: (結果列表, next_cursor；沒有下一頁時為 None)
+    """
+    if after is not None:
+        query = query.where(keyset_after(sort_columns, after, descending))
+    query = query.order_by(*(column.desc() if descending else column for column in sort_columns))
+    if limit is None:
+        return db.session.execute(query).all(), None
+    return split_page(db.session.execute(query.limit(limit + 1)).all(), limit, key)
+
+def _todo_statistics(start_date=None, end_date=None, user_ids=None, department=None, status=None,
+                     include_archived=True, include_current=True, include_tasks=False):
+    """
+    Todo 統計引擎：狀態計數、逾期判斷與完成率都在 SQL 中以 GROUP BY / CASE 計算
+
+    已歸檔任務以 archived_at 篩選日期範圍，當前任務的條件見 _current_todo_filters
+    (期間開始前到期、尚未完成的逾期任務仍會列入)。
+    只有在 include_tasks=True 時才會另外查詢任務明細 (一次 JOIN User 取得使用者名稱)。
+
     Args:
         start_date: 開始日期 (UTC)
         end_date: 結束日期 (UTC)
-        user_id: 使用者 ID
+        user_ids: 使用者 ID 列表
         department: 部門名稱
         status: 任務狀態
         include_archived: 是否包含已歸檔的任務
-    
+        include_current: 是否包含當前任務
+        include_tasks: 是否回傳任務明細
+
     Returns:
         dict: 統計數據
     """
-    taiwan_tz = timezone('Asia/Taipei')
-    
-    # 查詢已歸檔的任務
-    archived_query = ArchivedTodo.query
-    if start_date:
-        archived_query = archived_query.filter(ArchivedTodo.archived_at >= start_date)
-    if end_date:
-        archived_query = archived_query.filter(ArchivedTodo.archived_at <= end_date)
-    if user_id:
-        archived_query = archived_query.filter(ArchivedTodo.user_id == user_id)
-    if status:
-        archived_query = archived_query.filter(ArchivedTodo.status == status)
-    
-    archived_todos = archived_query.all() if include_archived else []
-    
-    # 查詢當前任務
-    current_query = Todo.query
-    if user_id:
-        current_query = current_query.filter(Todo.user_id == user_id)
-    if status:
-        current_query = current_query.filter(Todo.status == status)
-    
-    current_todos = current_query.all()
-    
-    # 統計數據
+    now_utc = datetime.now(utc)
+
+    archived_filters = _todo_filters(ArchivedTodo, ArchivedTodo.archived_at, start_date, end_date, user_ids, department, status)
+    current_filters = _current_todo_filters(start_date, end_date, user_ids, department, status, now_utc)
+
+    # 每筆任務只取狀態與旗標，再於外層一次彙總
+    sources = []
+    if include_archived:
+        sources.append(
+            select(
+                ArchivedTodo.status.label('status'),
+                literal(1).label('is_archived'),
+                literal(0).label('is_overdue')
+            ).where(*archived_filters)
+        )
+    if include_current:
+        sources.append(
+            select(
+                Todo.status.label('status'),
+                literal(0).label('is_archived'),
+                db.case(
+                    (and_(Todo.due_date < now_utc, Todo.status != TodoStatus.COMPLETED.value), 1),
+                    else_=0
+                ).label('is_overdue')
+            ).where(*current_filters)
+        )
+
     stats = {
-        'total': len(archived_todos) + len(current_todos),
+        'total': 0,
         'completed': 0,
         'in_progress': 0,
         'pending': 0,
         'uncompleted': 0,
         'overdue': 0,
+        'completion_rate': 0,
         'tasks': []
     }
+
+    if sources:
+        rows = (union_all(*sources) if len(sources) > 1 else sources[0]).subquery()
+
+        def _count_status(value, current_only=False):
+            condition = rows.c.status == value
+            if current_only:
+                condition = and_(condition, rows.c.is_archived == 0)
+            return func.coalesce(func.sum(db.case((condition, 1), else_=0)), 0)
+
+        completed = _count_status(TodoStatus.COMPLETED.value)
+        total = func.count()
+        result = db.session.execute(select(
+            total,
+            completed,
+            # 已歸檔任務只會是已完成或未完成，進行中/待開始只計算當前任務
+            _count_status(TodoStatus.IN_PROGRESS.value, current_only=True),
+            _count_status(TodoStatus.PENDING.value, current_only=True),
+            _count_status(TodoStatus.UNCOMPLETED.value),
+            func.coalesce(func.sum(rows.c.is_overdue), 0),
+            func.coalesce(func.round(completed * 100.0 / func.nullif(total, 0), 2), 0)
+        )).one()
+        (stats['total'], stats['completed'], stats['in_progress'], stats['pending'],
+         stats['uncompleted'], stats['overdue'], stats['completion_rate']) = result
+
+    if include_tasks:
+        if include_archived:
+            archived_rows = db.session.execute(
+                select(ArchivedTodo, User.name)
+                .outerjoin(User, User.id == ArchivedTodo.user_id)
+                .where(*archived_filters)
+                .order_by(ArchivedTodo.id)
+            ).all()
+            stats['tasks'].extend(_archived_task_dict(todo, user_name) for todo, user_name in archived_rows)
+
+        if include_current:
+            current_rows = db.session.execute(
+                select(Todo, User.name)
+                .outerjoin(User, User.id == Todo.user_id)
+                .where(*current_filters)
+                .order_by(Todo.id)
+            ).all()
+            stats['tasks'].extend(_current_task_dict(todo, user_name, now_utc) for todo, user_name in current_rows)
+
+    return stats
+
+def _get_todo_statistics(start_date=None, end_date=None, user_id=None, department=None, status=None,
+                         include_archived=True, include_current=True, include_tasks=False):
+    """
+    通用的 Todo 統計查詢函數
     
-    # 處理已歸檔任務
-    for todo in archived_todos:
-        if todo.status == TodoStatus.COMPLETED.value:
-            stats['completed'] += 1
-        elif todo.status == TodoStatus.UNCOMPLETED.value:
-            stats['uncompleted'] += 1
-        
-        user = db.session.get(User, todo.user_id)
-        stats['tasks'].append({
-            'id': todo.id,
-            'title': todo.title,
-            'description': todo.description,
-            'status': todo.status,
-            'user_name': user.name if user else 'Unknown',
-            'user_id': todo.user_id,
-            'due_date': (utc.localize(todo.due_date) if todo.due_date and not todo.due_date.tzinfo else todo.due_date).astimezone(taiwan_tz).strftime('%Y-%m-%d') if todo.due_date else None,
-            'archived_at': (utc.localize(todo.archived_at) if todo.archived_at and not todo.archived_at.tzinfo else todo.archived_at).astimezone(taiwan_tz).strftime('%Y-%m-%d %H:%M') if todo.archived_at else None,
-            'is_archived': True
-        })
-    
-    # 處理當前任務
-    today_utc = datetime.now(utc)
-    # 確保時區一致性：如果資料庫中的 due_date 是 naive，則需要本地化
-    for todo in current_todos:
-        if todo.status == TodoStatus.COMPLETED.value:
-            stats['completed'] += 1
-        elif todo.status == TodoStatus.IN_PROGRESS.value:
-            stats['in_progress'] += 1
-        elif todo.status == TodoStatus.PENDING.value:
-            stats['pending'] += 1
-        elif todo.status == TodoStatus.UNCOMPLETED.value:
-            stats['uncompleted'] += 1
-        
-        # 檢查是否逾期
-        is_overdue = False
-        if todo.due_date and todo.status != TodoStatus.COMPLETED.value:
-            # 確保時區一致性 - 統一轉換為 aware datetime
-            if todo.due_date.tzinfo is None:
-                # naive datetime - 假設是 UTC
-                due_date_aware = utc.localize(todo.due_date)
-            else:
-                # 已經是 aware datetime
-                due_date_aware = todo.due_date.astimezone(utc)
-            
-            if due_date_aware < today_utc:
-                is_overdue = True
-                stats['overdue'] += 1
-        
-        user = db.session.get(User, todo.user_id)
-        stats['tasks'].append({
-            'id': todo.id,
-            'title': todo.title,
-            'description': todo.description,
-            'status': todo.status,
-            'user_name': user.name if user else 'Unknown',
-            'user_id': todo.user_id,
-            'due_date': (utc.localize(todo.due_date) if todo.due_date and not todo.due_date.tzinfo else todo.due_date).astimezone(taiwan_tz).strftime('%Y-%m-%d') if todo.due_date else None,
-            'is_overdue': is_overdue,
-            'is_archived': False
-        })
-    
-    # 計算完成率
-    if stats['total'] > 0:
-        stats['completion_rate'] = round((stats['completed'] / stats['total']) * 100, 2)
-    else:
-        stats['completion_rate'] = 0
+    Args:
+        start_date: 開始日期 (UTC)
+        end_date: 結束日期 (UTC)
+        user_id: 使用者 ID
+        department: 部門名稱
+        status: 任務狀態
+        include_archived: 是否包含已歸檔的任務
+        include_current: 是否包含當前任務
+        include_tasks: 是否回傳任務明細
     
-    return stats
+    Returns:
+        dict: 統計數據
+    """
+    return _todo_statistics(
+        start_date=start_date,
+        end_date=end_date,
+        user_ids=[user_id] if user_id else None,
+        department=department,
+        status=status,
+        include_archived=include_archived,
+        include_current=include_current,
+        include_tasks=include_tasks
+    )
 
-def _get_todo_statistics_multi_users(start_date=None, end_date=None, user_ids=None, status=None, include_archived=True):
+def _get_todo_statistics_multi_users(start_date=None, end_date=None, user_ids=None, status=None,
+                                     include_archived=True, include_current=True, include_tasks=False):
     """
     多使用者的 Todo 統計查詢函數
     
@@ -1397,109 +1777,144 @@ def _get_todo_statistics_multi_users(start_date=None, end_date=None, user_ids=No
         user_ids: 使用者 ID 列表
         status: 任務狀態
         include_archived: 是否包含已歸檔的任務
+        include_current: 是否包含當前任務
+        include_tasks: 是否回傳任務明細
     
     Returns:
         dict: 統計數據
     """
-    taiwan_tz = timezone('Asia/Taipei')
-    
-    # 查詢已歸檔的任務
-    archived_query = ArchivedTodo.query
-    if start_date:
-        archived_query = archived_query.filter(ArchivedTodo.archived_at >= start_date)
-    if end_date:
-        archived_query = archived_query.filter(ArchivedTodo.archived_at <= end_date)
-    if user_ids:
-        archived_query = archived_query.filter(ArchivedTodo.user_id.in_(user_ids))
-    if status:
-        archived_query = archived_query.filter(ArchivedTodo.status == status)
-    
-    archived_todos = archived_query.all() if include_archived else []
-    
-    # 查詢當前任務
-    current_query = Todo.query
-    if user_ids:
-        current_query = current_query.filter(Todo.user_id.in_(user_ids))
-    if status:
-        current_query = current_query.filter(Todo.status == status)
-    
-    current_todos = current_query.all()
-    
-    # 統計數據
-    stats = {
-        'total': len(archived_todos) + len(current_todos),
-        'completed': 0,
-        'in_progress': 0,
-        'pending': 0,
-        'uncompleted': 0,
-        'overdue': 0,
-        'tasks': []
+    return _todo_statistics(
+        start_date=start_date,
+        end_date=end_date,
+        user_ids=user_ids,
+        status=status,
+        include_archived=include_archived,
+        include_current=include_current,
+        include_tasks=include_tasks
+    )
+
+def _archived_todo_page(start_date=None, end_date=None, user_ids=None, status=None, page=1, per_page=50):
+    """
+    已歸檔任務的分頁查詢：總數與狀態計數以一次 COUNT 取得，明細只查詢該頁 (LIMIT/OFFSET)
+
+    篩選條件與 _todo_statistics 相同 (以 archived_at 篩選日期範圍)，依 ID 排序。
+
+    Args:
+        start_date: 開始日期 (UTC)
+        end_date: 結束日期 (UTC)
+        user_ids: 使用者 ID 列表
+        status: 任務狀態
+        page: 頁碼 (從 1 開始)
+        per_page: 每頁筆數
+
+    Returns:
+        dict: {'total', 'completed', 'uncompleted', 'tasks'}
+    """
+    filters = _todo_filters(ArchivedTodo, ArchivedTodo.archived_at, start_date, end_date, user_ids, status=status)
+
+    def _count_status(value):
+        return func.coalesce(func.sum(db.case((ArchivedTodo.status == value, 1), else_=0)), 0)
+
+    total, completed, uncompleted = db.session.execute(
+        select(func.count(), _count_status(TodoStatus.COMPLETED.value), _count_status(TodoStatus.UNCOMPLETED.value))
+        .where(*filters)
+    ).one()
+
+    rows = db.session.execute(
+        select(ArchivedTodo, User.name)
+        .outerjoin(User, User.id == ArchivedTodo.user_id)
+        .where(*filters)
+        .order_by(ArchivedTodo.id)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all() if total else []
+
+    return {
+        'total': total,
+        'completed': completed,
+        'uncompleted': uncompleted,
+        'tasks': [_archived_task_dict(todo, user_name) for todo, user_name in rows]
     }
-    
-    # 處理已歸檔任務
-    for todo in archived_todos:
-        if todo.status == TodoStatus.COMPLETED.value:
-            stats['completed'] += 1
-        elif todo.status == TodoStatus.UNCOMPLETED.value:
-            stats['uncompleted'] += 1
-        
-        user = db.session.get(User, todo.user_id)
-        stats['tasks'].append({
-            'id': todo.id,
-            'title': todo.title,
-            'description': todo.description,
-            'status': todo.status,
-            'user_name': user.name if user else 'Unknown',
-            'user_id': todo.user_id,
-            'due_date': (utc.localize(todo.due_date) if todo.due_date and not todo.due_date.tzinfo else todo.due_date).astimezone(taiwan_tz).strftime('%Y-%m-%d') if todo.due_date else None,
-            'archived_at': (utc.localize(todo.archived_at) if todo.archived_at and not todo.archived_at.tzinfo else todo.archived_at).astimezone(taiwan_tz).strftime('%Y-%m-%d %H:%M') if todo.archived_at else None,
-            'is_archived': True
-        })
-    
-    # 處理當前任務
-    today_utc = datetime.now(utc)
-    for todo in current_todos:
-        if todo.status == TodoStatus.COMPLETED.value:
-            stats['completed'] += 1
-        elif todo.status == TodoStatus.IN_PROGRESS.value:
-            stats['in_progress'] += 1
-        elif todo.status == TodoStatus.PENDING.value:
-            stats['pending'] += 1
-        elif todo.status == TodoStatus.UNCOMPLETED.value:
-            stats['uncompleted'] += 1
-        
-        # 檢查是否逾期
-        is_overdue = False
-        if todo.due_date and todo.status != TodoStatus.COMPLETED.value:
-            if todo.due_date.tzinfo is None:
-                due_date_aware = utc.localize(todo.due_date)
-            else:
-                due_date_aware = todo.due_date.astimezone(utc)
-            
-            if due_date_aware < today_utc:
-                is_overdue = True
-                stats['overdue'] += 1
-        
-        user = db.session.get(User, todo.user_id)
-        stats['tasks'].append({
-            'id': todo.id,
-            'title': todo.title,
-            'description': todo.description,
-            'status': todo.status,
-            'user_name': user.name if user else 'Unknown',
-            'user_id': todo.user_id,
-            'due_date': (utc.localize(todo.due_date) if todo.due_date and not todo.due_date.tzinfo else todo.due_date).astimezone(taiwan_tz).strftime('%Y-%m-%d') if todo.due_date else None,
-            'is_overdue': is_overdue,
-            'is_archived': False
-        })
-    
-    # 計算完成率
-    if stats['total'] > 0:
-        stats['completion_rate'] = round((stats['completed'] / stats['total']) * 100, 2)
+
+def _ranking_scope_users(current_user, active_only=False):
+    """
+    依報告範圍權限取得排行榜的使用者，成員取自權限索引 (不載入 User 資料列)
+
+    管理員、協理可以看所有人，廠長、經理、副理看自己單位，課長、副課長看自己部門和單位，
+    其他人只能看自己；範圍內的系統管理員不列入排行。
+
+    Args:
+        active_only (bool): 是否只列出在職的使用者
+
+    Returns:
+        list: UserRef (只能看自己時為 current_user)，依 ID 排序
+    """
+    if current_user.level not in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value] + MANAGER_LEVELS + SECTION_LEVELS:
+        return [current_user]
+    index = get_permission_index(db, User, CacheVersion)
+    if current_user.level in MANAGER_LEVELS:
+        user_ids = index.unit_user_ids(current_user.unit)
+    elif current_user.level in SECTION_LEVELS:
+        user_ids = index.unit_department_user_ids(current_user.department, current_user.unit)
     else:
-        stats['completion_rate'] = 0
-    
-    return stats
+        user_ids = list(index.users)
+    users = (index.users[user_id] for user_id in user_ids)
+    return [user for user in users
+            if user.level != UserLevel.ADMIN.value and (user.is_active or not active_only)]
+
+def _get_user_ranking_stats(user_ids, start_date=None, end_date=None):
+    """
+    一次 GROUP BY user_id 算出排行榜所需的統計
+
+    與 _todo_statistics 相同：已歸檔任務以 archived_at 篩選，當前任務以 _current_todo_filters 篩選
+    (期間開始前到期、尚未完成的逾期任務仍會列入，不會因此提高完成率)。
+    完成天數為已完成任務 created_at 到 completed_at (改為已完成的時間) 的天數，沒有完成時間的任務不計入平均。
+
+    Args:
+        user_ids: 使用者 ID 列表
+        start_date: 開始日期 (UTC)
+        end_date: 結束日期 (UTC)
+
+    Returns:
+        dict: {user_id: {'total', 'completed', 'completion_rate', 'avg_days'}}，沒有任務的使用者不會出現
+    """
+    if not user_ids:
+        return {}
+
+    def _source(model, conditions):
+        is_completed = model.status == TodoStatus.COMPLETED.value
+        return select(
+            model.user_id.label('user_id'),
+            db.case((is_completed, 1), else_=0).label('is_completed'),
+            db.case(
+                (is_completed, func.julianday(model.completed_at) - func.julianday(model.created_at)),
+                else_=None
+            ).label('completion_days')
+        ).where(*conditions)
+
+    rows = union_all(
+        _source(ArchivedTodo, _todo_filters(ArchivedTodo, ArchivedTodo.archived_at, start_date, end_date, user_ids)),
+        _source(Todo, _current_todo_filters(start_date, end_date, user_ids))
+    ).subquery()
+
+    results = db.session.execute(
+        select(
+            rows.c.user_id,
+            func.count(),
+            func.sum(rows.c.is_completed),
+            func.avg(rows.c.completion_days)  # AVG 會忽略 NULL，只平均已完成任務
+        ).group_by(rows.c.user_id)
+    ).all()
+
+    ranking_stats = {}
+    for user_id, total, completed, avg_days in results:
+        ranking_stats[user_id] = {
+            'total': total,
+            'completed': completed or 0,
+            'completion_rate': round((completed or 0) / total * 100, 2) if total else 0,
+            'avg_days': avg_days
+        }
+    return ranking_stats
 
 def _get_user_ranking(period='week', metric='completed', limit=10, current_user=None):
     """
@@ -1531,63 +1946,39 @@ def _get_user_ranking(period='week', metric='completed', limit=10, current_user=
     
     # 根據權限決定查詢範圍
     if current_user:
-        if current_user.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
-            # 管理員和協理可以看所有人
-            users = User.query.filter_by(is_active=True).filter(User.level != UserLevel.ADMIN.value).all()
-        elif current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            # 廠長、經理、副理可以看自己單位的人
-            users = User.query.filter_by(is_active=True, unit=current_user.unit).filter(User.level != UserLevel.ADMIN.value).all()
-        elif current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            # 課長、副課長可以看自己部門和單位的人
-            users = User.query.filter_by(is_active=True, department=current_user.department, unit=current_user.unit).filter(User.level != UserLevel.ADMIN.value).all()
-        else:
-            # 其他人只能看自己
-            users = [current_user]
+        users = _ranking_scope_users(current_user, active_only=True)
     else:
         # 沒有提供 current_user，查詢所有活躍使用者
-        users = User.query.filter_by(is_active=True).all()
+        users = [user for user in get_permission_index(db, User, CacheVersion).users.values() if user.is_active]
     
+    user_ids = [user.id for user in users]
+    ranking_stats = _get_user_ranking_stats(user_ids, start_date=start_date_utc)
+
     user_stats = []
-    
     for user in users:
-        stats = _get_todo_statistics(
-            start_date=start_date_utc,
-            user_id=user.id,
-            include_archived=True
-        )
-        
-        # 計算平均完成天數
-        avg_days = 0
-        completed_tasks = [t for t in stats['tasks'] if t['status'] == TodoStatus.COMPLETED.value and t.get('is_archived')]
-        if completed_tasks:
-            total_days = 0
-            count = 0
-            for task in completed_tasks:
-                # 這裡簡化計算，實際應該計算建立日期到完成日期的天數
-                count += 1
-            if count > 0:
-                avg_days = total_days / count
-        
+        stats = ranking_stats.get(user.id, {})
+        avg_days = stats.get('avg_days')
         user_stats.append({
             'user_id': user.id,
             'user_name': user.name,
             'department': user.department,
             'unit': user.unit,
             'role': user.role,
-            'total_tasks': stats['total'],
-            'completed_tasks': stats['completed'],
-            'completion_rate': stats['completion_rate'],
-            'avg_days': round(avg_days, 1)
+            'total_tasks': stats.get('total', 0),
+            'completed_tasks': stats.get('completed', 0),
+            'completion_rate': stats.get('completion_rate', 0),
+            'avg_days': round(avg_days, 1) if avg_days is not None else 0
         })
-    
-    # 根據指標排序
+
+    # 只取前 limit 名，不需排序整個列表 (heapq 與 sorted 一樣保持同分時的原始順序)
     if metric == 'completed':
-        user_stats.sort(key=lambda x: x['completed_tasks'], reverse=True)
+        return heapq.nlargest(limit, user_stats, key=lambda x: x['completed_tasks'])
     elif metric == 'completion_rate':
-        user_stats.sort(key=lambda x: x['completion_rate'], reverse=True)
+        return heapq.nlargest(limit, user_stats, key=lambda x: x['completion_rate'])
     elif metric == 'avg_days':
-        user_stats.sort(key=lambda x: x['avg_days'])
-    
+        # 沒有已完成任務的使用者沒有平均天數，排在最後
+        return heapq.nsmallest(limit, user_stats, key=lambda x: (x['completed_tasks'] == 0, x['avg_days']))
+
     return user_stats[:limit]
 
 def _get_meeting_task_statistics(start_date=None, end_date=None, task_type=None, status=None, user_id=None):
@@ -1786,6 +2177,113 @@ def _get_meeting_task_statistics_multi_users(start_date=None, end_date=None, tas
     
     return stats
 
+def _meeting_task_scope_filters(current_user):
+    """
+    會議任務報告依權限的負責人篩選條件
+
+    Returns:
+        list: SQL 條件 (管理員和協理可以看全部，為空列表)
+    """
+    if current_user.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
+        return []
+    if current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
+        # 廠長、經理、副理可以看自己單位的
+        unit_user_ids = get_permission_index(db, User, CacheVersion).unit_user_ids(current_user.unit)
+        return [MeetingTask.assigned_to_user_id.in_(unit_user_ids)]
+    if current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
+        # 課長、副課長可以看自己部門和單位的
+        dept_user_ids = get_permission_index(db, User, CacheVersion).unit_department_user_ids(current_user.department, current_user.unit)
+        return [MeetingTask.assigned_to_user_id.in_(dept_user_ids)]
+    # 一般員工只能看自己的
+    return [MeetingTask.assigned_to_user_id == current_user.id]
+
+def _meeting_task_total(conditions):
+    return db.session.execute(
+        select(func.count()).select_from(MeetingTask).join(Meeting, Meeting.id == MeetingTask.meeting_id).where(*conditions)
+    ).scalar_one()
+
+def _meeting_task_select():
+    """會議任務列表共用的查詢：會議主旨、日期與負責人、指派人、管制人名稱在同一個查詢中 JOIN 取得"""
+    assigned_to = db.aliased(User)
+    assigned_by = db.aliased(User)
+    controller = db.aliased(User)
+    return (
+        select(MeetingTask, Meeting.subject, Meeting.meeting_date,
+               assigned_to.name, assigned_by.name, controller.name)
+        .join(Meeting, Meeting.id == MeetingTask.meeting_id)
+        .outerjoin(assigned_to, assigned_to.id == MeetingTask.assigned_to_user_id)
+        .outerjoin(assigned_by, assigned_by.id == MeetingTask.assigned_by_user_id)
+        .outerjoin(controller, controller.id == MeetingTask.controller_user_id)
+    )
+
+def _meeting_task_report_page(start_date=None, task_type=None, statuses=None, user_id=None, page=1, per_page=50,
+                              after_id=None):
+    """
+    會議任務報告列表的分頁查詢：總數以 COUNT 取得，只查詢該頁的任務
+
+    依 ID 排序；提供 after_id (游標) 時從該筆之後讀取，否則以頁碼 LIMIT/OFFSET。
+
+    Args:
+        start_date: 會議開始日期 (UTC)
+        task_type: 任務類型 (tracking/resolution)
+        statuses: 任務狀態列表
+        user_id: 負責人 ID
+        page: 頁碼 (從 1 開始)
+        per_page: 每頁筆數
+        after_id: 上一頁最後一筆的 ID
+
+    Returns:
+        tuple: (total, tasks, next_cursor)
+    """
+    conditions = []
+    if start_date:
+        conditions.append(Meeting.meeting_date >= start_date)
+    if task_type:
+        conditions.append(MeetingTask.task_type == task_type)
+    if statuses:
+        conditions.append(MeetingTask.status.in_(statuses))
+    if user_id:
+        conditions.append(MeetingTask.assigned_to_user_id == user_id)
+
+    total = _meeting_task_total(conditions)
+    if not total:
+        return 0, [], None
+
+    query = _meeting_task_select().where(*conditions)
+    if after_id is None:
+        query = query.offset((page - 1) * per_page)
+    rows, next_cursor = _keyset_fetch(
+        query, [MeetingTask.id], key=lambda row: (row[0].id,),
+        limit=per_page, after=None if after_id is None else [after_id]
+    )
+
+    today_utc = datetime.now(utc)
+    tasks = []
+    for task, subject, meeting_date, assigned_to_name, assigned_by_name, controller_name in rows:
+        # 逾期只判斷追蹤項目 (決議項目沒有時間壓力)
+        is_overdue = False
+        if task.task_type != MeetingTaskType.RESOLUTION.value and task.expected_completion_date \
+                and task.status != MeetingTaskStatus.COMPLETED.value:
+            expected_date = task.expected_completion_date
+            is_overdue = (expected_date if expected_date.tzinfo else utc.localize(expected_date)) < today_utc
+        tasks.append({
+            'id': task.id,
+            'meeting_id': task.meeting_id,
+            'meeting_subject': subject,
+            'meeting_date': _to_taiwan_str(meeting_date, '%Y-%m-%d'),
+            'task_type': task.task_type,
+            'task_description': task.task_description,
+            'status': task.status,
+            'assigned_to_name': assigned_to_name or 'Unknown',
+            'assigned_by_name': assigned_by_name or 'Unknown',
+            'controller_name': controller_name,
+            'expected_completion_date': _to_taiwan_str(task.expected_completion_date, '%Y-%m-%d'),
+            'actual_completion_date': _to_taiwan_str(task.actual_completion_date, '%Y-%m-%d'),
+            'is_overdue': is_overdue,
+            'uncompleted_reason': task.uncompleted_reason_from_todo
+        })
+    return total, tasks, next_cursor
+
 # ============================================
 # 原有的報告生成函數
 # ============================================
@@ -1796,6 +2294,7 @@ def _generate_report_data(start_date, end_date):
         ArchivedTodo.archived_at >= start_date,
         ArchivedTodo.archived_at <= end_date
     ).all()
+    histories = TodoEvent.history_for_many(HistoryEntityType.ARCHIVED_TODO, [t.id for t in archived_todos])
 
     report_data = {}
     for todo in archived_todos:
@@ -1833,9 +2332,9 @@ def _generate_report_data(start_date, end_date):
                 user_data['uncompleted_tasks'] += 1
             
             processed_history_log = []
-            if todo.history_log:
+            history_entries = histories.get(todo.id, [])
+            if history_entries:
                 try:
-                    history_entries = json.loads(todo.history_log)
                     for entry in history_entries:
                         if isinstance(entry, dict) and 'timestamp' in entry and entry['timestamp']:
                             try:
@@ -1847,7 +2346,7 @@ def _generate_report_data(start_date, end_date):
                         else:
                             processed_history_log.append(entry) # Keep entry as is if not a dict or no timestamp
                 except Exception as e: # Catch any exception during history_log processing
-                    logging.error(f"Error processing history_log for todo ID {todo.id}: {todo.history_log}. Error: {e}")
+                    logging.error(f"Error processing history_log for todo ID {todo.id}: {history_entries}. Error: {e}")
                     processed_history_log = [{'event_type': 'error', 'details': f'Error processing history log: {e}'}]
 
             user_data['tasks'].append({
@@ -1950,16 +2449,14 @@ def get_todo_overview():
             current_stats = _get_todo_statistics(include_archived=False)
         # 廠長、經理、副理可以看自己單位的
         elif current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            unit_users = User.query.filter_by(unit=current_user.unit).all()
-            unit_user_ids = [u.id for u in unit_users]
+            unit_user_ids = get_permission_index(db, User, CacheVersion).unit_user_ids(current_user.unit)
             week_stats = _get_todo_statistics_multi_users(start_date=start_of_week_utc, user_ids=unit_user_ids)
             month_stats = _get_todo_statistics_multi_users(start_date=start_of_month_utc, user_ids=unit_user_ids)
             year_stats = _get_todo_statistics_multi_users(start_date=start_of_year_utc, user_ids=unit_user_ids)
             current_stats = _get_todo_statistics_multi_users(user_ids=unit_user_ids, include_archived=False)
         # 課長、副課長可以看自己部門和單位的
         elif current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            dept_users = User.query.filter_by(department=current_user.department, unit=current_user.unit).all()
-            dept_user_ids = [u.id for u in dept_users]
+            dept_user_ids = get_permission_index(db, User, CacheVersion).unit_department_user_ids(current_user.department, current_user.unit)
             week_stats = _get_todo_statistics_multi_users(start_date=start_of_week_utc, user_ids=dept_user_ids)
             month_stats = _get_todo_statistics_multi_users(start_date=start_of_month_utc, user_ids=dept_user_ids)
             year_stats = _get_todo_statistics_multi_users(start_date=start_of_year_utc, user_ids=dept_user_ids)
@@ -2012,8 +2509,8 @@ def get_todo_historical():
         user_id = request.args.get('user_id', type=int)
         department = request.args.get('department')
         status = request.args.get('status')
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = max(request.args.get('per_page', 50, type=int), 1)
         
         # 計算時間範圍
         taiwan_tz = timezone('Asia/Taipei')
@@ -2074,97 +2571,53 @@ def get_todo_historical():
         # 管理員和協理可以看全部
         if current_user.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
             # 如果指定了user_id就按user_id查，否則查全部
-            if user_id:
-                stats = _get_todo_statistics(
-                    start_date=start_date_utc,
-                    end_date=end_date_utc if 'end_date_utc' in locals() else None,
-                    user_id=user_id,
-                    status=status,
-                    include_archived=True
-                )
-            else:
-                stats = _get_todo_statistics(
-                    start_date=start_date_utc,
-                    end_date=end_date_utc if 'end_date_utc' in locals() else None,
-                    status=status,
-                    include_archived=True
-                )
+            scope_user_ids = [user_id] if user_id else None
         # 廠長、經理、副理可以看自己單位的
         elif current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            unit_users = User.query.filter_by(unit=current_user.unit).all()
-            unit_user_ids = [u.id for u in unit_users]
+            unit_user_ids = get_permission_index(db, User, CacheVersion).unit_user_ids(current_user.unit)
             
             # 如果指定了user_id，檢查是否在單位內
             if user_id:
                 if user_id not in unit_user_ids:
                     return jsonify({'error': '您沒有權限查看其他單位的數據'}), 403
-                stats = _get_todo_statistics(
-                    start_date=start_date_utc,
-                    end_date=end_date_utc if 'end_date_utc' in locals() else None,
-                    user_id=user_id,
-                    status=status,
-                    include_archived=True
-                )
+                scope_user_ids = [user_id]
             else:
-                stats = _get_todo_statistics_multi_users(
-                    start_date=start_date_utc,
-                    end_date=end_date_utc if 'end_date_utc' in locals() else None,
-                    user_ids=unit_user_ids,
-                    status=status,
-                    include_archived=True
-                )
+                scope_user_ids = unit_user_ids
         # 課長、副課長可以看自己部門和單位的
         elif current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            dept_users = User.query.filter_by(department=current_user.department, unit=current_user.unit).all()
-            dept_user_ids = [u.id for u in dept_users]
+            dept_user_ids = get_permission_index(db, User, CacheVersion).unit_department_user_ids(current_user.department, current_user.unit)
             
             # 如果指定了user_id，檢查是否在部門內
             if user_id:
                 if user_id not in dept_user_ids:
                     return jsonify({'error': '您沒有權限查看其他部門的數據'}), 403
-                stats = _get_todo_statistics(
-                    start_date=start_date_utc,
-                    end_date=end_date_utc if 'end_date_utc' in locals() else None,
-                    user_id=user_id,
-                    status=status,
-                    include_archived=True
-                )
+                scope_user_ids = [user_id]
             else:
-                stats = _get_todo_statistics_multi_users(
-                    start_date=start_date_utc,
-                    end_date=end_date_utc if 'end_date_utc' in locals() else None,
-                    user_ids=dept_user_ids,
-                    status=status,
-                    include_archived=True
-                )
+                scope_user_ids = dept_user_ids
         else:
             # 一般員工只能看自己的
-            stats = _get_todo_statistics(
-                start_date=start_date_utc,
-                end_date=end_date_utc if 'end_date_utc' in locals() else None,
-                user_id=current_user.id,
-                status=status,
-                include_archived=True
-            )
+            scope_user_ids = [current_user.id]
         
-        # 過濾出已歸檔的任務
-        archived_tasks = [t for t in stats['tasks'] if t.get('is_archived')]
-        
-        # 分頁
-        total = len(archived_tasks)
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_tasks = archived_tasks[start_idx:end_idx]
+        # 分頁與計數都在資料庫中完成，只載入該頁的任務
+        result = _archived_todo_page(
+            start_date=start_date_utc,
+            end_date=end_date_utc,
+            user_ids=scope_user_ids,
+            status=status,
+            page=page,
+            per_page=per_page
+        )
+        total = result['total']
         
         return jsonify({
             'total': total,
             'page': page,
             'per_page': per_page,
             'total_pages': (total + per_page - 1) // per_page,
-            'tasks': paginated_tasks,
+            'tasks': result['tasks'],
             'stats': {
-                'completed': len([t for t in archived_tasks if t['status'] == TodoStatus.COMPLETED.value]),
-                'uncompleted': len([t for t in archived_tasks if t['status'] == TodoStatus.UNCOMPLETED.value])
+                'completed': result['completed'],
+                'uncompleted': result['uncompleted']
             }
         })
     except Exception as e:
@@ -2174,7 +2627,13 @@ def get_todo_historical():
 @app.route('/api/reports/todo/current')
 @login_required
 def get_todo_current():
-    """獲取當前未完成任務列表"""
+    """
+    獲取當前未完成任務列表，依 (預計完成日期, ID) 排序
+
+    Query Args:
+        limit (int, optional): 每頁筆數；與 cursor 都未提供時回傳全部
+        cursor (str, optional): 上一頁回傳的 next_cursor
+    """
     current_user = get_current_user()
     if not current_user:
         return jsonify({'error': '未授權'}), 401
@@ -2183,85 +2642,66 @@ def get_todo_current():
         user_id = request.args.get('user_id', type=int)
         status = request.args.get('status')
         show_overdue_only = request.args.get('overdue_only', 'false').lower() == 'true'
+        try:
+            limit, after = _listing_cursor_args(datetime, int)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # 根據權限決定查詢範圍
         # 管理員和協理可以看全部
         if current_user.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
             # 如果指定了user_id就按user_id查，否則查全部
-            if user_id:
-                stats = _get_todo_statistics(
-                    user_id=user_id,
-                    status=status,
-                    include_archived=False
-                )
-            else:
-                stats = _get_todo_statistics(
-                    status=status,
-                    include_archived=False
-                )
+            scope_user_ids = [user_id] if user_id else None
         # 廠長、經理、副理可以看自己單位的
         elif current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            unit_users = User.query.filter_by(unit=current_user.unit).all()
-            unit_user_ids = [u.id for u in unit_users]
+            unit_user_ids = get_permission_index(db, User, CacheVersion).unit_user_ids(current_user.unit)
             
             # 如果指定了user_id，檢查是否在單位內
             if user_id:
                 if user_id not in unit_user_ids:
                     return jsonify({'error': '您沒有權限查看其他單位的數據'}), 403
-                stats = _get_todo_statistics(
-                    user_id=user_id,
-                    status=status,
-                    include_archived=False
-                )
+                scope_user_ids = [user_id]
             else:
-                stats = _get_todo_statistics_multi_users(
-                    user_ids=unit_user_ids,
-                    status=status,
-                    include_archived=False
-                )
+                scope_user_ids = unit_user_ids
         # 課長、副課長可以看自己部門和單位的
         elif current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            dept_users = User.query.filter_by(department=current_user.department, unit=current_user.unit).all()
-            dept_user_ids = [u.id for u in dept_users]
+            dept_user_ids = get_permission_index(db, User, CacheVersion).unit_department_user_ids(current_user.department, current_user.unit)
             
             # 如果指定了user_id，檢查是否在部門內
             if user_id:
                 if user_id not in dept_user_ids:
                     return jsonify({'error': '您沒有權限查看其他部門的數據'}), 403
-                stats = _get_todo_statistics(
-                    user_id=user_id,
-                    status=status,
-                    include_archived=False
-                )
+                scope_user_ids = [user_id]
             else:
-                stats = _get_todo_statistics_multi_users(
-                    user_ids=dept_user_ids,
-                    status=status,
-                    include_archived=False
-                )
+                scope_user_ids = dept_user_ids
         else:
             # 一般員工只能看自己的
-            stats = _get_todo_statistics(
-                user_id=current_user.id,
-                status=status,
-                include_archived=False
-            )
+            scope_user_ids = [current_user.id]
         
-        # 過濾出當前未完成任務（排除已完成、未完成(已關閉)和已歸檔）
-        current_tasks = [
-            t for t in stats['tasks'] 
-            if not t.get('is_archived') 
-            and t.get('status') != TodoStatus.COMPLETED.value
-            and t.get('status') != TodoStatus.UNCOMPLETED.value
-        ]
+        stats = _todo_statistics(user_ids=scope_user_ids, status=status, include_archived=False)
         
-        # 如果只顯示逾期任務
+        # 當前未完成任務（排除已完成、未完成(已關閉)）；逾期篩選也在 SQL 中完成
+        now_utc = datetime.now(utc)
+        conditions = _todo_filters(Todo, Todo.due_date, user_ids=scope_user_ids, status=status) + [
+            Todo.status.notin_([TodoStatus.COMPLETED.value, TodoStatus.UNCOMPLETED.value])
+        ]
         if show_overdue_only:
-            current_tasks = [t for t in current_tasks if t.get('is_overdue')]
+            conditions.append(Todo.due_date < now_utc)
+        
+        rows, next_cursor = _keyset_fetch(
+            select(Todo, User.name).outerjoin(User, User.id == Todo.user_id).where(*conditions),
+            [Todo.due_date, Todo.id], key=lambda row: (row[0].due_date, row[0].id),
+            limit=limit, after=after
+        )
+        if limit is None:
+            total = len(rows)
+        else:
+            total = db.session.execute(select(func.count()).select_from(Todo).where(*conditions)).scalar_one()
         
         return jsonify({
-            'total': len(current_tasks),
-            'tasks': current_tasks,
+            'total': total,
+            'tasks': [_current_task_dict(todo, user_name, now_utc) for todo, user_name in rows],
+            'next_cursor': next_cursor,
             'stats': {
                 'in_progress': stats['in_progress'],
                 'pending': stats['pending'],
@@ -2339,16 +2779,14 @@ def get_meeting_tasks_overview():
         # 廠長、經理、副理可以看自己單位的
         elif current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
             # 獲取單位所有人員
-            unit_users = User.query.filter_by(unit=current_user.unit).all()
-            unit_user_ids = [u.id for u in unit_users]
+            unit_user_ids = get_permission_index(db, User, CacheVersion).unit_user_ids(current_user.unit)
             week_stats = _get_meeting_task_statistics_multi_users(start_date=start_of_week_utc, user_ids=unit_user_ids)
             month_stats = _get_meeting_task_statistics_multi_users(start_date=start_of_month_utc, user_ids=unit_user_ids)
             year_stats = _get_meeting_task_statistics_multi_users(start_date=start_of_year_utc, user_ids=unit_user_ids)
             all_stats = _get_meeting_task_statistics_multi_users(user_ids=unit_user_ids)
         # 課長、副課長可以看自己部門和單位的
         elif current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            dept_users = User.query.filter_by(department=current_user.department, unit=current_user.unit).all()
-            dept_user_ids = [u.id for u in dept_users]
+            dept_user_ids = get_permission_index(db, User, CacheVersion).unit_department_user_ids(current_user.department, current_user.unit)
             week_stats = _get_meeting_task_statistics_multi_users(start_date=start_of_week_utc, user_ids=dept_user_ids)
             month_stats = _get_meeting_task_statistics_multi_users(start_date=start_of_month_utc, user_ids=dept_user_ids)
             year_stats = _get_meeting_task_statistics_multi_users(start_date=start_of_year_utc, user_ids=dept_user_ids)
@@ -2419,8 +2857,16 @@ def get_meeting_tasks_report_list():
         task_type = request.args.get('task_type')
         user_id = request.args.get('user_id', type=int)
         user_name = request.args.get('user_name')  # 新增：接受用戶名稱
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = max(request.args.get('per_page', 50, type=int), 1)
+        
+        # 游標 (上一頁的 next_cursor) 優先於頁碼，讀取深度不影響查詢成本
+        after_id = None
+        if request.args.get('cursor'):
+            try:
+                after_id, = decode_key(request.args['cursor'], (int,))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
         
         # 如果傳入的是用戶名稱，轉換為用戶 ID
         if user_name and not user_id:
@@ -2452,33 +2898,24 @@ def get_meeting_tasks_report_list():
         if not user_id and current_user.level not in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
             user_id = current_user.id
         
-        # 獲取已完成和已同意的任務列表
-        # 只顯示 completed 和 agreed_finalized 狀態
-        stats = _get_meeting_task_statistics(
+        # 只顯示 completed 和 agreed_finalized 狀態；篩選、計數與分頁都在資料庫中完成
+        total, paginated_tasks, next_cursor = _meeting_task_report_page(
             start_date=start_date_utc,
             task_type=task_type,
-            status=None,  # 不使用 status 參數，在後面手動過濾
-            user_id=user_id
+            statuses=[MeetingTaskStatus.COMPLETED.value, MeetingTaskStatus.AGREED_FINALIZED.value],
+            user_id=user_id,
+            page=page,
+            per_page=per_page,
+            after_id=after_id
         )
         
-        # 過濾：只保留已完成和已同意的任務
-        filtered_tasks = [
-            task for task in stats['tasks']
-            if task['status'] == 'completed' or task['status'] == 'agreed_finalized'
-        ]
-        
-        # 分頁
-        total = len(filtered_tasks)
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_tasks = filtered_tasks[start_idx:end_idx]
-        
         return jsonify({
             'total': total,
             'page': page,
             'per_page': per_page,
             'total_pages': (total + per_page - 1) // per_page,
-            'tasks': paginated_tasks
+            'tasks': paginated_tasks,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         logging.error(f"Error in get_meeting_tasks_list: {e}")
@@ -2487,101 +2924,61 @@ def get_meeting_tasks_report_list():
 @app.route('/api/reports/meeting-tasks/in-progress')
 @login_required
 def get_meeting_tasks_in_progress():
-    """獲取進行中的會議任務（排除逾期的）"""
+    """
+    獲取進行中的會議任務（排除逾期的），依建立順序由新到舊排序 (ID 遞減)
+
+    Query Args:
+        limit (int, optional): 每頁筆數；與 cursor 都未提供時回傳全部
+        cursor (str, optional): 上一頁回傳的 next_cursor
+    """
     current_user = get_current_user()
     if not current_user:
         return jsonify({'error': '未授權'}), 401
     
     try:
-        taiwan_tz = timezone('Asia/Taipei')
+        try:
+            limit, after = _listing_cursor_args(int)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         today = datetime.now(utc)
         
         # 查詢進行中的追蹤項目（排除已完成、已同意、未指派、決議項目）
-        query = MeetingTask.query.filter(
+        # 已逾期的追蹤項目顯示在逾期任務頁面，這裡也一併排除
+        conditions = [
             MeetingTask.task_type == MeetingTaskType.TRACKING.value,  # 只查追蹤項目
             MeetingTask.status.notin_([
                 MeetingTaskStatus.COMPLETED.value,
                 MeetingTaskStatus.AGREED_FINALIZED.value,
                 MeetingTaskStatus.UNASSIGNED.value
-            ])
-        ).join(Meeting).order_by(MeetingTask.created_at.desc())
-        
-        # 根據權限過濾
-        if current_user.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
-            # 管理員和協理可以看全部
-            pass
-        elif current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            # 廠長、經理、副理可以看自己單位的
-            unit_users = User.query.filter_by(unit=current_user.unit).all()
-            unit_user_ids = [u.id for u in unit_users]
-            query = query.filter(MeetingTask.assigned_to_user_id.in_(unit_user_ids))
-        elif current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            # 課長、副課長可以看自己部門和單位的
-            dept_users = User.query.filter_by(department=current_user.department, unit=current_user.unit).all()
-            dept_user_ids = [u.id for u in dept_users]
-            query = query.filter(MeetingTask.assigned_to_user_id.in_(dept_user_ids))
-        else:
-            # 一般員工只能看自己的
-            query = query.filter(MeetingTask.assigned_to_user_id == current_user.id)
-        
-        tasks = query.all()
+            ]),
+            or_(MeetingTask.expected_completion_date.is_(None), MeetingTask.expected_completion_date >= today)
+        ] + _meeting_task_scope_filters(current_user)
+        
+        rows, next_cursor = _keyset_fetch(
+            _meeting_task_select().where(*conditions),
+            [MeetingTask.id], key=lambda row: (row[0].id,),
+            limit=limit, after=after, descending=True
+        )
         
         in_progress_tasks = []
-        for task in tasks:
-            try:
-                # 排除逾期的追蹤項目（這些顯示在逾期任務頁面）
-                if task.expected_completion_date:
-                    if task.expected_completion_date.tzinfo is None:
-                        expected_date_aware = utc.localize(task.expected_completion_date)
-                    else:
-                        expected_date_aware = task.expected_completion_date
-                    
-                    # 如果已經逾期，跳過（這些在逾期任務頁面顯示）
-                    if expected_date_aware < today:
-                        continue
-                
-                assigned_to = db.session.get(User, task.assigned_to_user_id)
-                controller = db.session.get(User, task.controller_user_id) if task.controller_user_id else None
-                
-                # 安全處理會議日期
-                if task.meeting and task.meeting.meeting_date:
-                    if task.meeting.meeting_date.tzinfo is None:
-                        meeting_date_aware = utc.localize(task.meeting.meeting_date)
-                    else:
-                        meeting_date_aware = task.meeting.meeting_date
-                    meeting_date_str = meeting_date_aware.astimezone(taiwan_tz).strftime('%Y-%m-%d')
-                else:
-                    meeting_date_str = None
-                
-                # 預計完成日期
-                if task.expected_completion_date:
-                    if task.expected_completion_date.tzinfo is None:
-                        expected_date_aware = utc.localize(task.expected_completion_date)
-                    else:
-                        expected_date_aware = task.expected_completion_date
-                    expected_date_str = expected_date_aware.astimezone(taiwan_tz).strftime('%Y-%m-%d')
-                else:
-                    expected_date_str = None
-                
-                in_progress_tasks.append({
-                    'id': task.id,
-                    'meeting_id': task.meeting_id,
-                    'meeting_subject': task.meeting.subject if task.meeting else 'Unknown',
-                    'meeting_date': meeting_date_str,
-                    'task_type': task.task_type,
-                    'task_description': task.task_description,
-                    'assigned_to_name': assigned_to.name if assigned_to else 'Unknown',
-                    'controller_name': controller.name if controller else None,
-                    'expected_completion_date': expected_date_str,
-                    'status': task.status
-                })
-            except Exception as task_error:
-                logging.error(f"Error processing task {task.id}: {task_error}")
-                continue
+        for task, subject, meeting_date, assigned_to_name, _, controller_name in rows:
+            in_progress_tasks.append({
+                'id': task.id,
+                'meeting_id': task.meeting_id,
+                'meeting_subject': subject,
+                'meeting_date': _to_taiwan_str(meeting_date, '%Y-%m-%d'),
+                'task_type': task.task_type,
+                'task_description': task.task_description,
+                'assigned_to_name': assigned_to_name or 'Unknown',
+                'controller_name': controller_name,
+                'expected_completion_date': _to_taiwan_str(task.expected_completion_date, '%Y-%m-%d'),
+                'status': task.status
+            })
         
         return jsonify({
-            'total': len(in_progress_tasks),
-            'tasks': in_progress_tasks
+            'total': _meeting_task_total(conditions) if limit is not None else len(in_progress_tasks),
+            'tasks': in_progress_tasks,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         logging.error(f"Error in get_meeting_tasks_in_progress: {e}", exc_info=True)
@@ -2590,108 +2987,130 @@ def get_meeting_tasks_in_progress():
 @app.route('/api/reports/meeting-tasks/overdue')
 @login_required
 def get_meeting_tasks_overdue():
-    """獲取逾期的會議任務（僅追蹤項目）"""
+    """
+    獲取逾期的會議任務（僅追蹤項目），依預計完成日期排序 (逾期最久的排前面)
+
+    Query Args:
+        limit (int, optional): 每頁筆數；與 cursor 都未提供時回傳全部
+        cursor (str, optional): 上一頁回傳的 next_cursor
+    """
     current_user = get_current_user()
     if not current_user:
         return jsonify({'error': '未授權'}), 401
     
     try:
-        # 查詢所有逾期的追蹤項目
-        taiwan_tz = timezone('Asia/Taipei')
+        try:
+            limit, after = _listing_cursor_args(datetime, int)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         today = datetime.now(utc)
         
-        # 基本查詢：只查追蹤項目，排除已完成的
-        query = MeetingTask.query.filter(
+        # 只查追蹤項目，排除已完成的；沒有預計完成日期或還沒到期的不算逾期
+        conditions = [
             MeetingTask.task_type == MeetingTaskType.TRACKING.value,  # 只查追蹤項目
-            MeetingTask.status != MeetingTaskStatus.COMPLETED.value
-        ).join(Meeting)
-        
-        # 根據權限過濾
-        if current_user.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
-            # 管理員和協理可以看全部
-            pass
-        elif current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            # 廠長、經理、副理可以看自己單位的
-            unit_users = User.query.filter_by(unit=current_user.unit).all()
-            unit_user_ids = [u.id for u in unit_users]
-            query = query.filter(MeetingTask.assigned_to_user_id.in_(unit_user_ids))
-        elif current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            # 課長、副課長可以看自己部門和單位的
-            dept_users = User.query.filter_by(department=current_user.department, unit=current_user.unit).all()
-            dept_user_ids = [u.id for u in dept_users]
-            query = query.filter(MeetingTask.assigned_to_user_id.in_(dept_user_ids))
-        else:
-            # 一般員工只能看自己的
-            query = query.filter(MeetingTask.assigned_to_user_id == current_user.id)
-        
-        tasks = query.all()
+            MeetingTask.status != MeetingTaskStatus.COMPLETED.value,
+            MeetingTask.expected_completion_date.is_not(None),
+            MeetingTask.expected_completion_date < today
+        ] + _meeting_task_scope_filters(current_user)
+        
+        rows, next_cursor = _keyset_fetch(
+            _meeting_task_select().where(*conditions),
+            [MeetingTask.expected_completion_date, MeetingTask.id],
+            key=lambda row: (row[0].expected_completion_date, row[0].id),
+            limit=limit, after=after
+        )
         
         overdue_tasks = []
-        for task in tasks:
-            try:
-                # 追蹤項目：使用預計完成日期判斷逾期
-                if not task.expected_completion_date:
-                    continue  # 沒有預計完成日期的跳過
-                
-                if task.expected_completion_date.tzinfo is None:
-                    expected_date_aware = utc.localize(task.expected_completion_date)
-                else:
-                    expected_date_aware = task.expected_completion_date
-                
-                # 如果還沒到期，跳過
-                if expected_date_aware >= today:
-                    continue
-                
-                # 計算逾期天數
-                overdue_days_display = (today - expected_date_aware).days
-                
-                assigned_to = db.session.get(User, task.assigned_to_user_id)
-                assigned_by = db.session.get(User, task.assigned_by_user_id)
-                controller = db.session.get(User, task.controller_user_id) if task.controller_user_id else None
-                
-                # 安全處理時區轉換
-                expected_date_str = expected_date_aware.astimezone(taiwan_tz).strftime('%Y-%m-%d')
-                
-                # 安全處理會議日期
-                if task.meeting and task.meeting.meeting_date:
-                    if task.meeting.meeting_date.tzinfo is None:
-                        meeting_date_aware = utc.localize(task.meeting.meeting_date)
-                    else:
-                        meeting_date_aware = task.meeting.meeting_date
-                    meeting_date_str = meeting_date_aware.astimezone(taiwan_tz).strftime('%Y-%m-%d')
-                else:
-                    meeting_date_str = None
-                
-                overdue_tasks.append({
-                    'id': task.id,
-                    'meeting_id': task.meeting_id,
-                    'meeting_subject': task.meeting.subject if task.meeting else 'Unknown',
-                    'meeting_date': meeting_date_str,
-                    'task_description': task.task_description,
-                    'task_type': task.task_type,
-                    'status': task.status,
-                    'assigned_to_name': assigned_to.name if assigned_to else 'Unknown',
-                    'assigned_by_name': assigned_by.name if assigned_by else 'Unknown',
-                    'controller_name': controller.name if controller else None,
-                    'expected_completion_date': expected_date_str,
-                    'overdue_days': overdue_days_display,
-                    'uncompleted_reason': task.uncompleted_reason_from_todo
-                })
-            except Exception as task_error:
-                logging.error(f"Error processing task {task.id}: {task_error}")
-                continue
-        
-        # 排序：按逾期天數降序（逾期最久的排前面）
-        overdue_tasks.sort(key=lambda x: -x['overdue_days'])
+        for task, subject, meeting_date, assigned_to_name, assigned_by_name, controller_name in rows:
+            expected_date_aware = utc.localize(task.expected_completion_date) if task.expected_completion_date.tzinfo is None \
+                else task.expected_completion_date
+            overdue_tasks.append({
+                'id': task.id,
+                'meeting_id': task.meeting_id,
+                'meeting_subject': subject,
+                'meeting_date': _to_taiwan_str(meeting_date, '%Y-%m-%d'),
+                'task_description': task.task_description,
+                'task_type': task.task_type,
+                'status': task.status,
+                'assigned_to_name': assigned_to_name or 'Unknown',
+                'assigned_by_name': assigned_by_name or 'Unknown',
+                'controller_name': controller_name,
+                'expected_completion_date': _to_taiwan_str(expected_date_aware, '%Y-%m-%d'),
+                'overdue_days': (today - expected_date_aware).days,  # 逾期天數
+                'uncompleted_reason': task.uncompleted_reason_from_todo
+            })
         
         return jsonify({
-            'total': len(overdue_tasks),
-            'tasks': overdue_tasks
+            'total': _meeting_task_total(conditions) if limit is not None else len(overdue_tasks),
+            'tasks': overdue_tasks,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         logging.error(f"Error in get_meeting_tasks_overdue: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+def _get_meeting_task_ranking_users(current_user):
+    """依權限取得會議任務排行榜可見的使用者"""
+    users = _ranking_scope_users(current_user)
+    logging.info(f"Meeting task ranking for {current_user.level} user, found {len(users)} users")
+    return users
+
+def _meeting_task_ranking_entry(user_id, user_name, total_tasks, completed_tasks, in_progress_tasks):
+    """組成排行榜單筆資料並計算完成率"""
+    return {
+        'user_id': user_id,
+        'user_name': user_name,
+        'total_tasks': total_tasks,
+        'completed_tasks': completed_tasks,
+        'in_progress_tasks': in_progress_tasks,
+        'completion_rate': round((completed_tasks / total_tasks * 100), 1) if total_tasks > 0 else 0
+    }
+
+def _get_meeting_task_rankings(users):
+    """
+    計算會議任務個人排行榜
+
+    以一次 GROUP BY assigned_to_user_id 的查詢，用 SUM(CASE ...) 同時算出
+    總數、已完成與進行中的追蹤任務數，查詢次數不隨使用者人數增加。
+
+    Args:
+        users: 要列入排行的使用者列表
+
+    Returns:
+        list: 依完成任務數排序的排行榜數據
+    """
+    in_progress_statuses = [
+        MeetingTaskStatus.IN_PROGRESS_TODO.value,
+        MeetingTaskStatus.RESOLVED_EXECUTING.value,
+        MeetingTaskStatus.ASSIGNED.value
+    ]
+    user_ids = [user.id for user in users]
+    counts = {}
+    if user_ids:
+        rows = db.session.execute(
+            select(
+                MeetingTask.assigned_to_user_id,
+                func.count(MeetingTask.id),
+                func.sum(db.case((MeetingTask.status == MeetingTaskStatus.COMPLETED.value, 1), else_=0)),
+                func.sum(db.case((MeetingTask.status.in_(in_progress_statuses), 1), else_=0))
+            ).where(
+                MeetingTask.assigned_to_user_id.in_(user_ids),
+                # 只統計追蹤任務，不統計決議項目
+                MeetingTask.task_type == MeetingTaskType.TRACKING.value
+            ).group_by(MeetingTask.assigned_to_user_id)
+        ).all()
+        counts = {user_id: (total, completed, in_progress) for user_id, total, completed, in_progress in rows}
+
+    rankings = []
+    for user in users:
+        total_tasks, completed_tasks, in_progress_tasks = counts.get(user.id, (0, 0, 0))
+        user_name = f"{user.name} ({user.role})" if hasattr(user, 'role') and user.role else user.name
+        rankings.append(_meeting_task_ranking_entry(user.id, user_name, total_tasks, completed_tasks, in_progress_tasks))
+
+    # 按完成任務數排序
+    rankings.sort(key=lambda x: x['completed_tasks'], reverse=True)
+    return rankings
+
 @app.route('/api/reports/meeting-tasks/ranking')
 @login_required
 def get_meeting_tasks_ranking():
@@ -2704,81 +3123,8 @@ def get_meeting_tasks_ranking():
         logging.info(f"Meeting tasks ranking requested by user: {current_user.name}")
         
         # 根據權限決定查詢範圍
-        if current_user.level == UserLevel.ADMIN.value:
-            # 系統管理員可以看到所有人的排行
-            users = User.query.filter(User.level != UserLevel.ADMIN.value).all()
-            logging.info(f"Admin user, found {len(users)} users")
-        elif current_user.level == UserLevel.EXECUTIVE_MANAGER.value:
-            # 協理可以看到所有人的排行（除了管理員）
-            users = User.query.filter(User.level != UserLevel.ADMIN.value).all()
-            logging.info(f"Executive Manager user, found {len(users)} users")
-        elif current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            # 廠長、經理、副理可以看到自己單位的人員排行
-            users = User.query.filter(
-                User.unit == current_user.unit,
-                User.level != UserLevel.ADMIN.value
-            ).all()
-            logging.info(f"Manager level user, found {len(users)} users in unit: {current_user.unit}")
-        elif current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            # 課長、副課長可以看到自己部門和單位的人員排行
-            users = User.query.filter(
-                User.department == current_user.department,
-                User.unit == current_user.unit,
-                User.level != UserLevel.ADMIN.value
-            ).all()
-            logging.info(f"Section Chief level user, found {len(users)} users in department: {current_user.department}, unit: {current_user.unit}")
-        else:
-            # 其他人只能看到自己
-            users = [current_user]
-            logging.info("Regular user, showing own stats only")
-        
-        rankings = []
-        for user in users:
-            try:
-                # 只統計追蹤任務，不統計決議項目
-                total_tasks = MeetingTask.query.filter(
-                    MeetingTask.assigned_to_user_id == user.id,
-                    MeetingTask.task_type == MeetingTaskType.TRACKING.value
-                ).count()
-                
-                completed_tasks = MeetingTask.query.filter(
-                    MeetingTask.assigned_to_user_id == user.id,
-                    MeetingTask.task_type == MeetingTaskType.TRACKING.value,
-                    MeetingTask.status == MeetingTaskStatus.COMPLETED.value
-                ).count()
-                
-                in_progress_tasks = MeetingTask.query.filter(
-                    MeetingTask.assigned_to_user_id == user.id,
-                    MeetingTask.task_type == MeetingTaskType.TRACKING.value,
-                    or_(
-                        MeetingTask.status == MeetingTaskStatus.IN_PROGRESS_TODO.value,
-                        MeetingTask.status == MeetingTaskStatus.RESOLVED_EXECUTING.value,
-                        MeetingTask.status == MeetingTaskStatus.ASSIGNED.value
-                    )
-                ).count()
-                
-                # 計算完成率
-                completion_rate = round((completed_tasks / total_tasks * 100), 1) if total_tasks > 0 else 0
-                
-                user_name = f"{user.name} ({user.role})" if hasattr(user, 'role') and user.role else user.name
-                
-                rankings.append({
-                    'user_id': user.id,
-                    'user_name': user_name,
-                    'total_tasks': total_tasks,
-                    'completed_tasks': completed_tasks,
-                    'in_progress_tasks': in_progress_tasks,
-                    'completion_rate': completion_rate
-                })
-                
-                logging.info(f"Processed user {user.name}: {total_tasks} total, {completed_tasks} completed")
-                
-            except Exception as user_error:
-                logging.error(f"Error processing user {user.id} ({user.name}): {user_error}", exc_info=True)
-                continue
-        
-        # 按完成任務數排序
-        rankings.sort(key=lambda x: x['completed_tasks'], reverse=True)
+        users = _get_meeting_task_ranking_users(current_user)
+        rankings = _get_meeting_task_rankings(users)
         
         logging.info(f"Successfully processed {len(rankings)} users for ranking")
         
@@ -2802,81 +3148,8 @@ def get_meeting_tasks_ranking_full():
         logging.info(f"Meeting tasks ranking (full) requested by user: {current_user.name}")
         
         # 根據權限決定查詢範圍
-        if current_user.level == UserLevel.ADMIN.value:
-            # 系統管理員可以看到所有人的排行
-            users = User.query.filter(User.level != UserLevel.ADMIN.value).all()
-            logging.info(f"Admin user, found {len(users)} users")
-        elif current_user.level == UserLevel.EXECUTIVE_MANAGER.value:
-            # 協理可以看到所有人的排行（除了管理員）
-            users = User.query.filter(User.level != UserLevel.ADMIN.value).all()
-            logging.info(f"Executive Manager user, found {len(users)} users")
-        elif current_user.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
-            # 廠長、經理、副理可以看到自己單位的人員排行
-            users = User.query.filter(
-                User.unit == current_user.unit,
-                User.level != UserLevel.ADMIN.value
-            ).all()
-            logging.info(f"Manager level user, found {len(users)} users in unit: {current_user.unit}")
-        elif current_user.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
-            # 課長、副課長可以看到自己部門和單位的人員排行
-            users = User.query.filter(
-                User.department == current_user.department,
-                User.unit == current_user.unit,
-                User.level != UserLevel.ADMIN.value
-            ).all()
-            logging.info(f"Section Chief level user, found {len(users)} users in department: {current_user.department}, unit: {current_user.unit}")
-        else:
-            # 其他人只能看到自己
-            users = [current_user]
-            logging.info("Regular user, showing own stats only")
-        
-        rankings = []
-        for user in users:
-            try:
-                # 只統計追蹤任務，不統計決議項目
-                total_tasks = MeetingTask.query.filter(
-                    MeetingTask.assigned_to_user_id == user.id,
-                    MeetingTask.task_type == MeetingTaskType.TRACKING.value
-                ).count()
-                
-                completed_tasks = MeetingTask.query.filter(
-                    MeetingTask.assigned_to_user_id == user.id,
-                    MeetingTask.task_type == MeetingTaskType.TRACKING.value,
-                    MeetingTask.status == MeetingTaskStatus.COMPLETED.value
-                ).count()
-                
-                in_progress_tasks = MeetingTask.query.filter(
-                    MeetingTask.assigned_to_user_id == user.id,
-                    MeetingTask.task_type == MeetingTaskType.TRACKING.value,
-                    or_(
-                        MeetingTask.status == MeetingTaskStatus.IN_PROGRESS_TODO.value,
-                        MeetingTask.status == MeetingTaskStatus.RESOLVED_EXECUTING.value,
-                        MeetingTask.status == MeetingTaskStatus.ASSIGNED.value
-                    )
-                ).count()
-                
-                # 計算完成率
-                completion_rate = round((completed_tasks / total_tasks * 100), 1) if total_tasks > 0 else 0
-                
-                user_name = f"{user.name} ({user.role})" if hasattr(user, 'role') and user.role else user.name
-                
-                rankings.append({
-                    'user_id': user.id,
-                    'user_name': user_name,
-                    'total_tasks': total_tasks,
-                    'completed_tasks': completed_tasks,
-                    'in_progress_tasks': in_progress_tasks,
-                    'completion_rate': completion_rate
-                })
-                
-                logging.info(f"Processed user {user.name}: {total_tasks} total, {completed_tasks} completed")
-                
-            except Exception as user_error:
-                logging.error(f"Error processing user {user.id} ({user.name}): {user_error}", exc_info=True)
-                continue
-        
-        # 按完成任務數排序
-        rankings.sort(key=lambda x: x['completed_tasks'], reverse=True)
+        users = _get_meeting_task_ranking_users(current_user)
+        rankings = _get_meeting_task_rankings(users)
         
         logging.info(f"Successfully processed {len(rankings)} users for ranking")
         
@@ -2894,24 +3167,10 @@ def get_meeting_tasks_ranking_test():
     try:
         logging.info("Test ranking endpoint called")
         
-        # 返回測試數據
+        # 返回測試數據 (與正式排行榜使用相同的資料格式)
         test_rankings = [
-            {
-                'user_id': 1,
-                'user_name': '測試用戶1',
-                'total_tasks': 10,
-                'completed_tasks': 8,
-                'in_progress_tasks': 2,
-                'completion_rate': 80.0
-            },
-            {
-                'user_id': 2,
-                'user_name': '測試用戶2',
-                'total_tasks': 5,
-                'completed_tasks': 3,
-                'in_progress_tasks': 2,
-                'completion_rate': 60.0
-            }
+            _meeting_task_ranking_entry(1, '測試用戶1', 10, 8, 2),
+            _meeting_task_ranking_entry(2, '測試用戶2', 5, 3, 2)
         ]
         
         logging.info(f"Returning test data: {test_rankings}")
@@ -3107,7 +3366,8 @@ def reports_meeting_tasks():
 @login_required
 def scheduled_notifications():
     current_user = get_current_user()
-    assignable_users = [u for u in User.query.filter_by(is_active=True).all() if current_user.can_assign_to(u)]
+    assignable_ids = get_permission_index(db, User, CacheVersion).assignable_ids(current_user)
+    assignable_users = [u for u in User.query.filter_by(is_active=True).all() if u.id in assignable_ids]
     if current_user not in assignable_users:
         assignable_users.append(current_user)
     assignable_users.sort(key=lambda u: u.name)
@@ -3174,8 +3434,10 @@ def scheduled_notifications():
             weekly_day=weekly_day,
             is_active=True
         )
+        new_notification.refresh_next_fire_at()
         db.session.add(new_notification)
         db.session.commit()
+        wake_scheduled_notifications(new_notification.next_fire_at)
         flash('通知已成功建立！', 'success')
         return redirect(url_for('scheduled_notifications'))
 
@@ -3205,7 +3467,8 @@ def edit_scheduled_notification(notification_id):
         flash('您沒有權限編輯此通知！', 'error')
         return redirect(url_for('scheduled_notifications'))
 
-    assignable_users = [u for u in User.query.filter_by(is_active=True).all() if current_user.can_assign_to(u)]
+    assignable_ids = get_permission_index(db, User, CacheVersion).assignable_ids(current_user)
+    assignable_users = [u for u in User.query.filter_by(is_active=True).all() if u.id in assignable_ids]
     if current_user not in assignable_users:
         assignable_users.append(current_user)
     assignable_users.sort(key=lambda u: u.name)
@@ -3269,8 +3532,10 @@ def edit_scheduled_notification(notification_id):
             notification_to_edit.specific_date = specific_date
             notification_to_edit.specific_time = specific_time
             notification_to_edit.weekly_day = weekly_day
+            notification_to_edit.refresh_next_fire_at()
             
             db.session.commit()
+            wake_scheduled_notifications(notification_to_edit.next_fire_at)
             flash('通知已成功更新！', 'success')
             return redirect(url_for('scheduled_notifications'))
         except Exception as e:
@@ -3298,7 +3563,11 @@ def toggle_scheduled_notification(notification_id):
 
     try:
         notification.is_active = not notification.is_active
+        if notification.is_active:
+            notification.refresh_next_fire_at()
         db.session.commit()
+        if notification.is_active:
+            wake_scheduled_notifications(notification.next_fire_at)
         return jsonify({'message': '通知狀態已更新！', 'is_active': notification.is_active}), 200
     except Exception as e:
         db.session.rollback()
@@ -3324,6 +3593,40 @@ def delete_scheduled_notification(notification_id):
         db.session.rollback()
         return jsonify({'error': f'刪除通知時發生錯誤: {e}'}), 500
 
+@app.route('/api/todo/<int:todo_id>/history')
+@login_required
+def get_todo_history(todo_id):
+    """
+    分頁取得任務履歷 (依時間排序)
+
+    Query Args:
+        limit (int, optional): 每頁筆數，預設 HISTORY_PAGE_SIZE
+        cursor (str, optional): 上一頁回傳的 next_cursor
+
+    Returns:
+        JSON: {'history': [...], 'next_cursor': str 或 None}
+    """
+    current_user = get_current_user()
+    todo = db.get_or_404(Todo, todo_id)
+    # 可以查看任務負責人資料的使用者才能查看履歷 (與使用者面板相同)
+    if not current_user.can_modify_todo(todo):
+        return jsonify({'error': 'Access denied'}), 403
+
+    try:
+        limit = parse_limit(request.args.get('limit'), HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE_MAX)
+        after = None
+        if request.args.get('cursor'):
+            after_timestamp, after_id = decode_cursor(request.args['cursor'], 2)
+            after = (datetime.fromisoformat(after_timestamp), int(after_id))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    history, last = TodoEvent.history_page(HistoryEntityType.TODO, todo.id, limit, after)
+    return jsonify({
+        'history': history,
+        'next_cursor': encode_cursor(last[0].isoformat(), last[1]) if last else None
+    })
+
 @app.route('/api/todo/<int:todo_id>/status', methods=['PUT'])
 @login_required
 def update_todo_status(todo_id):
@@ -3343,8 +3646,8 @@ def update_todo_status(todo_id):
 
     old_status = todo.status
 
-    # 讀取現有的 history_log
-    history = json.loads(todo.history_log or '[]')
+    # 本次請求新增的履歷事件 (需同步到關聯的 MeetingTask)
+    new_events = []
 
     if new_status == TodoStatus.UNCOMPLETED.value:
         # 新增：處理預計完成日期的更新
@@ -3356,43 +3659,37 @@ def update_todo_status(todo_id):
                 
                 # 記錄預計完成日期變更到履歷
                 taiwan_tz = timezone('Asia/Taipei')
-                due_date_change_entry = {
-                    'event_type': 'due_date_changed',
-                    'timestamp': datetime.now(utc).isoformat(),
-                    'actor': {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
-                    'details': {
+                new_events.append(TodoEvent.record(
+                    HistoryEntityType.TODO, todo.id, 'due_date_changed',
+                    actor={'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
+                    details={
                         'old_due_date': old_due_date.astimezone(taiwan_tz).strftime('%Y-%m-%d %H:%M'),
                         'new_due_date': new_due_date_parsed.astimezone(taiwan_tz).strftime('%Y-%m-%d %H:%M'),
                         'reason': uncompleted_reason
                     }
-                }
-                history.append(due_date_change_entry)
+                ))
                 logging.info(f"Updated due date for Todo {todo.id} from {old_due_date} to {new_due_date_parsed}")
             except Exception as e:
                 logging.error(f"Failed to parse new_due_date for Todo {todo.id}: {e}")
                 return jsonify({'error': '無效的日期格式'}), 400
         
         # 記錄未完成事件
-        history_entry = {
-            'event_type': 'status_changed',
-            'timestamp': datetime.now(utc).isoformat(),
-            'actor': {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
-            'details': {'old_status': old_status, 'new_status': TodoStatus.UNCOMPLETED.value, 'reason': uncompleted_reason}
-        }
-        history.append(history_entry)
-        todo.history_log = json.dumps(history)
+        new_events.append(TodoEvent.record(
+            HistoryEntityType.TODO, todo.id, 'status_changed',
+            actor={'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
+            details={'old_status': old_status, 'new_status': TodoStatus.UNCOMPLETED.value, 'reason': uncompleted_reason}
+        ))
         todo.status = TodoStatus.IN_PROGRESS.value # 自動切換為進行中
+        todo.completed_at = None
     else:
         # 記錄狀態變更事件
-        history_entry = {
-            'event_type': 'status_changed',
-            'timestamp': datetime.now(utc).isoformat(),
-            'actor': {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
-            'details': {'old_status': old_status, 'new_status': new_status}
-        }
-        history.append(history_entry)
-        todo.history_log = json.dumps(history)
+        new_events.append(TodoEvent.record(
+            HistoryEntityType.TODO, todo.id, 'status_changed',
+            actor={'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
+            details={'old_status': old_status, 'new_status': new_status}
+        ))
         todo.status = new_status
+        todo.completed_at = datetime.utcnow() if new_status == TodoStatus.COMPLETED.value else None
 
     # 如果 Todo 任務與 MeetingTask 相關聯，則更新 MeetingTask 的狀態和履歷
     logging.info(f"Checking todo.meeting_task_id for todo ID {todo.id}: {todo.meeting_task_id}")
@@ -3426,22 +3723,12 @@ def update_todo_status(todo_id):
                 meeting_task.actual_completion_date = None
                 meeting_task.uncompleted_reason_from_todo = None
 
-            # 將 Todo 的最新履歷附加到 MeetingTask 的履歷中
-            meeting_task_history = json.loads(meeting_task.history_log or '[]')
-            if history: # history 是從 todo.history_log 來的
-                # 如果有日期變更事件，先添加它
-                if new_status == TodoStatus.UNCOMPLETED.value and new_due_date and len(history) >= 2:
-                    # 添加倒數第二個事件（日期變更事件）
-                    meeting_task_history.append(history[-2])
-                # 添加最新的事件（狀態變更事件）
-                latest_todo_event = history[-1]
-                meeting_task_history.append(latest_todo_event)
-            meeting_task.history_log = json.dumps(meeting_task_history)
+            # 將本次的 Todo 履歷 (日期變更、狀態變更) 同步到 MeetingTask 的履歷中
+            for event in new_events:
+                event.copy_to(HistoryEntityType.MEETING_TASK, meeting_task.id)
             
             db.session.add(meeting_task)
 
-    db.session.commit()
-
     try:
         if new_status == TodoStatus.COMPLETED.value:
             assigner = todo.assigned_by
@@ -3455,10 +3742,11 @@ def update_todo_status(todo_id):
                     f"<b>完成日期:</b> {datetime.now(timezone('Asia/Taipei')).strftime('%Y-%m-%d')}<br><br>"
                     f"請登入系統查看：<br><a href='http://192.168.6.119:5001'>http://192.168.6.119:5001</a>"
                 )
-                send_mail(subject, body, assigner.email)
-                logging.info(f"Sent 'task completed' notification for task {todo.id} to assigner {assigner.email}")
+                queue_mail(subject, body, assigner.email)
+                logging.info(f"Queued 'task completed' notification for task {todo.id} to assigner {assigner.email}")
     except Exception as e:
-        logging.error(f"Failed to send 'task completed' notification for task {todo.id}: {e}")
+        logging.error(f"Failed to queue 'task completed' notification for task {todo.id}: {e}")
+    db.session.commit()
 
     return jsonify({'message': '待辦事項狀態已更新'})
 
@@ -3611,16 +3899,16 @@ def add_meeting_task():
             actual_completion_date=None,
             status=initial_status,
             is_assigned_to_todo=is_assigned_to_todo,
-            history_log=json.dumps([{
-                'event_type': 'created',
-                'timestamp': datetime.now(utc).isoformat(),
-                'actor': {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
-                'details': {'message': '會議任務已建立'}
-            }]),
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow()
         )
         db.session.add(new_meeting_task)
+        db.session.flush() # 取得 new_meeting_task.id 以記錄履歷
+        TodoEvent.record(
+            HistoryEntityType.MEETING_TASK, new_meeting_task.id, 'created',
+            actor={'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
+            details={'message': '會議任務已建立'}
+        )
         db.session.commit()
 
         return jsonify({'message': '會議任務已成功記錄'}), 200
@@ -3752,10 +4040,11 @@ def create_new_meeting_discussion():
                 )
                 
                 try:
-                    send_mail(subject, body, recipient_email)
-                    logging.info(f"Sent meeting notification for '{meeting_topic}' to {recipient_email}")
+                    queue_mail(subject, body, recipient_email)
+                    logging.info(f"Queued meeting notification for '{meeting_topic}' to {recipient_email}")
                 except Exception as mail_e:
-                    logging.error(f"Failed to send meeting notification for '{meeting_topic}' to {recipient_email}: {mail_e}")
+                    logging.error(f"Failed to queue meeting notification for '{meeting_topic}' to {recipient_email}: {mail_e}")
+            db.session.commit()
 
         return jsonify({'message': '新會議和討論議題已成功創建', 'meeting_id': new_meeting.id, 'discussion_item_id': new_discussion_item.id}), 200
 
@@ -3904,7 +4193,6 @@ def manage_meeting_task(meeting_task_id):
             return jsonify({'error': '已同意的決議不能修改'}), 400
         
         data = request.get_json()
-        history = json.loads(meeting_task.history_log or '[]')
         update_details = {}
 
         new_assigned_to_key = data.get('assigned_to_user_key')
@@ -3986,13 +4274,11 @@ def manage_meeting_task(meeting_task_id):
 
         # 如果有任何更新，則記錄並提交
         if update_details:
-            history.append({
-                'event_type': 'updated',
-                'timestamp': datetime.now(utc).isoformat(),
-                'actor': {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
-                'details': update_details
-            })
-            meeting_task.history_log = json.dumps(history)
+            TodoEvent.record(
+                HistoryEntityType.MEETING_TASK, meeting_task.id, 'updated',
+                actor={'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
+                details=update_details
+            )
             db.session.commit()
             return jsonify({'message': '任務已更新'})
         
@@ -4004,6 +4290,7 @@ def manage_meeting_task(meeting_task_id):
         if meeting_task.is_assigned_to_todo:
             return jsonify({'error': '此任務已指派到主任務列表，無法刪除'}), 400
             
+        TodoEvent.delete_for(HistoryEntityType.MEETING_TASK, meeting_task.id)
         db.session.delete(meeting_task)
         
         # 由於 MeetingTask 不再直接關聯 DiscussionItem，這裡的邏輯需要調整
@@ -4031,18 +4318,14 @@ def agree_meeting_task(meeting_task_id):
     meeting_task.status = MeetingTaskStatus.AGREED_FINALIZED.value
 
     # 記錄歷史事件
-    history = json.loads(meeting_task.history_log or '[]')
-    history.append({
-        'event_type': 'agreed_finalized',
-        'timestamp': datetime.now(utc).isoformat(),
-        'actor': {'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
-        'details': {'message': '決議已同意並最終確定'}
-    })
-    meeting_task.history_log = json.dumps(history)
+    TodoEvent.record(
+        HistoryEntityType.MEETING_TASK, meeting_task.id, 'agreed_finalized',
+        actor={'id': current_user.id, 'name': current_user.name, 'user_key': current_user.user_key},
+        details={'message': '決議已同意並最終確定'}
+    )
 
     try:
-        db.session.commit()
-        # 通知管制者 (如果存在)
+        # 通知管制者 (如果存在)，寫入寄件匣與狀態一起提交
         if meeting_task.controller_user_id:
             controller = db.session.get(User, meeting_task.controller_user_id)
             if controller and controller.email and controller.notification_enabled:
@@ -4052,7 +4335,8 @@ def agree_meeting_task(meeting_task_id):
                     f"會議決議 {meeting_task.meeting.subject} 中的任務 {meeting_task.task_description} 已由 {current_user.name} 同意並最終確定。\n\n"
                     f"請登入系統查看：\nhttp://192.168.6.119:5001"
                 )
-                send_mail(subject, body, controller.email)
+                queue_mail(subject, body, controller.email)
+        db.session.commit()
         return jsonify({'message': '決議已同意並最終確定'}), 200
     except Exception as e:
         db.session.rollback()
@@ -4134,18 +4418,6 @@ def assign_tracking_task_to_todo(meeting_task_id):
     
     assigned_to_user = db.session.get(User, meeting_task.assigned_to_user_id)
 
-    history_entry = {
-        'event_type': 'assigned_from_meeting',
-        'timestamp': datetime.now(utc).isoformat(),
-        'actor': {'id': assigner_user.id, 'name': assigner_user.name, 'user_key': assigner_user.user_key},
-        'details': {
-            'meeting_topic': meeting.subject, # 使用 Meeting 的 subject
-            'assigned_to': {'id': assigned_to_user.id, 'name': assigned_to_user.name, 'user_key': assigned_to_user.user_key},
-            'assigned_by': {'id': assigner_user.id, 'name': assigner_user.name, 'user_key': assigner_user.user_key}
-        }
-    }
-    new_todo.history_log = json.dumps([history_entry])
-
     meeting_task.is_assigned_to_todo = True
     meeting_task.status = MeetingTaskStatus.ASSIGNED.value
     meeting_task.todo = new_todo
@@ -4155,20 +4427,24 @@ def assign_tracking_task_to_todo(meeting_task_id):
         db.session.add(meeting_task)
         db.session.flush()
 
-        meeting_task_history = json.loads(meeting_task.history_log or '[]')
-        meeting_task_history.append({
-            'event_type': 'assigned_to_todo',
-            'timestamp': datetime.now(utc).isoformat(),
-            'actor': {'id': assigner_user.id, 'name': assigner_user.name, 'user_key': assigner_user.user_key},
-            'details': {
+        TodoEvent.record(
+            HistoryEntityType.TODO, new_todo.id, 'assigned_from_meeting',
+            actor={'id': assigner_user.id, 'name': assigner_user.name, 'user_key': assigner_user.user_key},
+            details={
+                'meeting_topic': meeting.subject, # 使用 Meeting 的 subject
+                'assigned_to': {'id': assigned_to_user.id, 'name': assigned_to_user.name, 'user_key': assigned_to_user.user_key},
+                'assigned_by': {'id': assigner_user.id, 'name': assigner_user.name, 'user_key': assigner_user.user_key}
+            }
+        )
+        TodoEvent.record(
+            HistoryEntityType.MEETING_TASK, meeting_task.id, 'assigned_to_todo',
+            actor={'id': assigner_user.id, 'name': assigner_user.name, 'user_key': assigner_user.user_key},
+            details={
                 'assigned_to_todo_id': new_todo.id,
                 'assigned_to_user': {'id': assigned_to_user.id, 'name': assigned_to_user.name, 'user_key': assigned_to_user.user_key},
                 'assigned_by_user': {'id': assigner_user.id, 'name': assigner_user.name, 'user_key': assigner_user.user_key}
             }
-        })
-        meeting_task.history_log = json.dumps(meeting_task_history)
-        
-        db.session.commit()
+        )
 
         if assigned_to_user and assigned_to_user.email and assigned_to_user.notification_enabled:
             subject = f"會議任務指派已確認預計完成日期：{new_todo.title}"
@@ -4186,7 +4462,9 @@ def assign_tracking_task_to_todo(meeting_task_id):
             if assigner_user.id != assigned_to_user.id and assigner_user.email and assigner_user.notification_enabled:
                 mail_cc = assigner_user.email
             
-            send_mail(subject, body, assigned_to_user.email, mail_cc=mail_cc)
+            queue_mail(subject, body, assigned_to_user.email, mail_cc=mail_cc)
+
+        db.session.commit()
 
         return jsonify({'message': '任務已成功指派到主任務列表'}), 200
     except Exception as e:
@@ -4250,7 +4528,7 @@ def get_single_meeting_task(meeting_task_id):
         'actual_completion_date': meeting_task.actual_completion_date.isoformat() if meeting_task.actual_completion_date else None,
         'status': meeting_task.status,
         'is_assigned_to_todo': meeting_task.is_assigned_to_todo,
-        'history_log': json.loads(meeting_task.history_log or '[]'),
+        'history_log': TodoEvent.history_for(HistoryEntityType.MEETING_TASK, meeting_task.id),
         'permissions': {
             'can_edit_assignee_fields': can_edit_assignee_fields
         }
@@ -4373,69 +4651,110 @@ def get_meeting_available_dates():
 @app.route('/api/meeting_tasks_list')
 @login_required
 def get_meeting_tasks_list():
+    """
+    會議任務記錄列表，依會議日期與 ID 排序
+
+    任務、會議與各使用者名稱在同一個查詢中 JOIN 取得，出席人員與履歷各以一次查詢批次載入，
+    查詢次數不隨任務數增加。
+
+    Query Args:
+        year, month (int, optional): 會議年份、月份
+        meeting_topic (str, optional): 會議主題
+        meeting_date (str, optional): 會議日期 (YYYY-MM-DD)
+        limit (int, optional): 每頁筆數；與 cursor 都未提供時回傳全部
+        cursor (str, optional): 上一頁回傳的 next_cursor
+
+    Returns:
+        JSON: {'tasks': [...], 'next_cursor': str 或 None}
+    """
+    try:
+        limit, after = _listing_cursor_args(datetime, int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
     meeting_topic = request.args.get('meeting_topic') # 新增接收 meeting_topic
     meeting_date_str = request.args.get('meeting_date') # 新增接收 meeting_date
 
-    # 查詢所有 MeetingTask，並關聯到 Meeting
-    query = db.session.query(MeetingTask, Meeting).join(
-        Meeting, MeetingTask.meeting_id == Meeting.id
-    )
-
+    conditions = []
     if year:
-        query = query.filter(db.extract('year', Meeting.meeting_date) == year)
+        conditions.append(db.extract('year', Meeting.meeting_date) == year)
     if month:
-        query = query.filter(db.extract('month', Meeting.meeting_date) == month)
-    
+        conditions.append(db.extract('month', Meeting.meeting_date) == month)
     if meeting_topic:
-        query = query.filter(Meeting.subject == meeting_topic)
+        conditions.append(Meeting.subject == meeting_topic)
     if meeting_date_str:
         try:
             meeting_date = datetime.fromisoformat(meeting_date_str).date()
-            query = query.filter(func.date(Meeting.meeting_date) == meeting_date)
+            conditions.append(func.date(Meeting.meeting_date) == meeting_date)
         except ValueError:
             pass # 忽略無效的日期格式
 
-    results = query.all()
-    tasks_data = []
-    for task, meeting in results:
-        # 獲取與此會議相關的 DiscussionItem (如果存在)
-        discussion_item = db.session.query(DiscussionItem).filter_by(meeting_id=meeting.id).first()
-        discussion_topic = discussion_item.topic if discussion_item else 'N/A'
-        chairman_name = db.session.get(User, meeting.chairman_user_id).name if meeting.chairman_user_id else 'N/A'
-        assigned_by_name = db.session.get(User, task.assigned_by_user_id).name if task.assigned_by_user_id else 'N/A'
-        assigned_to_name = db.session.get(User, task.assigned_to_user_id).name if task.assigned_to_user_id else 'N/A'
-        recorder_name = db.session.get(User, meeting.recorder_user_id).name if meeting.recorder_user_id else None
-        controller_name = db.session.get(User, task.controller_user_id).name if task.controller_user_id else None
-        
-        attendees_names = []
-        for attendee in meeting.attendees:
-            attendees_names.append(attendee.user.name)
+    assigned_to = db.aliased(User)
+    assigned_by = db.aliased(User)
+    controller = db.aliased(User)
+    chairman = db.aliased(User)
+    recorder = db.aliased(User)
+    # DiscussionItem.meeting_id 為唯一鍵，JOIN 後每個任務仍只有一列
+    query = (
+        select(MeetingTask, Meeting.subject, Meeting.meeting_date, Meeting.recorder_user_id,
+               assigned_to.name, assigned_to.user_key, assigned_by.name, controller.name, controller.user_key,
+               chairman.name, recorder.name, DiscussionItem.topic)
+        .join(Meeting, Meeting.id == MeetingTask.meeting_id)
+        .outerjoin(assigned_to, assigned_to.id == MeetingTask.assigned_to_user_id)
+        .outerjoin(assigned_by, assigned_by.id == MeetingTask.assigned_by_user_id)
+        .outerjoin(controller, controller.id == MeetingTask.controller_user_id)
+        .outerjoin(chairman, chairman.id == Meeting.chairman_user_id)
+        .outerjoin(recorder, recorder.id == Meeting.recorder_user_id)
+        .outerjoin(DiscussionItem, DiscussionItem.meeting_id == Meeting.id)
+        .where(*conditions)
+    )
+    rows, next_cursor = _keyset_fetch(
+        query, [Meeting.meeting_date, MeetingTask.id], key=lambda row: (row[2], row[0].id),
+        limit=limit, after=after
+    )
+
+    # 出席人員依會議批次查詢
+    attendees_by_meeting = {}
+    meeting_ids = {row[0].meeting_id for row in rows}
+    if meeting_ids:
+        attendee_rows = db.session.execute(
+            select(MeetingAttendee.meeting_id, User.name)
+            .join(User, User.id == MeetingAttendee.user_id)
+            .where(MeetingAttendee.meeting_id.in_(meeting_ids))
+            .order_by(MeetingAttendee.meeting_id, User.id)
+        ).all()
+        for meeting_id, name in attendee_rows:
+            attendees_by_meeting.setdefault(meeting_id, []).append(name)
+    histories = TodoEvent.history_for_many(HistoryEntityType.MEETING_TASK, [row[0].id for row in rows])
 
+    tasks_data = []
+    for (task, subject, meeting_date, recorder_user_id, assigned_to_name, assigned_to_user_key, assigned_by_name,
+         controller_name, controller_user_key, chairman_name, recorder_name, discussion_topic) in rows:
         tasks_data.append({
             'id': task.id,
-            'meeting_topic': meeting.subject,
-            'meeting_date': meeting.meeting_date.astimezone(timezone('Asia/Taipei')).strftime('%Y-%m-%d'),
-            'chairman_name': chairman_name,
-            'attendees_names': attendees_names,
-            'discussion_topic': discussion_item.topic, # 新增討論議題
+            'meeting_topic': subject,
+            'meeting_date': _to_taiwan_str(meeting_date, '%Y-%m-%d'),
+            'chairman_name': chairman_name or 'N/A',
+            'attendees_names': attendees_by_meeting.get(task.meeting_id, []),
+            'discussion_topic': discussion_topic or 'N/A', # 新增討論議題
             'task_type': task.task_type,
             'task_description': task.task_description,
-            'assigned_by_name': assigned_by_name,
-            'assigned_to_user_key': task.assigned_to_user.user_key if task.assigned_to_user else None, # 新增 user_key
-            'assigned_to_name': assigned_to_name,
-            'recorder_user_id': meeting.recorder_user_id, # 從 Meeting 獲取
+            'assigned_by_name': assigned_by_name or 'N/A',
+            'assigned_to_user_key': assigned_to_user_key, # 新增 user_key
+            'assigned_to_name': assigned_to_name or 'N/A',
+            'recorder_user_id': recorder_user_id, # 從 Meeting 獲取
             'recorder_name': recorder_name,
-            'controller_user_key': task.controller_user.user_key if task.controller_user else None, # 新增 user_key
+            'controller_user_key': controller_user_key, # 新增 user_key
             'controller_name': controller_name,
-            'expected_completion_date': task.expected_completion_date.astimezone(timezone('Asia/Taipei')).strftime('%Y-%m-%d') if task.expected_completion_date else None,
+            'expected_completion_date': _to_taiwan_str(task.expected_completion_date, '%Y-%m-%d'),
             'actual_completion_date': task.actual_completion_date.isoformat() if task.actual_completion_date else None,
             'status': task.status,
             'is_assigned_to_todo': task.is_assigned_to_todo,
-            'history_log': json.loads(task.history_log or '[]')
+            'history_log': histories.get(task.id, [])
         })
-    return jsonify(tasks_data)
+    return jsonify({'tasks': tasks_data, 'next_cursor': next_cursor})
 
 @app.route('/api/export_meeting_tasks_pdf', methods=['POST'])
 @login_required
@@ -4836,6 +5155,11 @@ def delete_user(user_id):
         flash('不允許刪除管理員帳號！', 'error')
         return redirect(url_for('admin_users'))
 
+    # 使用者的 Todo 會隨使用者一併刪除 (cascade)，履歷存在 todo_event 中需另外刪除，
+    # 避免 SQLite 重用 ID 時新任務接到舊履歷；ArchivedTodo 不會被刪除，其履歷保留
+    TodoEvent.delete_for_many(
+        HistoryEntityType.TODO, db.session.scalars(select(Todo.id).where(Todo.user_id == user.id)).all()
+    )
     db.session.delete(user)
     db.session.commit()
     flash('使用者已成功刪除！', 'success')
@@ -4880,7 +5204,6 @@ def reset_user_password(user_id):
     new_password = secrets.token_urlsafe(8)
     user.set_password(new_password)
     user.must_change_password = True # 強制使用者下次登入時修改密碼
-    db.session.commit()
     try:
         if user.notification_enabled:
             subject = "[重要] 您的密碼已重設"
@@ -4891,10 +5214,11 @@ def reset_user_password(user_id):
                 f"請立即使用此臨時密碼登入，並設定您的新密碼。\n\n"
                 f"請登入系統：\nhttp://192.168.6.119:5001"
             )
-            send_mail(subject, body, user.email)
-            logging.info(f"Sent 'password reset' notification to {user.email}")
+            queue_mail(subject, body, user.email)
+            logging.info(f"Queued 'password reset' notification to {user.email}")
     except Exception as e:
-        logging.error(f"Failed to send 'password reset' notification to {user.email}: {e}")
+        logging.error(f"Failed to queue 'password reset' notification to {user.email}: {e}")
+    db.session.commit()
     return jsonify({'message': f'使用者 {user.name} 的密碼已重設。', 'temp_password': new_password})
 
 @app.route('/api/scheduled_notification/<int:notification_id>/send_now', methods=['POST'])
@@ -4910,10 +5234,11 @@ def send_scheduled_notification_now(notification_id):
     if notification.user_id != current_user.id and current_user.level != UserLevel.ADMIN.value:
         return jsonify({'error': '您沒有權限手動發送此通知！'}), 403
 
-    recipient_ids = [int(uid) for uid in notification.recipient_user_ids.split(',') if uid.strip()]
+    recipient_ids = notification.recipient_ids()
+    users_by_id = {user.id: user for user in User.query.filter(User.id.in_(recipient_ids))} if recipient_ids else {}
     recipients_to_email_list = []
     for user_id in recipient_ids:
-        user = db.session.get(User, user_id)
+        user = users_by_id.get(user_id)
         if user and user.email and user.notification_enabled:
             recipients_to_email_list.append(user.email)
     
@@ -4977,6 +5302,48 @@ def send_scheduled_notification_now(notification_id):
         logging.error(f"An unexpected error occurred while manually sending notification {notification.id}: {e}", exc_info=True)
         return jsonify({'error': f'手動發送時發生未知錯誤: {str(e)}'}), 500
 
+@app.route('/api/admin/job_runs')
+@admin_required
+def job_run_summary():
+    """
+    排程工作執行統計 (最近 days 天，預設 30)：各工作的執行/失敗/錯過次數、
+    耗時百分位數 (p50/p90/p99/max) 與平均讀取列數、郵件數
+    """
+    days = request.args.get('days', 30, type=int)
+    if days is None or days <= 0 or days > 366:
+        return jsonify({'error': 'days 必須介於 1 到 366'}), 400
+    return jsonify({'days': days, 'jobs': summarize_job_runs(db, JobRun, days)})
+
+@app.route('/health/scheduler')
+def scheduler_health():
+    """
+    排程器健康檢查 (供監控使用，不需登入)
+
+    回報持有排程租約的程序與最後一次心跳；租約已過期 (排程 worker 停止或無法連線資料庫) 時回傳 503。
+    未啟用租約選舉時回報本程序排程器的狀態。
+    """
+    now = datetime.now(utc)
+    result = {'mode': scheduler_mode, 'leader_election': scheduler_leader_election}
+    if app_scheduler is not None and not scheduler_leader_election:
+        result['healthy'] = app_scheduler.running
+        return jsonify(result), 200 if result['healthy'] else 503
+
+    lease = db.session.get(SchedulerLease, SCHEDULER_LEASE_NAME)
+    if lease is None:
+        result.update({'healthy': False, 'message': '尚無排程程序取得租約'})
+        return jsonify(result), 503
+
+    expires_at = utc.localize(lease.expires_at)
+    heartbeat_at = utc.localize(lease.heartbeat_at)
+    result.update({
+        'healthy': expires_at > now,
+        'holder': lease.holder,
+        'heartbeat_at': heartbeat_at.isoformat(),
+        'expires_at': expires_at.isoformat(),
+        'seconds_since_heartbeat': round((now - heartbeat_at).total_seconds(), 1),
+    })
+    return jsonify(result), 200 if result['healthy'] else 503
+
 def init_sample_data():
     """初始化範例資料"""
     if User.query.count() == 0:
@@ -5047,14 +5414,13 @@ def init_sample_data():
             ]
             for todo_data in todos_data:
                 todo = Todo(**todo_data)
-                history_entry = {
-                    'event_type': 'assigned',
-                    'timestamp': datetime.now(utc).isoformat(),
-                    'actor': {'id': exec_manager.id, 'name': exec_manager.name, 'user_key': exec_manager.user_key},
-                    'details': {'assigned_to': {'id': exec_manager.id, 'name': exec_manager.name, 'user_key': exec_manager.user_key}}
-                }
-                todo.history_log = json.dumps([history_entry])
                 db.session.add(todo)
+                db.session.flush()
+                TodoEvent.record(
+                    HistoryEntityType.TODO, todo.id, 'assigned',
+                    actor={'id': exec_manager.id, 'name': exec_manager.name, 'user_key': exec_manager.user_key},
+                    details={'assigned_to': {'id': exec_manager.id, 'name': exec_manager.name, 'user_key': exec_manager.user_key}}
+                )
 
         # 廠長的待辦事項
         plant_manager1 = User.query.filter_by(user_key='plant_manager1').first()
@@ -5065,14 +5431,13 @@ def init_sample_data():
             ]
             for todo_data in todos_data:
                 todo = Todo(**todo_data)
-                history_entry = {
-                    'event_type': 'assigned',
-                'timestamp': datetime.now(utc).isoformat(),
-                    'actor': {'id': plant_manager1.id, 'name': plant_manager1.name, 'user_key': plant_manager1.user_key},
-                    'details': {'assigned_to': {'id': plant_manager1.id, 'name': plant_manager1.name, 'user_key': plant_manager1.user_key}}
-                }
-                todo.history_log = json.dumps([history_entry])
                 db.session.add(todo)
+                db.session.flush()
+                TodoEvent.record(
+                    HistoryEntityType.TODO, todo.id, 'assigned',
+                    actor={'id': plant_manager1.id, 'name': plant_manager1.name, 'user_key': plant_manager1.user_key},
+                    details={'assigned_to': {'id': plant_manager1.id, 'name': plant_manager1.name, 'user_key': plant_manager1.user_key}}
+                )
 
         # 課長的待辦事項 (裝一課)
         section_chief_z1 = User.query.filter_by(user_key='section_chief_z1').first()
@@ -5083,14 +5448,13 @@ def init_sample_data():
             ]
             for todo_data in todos_data:
                 todo = Todo(**todo_data)
-                history_entry = {
-                    'event_type': 'assigned',
-                    'timestamp': datetime.now(utc).isoformat(),
-                    'actor': {'id': section_chief_z1.id, 'name': section_chief_z1.name, 'user_key': section_chief_z1.user_key},
-                    'details': {'assigned_to': {'id': section_chief_z1.id, 'name': section_chief_z1.name, 'user_key': section_chief_z1.user_key}}
-                }
-                todo.history_log = json.dumps([history_entry])
                 db.session.add(todo)
+                db.session.flush()
+                TodoEvent.record(
+                    HistoryEntityType.TODO, todo.id, 'assigned',
+                    actor={'id': section_chief_z1.id, 'name': section_chief_z1.name, 'user_key': section_chief_z1.user_key},
+                    details={'assigned_to': {'id': section_chief_z1.id, 'name': section_chief_z1.name, 'user_key': section_chief_z1.user_key}}
+                )
 
         # 組長的待辦事項 (裝一課)
         team_leader_z1_1 = User.query.filter_by(user_key='team_leader_z1_1').first()
@@ -5100,14 +5464,13 @@ def init_sample_data():
             ]
             for todo_data in todos_data:
                 todo = Todo(**todo_data)
-                history_entry = {
-                    'event_type': 'assigned',
-                    'timestamp': datetime.now(utc).isoformat(),
-                    'actor': {'id': team_leader_z1_1.id, 'name': team_leader_z1_1.name, 'user_key': team_leader_z1_1.user_key},
-                    'details': {'assigned_to': {'id': team_leader_z1_1.id, 'name': team_leader_z1_1.name, 'user_key': team_leader_z1_1.user_key}}
-                }
-                todo.history_log = json.dumps([history_entry])
                 db.session.add(todo)
+                db.session.flush()
+                TodoEvent.record(
+                    HistoryEntityType.TODO, todo.id, 'assigned',
+                    actor={'id': team_leader_z1_1.id, 'name': team_leader_z1_1.name, 'user_key': team_leader_z1_1.user_key},
+                    details={'assigned_to': {'id': team_leader_z1_1.id, 'name': team_leader_z1_1.name, 'user_key': team_leader_z1_1.user_key}}
+                )
 
         db.session.commit()
 
@@ -0,0 +1,129 @@
+"""
+SQLite 併發讀寫基準測試
+
+模擬 Waitress 多執行緒讀取 (報告查詢) 與排程器寫入 (轉移/歸檔) 同時發生的情況，
+比較 'legacy' (rollback journal) 與 'wal' 兩種引擎設定檔在寫入進行中的讀取吞吐量。
+
+用法：
+    python bench_sqlite_concurrency.py [--readers 8] [--seconds 5] [--rows 20000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from db_engine import get_engine_profile, build_engine_options, register_sqlite_pragmas
+
+STATUSES = ['pending', 'in-progress', 'completed', 'uncompleted']
+
+
+def _prepare_database(path, rows):
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE todo (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "status VARCHAR(20) NOT NULL, todo_type VARCHAR(20) NOT NULL, "
+            "due_date DATETIME NOT NULL, history_log TEXT)"
+        ))
+        conn.execute(text("CREATE INDEX ix_todo_user_type_status_due ON todo (user_id, todo_type, status, due_date)"))
+        base = datetime(2025, 1, 1)
+        conn.execute(
+            text("INSERT INTO todo (user_id, status, todo_type, due_date, history_log) VALUES (:u, :s, :t, :d, :h)"),
+            [{'u': i % 50, 's': random.choice(STATUSES), 't': random.choice(['current', 'next']),
+              'd': base + timedelta(hours=i), 'h': '[]'} for i in range(rows)]
+        )
+    engine.dispose()
+
+
+def _run_profile(path, profile_name, readers, seconds):
+    profile = get_engine_profile(profile_name)
+    uri = f'sqlite:///{path}'
+    engine = create_engine(uri, **build_engine_options(uri, profile))
+    register_sqlite_pragmas(engine, profile)
+
+    stop = threading.Event()
+    counters = {'reads': 0, 'read_errors': 0, 'writes': 0, 'write_errors': 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def writer():
+        # 每筆交易改寫大量 history_log，模擬 transfer_and_archive_todos 的大型寫入交易；
+        # 寫入量超過頁快取時，rollback journal 模式會在交易中途取得排他鎖而阻擋讀取
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text("UPDATE todo SET status = :s, history_log = :h WHERE user_id % 5 = :m"),
+                        {'s': random.choice(STATUSES), 'h': 'x' * random.randint(400, 800), 'm': random.randint(0, 4)}
+                    )
+                with lock:
+                    counters['writes'] += 1
+            except OperationalError:
+                with lock:
+                    counters['write_errors'] += 1
+
+    def reader():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(
+                        "SELECT status, COUNT(*) FROM todo WHERE user_id = :u GROUP BY status"
+                    ), {'u': random.randint(0, 49)}).fetchall()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    counters['reads'] += 1
+                    latencies.append(elapsed)
+            except OperationalError:
+                with lock:
+                    counters['read_errors'] += 1
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float('nan')
+    return {
+        'profile': profile_name,
+        'reads_per_sec': counters['reads'] / seconds,
+        'read_p99_ms': p99,
+        'read_errors': counters['read_errors'],
+        'write_txns': counters['writes'],
+        'write_errors': counters['write_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8, help='讀取執行緒數 (對應 Waitress --threads)')
+    parser.add_argument('--seconds', type=float, default=5.0, help='每個設定檔的測試秒數')
+    parser.add_argument('--rows', type=int, default=20000, help='測試資料筆數')
+    args = parser.parse_args()
+
+    results = []
+    for profile_name in ['legacy', 'wal']:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bench.db')
+            _prepare_database(path, args.rows)
+            results.append(_run_profile(path, profile_name, args.readers, args.seconds))
+
+    print(f"{'profile':<8} {'reads/s':>10} {'read p99 ms':>12} {'read errs':>10} {'write txns':>11} {'write errs':>11}")
+    for r in results:
+        print(f"{r['profile']:<8} {r['reads_per_sec']:>10.1f} {r['read_p99_ms']:>12.2f} {r['read_errors']:>10} "
+              f"{r['write_txns']:>11} {r['write_errors']:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -37,6 +37,34 @@ UNIT_TO_MAIN_DEPT_MAP = {
     '品管課': '品保部'
 }
 
+# SQLite 引擎設定檔 (由環境變數 DB_ENGINE_PROFILE 選擇，預設為 'wal')
+# Waitress 以多執行緒處理請求，且 APScheduler 背景執行緒同時寫入，
+# 'wal' 讓讀取不會被寫入阻擋，並以 busy_timeout 取代立即拋出 "database is locked"。
+# 'legacy' 保留 SQLite 預設的 rollback journal 行為，僅供比較或排查問題使用。
+DB_ENGINE_PROFILES = {
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout_ms': 15000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size_kib': 64 * 1024,
+        'pool_size': 10,        # Waitress 8 個執行緒 + 排程器
+        'max_overflow': 10,
+        'pool_timeout': 30,
+    },
+    'legacy': {
+        'journal_mode': None,
+        'synchronous': None,
+        'busy_timeout_ms': 5000,
+        'mmap_size': None,
+        'cache_size_kib': None,
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+    },
+}
+DEFAULT_DB_ENGINE_PROFILE = 'wal'
+
 # 登入與帳戶鎖定配置
 LOGIN_ATTEMPTS_LIMIT = 3
 ACCOUNT_LOCK_MINUTES = 30
@@ -77,6 +105,40 @@ class MeetingTaskType(str, Enum):
     TRACKING = "tracking"
     RESOLUTION = "resolution"
 
+class HistoryEntityType(str, Enum):
+    TODO = "todo"
+    ARCHIVED_TODO = "archived_todo"
+    MEETING_TASK = "meeting_task"
+
+class CacheVersionName(str, Enum):
+    USER_DIRECTORY = "user_directory" # 使用者的單位、在職狀態 (單位 -> 使用者 ID 對應表)
+    ORG_TREE = "org_tree"             # 使用者的姓名、職級、部門與單位 (首頁組織圖)
+    USER_PERMISSIONS = "user_permissions" # 使用者的職級、部門與單位 (可存取、可指派的使用者索引)
+
+class SchedulerMode(str, Enum):
+    ALL = "all"       # Web 程序內執行排程工作 (單機部署)
+    WEB = "web"       # 只處理請求，不啟動排程器 (排程由獨立的 worker 執行)
+    WORKER = "worker" # 獨立的排程程序 (python scheduler_worker.py)，不處理請求
+
+class SchedulerJobStore(str, Enum):
+    DATABASE = "database" # 排程存於資料庫 (apscheduler_jobs)，重新啟動後保留下次執行時間
+    MEMORY = "memory"     # 只存於記憶體 (測試用)
+
+class JobRunStatus(str, Enum):
+    SUCCESS = "success"
+    FAILED = "failed"
+    MISSED = "missed" # 超過 misfire_grace_time 而未執行
+
+class MailOutboxStatus(str, Enum):
+    PENDING = "pending" # 等待發送 (含等待重試)
+    SENDING = "sending" # 已被 worker 認領
+    SENT = "sent"
+    DEAD = "dead"       # 超過重試次數，不再發送
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
 MEETING_TASK_STATUS_CHINESE = {
     MeetingTaskStatus.UNASSIGNED.value: "未指派",
     MeetingTaskStatus.ASSIGNED.value: "已指派",
@@ -89,4 +151,67 @@ MEETING_TASK_STATUS_CHINESE = {
 }
 
 # Mail Service API URL
-MAIL_API_URL = "http://192.168.1.231/HFSRAPITS/SendMail/APISend"
\ No newline at end of file
+MAIL_API_URL = "http://192.168.1.231/HFSRAPITS/SendMail/APISend"
+
+# 郵件 API 連線設定 (mail_service 共用一個保持連線的 requests.Session)
+MAIL_API_CONNECT_TIMEOUT_SECONDS = 3     # 建立連線逾時
+MAIL_API_READ_TIMEOUT_SECONDS = 15       # 等待回應逾時
+MAIL_API_POOL_SIZE = 4                   # 連線池大小 (>= 寄件匣 worker 數)
+MAIL_API_MAX_RETRIES = 2                 # 連線失敗或 5xx 時的重試次數
+MAIL_API_RETRY_BACKOFF_FACTOR = 0.5      # 重試間隔 factor * 2^(n-1) 秒
+MAIL_API_CIRCUIT_FAILURE_THRESHOLD = 5   # 連續失敗幾次後斷路，直接回傳失敗不再呼叫 API
+MAIL_API_CIRCUIT_RESET_SECONDS = 60      # 斷路後多久放行一次試探請求
+MAIL_API_RATE_PER_SECOND = 2.0          # 郵件 API 允許的發送速率 (所有程序的所有發送者合計，狀態存於 rate_limit_bucket 資料表)
+MAIL_API_RATE_BURST = 5                  # 可連續立即發送的封數
+MAIL_API_RATE_BUCKET_NAME = 'mail_api'   # rate_limit_bucket 中郵件 API 限速器的資料列名稱
+
+# 郵件寄件匣 (Outbox) 設定
+# 請求處理只寫入 mail_outbox 資料表，由背景 worker 呼叫郵件 API 發送。
+MAIL_OUTBOX_WORKERS = 2                  # worker 執行緒數 (可由環境變數 MAIL_OUTBOX_WORKERS 覆寫，0 表示不啟動)
+MAIL_OUTBOX_POLL_SECONDS = 5             # 沒有待發送郵件時的輪詢間隔
+MAIL_OUTBOX_MAX_ATTEMPTS = 6             # 超過此次數即標記為 dead
+MAIL_OUTBOX_BACKOFF_BASE_SECONDS = 30    # 第 n 次失敗後等待 base * 2^(n-1) 秒
+MAIL_OUTBOX_BACKOFF_MAX_SECONDS = 3600
+MAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS = 300  # 認領後超過此時間未完成 (worker 中斷) 可被重新認領
+MAIL_DIGEST_WINDOW_SECONDS = 900         # 彙整通知的收集時間：同一收件人在此期間內的通知合併成一封 (涵蓋 07:25-07:37 的晨間提醒)
+
+# 使用者自訂定時通知
+SCHEDULED_NOTIFICATION_GRACE_MINUTES = 5         # 超過預定時間此分鐘數仍未發送即視為錯過
+SCHEDULED_NOTIFICATION_MAX_SLEEP_SECONDS = 3600  # 排程器休眠到下一個發送時間，但最長不超過此秒數 (讓其他程序的修改也能被讀到)
+
+# 週報排程
+REPORT_SCHEDULE_RETRY_MINUTES = 5            # 驗證未通過時，當天每隔此分鐘數重新檢查
+REPORT_SCHEDULE_MAX_SLEEP_SECONDS = 3600     # 排程器休眠到下一個週報時間，但最長不超過此秒數
+
+# 排程器執行模式與主程序選舉
+# 每個程序的排程器都以暫停狀態啟動，只有持有資料庫租約的程序會執行排程工作。
+SCHEDULER_MODE = SchedulerMode.ALL.value # 可由環境變數 SCHEDULER_MODE 覆寫 (all / web / worker)
+SCHEDULER_LEADER_ELECTION = True         # 可由環境變數 SCHEDULER_LEADER_ELECTION 覆寫 (0 表示單一程序部署，直接執行排程；worker 模式一律選舉)
+SCHEDULER_LEASE_NAME = "app_scheduler"
+SCHEDULER_LEASE_TTL_SECONDS = 60         # 持有者超過此秒數未續約即可被接手
+SCHEDULER_LEASE_HEARTBEAT_SECONDS = 20   # 續約間隔 (需小於 TTL)
+SCHEDULER_JOBSTORE = SchedulerJobStore.DATABASE.value # 可由環境變數 SCHEDULER_JOBSTORE 覆寫
+SCHEDULER_JOBSTORE_TABLE = "apscheduler_jobs"       # 由 APScheduler 自行建立，遷移 (autogenerate) 時略過
+# 錯過的執行 (程序停止、重新啟動或切換主程序期間) 在此秒數內補跑一次，多次錯過只補一次
+SCHEDULER_CATCH_UP_GRACE_SECONDS = {
+    'transfer_and_archive_todos': 6 * 24 * 3600,  # 週一歸檔：本週內補跑
+    'check_due_today_tasks': 4 * 3600,            # 晨間提醒：當天上午補寄
+    'check_overdue_tasks': 4 * 3600,
+    'check_unassigned_meeting_tasks': 4 * 3600,
+    'check_unagreed_resolution_items': 4 * 3600,
+    'check_and_trigger_reports': 3600,
+    'check_scheduled_notifications': 3600,
+}
+SCHEDULER_DEFAULT_MISFIRE_GRACE_SECONDS = 300
+
+# 每週歸檔
+ARCHIVE_CHUNK_SIZE = 500                 # 每個交易歸檔的任務數 (交易越小，SQLite 寫入鎖持有時間越短)
+
+# 分頁 (游標)
+HISTORY_PAGE_SIZE = 20                   # 任務履歷每頁筆數 (使用者展開任務時才載入)
+HISTORY_PAGE_SIZE_MAX = 100              # 任務履歷每頁筆數上限 (limit 參數)
+LISTING_PAGE_SIZE = 50                   # 報告列表 API 只帶 cursor 時的每頁筆數
+LISTING_PAGE_SIZE_MAX = 500              # 報告列表 API 每頁筆數上限 (limit 參數)
+
+# 資料匯出 (串流)
+EXPORT_BATCH_SIZE = 500                  # 匯出時每次從資料庫游標讀取的列數 (記憶體用量只與此有關)
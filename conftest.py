@@ -0,0 +1,111 @@
+"""
+pytest 共用設定
+
+import app 時即會建立資料庫連線，因此必須在任何測試模組 import app 之前
+將 DATABASE_URL 指向記憶體資料庫，避免測試寫入 instance/todo_system.db；
+寄件匣 worker 也不啟動，測試以 drain_mail_outbox 同步發送；
+排程器不進行租約選舉、排程也只存於記憶體 (避免背景執行緒與測試共用同一個記憶體資料庫連線)。
+"""
+import os
+from contextlib import contextmanager
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['MAIL_OUTBOX_WORKERS'] = '0'
+os.environ['SCHEDULER_LEADER_ELECTION'] = '0'
+os.environ['SCHEDULER_JOBSTORE'] = 'memory'
+
+import pytest
+from sqlalchemy import event
+
+
+def _clear_versioned_caches():
+    # 每個測試都重建資料表，快取版本號會從頭開始，程序內快取需一併清除
+    import org_tree
+    import permission_index
+    import scheduler
+    for cache in (org_tree._org_tree_cache, permission_index._permission_index_cache, scheduler._unit_user_ids_cache):
+        cache.clear()
+
+
+@pytest.fixture
+def app_db():
+    """建立乾淨的記憶體資料表，測試結束後清除"""
+    from app import app, db
+    _clear_versioned_caches()
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-secret-key'
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app_db):
+    from app import app
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app_db):
+    """
+    計算區塊內送出的 SELECT 數量
+
+    用法：
+        with count_queries() as statements:
+            ...
+        assert len(statements) == 1
+    """
+    @contextmanager
+    def _count():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append(statement)
+
+        event.listen(app_db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(app_db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return _count
+
+
+@pytest.fixture
+def make_user(app_db):
+    """
+    建立並提交一位測試使用者 (預設為第一廠裝一課的職員，開啟通知)
+
+    用法：
+        chief = make_user('chief', UserLevel.SECTION_CHIEF.value)
+        other = make_user('other', unit='裝三課')
+    """
+    from app import User
+    from config import UserLevel
+
+    def _make(user_key, level=UserLevel.STAFF.value, **overrides):
+        fields = dict(
+            user_key=user_key, name=user_key, role='職員', department='第一廠', unit='裝一課',
+            level=level, avatar='👷', email=f'{user_key}@example.com', notification_enabled=True,
+            password_hash='x'
+        )
+        fields.update(overrides)
+        user = User(**fields)
+        app_db.session.add(user)
+        app_db.session.commit()
+        return user
+
+    return _make
+
+
+@pytest.fixture
+def login(client):
+    """以指定使用者登入測試 client (直接寫入 session)"""
+    def _login(user):
+        with client.session_transaction() as sess:
+            sess['user_id'] = user.id
+
+    return _login
@@ -0,0 +1,80 @@
+import logging
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from config import DB_ENGINE_PROFILES, DEFAULT_DB_ENGINE_PROFILE
+
+
+def get_engine_profile(name=None):
+    """
+    取得 SQLite 引擎設定檔。
+
+    Args:
+        name (str, optional): 設定檔名稱，未指定或不存在時使用 DEFAULT_DB_ENGINE_PROFILE。
+
+    Returns:
+        dict: 設定檔內容 (journal_mode, synchronous, busy_timeout_ms, mmap_size, pool_size ...)
+    """
+    if name and name not in DB_ENGINE_PROFILES:
+        logging.warning(f"Unknown DB engine profile '{name}', falling back to '{DEFAULT_DB_ENGINE_PROFILE}'.")
+        name = None
+    return DB_ENGINE_PROFILES[name or DEFAULT_DB_ENGINE_PROFILE]
+
+
+def _is_file_sqlite(database_uri):
+    url = make_url(database_uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def build_engine_options(database_uri, profile):
+    """
+    依設定檔建立 SQLALCHEMY_ENGINE_OPTIONS。
+
+    只有檔案型 SQLite 才設定連線池大小；記憶體資料庫由 Flask-SQLAlchemy 使用 StaticPool。
+    """
+    if not _is_file_sqlite(database_uri):
+        return {}
+    return {
+        'pool_size': profile['pool_size'],
+        'max_overflow': profile['max_overflow'],
+        'pool_timeout': profile['pool_timeout'],
+        'connect_args': {
+            # sqlite3 的 timeout 以秒為單位，與 busy_timeout 保持一致
+            'timeout': profile['busy_timeout_ms'] / 1000,
+        },
+    }
+
+
+def register_sqlite_pragmas(engine, profile):
+    """
+    在每條新的 SQLite 連線上套用設定檔中的 PRAGMA。
+
+    journal_mode=WAL 會寫入資料庫檔案本身，其餘 PRAGMA 僅對該連線有效，
+    因此必須在 "connect" 事件中逐條設定。
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = []
+    if profile.get('journal_mode'):
+        pragmas.append(f"PRAGMA journal_mode={profile['journal_mode']}")
+    if profile.get('synchronous'):
+        pragmas.append(f"PRAGMA synchronous={profile['synchronous']}")
+    if profile.get('busy_timeout_ms') is not None:
+        pragmas.append(f"PRAGMA busy_timeout={int(profile['busy_timeout_ms'])}")
+    if profile.get('mmap_size') is not None:
+        pragmas.append(f"PRAGMA mmap_size={int(profile['mmap_size'])}")
+    if profile.get('cache_size_kib') is not None:
+        # 負值代表以 KiB 為單位
+        pragmas.append(f"PRAGMA cache_size=-{int(profile['cache_size_kib'])}")
+
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
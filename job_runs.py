@@ -0,0 +1,147 @@
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pytz import utc
+from sqlalchemy import select
+
+from config import JobRunStatus
+
+_local = threading.local()
+
+
+class JobRunStats:
+    """單次排程工作執行期間累計的統計 (由工作內呼叫 record_job_stats 更新)"""
+
+    def __init__(self):
+        self.rows_scanned = 0
+        self.mails_queued = 0
+
+
+def record_job_stats(rows_scanned=0, mails_queued=0):
+    """
+    累加目前執行緒上排程工作的統計；不在排程工作中呼叫時不做任何事。
+
+    Args:
+        rows_scanned (int, optional): 讀取的資料列數
+        mails_queued (int, optional): 加入寄件匣 (或直接交給郵件 API) 的郵件數
+    """
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.rows_scanned += rows_scanned
+        stats.mails_queued += mails_queued
+
+
+def _save_job_run(app, db, JobRun, **fields):
+    # 寫入失敗只記錄錯誤，不影響排程工作本身
+    try:
+        with app.app_context():
+            db.session.add(JobRun(**fields))
+            db.session.commit()
+    except Exception as e:
+        logging.error(f"Failed to record job run for {fields.get('job_name')}: {e}")
+
+
+def run_tracked_job(app, db, JobRun, job_name, func, *args):
+    """
+    執行排程工作並寫入一筆 JobRun (開始/結束時間、耗時、讀取列數、排入寄送的郵件數、錯誤)。
+
+    工作拋出的例外會記錄後再拋出，讓 APScheduler 照常記錄錯誤。
+    """
+    stats = JobRunStats()
+    _local.stats = stats
+    started_at = datetime.now(utc)
+    started = time.monotonic()
+    error = None
+    try:
+        return func(*args)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _local.stats = None
+        duration_ms = int((time.monotonic() - started) * 1000)
+        _save_job_run(
+            app, db, JobRun,
+            job_name=job_name,
+            status=JobRunStatus.FAILED.value if error else JobRunStatus.SUCCESS.value,
+            started_at=started_at,
+            finished_at=datetime.now(utc),
+            duration_ms=duration_ms,
+            rows_scanned=stats.rows_scanned,
+            mails_queued=stats.mails_queued,
+            error=error[:2000] if error else None,
+            misfired=False
+        )
+        logging.info(
+            f"Job {job_name} finished in {duration_ms} ms "
+            f"(rows scanned: {stats.rows_scanned}, mails queued: {stats.mails_queued}{', failed' if error else ''})."
+        )
+
+
+def record_missed_run(app, db, JobRun, job_name, scheduled_run_time):
+    """記錄超過 misfire_grace_time 而未執行的排程 (APScheduler EVENT_JOB_MISSED)"""
+    logging.warning(f"Job {job_name} missed its run scheduled at {scheduled_run_time}.")
+    _save_job_run(
+        app, db, JobRun,
+        job_name=job_name,
+        status=JobRunStatus.MISSED.value,
+        started_at=scheduled_run_time,
+        finished_at=None,
+        duration_ms=None,
+        rows_scanned=0,
+        mails_queued=0,
+        misfired=True
+    )
+
+
+def _percentile(sorted_values, fraction):
+    # nearest-rank 百分位數
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_job_runs(db, JobRun, days=30):
+    """
+    依工作彙整最近 days 天的執行紀錄：次數、失敗與錯過次數、耗時百分位數與平均讀取列數、排入寄送的郵件數。
+
+    Returns:
+        list: 依工作名稱排序的統計字典
+    """
+    since = datetime.now(utc) - timedelta(days=days)
+    rows = db.session.execute(
+        select(JobRun.job_name, JobRun.status, JobRun.duration_ms, JobRun.rows_scanned, JobRun.mails_queued, JobRun.started_at)
+        .where(JobRun.started_at >= since)
+        .order_by(JobRun.job_name, JobRun.started_at)
+    ).all()
+
+    by_job = {}
+    for row in rows:
+        by_job.setdefault(row.job_name, []).append(row)
+
+    summary = []
+    for job_name, runs in sorted(by_job.items()):
+        executed = [run for run in runs if run.status != JobRunStatus.MISSED.value]
+        durations = sorted(run.duration_ms for run in executed if run.duration_ms is not None)
+        last_run = runs[-1]
+        summary.append({
+            'job_name': job_name,
+            'runs': len(executed),
+            'failures': sum(1 for run in executed if run.status == JobRunStatus.FAILED.value),
+            'missed': len(runs) - len(executed),
+            'duration_ms': {
+                'p50': _percentile(durations, 0.5),
+                'p90': _percentile(durations, 0.9),
+                'p99': _percentile(durations, 0.99),
+                'max': durations[-1] if durations else None,
+            },
+            'avg_rows_scanned': round(sum(run.rows_scanned or 0 for run in executed) / len(executed), 1) if executed else None,
+            'avg_mails_queued': round(sum(run.mails_queued or 0 for run in executed) / len(executed), 1) if executed else None,
+            'last_run_at': utc.localize(last_run.started_at).isoformat() if last_run.started_at else None,
+            'last_status': last_run.status,
+        })
+    return summary
@@ -0,0 +1,312 @@
+import atexit
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pytz import utc
+from sqlalchemy import event, select, update, and_, or_
+
+import mail_service
+from job_runs import record_job_stats
+from config import (
+    MailOutboxStatus, MAIL_OUTBOX_POLL_SECONDS, MAIL_OUTBOX_MAX_ATTEMPTS,
+    MAIL_OUTBOX_BACKOFF_BASE_SECONDS, MAIL_OUTBOX_BACKOFF_MAX_SECONDS, MAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS,
+    MAIL_DIGEST_WINDOW_SECONDS
+)
+
+_worker_pool = None
+
+
+def _split_addresses(*address_lists):
+    """
+    將以「;」或「,」分隔的收件人字串拆成個別地址 (去除空白、不分大小寫去重，保留原順序)
+
+    Returns:
+        list: 小寫的郵件地址
+    """
+    addresses = []
+    for address_list in address_lists:
+        for address in (address_list or "").replace(",", ";").split(";"):
+            address = address.strip().lower()
+            if address and address not in addresses:
+                addresses.append(address)
+    return addresses
+
+
+def enqueue_mail(db, MailOutbox, subject, body, mail_to, mail_cc="", digest=False):
+    """
+    將郵件寫入寄件匣，由背景 worker 發送。
+
+    只加入目前的 session，不會 commit：與觸發通知的資料異動在同一個交易中提交，
+    交易回滾時郵件也不會送出。
+
+    Args:
+        subject (str): 信件主旨
+        body (str): 信件內文 (HTML)
+        mail_to (str): 收件人，多個以「;」分隔
+        mail_cc (str, optional): 副本
+        digest (bool, optional): 是否為彙整通知。彙整通知延後 MAIL_DIGEST_WINDOW_SECONDS 發送，
+            收件人與副本拆成每位收件人一筆，期間同一收件人的彙整通知 (不論原本的副本為何) 會合併成一封
+
+    Returns:
+        list: 已加入 session 的寄件匣項目 (一般郵件一筆，彙整通知每位收件人一筆)
+    """
+    now = datetime.now(utc)
+    if digest:
+        recipients = [(address, "") for address in _split_addresses(mail_to, mail_cc)]
+        next_attempt_at = now + timedelta(seconds=MAIL_DIGEST_WINDOW_SECONDS)
+    else:
+        recipients = [(mail_to, mail_cc or "")]
+        next_attempt_at = now
+    outboxes = [
+        MailOutbox(
+            subject=subject,
+            body=body,
+            mail_to=to,
+            mail_cc=cc,
+            status=MailOutboxStatus.PENDING.value,
+            attempts=0,
+            is_digest=digest,
+            next_attempt_at=next_attempt_at
+        )
+        for to, cc in recipients
+    ]
+    db.session.add_all(outboxes)
+    record_job_stats(mails_queued=len(outboxes)) # 由排程工作加入時計入執行紀錄 (摘要郵件每位收件者一筆)
+    # commit 後喚醒 worker (見 _wake_after_commit)
+    db.session.info['mail_outbox_queued'] = True
+    return outboxes
+
+
+def wake_mail_outbox_workers():
+    """通知 worker 立即檢查寄件匣 (不必等到下次輪詢)"""
+    if _worker_pool is not None:
+        _worker_pool.wake()
+
+
+def _wake_after_commit(session):
+    if session.info.pop('mail_outbox_queued', False):
+        wake_mail_outbox_workers()
+
+
+def backoff_seconds(attempts):
+    """第 attempts 次失敗後的等待秒數 (指數退避，上限 MAIL_OUTBOX_BACKOFF_MAX_SECONDS)"""
+    return min(MAIL_OUTBOX_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), MAIL_OUTBOX_BACKOFF_MAX_SECONDS)
+
+
+def _stale_claim(MailOutbox, now):
+    # worker 在發送途中中斷時，認領逾時後可由其他 worker 接手
+    stale_before = now - timedelta(seconds=MAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS)
+    return and_(MailOutbox.status == MailOutboxStatus.SENDING.value, MailOutbox.claimed_at < stale_before)
+
+
+def _claimable(MailOutbox, now):
+    return or_(
+        and_(MailOutbox.status == MailOutboxStatus.PENDING.value, MailOutbox.next_attempt_at <= now),
+        _stale_claim(MailOutbox, now)
+    )
+
+
+def claim_next(db, MailOutbox):
+    """
+    認領下一封可發送的郵件。
+
+    先找出候選項目，再以帶相同條件的 UPDATE 認領；多個 worker 同時認領同一筆時
+    只有一個 UPDATE 會影響到資料列，其餘的會改認領下一筆。
+    候選項目為彙整通知時 (每位收件人一筆，見 enqueue_mail)，同一收件人其餘尚未發送的彙整通知
+    (不論是否到期) 以同一個 token 一併認領。
+
+    Returns:
+        tuple: (outbox_id, claim_token)，沒有可發送的郵件時回傳 None
+    """
+    while True:
+        now = datetime.now(utc)
+        candidate = db.session.execute(
+            select(MailOutbox.id, MailOutbox.is_digest, MailOutbox.mail_to)
+            .where(_claimable(MailOutbox, now))
+            .order_by(MailOutbox.next_attempt_at, MailOutbox.id)
+            .limit(1)
+        ).first()
+        if candidate is None:
+            db.session.commit()
+            return None
+        candidate_id = candidate.id
+
+        claim_token = uuid.uuid4().hex
+        result = db.session.execute(
+            update(MailOutbox)
+            .where(MailOutbox.id == candidate_id, _claimable(MailOutbox, now))
+            .values(status=MailOutboxStatus.SENDING.value, claimed_at=now, claimed_by=claim_token)
+        )
+        if result.rowcount == 1 and candidate.is_digest:
+            db.session.execute(
+                update(MailOutbox)
+                .where(
+                    MailOutbox.is_digest == True,
+                    MailOutbox.mail_to == candidate.mail_to,
+                    or_(MailOutbox.status == MailOutboxStatus.PENDING.value, _stale_claim(MailOutbox, now))
+                )
+                .values(status=MailOutboxStatus.SENDING.value, claimed_at=now, claimed_by=claim_token)
+            )
+        db.session.commit()
+        if result.rowcount == 1:
+            return candidate_id, claim_token
+
+
+def combine_digest(rows):
+    """
+    將同一收件人的多封彙整通知合併為一封郵件。
+
+    Args:
+        rows (list): 依建立順序排列的 MailOutbox 項目
+
+    Returns:
+        tuple: (subject, body)
+    """
+    if len(rows) == 1:
+        return rows[0].subject, rows[0].body
+    subject = f"【通知彙整】您有 {len(rows)} 則新通知"
+    sections = [f"<b>{row.subject}</b><br><br>{row.body}" for row in rows]
+    return subject, "<br><hr><br>".join(sections)
+
+
+def deliver(db, MailOutbox, outbox_id, claim_token, send=None):
+    """
+    發送已認領的郵件並記錄結果。
+
+    同一 token 認領的彙整通知合併成一封發送。成功標記為 sent；
+    失敗時累加嘗試次數並依指數退避排定下次發送，超過 MAIL_OUTBOX_MAX_ATTEMPTS 次則標記為 dead。
+    標記為 sent 或 dead 時清空內文 (例如重設密碼信中的臨時密碼)，不會留存在資料庫與備份中；
+    主旨、收件人與錯誤訊息保留供查詢。
+
+    Returns:
+        str: 處理後的狀態 (MailOutboxStatus 值)，認領已被接手時為 None
+    """
+    send = send or mail_service.send_mail
+    rows = db.session.scalars(
+        select(MailOutbox)
+        .where(MailOutbox.claimed_by == claim_token)
+        .order_by(MailOutbox.created_at, MailOutbox.id)
+    ).all()
+    if not rows:
+        db.session.commit()
+        return None
+    subject, body = combine_digest(rows)
+    mail_to, mail_cc = rows[0].mail_to, rows[0].mail_cc
+    attempts = max(row.attempts for row in rows)
+    # 發送期間不持有交易，避免 SQLite 寫入鎖等待郵件 API
+    db.session.commit()
+
+    try:
+        success, message = send(subject, body, mail_to, mail_cc=mail_cc)
+    except Exception as e:
+        success, message = False, f"發生未知錯誤: {e}"
+
+    now = datetime.now(utc)
+    if success:
+        values = {'status': MailOutboxStatus.SENT.value, 'sent_at': now, 'last_error': None, 'body': ''}
+    else:
+        attempts += 1
+        if attempts >= MAIL_OUTBOX_MAX_ATTEMPTS:
+            values = {'status': MailOutboxStatus.DEAD.value, 'body': ''}
+            logging.error(f"Mail outbox {outbox_id} to {mail_to} moved to dead letter after {attempts} attempts: {message}")
+        else:
+            values = {
+                'status': MailOutboxStatus.PENDING.value,
+                'next_attempt_at': now + timedelta(seconds=backoff_seconds(attempts))
+            }
+            logging.warning(f"Mail outbox {outbox_id} to {mail_to} failed (attempt {attempts}), will retry: {message}")
+        values.update({'attempts': attempts, 'last_error': str(message)[:1000]})
+
+    values.update({'claimed_at': None, 'claimed_by': None})
+    # 只有仍持有認領權時才更新，避免覆寫已被其他 worker 接手的結果
+    db.session.execute(
+        update(MailOutbox)
+        .where(MailOutbox.claimed_by == claim_token)
+        .values(**values)
+    )
+    db.session.commit()
+    return values['status']
+
+
+def drain_mail_outbox(app, db, MailOutbox, send=None, limit=None):
+    """
+    發送寄件匣中所有目前可發送的郵件。
+
+    Args:
+        limit (int, optional): 最多處理幾封，預設為直到沒有可發送的郵件
+
+    Returns:
+        int: 本次處理的郵件數
+    """
+    processed = 0
+    with app.app_context():
+        while limit is None or processed < limit:
+            claimed = claim_next(db, MailOutbox)
+            if claimed is None:
+                break
+            deliver(db, MailOutbox, *claimed, send=send)
+            processed += 1
+    return processed
+
+
+class MailOutboxWorkerPool:
+    """背景執行緒池：持續從寄件匣認領並發送郵件"""
+
+    def __init__(self, app, db, MailOutbox, workers, poll_seconds=MAIL_OUTBOX_POLL_SECONDS, send=None):
+        self.app = app
+        self.db = db
+        self.MailOutbox = MailOutbox
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.send = send
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"mail-outbox-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Started {self.workers} mail outbox worker(s).")
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                drain_mail_outbox(self.app, self.db, self.MailOutbox, send=self.send)
+            except Exception as e:
+                logging.error(f"Mail outbox worker error: {e}", exc_info=True)
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+
+def start_mail_outbox_workers(app, db, MailOutbox, workers):
+    """
+    啟動寄件匣 worker，並在 session commit 後喚醒 worker。
+
+    Args:
+        workers (int): 執行緒數，0 表示不啟動 (例如測試或唯讀部署)
+
+    Returns:
+        MailOutboxWorkerPool: 執行緒池，未啟動時為 None
+    """
+    global _worker_pool
+    if workers <= 0:
+        logging.info("Mail outbox workers disabled.")
+        return None
+    _worker_pool = MailOutboxWorkerPool(app, db, MailOutbox, workers)
+    _worker_pool.start()
+    event.listen(db.session, 'after_commit', _wake_after_commit)
+    atexit.register(_worker_pool.stop)
+    return _worker_pool
@@ -1,11 +1,113 @@
 import requests
 import json
 import logging
-from config import MAIL_API_URL
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from rate_limiter import mail_rate_limiter
+from job_runs import record_job_stats
+from config import (
+    MAIL_API_URL, MAIL_API_CONNECT_TIMEOUT_SECONDS, MAIL_API_READ_TIMEOUT_SECONDS, MAIL_API_POOL_SIZE,
+    MAIL_API_MAX_RETRIES, MAIL_API_RETRY_BACKOFF_FACTOR, MAIL_API_CIRCUIT_FAILURE_THRESHOLD, MAIL_API_CIRCUIT_RESET_SECONDS
+)
 
 # 配置日誌記錄
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+class CircuitBreaker:
+    """
+    郵件 API 斷路器。
+
+    連續失敗達 failure_threshold 次後進入 open 狀態，期間直接回傳失敗；
+    經過 reset_seconds 後放行一次試探請求 (half-open)，成功即恢復，失敗則重新計時。
+    """
+
+    def __init__(self, failure_threshold=MAIL_API_CIRCUIT_FAILURE_THRESHOLD, reset_seconds=MAIL_API_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            # half-open：只放行一個試探請求
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logging.error(f"Mail API circuit opened after {self._failures} consecutive failures.")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+circuit_breaker = CircuitBreaker()
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    """建立共用的 requests.Session：保持連線的連線池，並在連線失敗或 5xx 時重試"""
+    retry = Retry(
+        total=MAIL_API_MAX_RETRIES,
+        connect=MAIL_API_MAX_RETRIES,
+        read=False,  # 已送出的請求逾時不重試，避免重複寄信
+        status=MAIL_API_MAX_RETRIES,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['POST']),
+        backoff_factor=MAIL_API_RETRY_BACKOFF_FACTOR,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAIL_API_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.headers.update({'Content-Type': 'application/json'})
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    """取得 (必要時建立) 共用的郵件 API session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def reset_session():
+    """關閉並捨棄共用 session，下次發送時依目前設定重新建立"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
 def send_mail(subject, body, mail_to, mail_cc="", IsBodyHtml="H"):
     """
     發送郵件到指定的 API 服務。
@@ -21,7 +123,6 @@ def send_mail(subject, body, mail_to, mail_cc="", IsBodyHtml="H"):
         tuple: (bool, str) 表示發送是否成功以及訊息。
     """
     api_url = MAIL_API_URL
-    headers = {'Content-Type': 'application/json'}
 
     # 確保主旨和內文不超過最大長度
     subject = subject[:40]
@@ -38,14 +139,30 @@ def send_mail(subject, body, mail_to, mail_cc="", IsBodyHtml="H"):
         "IsBodyHtml": "H"  # 可以把內容轉成HTML格式
     }
 
+    if not circuit_breaker.allow_request():
+        logging.warning(f"Mail API circuit is open, skipping email to {mail_to}.")
+        return False, "郵件服務暫時無法使用 (斷路中)"
+
+    # 依郵件 API 允許的速率發送，取代各呼叫端自行 sleep
+    mail_rate_limiter.acquire()
+
     try:
-        response = requests.post(api_url, headers=headers, data=json.dumps(payload))
+        response = get_session().post(
+            api_url, data=json.dumps(payload),
+            timeout=(MAIL_API_CONNECT_TIMEOUT_SECONDS, MAIL_API_READ_TIMEOUT_SECONDS)
+        )
+        # API 有回應 (非 5xx) 即視為服務正常，4xx 或業務錯誤不計入斷路
+        if response.status_code >= 500:
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
         response.raise_for_status()  # 如果響應狀態碼是 4xx 或 5xx，則拋出 HTTPError
 
         try:
             response_json = response.json()
             if response_json.get("isSuccess") == True:
                 logging.info(f"Email sent successfully to {mail_to}. Response: {response_json}")
+                record_job_stats(mails_queued=1) # 排程工作直接寄送的郵件計入執行紀錄
                 return True, "郵件發送成功"
             else:
                 error_message = response_json.get("Message", "未知錯誤")
@@ -59,15 +176,19 @@ def send_mail(subject, body, mail_to, mail_cc="", IsBodyHtml="H"):
         logging.error(f"HTTP error occurred: {http_err} - Response: {http_err.response.text if http_err.response else 'N/A'}. Full request payload: {json.dumps(payload)}")
         return False, f"HTTP 錯誤: {http_err}"
     except requests.exceptions.ConnectionError as conn_err:
+        circuit_breaker.record_failure()
         logging.error(f"Connection error occurred: {conn_err}. Full request payload: {json.dumps(payload)}")
         return False, f"連線錯誤: 無法連接到郵件服務 API"
     except requests.exceptions.Timeout as timeout_err:
+        circuit_breaker.record_failure()
         logging.error(f"Timeout error occurred: {timeout_err}. Full request payload: {json.dumps(payload)}")
         return False, f"逾時錯誤: 郵件服務 API 無響應"
     except requests.exceptions.RequestException as req_err:
+        circuit_breaker.record_failure()
         logging.error(f"An error occurred during the request: {req_err}. Full request payload: {json.dumps(payload)}")
         return False, f"請求錯誤: {req_err}"
     except Exception as e:
+        circuit_breaker.record_failure()
         logging.error(f"An unexpected error occurred: {e}. Full request payload: {json.dumps(payload)}")
         return False, f"發生未知錯誤: {e}"
 
@@ -9,7 +9,12 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from flask import current_app
 
+# 直接以 alembic 執行遷移時也不啟動排程器與郵件 worker (flask db 由 app 自行判斷)
+os.environ.setdefault('SCHEDULER_MODE', 'web')
+os.environ.setdefault('MAIL_OUTBOX_WORKERS', '0')
+
 from app import app, db # Import app and db from your main Flask app file
+from config import SCHEDULER_JOBSTORE_TABLE
 
 from alembic import context
 
@@ -99,9 +104,15 @@ with app.app_context():
                     directives[:] = []
                     logger.info('No changes in schema detected.')
 
+        # APScheduler 自行管理的排程資料表不屬於 models，autogenerate 時略過以免產生 drop_table
+        def include_object(object, name, type_, reflected, compare_to):
+            return not (type_ == 'table' and name == SCHEDULER_JOBSTORE_TABLE)
+
         conf_args = current_app.extensions['migrate'].configure_args
         if conf_args.get("process_revision_directives") is None:
             conf_args["process_revision_directives"] = process_revision_directives
+        if conf_args.get("include_object") is None:
+            conf_args["include_object"] = include_object
 
         connectable = get_engine()
 
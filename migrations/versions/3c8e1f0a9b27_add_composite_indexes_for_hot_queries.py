@@ -0,0 +1,71 @@
+"""Add composite indexes for hot report and scheduler queries
+
+Revision ID: 3c8e1f0a9b27
+Revises: 7315ea1f17d6
+Create Date: 2026-10-18 09:02:14.512337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e1f0a9b27'
+down_revision = '7315ea1f17d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_unit_department', ['unit', 'department'], unique=False)
+        batch_op.create_index('ix_user_level', ['level'], unique=False)
+
+    with op.batch_alter_table('meeting', schema=None) as batch_op:
+        batch_op.create_index('ix_meeting_meeting_date', ['meeting_date'], unique=False)
+        batch_op.create_index('ix_meeting_subject_meeting_date', ['subject', 'meeting_date'], unique=False)
+
+    with op.batch_alter_table('todo', schema=None) as batch_op:
+        batch_op.create_index('ix_todo_user_type_status_due', ['user_id', 'todo_type', 'status', 'due_date'], unique=False)
+        batch_op.create_index('ix_todo_due_date_status', ['due_date', 'status'], unique=False)
+        batch_op.create_index('ix_todo_type_due_date', ['todo_type', 'due_date'], unique=False)
+        batch_op.create_index('ix_todo_status_type', ['status', 'todo_type'], unique=False)
+        batch_op.create_index('ix_todo_meeting_task_id', ['meeting_task_id'], unique=False)
+
+    with op.batch_alter_table('archived_todo', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_todo_archived_user_status', ['archived_at', 'user_id', 'status'], unique=False)
+        batch_op.create_index('ix_archived_todo_user_archived', ['user_id', 'archived_at'], unique=False)
+
+    with op.batch_alter_table('meeting_task', schema=None) as batch_op:
+        batch_op.create_index('ix_meeting_task_assignee_type_status', ['assigned_to_user_id', 'task_type', 'status'], unique=False)
+        batch_op.create_index('ix_meeting_task_type_status', ['task_type', 'status'], unique=False)
+        batch_op.create_index('ix_meeting_task_meeting_id', ['meeting_id'], unique=False)
+
+    # 讓 SQLite 查詢規劃器取得新索引的統計資訊
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    with op.batch_alter_table('meeting_task', schema=None) as batch_op:
+        batch_op.drop_index('ix_meeting_task_meeting_id')
+        batch_op.drop_index('ix_meeting_task_type_status')
+        batch_op.drop_index('ix_meeting_task_assignee_type_status')
+
+    with op.batch_alter_table('archived_todo', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_todo_user_archived')
+        batch_op.drop_index('ix_archived_todo_archived_user_status')
+
+    with op.batch_alter_table('todo', schema=None) as batch_op:
+        batch_op.drop_index('ix_todo_meeting_task_id')
+        batch_op.drop_index('ix_todo_status_type')
+        batch_op.drop_index('ix_todo_type_due_date')
+        batch_op.drop_index('ix_todo_due_date_status')
+        batch_op.drop_index('ix_todo_user_type_status_due')
+
+    with op.batch_alter_table('meeting', schema=None) as batch_op:
+        batch_op.drop_index('ix_meeting_subject_meeting_date')
+        batch_op.drop_index('ix_meeting_meeting_date')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_level')
+        batch_op.drop_index('ix_user_unit_department')
@@ -0,0 +1,85 @@
+"""Add next_fire_at to scheduled_notification and backfill it
+
+Revision ID: a7c4e2b9d013
+Revises: f3b7d9a1c2e4
+Create Date: 2026-10-18 15:10:06.277419
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+from pytz import timezone, utc
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e2b9d013'
+down_revision = 'f3b7d9a1c2e4'
+branch_labels = None
+depends_on = None
+
+GRACE_MINUTES = 5
+
+scheduled_notification_table = sa.table(
+    'scheduled_notification',
+    sa.column('id', sa.Integer),
+    sa.column('schedule_type', sa.String),
+    sa.column('specific_date', sa.Date),
+    sa.column('specific_time', sa.Time),
+    sa.column('weekly_day', sa.Integer),
+    sa.column('is_active', sa.Boolean),
+    sa.column('last_sent_at', sa.DateTime),
+    sa.column('next_fire_at', sa.DateTime),
+)
+
+
+def _next_fire_at(row, now):
+    # 與 ScheduledNotification.compute_next_fire_at 相同的規則 (遷移不匯入 app)
+    if row.specific_time is None:
+        return None
+    taiwan_tz = timezone('Asia/Taipei')
+    now = now.astimezone(taiwan_tz)
+    if row.schedule_type == 'one_time':
+        if row.specific_date is None:
+            return None
+        fire_at = taiwan_tz.localize(datetime.combine(row.specific_date, row.specific_time))
+        if row.last_sent_at and utc.localize(row.last_sent_at) >= fire_at:
+            return None
+        if fire_at < now - timedelta(minutes=GRACE_MINUTES):
+            return None
+    elif row.schedule_type == 'weekly':
+        if row.weekly_day is None:
+            return None
+        days_ahead = (row.weekly_day - now.weekday()) % 7
+        fire_at = taiwan_tz.localize(datetime.combine(now.date() + timedelta(days=days_ahead), row.specific_time))
+        if fire_at <= now:
+            fire_at = taiwan_tz.localize(datetime.combine(fire_at.date() + timedelta(days=7), row.specific_time))
+    else:
+        return None
+    return fire_at.astimezone(utc).replace(tzinfo=None)
+
+
+def upgrade():
+    with op.batch_alter_table('scheduled_notification', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_fire_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_scheduled_notification_active_next_fire', ['is_active', 'next_fire_at'], unique=False)
+
+    conn = op.get_bind()
+    now = datetime.now(utc)
+    rows = conn.execute(
+        sa.select(scheduled_notification_table).where(scheduled_notification_table.c.is_active == sa.true())
+    ).fetchall()
+    for row in rows:
+        next_fire_at = _next_fire_at(row, now)
+        if next_fire_at is not None:
+            conn.execute(
+                scheduled_notification_table.update()
+                .where(scheduled_notification_table.c.id == row.id)
+                .values(next_fire_at=next_fire_at)
+            )
+
+
+def downgrade():
+    with op.batch_alter_table('scheduled_notification', schema=None) as batch_op:
+        batch_op.drop_index('ix_scheduled_notification_active_next_fire')
+        batch_op.drop_column('next_fire_at')
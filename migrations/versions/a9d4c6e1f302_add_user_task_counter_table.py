@@ -0,0 +1,36 @@
+"""Add user_task_counter table
+
+Revision ID: a9d4c6e1f302
+Revises: f7c3d8e2a5b1
+Create Date: 2026-10-18 20:12:37.408153
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4c6e1f302'
+down_revision = 'f7c3d8e2a5b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_task_counter',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('current_total', sa.Integer(), nullable=False),
+    sa.Column('current_completed', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', name=op.f('pk_user_task_counter'))
+    )
+    # 以現有的本週任務建立計數
+    op.execute(
+        "INSERT INTO user_task_counter (user_id, current_total, current_completed, updated_at) "
+        "SELECT user_id, COUNT(*), SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END), CURRENT_TIMESTAMP "
+        "FROM todo WHERE todo_type = 'current' GROUP BY user_id"
+    )
+
+
+def downgrade():
+    op.drop_table('user_task_counter')
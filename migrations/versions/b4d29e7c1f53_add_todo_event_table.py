@@ -0,0 +1,153 @@
+"""Add append-only todo_event table and backfill it from history_log JSON
+
+Revision ID: b4d29e7c1f53
+Revises: 3c8e1f0a9b27
+Create Date: 2026-10-18 10:41:37.208815
+
+"""
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from dateutil.parser import isoparse
+from pytz import utc
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4d29e7c1f53'
+down_revision = '3c8e1f0a9b27'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# (來源資料表, entity_type)
+HISTORY_SOURCES = [
+    ('todo', 'todo'),
+    ('archived_todo', 'archived_todo'),
+    ('meeting_task', 'meeting_task'),
+]
+
+todo_event_table = sa.table(
+    'todo_event',
+    sa.column('id', sa.Integer),
+    sa.column('entity_type', sa.String),
+    sa.column('entity_id', sa.Integer),
+    sa.column('event_type', sa.String),
+    sa.column('timestamp', sa.DateTime),
+    sa.column('actor', sa.Text),
+    sa.column('details', sa.Text),
+)
+
+
+def _source_table(name):
+    return sa.table(
+        name,
+        sa.column('id', sa.Integer),
+        sa.column('history_log', sa.Text),
+        sa.column('created_at', sa.DateTime),
+    )
+
+
+def _parse_timestamp(value, fallback):
+    try:
+        parsed = isoparse(value)
+    except (TypeError, ValueError):
+        return fallback
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(utc).replace(tzinfo=None)
+    return parsed
+
+
+def _events_from_history(entity_type, entity_id, history_log, created_at):
+    try:
+        entries = json.loads(history_log)
+    except ValueError:
+        return []
+    if not isinstance(entries, list):
+        return []
+
+    fallback = created_at or datetime.utcnow()
+    events = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('event_type'):
+            continue
+        actor = entry.get('actor')
+        details = entry.get('details')
+        events.append({
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'event_type': entry['event_type'],
+            'timestamp': _parse_timestamp(entry.get('timestamp'), fallback),
+            'actor': json.dumps(actor) if actor is not None else None,
+            'details': json.dumps(details) if details is not None else None,
+        })
+    return events
+
+
+def upgrade():
+    op.create_table('todo_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.String(length=50), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('actor', sa.Text(), nullable=True),
+    sa.Column('details', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_todo_event'))
+    )
+    with op.batch_alter_table('todo_event', schema=None) as batch_op:
+        batch_op.create_index('ix_todo_event_entity_timestamp', ['entity_type', 'entity_id', 'timestamp', 'id'], unique=False)
+
+    # 將既有的 history_log JSON 逐筆展開為事件列，原欄位保留以便降版
+    conn = op.get_bind()
+    for table_name, entity_type in HISTORY_SOURCES:
+        source = _source_table(table_name)
+        rows = conn.execute(
+            sa.select(source.c.id, source.c.history_log, source.c.created_at)
+            .where(source.c.history_log.isnot(None))
+            .order_by(source.c.id)
+        ).fetchall()
+
+        batch = []
+        for row in rows:
+            batch.extend(_events_from_history(entity_type, row.id, row.history_log, row.created_at))
+            if len(batch) >= BATCH_SIZE:
+                op.bulk_insert(todo_event_table, batch)
+                batch = []
+        if batch:
+            op.bulk_insert(todo_event_table, batch)
+
+
+def downgrade():
+    # 將事件寫回 history_log，避免降版後遺失升版期間新增的履歷
+    conn = op.get_bind()
+    for table_name, entity_type in HISTORY_SOURCES:
+        source = _source_table(table_name)
+        rows = conn.execute(
+            sa.select(
+                todo_event_table.c.entity_id, todo_event_table.c.event_type, todo_event_table.c.timestamp,
+                todo_event_table.c.actor, todo_event_table.c.details
+            )
+            .where(todo_event_table.c.entity_type == entity_type)
+            .order_by(todo_event_table.c.entity_id, todo_event_table.c.timestamp, todo_event_table.c.id)
+        ).fetchall()
+
+        histories = {}
+        for row in rows:
+            histories.setdefault(row.entity_id, []).append({
+                'event_type': row.event_type,
+                'timestamp': utc.localize(row.timestamp).isoformat(),
+                'actor': json.loads(row.actor) if row.actor else None,
+                'details': json.loads(row.details) if row.details else {},
+            })
+        for entity_id, history in histories.items():
+            conn.execute(
+                source.update().where(source.c.id == entity_id).values(history_log=json.dumps(history))
+            )
+
+    with op.batch_alter_table('todo_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_todo_event_entity_timestamp')
+
+    op.drop_table('todo_event')
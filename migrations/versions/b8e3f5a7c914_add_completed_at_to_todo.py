@@ -0,0 +1,43 @@
+"""Add completed_at to todo and archived_todo
+
+Revision ID: b8e3f5a7c914
+Revises: a9d4c6e1f302
+Create Date: 2026-10-18 22:41:05.127384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e3f5a7c914'
+down_revision = 'a9d4c6e1f302'
+branch_labels = None
+depends_on = None
+
+
+def _backfill(table, entity_type):
+    # 以最後一次改為已完成的履歷事件時間回填；沒有履歷的任務維持 NULL (不計入平均完成天數)
+    op.execute(
+        f"UPDATE {table} SET completed_at = ("
+        "SELECT MAX(e.timestamp) FROM todo_event e "
+        f"WHERE e.entity_type = '{entity_type}' AND e.entity_id = {table}.id "
+        "AND e.event_type = 'status_changed' AND json_extract(e.details, '$.new_status') = 'completed'"
+        f") WHERE status = 'completed'"
+    )
+
+
+def upgrade():
+    with op.batch_alter_table('todo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('completed_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('archived_todo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('completed_at', sa.DateTime(), nullable=True))
+    _backfill('todo', 'todo')
+    _backfill('archived_todo', 'archived_todo')
+
+
+def downgrade():
+    with op.batch_alter_table('archived_todo', schema=None) as batch_op:
+        batch_op.drop_column('completed_at')
+    with op.batch_alter_table('todo', schema=None) as batch_op:
+        batch_op.drop_column('completed_at')
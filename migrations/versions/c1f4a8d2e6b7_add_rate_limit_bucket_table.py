@@ -0,0 +1,29 @@
+"""Add rate_limit_bucket table
+
+Revision ID: c1f4a8d2e6b7
+Revises: b8e3f5a7c914
+Create Date: 2026-10-18 23:36:12.584029
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1f4a8d2e6b7'
+down_revision = 'b8e3f5a7c914'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rate_limit_bucket',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('name', name=op.f('pk_rate_limit_bucket'))
+    )
+
+
+def downgrade():
+    op.drop_table('rate_limit_bucket')
@@ -0,0 +1,71 @@
+"""Add next_fire_at to report_schedule and the cache_version table
+
+Revision ID: c5d8f1a2b3e6
+Revises: a7c4e2b9d013
+Create Date: 2026-10-18 16:42:31.508217
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+from pytz import timezone, utc
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8f1a2b3e6'
+down_revision = 'a7c4e2b9d013'
+branch_labels = None
+depends_on = None
+
+report_schedule_table = sa.table(
+    'report_schedule',
+    sa.column('id', sa.Integer),
+    sa.column('schedule_day', sa.Integer),
+    sa.column('schedule_time', sa.Time),
+    sa.column('is_active', sa.Boolean),
+    sa.column('last_sent_at', sa.DateTime),
+    sa.column('next_fire_at', sa.DateTime),
+)
+
+
+def _next_fire_at(row, now):
+    # 與 ReportSchedule.compute_next_fire_at 相同的規則 (遷移不匯入 app)
+    taiwan_tz = timezone('Asia/Taipei')
+    now = now.astimezone(taiwan_tz)
+    days_ahead = (row.schedule_day - now.weekday()) % 7
+    fire_at = taiwan_tz.localize(datetime.combine(now.date() + timedelta(days=days_ahead), row.schedule_time))
+    if fire_at <= now and row.last_sent_at is not None and utc.localize(row.last_sent_at) >= fire_at:
+        fire_at = taiwan_tz.localize(datetime.combine(fire_at.date() + timedelta(days=7), row.schedule_time))
+    return fire_at.astimezone(utc).replace(tzinfo=None)
+
+
+def upgrade():
+    op.create_table('cache_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name', name=op.f('pk_cache_version'))
+    )
+    with op.batch_alter_table('report_schedule', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_fire_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_report_schedule_active_next_fire', ['is_active', 'next_fire_at'], unique=False)
+
+    conn = op.get_bind()
+    now = datetime.now(utc)
+    rows = conn.execute(
+        sa.select(report_schedule_table).where(report_schedule_table.c.is_active == sa.true())
+    ).fetchall()
+    for row in rows:
+        conn.execute(
+            report_schedule_table.update()
+            .where(report_schedule_table.c.id == row.id)
+            .values(next_fire_at=_next_fire_at(row, now))
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('report_schedule', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_schedule_active_next_fire')
+        batch_op.drop_column('next_fire_at')
+
+    op.drop_table('cache_version')
@@ -0,0 +1,31 @@
+"""Add scheduler_lease table
+
+Revision ID: d2e6a9c4f871
+Revises: c5d8f1a2b3e6
+Create Date: 2026-10-18 17:25:44.120934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2e6a9c4f871'
+down_revision = 'c5d8f1a2b3e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('scheduler_lease',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('holder', sa.String(length=200), nullable=False),
+    sa.Column('acquired_at', sa.DateTime(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name', name=op.f('pk_scheduler_lease'))
+    )
+
+
+def downgrade():
+    op.drop_table('scheduler_lease')
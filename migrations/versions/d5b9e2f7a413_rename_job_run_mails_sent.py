@@ -0,0 +1,28 @@
+"""Rename job_run.mails_sent to mails_queued
+
+Revision ID: d5b9e2f7a413
+Revises: c1f4a8d2e6b7
+Create Date: 2026-10-18 23:58:41.207315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b9e2f7a413'
+down_revision = 'c1f4a8d2e6b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job_run', schema=None) as batch_op:
+        batch_op.alter_column('mails_sent', new_column_name='mails_queued',
+               existing_type=sa.Integer(), existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job_run', schema=None) as batch_op:
+        batch_op.alter_column('mails_queued', new_column_name='mails_sent',
+               existing_type=sa.Integer(), existing_nullable=False)
@@ -0,0 +1,30 @@
+"""Add job_checkpoint table
+
+Revision ID: e4a1b7c9d352
+Revises: d2e6a9c4f871
+Create Date: 2026-10-18 18:02:13.554106
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a1b7c9d352'
+down_revision = 'd2e6a9c4f871'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_checkpoint',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('run_key', sa.String(length=50), nullable=True),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name', name=op.f('pk_job_checkpoint'))
+    )
+
+
+def downgrade():
+    op.drop_table('job_checkpoint')
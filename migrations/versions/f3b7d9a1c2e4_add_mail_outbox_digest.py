@@ -0,0 +1,28 @@
+"""Add digest flag to mail_outbox for per-recipient notification coalescing
+
+Revision ID: f3b7d9a1c2e4
+Revises: e81a6c2d4f90
+Create Date: 2026-10-18 14:22:48.903116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7d9a1c2e4'
+down_revision = 'e81a6c2d4f90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mail_outbox', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_digest', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.create_index('ix_mail_outbox_digest_recipient', ['is_digest', 'mail_to', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mail_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_mail_outbox_digest_recipient')
+        batch_op.drop_column('is_digest')
@@ -0,0 +1,236 @@
+import copy
+from collections import namedtuple
+from datetime import datetime
+from itertools import chain
+
+from pytz import utc
+from sqlalchemy import event, inspect, select, delete, func, literal, case
+
+from config import LEVEL_ORDER, DEPARTMENT_STRUCTURE, UNIT_TO_MAIN_DEPT_MAP, UserLevel, TodoStatus, TodoType, CacheVersionName
+from version_cache import VersionedCache
+
+MAIN_DEPARTMENTS = ['第一廠', '第三廠', '採購物流部', '品保部']
+
+# 組織圖需要的使用者欄位；這些欄位變更時組織圖快取失效 (見 app.py 的 track_model_changes)
+ORG_MEMBER_FIELDS = ('user_key', 'name', 'avatar', 'role', 'department', 'unit', 'level')
+
+OrgMember = namedtuple('OrgMember', ('id',) + ORG_MEMBER_FIELDS)
+TaskCounts = namedtuple('TaskCounts', ['total_tasks', 'completed_tasks', 'overdue_tasks'])
+# 首頁卡片 = 快取的成員資料 + 本次請求讀取的任務數
+OrgCard = namedtuple('OrgCard', OrgMember._fields + TaskCounts._fields)
+
+NO_TASKS = TaskCounts(0, 0, 0)
+
+_org_tree_cache = VersionedCache(CacheVersionName.ORG_TREE.value)
+
+
+def _main_department(member):
+    # 根據用戶的部門和單位，判斷其所屬的主要部門
+    if member.department == '製造中心':
+        if member.unit in MAIN_DEPARTMENTS:
+            return member.unit  # 廠長/經理級別，直接歸屬到四大部門
+        return UNIT_TO_MAIN_DEPT_MAP.get(member.unit)  # 課級或以下，歸屬到對應的廠
+    if member.department in MAIN_DEPARTMENTS:
+        return member.department  # 如果部門本身就是四大部門之一，直接使用部門名稱
+    return None
+
+
+def build_organization_structure(members, director):
+    """
+    依部門、單位與職級排列組織圖 (不含任務數)。
+
+    Args:
+        members (list): 非管理員的 OrgMember
+        director (OrgMember): 最高層級主管 (製造中心-協理)，可為 None
+
+    Returns:
+        dict: 與 DEPARTMENT_STRUCTURE 相同結構，成員為 OrgMember
+    """
+    # 定義新的組織結構，以四大部門為基礎 (使用深複製)
+    department_structure = copy.deepcopy(DEPARTMENT_STRUCTURE)
+
+    # 將 director 加入組織結構
+    if director:
+        main_dept_name = _main_department(director)
+        if main_dept_name and main_dept_name in department_structure:
+            department_structure[main_dept_name]['management_team'].append(director)
+
+    for member in members:
+        # 如果當前用戶是協理，則跳過，因為協理已在前面處理過
+        if director and member.user_key == director.user_key:
+            continue
+
+        main_dept_name = _main_department(member)
+        if not main_dept_name or main_dept_name not in department_structure:
+            continue
+
+        # 將用戶放入對應的結構中
+        dept_data = department_structure[main_dept_name]
+
+        # 1. 分配部門主管 (廠長/經理/副理)
+        if member.level in [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
+            # 避免重複添加 director
+            if member.user_key != director.user_key if director else False:
+                dept_data['management_team'].append(member)
+
+        # 2. 分配單位(課)內成員
+        elif member.unit:
+            unit_data = dept_data['units'].setdefault(member.unit, {'management_team': [], 'leaders': [], 'staff': []})
+            if member.level in [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]:
+                unit_data['management_team'].append(member)
+            elif member.level == UserLevel.TEAM_LEADER.value:
+                unit_data['leaders'].append(member)
+            elif member.level == UserLevel.STAFF.value:
+                unit_data['staff'].append(member)
+
+        # 3. 分配部門內無明確單位的成員 (主要針對品保部/採購部)
+        else:
+            unit_data = dept_data['units'].setdefault('部門直屬', {'management_team': [], 'leaders': [], 'staff': []})
+            # 將非主管級別的用戶放入
+            if member.level not in [UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]:
+                unit_data['staff'].append(member)
+
+    # 對每個部門和單位內的成員進行排序
+    for dept_data in department_structure.values():
+        dept_data['management_team'].sort(key=lambda x: LEVEL_ORDER.get(x.level, 99))
+        for unit_data in dept_data['units'].values():
+            for group in unit_data.values():
+                group.sort(key=lambda x: LEVEL_ORDER.get(x.level, 99))
+
+    return department_structure
+
+
+def get_org_tree(db, User, CacheVersion):
+    """
+    讀取組織圖快取，使用者的組織圖欄位有異動時才重新查詢與排列。
+
+    Returns:
+        tuple: (director, departments)，成員為 OrgMember
+    """
+    def load():
+        rows = db.session.execute(
+            select(User.id, *(getattr(User, field) for field in ORG_MEMBER_FIELDS))
+            .where(User.level != UserLevel.ADMIN.value)
+            .order_by(User.id)
+        ).all()
+        members = [OrgMember(*row) for row in rows]
+        director = next((m for m in members if m.level == UserLevel.EXECUTIVE_MANAGER.value), None)
+        return director, build_organization_structure(members, director)
+
+    return _org_tree_cache.get(db, CacheVersion, load)
+
+
+def refresh_task_counters(connection, Todo, UserTaskCounter, user_ids):
+    """
+    以資料庫中的 Todo 重新計算指定使用者的本週任務數 (在目前的交易中)。
+
+    Args:
+        connection: Session.connection() 或 Connection
+        user_ids (iterable): 要更新的使用者 ID
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    todo_table = Todo.__table__
+    counter_table = UserTaskCounter.__table__
+    connection.execute(delete(counter_table).where(counter_table.c.user_id.in_(user_ids)))
+    connection.execute(counter_table.insert().from_select(
+        ['user_id', 'current_total', 'current_completed', 'updated_at'],
+        select(
+            todo_table.c.user_id,
+            func.count(),
+            func.sum(case((todo_table.c.status == TodoStatus.COMPLETED.value, 1), else_=0)),
+            literal(datetime.now(utc).replace(tzinfo=None))
+        )
+        .where(todo_table.c.user_id.in_(user_ids), todo_table.c.todo_type == TodoType.CURRENT.value)
+        .group_by(todo_table.c.user_id)
+    ))
+
+
+def track_task_counters(db, Todo, UserTaskCounter):
+    """
+    Todo 新增、刪除或負責人、類型、狀態變更時，在同一個交易中更新相關使用者的任務數。
+
+    flush 前記下受影響的使用者 (變更前後的負責人)，flush 後以 refresh_task_counters
+    重新計算這些使用者。以 Core 語句大量異動 Todo 時 (例如歸檔) 需自行呼叫 refresh_task_counters。
+    """
+    tracked = ('user_id', 'todo_type', 'status')
+
+    def load_previous_owner(target, value, oldvalue, initiator):
+        pass
+
+    # 負責人變更時需要舊值才能更新原負責人的計數；active_history 讓已過期的欄位在指派前先載入舊值
+    event.listen(Todo.user_id, 'set', load_previous_owner, active_history=True)
+
+    def before_flush(session, flush_context, instances):
+        user_ids = set()
+        for obj in chain(session.dirty, session.deleted):
+            if not isinstance(obj, Todo):
+                continue
+            state = inspect(obj)
+            if obj in session.dirty and not any(state.attrs[attr].history.has_changes() for attr in tracked):
+                continue
+            user_ids.update(state.attrs.user_id.history.deleted)
+            user_ids.add(obj.user_id)
+        session.info['task_counter_user_ids'] = user_ids
+
+    def after_flush(session, flush_context):
+        user_ids = session.info.pop('task_counter_user_ids', set())
+        user_ids.update(obj.user_id for obj in session.new if isinstance(obj, Todo))
+        user_ids.discard(None)
+        refresh_task_counters(session.connection(), Todo, UserTaskCounter, user_ids)
+
+    event.listen(db.session, 'before_flush', before_flush)
+    event.listen(db.session, 'after_flush', after_flush)
+
+
+def get_task_counts(db, Todo, UserTaskCounter):
+    """
+    讀取每位使用者的本週任務數、已完成數與逾期數。
+
+    本週任務數直接讀取 UserTaskCounter；逾期數隨日期變動無法預先累計，
+    以 ix_todo_due_date_status 範圍查詢即時分組計算。
+
+    Returns:
+        dict: user_id -> TaskCounts
+    """
+    totals = {
+        row.user_id: (row.current_total, row.current_completed)
+        for row in db.session.execute(
+            select(UserTaskCounter.user_id, UserTaskCounter.current_total, UserTaskCounter.current_completed)
+        )
+    }
+    # 逾期任務不包含今天 (以 UTC 日期計算)
+    today_start_of_day_utc = datetime.now(utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    overdue = dict(db.session.execute(
+        select(Todo.user_id, func.count())
+        .where(Todo.due_date < today_start_of_day_utc, Todo.status != TodoStatus.COMPLETED.value)
+        .group_by(Todo.user_id)
+    ).all())
+
+    return {
+        user_id: TaskCounts(*totals.get(user_id, (0, 0)), overdue.get(user_id, 0))
+        for user_id in totals.keys() | overdue.keys()
+    }
+
+
+def with_task_counts(director, departments, counts):
+    """
+    將快取的組織圖與任務數組合成首頁使用的卡片 (不修改快取內容)。
+
+    Returns:
+        tuple: (director, departments)，成員為 OrgCard
+    """
+    def card(member):
+        return OrgCard(*member, *counts.get(member.id, NO_TASKS))
+
+    cards = {}
+    for dept_name, dept_data in departments.items():
+        cards[dept_name] = {
+            'management_team': [card(member) for member in dept_data['management_team']],
+            'units': {
+                unit_name: {group: [card(member) for member in members] for group, members in unit_data.items()}
+                for unit_name, unit_data in dept_data['units'].items()
+            }
+        }
+    return (card(director) if director else None), cards
@@ -0,0 +1,125 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(*values):
+    """
+    將排序鍵 (例如 時間, id) 編碼為不透明的游標字串。
+
+    Args:
+        *values: 可 JSON 序列化的值，datetime 需先轉為 isoformat 字串
+
+    Returns:
+        str: URL-safe base64 字串
+    """
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """
+    解析 encode_cursor 產生的游標。
+
+    Args:
+        cursor (str): 游標字串
+        size (int): 排序鍵的數量
+
+    Returns:
+        list: 排序鍵
+
+    Raises:
+        ValueError: 游標格式錯誤
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return values
+
+
+def parse_limit(value, default, maximum):
+    """
+    解析每頁筆數參數。
+
+    Returns:
+        int: 1 ~ maximum 之間的筆數，未提供時為 default
+
+    Raises:
+        ValueError: 不是正整數或超過上限
+    """
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    if limit < 1 or limit > maximum:
+        raise ValueError(f'limit must be between 1 and {maximum}')
+    return limit
+
+
+def encode_key(*values):
+    """與 encode_cursor 相同，datetime 會自動轉為 isoformat 字串"""
+    return encode_cursor(*(value.isoformat() if isinstance(value, datetime) else value for value in values))
+
+
+def decode_key(cursor, types):
+    """
+    解析 encode_key 產生的游標並轉回原本的型別。
+
+    Args:
+        cursor (str): 游標字串
+        types (tuple): 各排序鍵的型別，例如 (datetime, int)
+
+    Returns:
+        list: 排序鍵
+
+    Raises:
+        ValueError: 游標格式錯誤
+    """
+    values = decode_cursor(cursor, len(types))
+    try:
+        return [datetime.fromisoformat(value) if kind is datetime else kind(value) for kind, value in zip(types, values)]
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+
+
+def keyset_after(columns, values, descending=False):
+    """
+    排序在 values 之後的資料的 SQL 條件。
+
+    (c1, c2) > (v1, v2) 展開為 c1 > v1 OR (c1 = v1 AND c2 > v2)，
+    搭配相同欄位的 ORDER BY 可直接從索引位置往後讀取，成本與頁數深度無關。
+    排序鍵不可為 NULL，最後一個欄位需唯一 (通常為 id)。
+
+    Args:
+        columns (list): 排序欄位
+        values (list): 上一頁最後一筆的排序鍵
+        descending (bool): 是否為遞減排序
+    """
+    conditions = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        after = column < value if descending else column > value
+        conditions.append(and_(*(c == v for c, v in zip(columns[:i], values[:i])), after))
+    return or_(*conditions)
+
+
+def split_page(rows, limit, key):
+    """
+    從多取一筆 (limit + 1) 的查詢結果切出本頁與下一頁的游標。
+
+    Args:
+        rows (list): 查詢結果
+        limit (int): 每頁筆數
+        key (callable): 由一筆資料取得排序鍵 (tuple)
+
+    Returns:
+        tuple: (本頁資料, next_cursor；沒有下一頁時為 None)
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_key(*key(rows[-1]))
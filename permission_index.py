@@ -0,0 +1,160 @@
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from config import LEVEL_ORDER, UserLevel, CacheVersionName
+from version_cache import VersionedCache
+
+# 權限判斷、指派對象清單與報告範圍 (排行榜) 需要的使用者欄位；這些欄位變更時權限索引失效 (見 app.py 的 track_model_changes)
+PERMISSION_FIELDS = ('user_key', 'level', 'department', 'unit', 'name', 'role', 'is_active')
+UserRef = namedtuple('UserRef', ('id',) + PERMISSION_FIELDS)
+
+MANAGER_LEVELS = [UserLevel.PLANT_MANAGER.value, UserLevel.MANAGER.value, UserLevel.ASSISTANT_MANAGER.value]
+SECTION_LEVELS = [UserLevel.SECTION_CHIEF.value, UserLevel.DEPUTY_SECTION_CHIEF.value]
+
+_permission_index_cache = VersionedCache(CacheVersionName.USER_PERMISSIONS.value)
+
+
+def can_view(viewer, target):
+    """viewer 是否可以存取 target 的資料 (兩者為 User 或 UserRef)"""
+    # 自己的資料總是可以存取
+    if viewer.user_key == target.user_key:
+        return True
+
+    current_level_value = LEVEL_ORDER.get(viewer.level, 0)
+    target_level_value = LEVEL_ORDER.get(target.level, 0)
+
+    # 系統管理員 (Admin) 可以看所有人
+    if viewer.level == UserLevel.ADMIN.value:
+        return True
+
+    # 製造中心-協理 (Executive Manager) 可以看自己部門及下級
+    if viewer.level == UserLevel.EXECUTIVE_MANAGER.value:
+        return (target.department == viewer.department) or \
+               (target_level_value < current_level_value)
+
+    # 廠長、經理、副理 (Plant Manager, Manager, Assistant Manager) 只能看自己單位的人員
+    if viewer.level in MANAGER_LEVELS:
+        return target.department == viewer.unit
+
+    # 課長、副課長 (Section Chief, Deputy Section Chief) 只能看自己單位以下的人員
+    if viewer.level in SECTION_LEVELS:
+        return (target.department == viewer.department and target.unit == viewer.unit) and \
+               (target_level_value < current_level_value)
+
+    # 其他層級 (組長、作業員) 只能看自己的資料
+    return False
+
+
+def can_assign(viewer, target):
+    """viewer 是否可以指派任務給 target (兩者為 User 或 UserRef)"""
+    current_level_value = LEVEL_ORDER.get(viewer.level, 0)
+    target_level_value = LEVEL_ORDER.get(target.level, 0)
+
+    # 管理員、製造中心-協理可以指派給任何人 (除了管理員)
+    if viewer.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
+        return target.level != UserLevel.ADMIN.value
+
+    # 廠長、經理、副理：層級低於自己、不是管理員或協理，且部門為自己所管理的範圍 (viewer.unit)
+    if viewer.level in MANAGER_LEVELS:
+        if target_level_value >= current_level_value:
+            return False
+        if target.level in [UserLevel.ADMIN.value, UserLevel.EXECUTIVE_MANAGER.value]:
+            return False
+        return target.department == viewer.unit
+
+    # 課長、副課長可以指派給自己單位內的下級
+    if viewer.level in SECTION_LEVELS:
+        return (viewer.department == target.department and viewer.unit == target.unit) and \
+               target_level_value < current_level_value
+
+    # 組長可以指派給自己；作業員沒有指派權限
+    if viewer.level == UserLevel.TEAM_LEADER.value:
+        return viewer.id == target.id
+    return False
+
+
+class PermissionIndex:
+    """
+    使用者權限索引：viewer -> 可存取的使用者 ID、assigner -> 可指派的使用者 ID，
+    以及報告範圍使用的「單位」、「部門 + 單位」成員。
+
+    由同一版使用者快照建立，使用者異動時整個索引重建；每位使用者的可存取與可指派集合
+    在第一次用到時計算一次，之後的權限判斷都是集合查詢。
+    """
+
+    def __init__(self, users):
+        """
+        Args:
+            users (list): 依 ID 排序的 UserRef
+        """
+        self.users = {user.id: user for user in users}
+        self._ids_by_key = {user.user_key: user.id for user in users}
+        self._unit_user_ids = {}
+        self._unit_department_user_ids = {}
+        for user in users:
+            self._unit_user_ids.setdefault(user.unit, []).append(user.id)
+            self._unit_department_user_ids.setdefault((user.department, user.unit), []).append(user.id)
+        self._visible = {}
+        self._assignable = {}
+
+    def _ids_matching(self, memo, predicate, viewer):
+        # 以索引中的快照判斷；尚未寫入資料庫的使用者直接以傳入的物件計算 (不快取)
+        snapshot = self.users.get(viewer.id)
+        if snapshot is None:
+            return frozenset(user.id for user in self.users.values() if predicate(viewer, user))
+        ids = memo.get(viewer.id)
+        if ids is None:
+            ids = frozenset(user.id for user in self.users.values() if predicate(snapshot, user))
+            memo[viewer.id] = ids
+        return ids
+
+    def visible_ids(self, viewer):
+        return self._ids_matching(self._visible, can_view, viewer)
+
+    def assignable_ids(self, viewer):
+        return self._ids_matching(self._assignable, can_assign, viewer)
+
+    def can_view_key(self, viewer, target_user_key):
+        """target_user_key 不存在時為 False"""
+        if viewer.user_key == target_user_key:
+            return True
+        target_id = self._ids_by_key.get(target_user_key)
+        return target_id is not None and target_id in self.visible_ids(viewer)
+
+    def can_view_id(self, viewer, target_user_id):
+        return target_user_id in self.visible_ids(viewer)
+
+    def can_assign(self, viewer, target):
+        if target.id not in self.users:
+            return can_assign(viewer, target)
+        return target.id in self.assignable_ids(viewer)
+
+    def assignable_users(self, viewer):
+        """可指派的使用者 (UserRef，依 ID 排序)"""
+        ids = self.assignable_ids(viewer)
+        return [user for user_id, user in self.users.items() if user_id in ids]
+
+    def unit_user_ids(self, unit):
+        """單位為 unit 的使用者 ID (報告範圍：廠長、經理、副理)"""
+        return list(self._unit_user_ids.get(unit, []))
+
+    def unit_department_user_ids(self, department, unit):
+        """部門與單位相同的使用者 ID (報告範圍：課長、副課長)"""
+        return list(self._unit_department_user_ids.get((department, unit), []))
+
+
+def get_permission_index(db, User, CacheVersion):
+    """
+    讀取權限索引，使用者新增、刪除或權限欄位變更時才重新建立。
+
+    Returns:
+        PermissionIndex
+    """
+    def load():
+        rows = db.session.execute(
+            select(*(getattr(User, field) for field in UserRef._fields)).order_by(User.id)
+        ).all()
+        return PermissionIndex([UserRef(*row) for row in rows])
+
+    return _permission_index_cache.get(db, CacheVersion, load)
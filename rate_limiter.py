@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import func, select, update, insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from config import MAIL_API_RATE_PER_SECOND, MAIL_API_RATE_BURST, MAIL_API_RATE_BUCKET_NAME
+
+
+class TokenBucket:
+    """
+    執行緒安全的 token bucket 限速器。
+
+    每秒補充 rate 個 token，最多累積 burst 個；每次發送前取得一個 token，
+    不足時等待到下一個 token 補充為止。
+
+    Args:
+        rate (float): 每秒允許的次數
+        burst (int): 可連續立即通過的次數
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = float(rate)
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated_at = clock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self):
+        """有 token 時立即取得並回傳 True，否則回傳 False"""
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        取得一個 token，必要時等待。
+
+        Args:
+            timeout (float, optional): 最長等待秒數，None 表示一直等待
+
+        Returns:
+            bool: 是否取得 token (逾時為 False)
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            self._sleep(wait)
+
+
+class SharedTokenBucket:
+    """
+    跨程序共用的 token bucket：剩餘 token 與最後補充時間存於資料庫 (RateLimitBucket)。
+
+    每次取得 token 在獨立的連線與交易中以一個條件式 UPDATE 完成補充與扣除，
+    多個 Web 程序、排程程序與其寄件匣 worker 加總仍不超過設定的速率。
+    尚未呼叫 use_database，或資料庫忙碌、資料表不存在時，退回程序內的 TokenBucket。
+
+    Args:
+        name (str): 資料列名稱
+        rate (float): 每秒允許的次數 (所有程序合計)
+        burst (int): 可連續立即通過的次數
+    """
+
+    def __init__(self, name, rate, burst, clock=time.time, sleep=time.sleep):
+        self.name = name
+        self._local = TokenBucket(rate, burst, sleep=sleep)
+        self.rate = self._local.rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._engine = None
+        self._table = None
+
+    def use_database(self, engine, table):
+        """
+        Args:
+            engine: SQLAlchemy engine (取得 token 時另開連線，不影響呼叫端的交易)
+            table: RateLimitBucket.__table__
+        """
+        self._engine = engine
+        self._table = table
+
+    def _take(self):
+        """
+        在獨立的交易中嘗試取得一個 token。
+
+        Returns:
+            float: 0 表示已取得，否則為預計還需等待的秒數
+        """
+        table = self._table
+        now = self._clock()
+        refilled = func.min(self.burst, table.c.tokens + (now - table.c.updated_at) * self.rate)
+        with self._engine.begin() as connection:
+            result = connection.execute(
+                update(table)
+                .where(table.c.name == self.name, refilled >= 1)
+                .values(tokens=refilled - 1, updated_at=now)
+            )
+            if result.rowcount == 1:
+                return 0
+            tokens = connection.scalar(select(refilled).where(table.c.name == self.name))
+            if tokens is None:
+                try:
+                    connection.execute(insert(table).values(name=self.name, tokens=self.burst - 1, updated_at=now))
+                    return 0
+                except IntegrityError:
+                    # 其他程序搶先建立，下一輪再取
+                    return 0.01
+        return max((1 - tokens) / self.rate, 0.01)
+
+    def try_acquire(self):
+        """有 token 時立即取得並回傳 True，否則回傳 False"""
+        if self._engine is None:
+            return self._local.try_acquire()
+        try:
+            return self._take() == 0
+        except SQLAlchemyError as e:
+            logging.warning(f"Shared rate limiter unavailable, using the in-process limiter: {e}")
+            return self._local.try_acquire()
+
+    def acquire(self, timeout=None):
+        """
+        取得一個 token，必要時等待。
+
+        Args:
+            timeout (float, optional): 最長等待秒數，None 表示一直等待
+
+        Returns:
+            bool: 是否取得 token (逾時為 False)
+        """
+        if self._engine is None:
+            return self._local.acquire(timeout)
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            try:
+                wait = self._take()
+            except SQLAlchemyError as e:
+                logging.warning(f"Shared rate limiter unavailable, using the in-process limiter: {e}")
+                remaining = None if deadline is None else max(deadline - self._clock(), 0)
+                return self._local.acquire(remaining)
+            if wait == 0:
+                return True
+            if deadline is not None and self._clock() + wait > deadline:
+                return False
+            self._sleep(wait)
+
+
+# 所有呼叫郵件 API 的地方 (排程通知、週報、寄件匣 worker) 共用同一個限速器；
+# app.py 載入時以 use_database 改為所有程序共用 (存於 rate_limit_bucket 資料表)
+mail_rate_limiter = SharedTokenBucket(MAIL_API_RATE_BUCKET_NAME, MAIL_API_RATE_PER_SECOND, MAIL_API_RATE_BURST)
@@ -0,0 +1,19 @@
+﻿# 啟動獨立的排程 worker (Web 程序請以 SCHEDULER_MODE=web 啟動，例如 run_waitress.ps1 前先設定環境變數)
+Write-Host "⏰ 啟動排程 worker..." -ForegroundColor Green
+Write-Host ""
+
+if (Test-Path "venv\Scripts\Activate.ps1") {
+    Write-Host "🔄 啟動虛擬環境..." -ForegroundColor Blue
+    & ".\venv\Scripts\Activate.ps1"
+
+    Write-Host "排程狀態可由 http://localhost:5001/health/scheduler 查詢" -ForegroundColor Cyan
+    Write-Host "按 Ctrl+C 停止 worker" -ForegroundColor Yellow
+    Write-Host "=" * 50 -ForegroundColor Gray
+    Write-Host ""
+
+    & ".\venv\Scripts\python.exe" scheduler_worker.py
+
+} else {
+    Write-Host "❌ 虛擬環境不存在" -ForegroundColor Red
+    Write-Host "請先執行 setup_and_run.ps1 來設置環境並安裝套件" -ForegroundColor Yellow
+}
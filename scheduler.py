@@ -4,19 +4,81 @@ from pytz import timezone, utc
 import time
 import atexit
 import json
-from time import sleep
+from collections import namedtuple
+from itertools import chain, groupby
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_MISSED
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.util import undefined
+from sqlalchemy import select, func, update, delete, literal, bindparam
+from sqlalchemy.orm import contains_eager, joinedload
 from mail_service import send_mail
-from config import TodoStatus, TodoType, MeetingTaskStatus, MeetingTaskType
+from mail_outbox import enqueue_mail
+from version_cache import VersionedCache
+from org_tree import refresh_task_counters
+from scheduler_lease import start_scheduler_leader
+from job_runs import run_tracked_job, record_missed_run, record_job_stats
+from config import (
+    TodoStatus, TodoType, MeetingTaskStatus, MeetingTaskType, HistoryEntityType, CacheVersionName,
+    SCHEDULED_NOTIFICATION_GRACE_MINUTES, SCHEDULED_NOTIFICATION_MAX_SLEEP_SECONDS, REPORT_SCHEDULE_RETRY_MINUTES, REPORT_SCHEDULE_MAX_SLEEP_SECONDS,
+    ARCHIVE_CHUNK_SIZE, SchedulerJobStore, SCHEDULER_JOBSTORE, SCHEDULER_JOBSTORE_TABLE,
+    SCHEDULER_CATCH_UP_GRACE_SECONDS, SCHEDULER_DEFAULT_MISFIRE_GRACE_SECONDS
+)
 from report_service import generate_and_send_weekly_report # 導入新的服務函式
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 TAIPEI_TZ = timezone('Asia/Taipei')
 
-def check_due_today_tasks(app, db, User, Todo):
+REMINDER_YIELD_PER = 500 # 晨間提醒每次自資料庫取回的筆數
+
+def _iter_open_tasks_by_user(db, User, Todo, *criteria):
+    """
+    Streams uncompleted todos matching ``criteria`` for users with notifications enabled,
+    grouped by user.
+
+    Runs a single query joined to User and ordered by user, so rows can be grouped
+    on the fly without a per-user follow-up query.
+
+    Yields:
+        tuple: (user, iterator of that user's todos ordered by due date)
+    """
+    stmt = (
+        select(Todo, User)
+        .join(User, User.id == Todo.user_id)
+        .where(
+            Todo.status != TodoStatus.COMPLETED.value,
+            User.notification_enabled == True,
+            *criteria
+        )
+        .order_by(User.id, Todo.due_date, Todo.id)
+        .execution_options(yield_per=REMINDER_YIELD_PER)
+    )
+    rows = db.session.execute(stmt)
+    for _, user_rows in groupby(rows, key=lambda row: row.User.id):
+        first = next(user_rows)
+        yield first.User, chain([first.Todo], (row.Todo for row in user_rows))
+
+
+def _append_task_lines(body_parts, tasks, taiwan_tz):
+    """Appends the task lines to ``body_parts`` and returns the number of tasks added."""
+    count = 0
+    for task in tasks:
+        due_date_str = task.due_date.astimezone(taiwan_tz).strftime('%Y-%m-%d %H:%M')
+        body_parts.append(f"    標題: {task.title}")
+        body_parts.append(f"    描述: {task.description}")
+        body_parts.append(f"    預計完成日期: {due_date_str}")
+        body_parts.append("")
+        count += 1
+    return count
+
+
+def check_due_today_tasks(app, db, User, Todo, MailOutbox):
     """
-    Checks for tasks due today and sends notifications.
+    Checks for tasks due today and queues digest notifications.
     """
     with app.app_context():
         logging.info("Running check_due_today_tasks...")
@@ -28,44 +90,28 @@ def check_due_today_tasks(app, db, User, Todo):
         today_start_utc = today_start_taipei.astimezone(utc)
         today_end_utc = today_end_taipei.astimezone(utc)
 
-        # Find users with tasks due today that are not completed
-        users_to_notify = db.session.query(User).join(Todo, User.id == Todo.user_id).filter(
-            Todo.due_date >= today_start_utc,
-            Todo.due_date <= today_end_utc,
-            Todo.status != TodoStatus.COMPLETED.value,
-            User.notification_enabled == True
-        ).distinct().all()
-
-        for user in users_to_notify:
-            user_due_today_tasks = Todo.query.filter(
-                Todo.user_id == user.id,
-                Todo.due_date >= today_start_utc,
-                Todo.due_date <= today_end_utc,
-                Todo.status != TodoStatus.COMPLETED.value
-            ).order_by(Todo.due_date).all()
-
-            if user_due_today_tasks:
-                subject = f"【今日任務提醒】您有 {len(user_due_today_tasks)} 項任務今日到期！"
-                body_parts = [f"您好 {user.name}，", "", "以下是您今日到期的任務：", ""]
-                for task in user_due_today_tasks:
-                    due_date_str = task.due_date.astimezone(taiwan_tz).strftime('%Y-%m-%d %H:%M')
-                    body_parts.append(f"    標題: {task.title}")
-                    body_parts.append(f"    描述: {task.description}")
-                    body_parts.append(f"    預計完成日期: {due_date_str}")
-                    body_parts.append("")
-                body_parts.append("請登入系統查看並完成您的任務：")
-                body_parts.append("http://192.168.6.119:5001") # Assuming this is the correct URL
-                body = "<br>".join(body_parts)
+        # One ordered query for all users with uncompleted tasks due today
+        for user, tasks in _iter_open_tasks_by_user(
+            db, User, Todo, Todo.due_date >= today_start_utc, Todo.due_date <= today_end_utc
+        ):
+            body_parts = [f"您好 {user.name}，", "", "以下是您今日到期的任務：", ""]
+            task_count = _append_task_lines(body_parts, tasks, taiwan_tz)
+            record_job_stats(rows_scanned=task_count)
+            body_parts.append("請登入系統查看並完成您的任務：")
+            body_parts.append("http://192.168.6.119:5001") # Assuming this is the correct URL
+            subject = f"【今日任務提醒】您有 {task_count} 項任務今日到期！"
+            body = "<br>".join(body_parts)
 
-                try:
-                    send_mail(subject, body, user.email)
-                    logging.info(f"Sent 'due today' notification to {user.email} for {len(user_due_today_tasks)} tasks.")
-                except Exception as e:
-                    logging.error(f"Failed to send 'due today' notification to {user.email}: {e}")
+            try:
+                enqueue_mail(db, MailOutbox, subject, body, user.email, digest=True)
+                logging.info(f"Queued 'due today' notification to {user.email} for {task_count} tasks.")
+            except Exception as e:
+                logging.error(f"Failed to queue 'due today' notification to {user.email}: {e}")
+        db.session.commit()
 
-def check_overdue_tasks(app, db, User, Todo):
+def check_overdue_tasks(app, db, User, Todo, MailOutbox):
     """
-    Checks for overdue tasks and sends notifications.
+    Checks for overdue tasks and queues digest notifications.
     """
     with app.app_context():
         logging.info("Running check_overdue_tasks...")
@@ -73,50 +119,34 @@ def check_overdue_tasks(app, db, User, Todo):
         today_start_taipei = datetime.now(taiwan_tz).replace(hour=0, minute=0, second=0, microsecond=0)
         today_start_utc = today_start_taipei.astimezone(utc)
 
-        # Find users with overdue tasks that are not completed
-        users_to_notify = db.session.query(User).join(Todo, User.id == Todo.user_id).filter(
-            Todo.due_date < today_start_utc, # Tasks due before today
-            Todo.status != TodoStatus.COMPLETED.value,
-            User.notification_enabled == True
-        ).distinct().all()
-
-        for user in users_to_notify:
-            user_overdue_tasks = Todo.query.filter(
-                Todo.user_id == user.id,
-                Todo.due_date < today_start_utc,
-                Todo.status != TodoStatus.COMPLETED.value
-            ).order_by(Todo.due_date).all()
-
-            if user_overdue_tasks:
-                subject = f"【逾期任務提醒】您有 {len(user_overdue_tasks)} 項任務已逾期！"
-                body_parts = [f"您好 {user.name}，", "", "以下是您已逾期的任務：", ""]
-                for task in user_overdue_tasks:
-                    due_date_str = task.due_date.astimezone(taiwan_tz).strftime('%Y-%m-%d %H:%M')
-                    body_parts.append(f"    標題: {task.title}")
-                    body_parts.append(f"    描述: {task.description}")
-                    body_parts.append(f"    預計完成日期: {due_date_str}")
-                    body_parts.append("")
-                
-                # 新增：提醒使用者可以重設預計完成日期
-                body_parts.append("<b>💡 小提示：</b>")
-                body_parts.append("如任務無法在原定期限完成，您可以在系統中將任務狀態設為「未完成」，")
-                body_parts.append("填寫未完成原因後，同時重新設定新的預計完成日期。")
-                body_parts.append("")
-                
-                body_parts.append("請登入系統查看並盡快處理您的逾期任務：")
-                body_parts.append("http://192.168.6.119:5001") # Assuming this is the correct URL
-                body = "<br>".join(body_parts)
+        # One ordered query for all users with uncompleted tasks due before today
+        for user, tasks in _iter_open_tasks_by_user(db, User, Todo, Todo.due_date < today_start_utc):
+            body_parts = [f"您好 {user.name}，", "", "以下是您已逾期的任務：", ""]
+            task_count = _append_task_lines(body_parts, tasks, taiwan_tz)
+            record_job_stats(rows_scanned=task_count)
 
-                try:
-                    send_mail(subject, body, user.email)
-                    logging.info(f"Sent 'overdue' notification to {user.email} for {len(user_overdue_tasks)} tasks.")
-                except Exception as e:
-                    logging.error(f"Failed to send 'overdue' notification to {user.email}: {e}")
+            # 新增：提醒使用者可以重設預計完成日期
+            body_parts.append("<b>💡 小提示：</b>")
+            body_parts.append("如任務無法在原定期限完成，您可以在系統中將任務狀態設為「未完成」，")
+            body_parts.append("填寫未完成原因後，同時重新設定新的預計完成日期。")
+            body_parts.append("")
+
+            body_parts.append("請登入系統查看並盡快處理您的逾期任務：")
+            body_parts.append("http://192.168.6.119:5001") # Assuming this is the correct URL
+            subject = f"【逾期任務提醒】您有 {task_count} 項任務已逾期！"
+            body = "<br>".join(body_parts)
+
+            try:
+                enqueue_mail(db, MailOutbox, subject, body, user.email, digest=True)
+                logging.info(f"Queued 'overdue' notification to {user.email} for {task_count} tasks.")
+            except Exception as e:
+                logging.error(f"Failed to queue 'overdue' notification to {user.email}: {e}")
+        db.session.commit()
 
 
-def check_unassigned_meeting_tasks(app, db, User, MeetingTask, Meeting):
+def check_unassigned_meeting_tasks(app, db, User, MeetingTask, Meeting, MailOutbox):
     """
-    Checks for unassigned meeting tasks and sends notifications.
+    Checks for unassigned meeting tasks and queues digest notifications.
     """
     with app.app_context():
         logging.info("Running check_unassigned_meeting_tasks...")
@@ -124,18 +154,25 @@ def check_unassigned_meeting_tasks(app, db, User, MeetingTask, Meeting):
         now_taipei = datetime.now(taiwan_tz)
         now_utc = now_taipei.astimezone(utc)
 
-        # Find tracking meeting tasks that are still unassigned and whose meeting date has passed
-        unassigned_tasks = db.session.query(MeetingTask).join(Meeting).filter(
+        # Find tracking meeting tasks that are still unassigned and whose meeting date has passed.
+        # The meeting, its chairman and every user referenced by the task are loaded in the same query.
+        unassigned_tasks = db.session.query(MeetingTask).join(MeetingTask.meeting).options(
+            contains_eager(MeetingTask.meeting).joinedload(Meeting.chairman),
+            joinedload(MeetingTask.assigned_to_user),
+            joinedload(MeetingTask.assigned_by_user),
+            joinedload(MeetingTask.controller_user)
+        ).filter(
             MeetingTask.task_type == MeetingTaskType.TRACKING.value,
             MeetingTask.status == MeetingTaskStatus.UNASSIGNED.value,
             Meeting.meeting_date < now_utc # Meeting date has passed
-        ).all()
+        ).order_by(MeetingTask.id).all()
+        record_job_stats(rows_scanned=len(unassigned_tasks))
 
         for task in unassigned_tasks:
-            assigned_to_user = db.session.get(User, task.assigned_to_user_id)
-            controller_user = db.session.get(User, task.controller_user_id) if task.controller_user_id else None
-            chairman = db.session.get(User, task.meeting.chairman_user_id) # Still needed for email body context
-            assigned_by_user = db.session.get(User, task.assigned_by_user_id) # Still needed for email body context
+            assigned_to_user = task.assigned_to_user
+            controller_user = task.controller_user
+            chairman = task.meeting.chairman # Still needed for email body context
+            assigned_by_user = task.assigned_by_user # Still needed for email body context
 
             recipients = set()
             if assigned_to_user and assigned_to_user.notification_enabled:
@@ -158,18 +195,18 @@ def check_unassigned_meeting_tasks(app, db, User, MeetingTask, Meeting):
                 body = "<br>".join(body_parts)
 
                 try:
-                    recipients_str = ";".join(list(recipients))
-                    cc_recipients_str = ";".join(list(cc_recipients))
-                    send_mail(subject, body, recipients_str, mail_cc=cc_recipients_str)
-                    logging.info(f"Sent 'unassigned meeting task' notification for task {task.id} to {recipients_str}.")
-                    sleep(5) # Add a 5-second delay after sending each email
+                    recipients_str = ";".join(sorted(recipients))
+                    cc_recipients_str = ";".join(sorted(cc_recipients))
+                    enqueue_mail(db, MailOutbox, subject, body, recipients_str, mail_cc=cc_recipients_str, digest=True)
+                    logging.info(f"Queued 'unassigned meeting task' notification for task {task.id} to {recipients_str}.")
                 except Exception as e:
-                    logging.error(f"Failed to send 'unassigned meeting task' notification for task {task.id}: {e}")
+                    logging.error(f"Failed to queue 'unassigned meeting task' notification for task {task.id}: {e}")
+        db.session.commit()
 
 
-def check_unagreed_resolution_items(app, db, User, MeetingTask, Meeting):
+def check_unagreed_resolution_items(app, db, User, MeetingTask, Meeting, MailOutbox):
     """
-    Checks for unagreed resolution items and sends notifications.
+    Checks for unagreed resolution items and queues digest notifications.
     """
     with app.app_context():
         logging.info("Running check_unagreed_resolution_items...")
@@ -177,17 +214,22 @@ def check_unagreed_resolution_items(app, db, User, MeetingTask, Meeting):
         now_taipei = datetime.now(taiwan_tz)
         now_utc = now_taipei.astimezone(utc)
 
-        # Find resolution meeting tasks that are not yet agreed/finalized
-        unagreed_resolution_items = db.session.query(MeetingTask).join(Meeting).filter(
+        # Find resolution meeting tasks that are not yet agreed/finalized,
+        # loading the meeting, assignee and controller in the same query
+        unagreed_resolution_items = db.session.query(MeetingTask).join(MeetingTask.meeting).options(
+            contains_eager(MeetingTask.meeting),
+            joinedload(MeetingTask.assigned_to_user),
+            joinedload(MeetingTask.controller_user)
+        ).filter(
             MeetingTask.task_type == MeetingTaskType.RESOLUTION.value,
             MeetingTask.status != MeetingTaskStatus.AGREED_FINALIZED.value,
             MeetingTask.expected_completion_date < now_utc # Expected completion date has passed
-        ).all()
+        ).order_by(MeetingTask.id).all()
+        record_job_stats(rows_scanned=len(unagreed_resolution_items))
 
         for item in unagreed_resolution_items:
-            assigned_to_user = db.session.get(User, item.assigned_to_user_id)
-            chairman = db.session.get(User, item.meeting.chairman_user_id)
-            controller_user = db.session.get(User, item.controller_user_id) if item.controller_user_id else None
+            assigned_to_user = item.assigned_to_user
+            controller_user = item.controller_user
 
             recipients = set()
             if assigned_to_user and assigned_to_user.notification_enabled:
@@ -209,16 +251,18 @@ def check_unagreed_resolution_items(app, db, User, MeetingTask, Meeting):
                 body = "<br>".join(body_parts)
 
                 try:
-                    recipients_str = ";".join(list(recipients))
-                    cc_recipients_str = ";".join(list(cc_recipients))
-                    send_mail(subject, body, recipients_str, mail_cc=cc_recipients_str)
-                    logging.info(f"Sent 'unagreed resolution item' notification for item {item.id} to {recipients_str}.")
-                    sleep(5) # Add a 5-second delay after sending each email
+                    recipients_str = ";".join(sorted(recipients))
+                    cc_recipients_str = ";".join(sorted(cc_recipients))
+                    enqueue_mail(db, MailOutbox, subject, body, recipients_str, mail_cc=cc_recipients_str, digest=True)
+                    logging.info(f"Queued 'unagreed resolution item' notification for item {item.id} to {recipients_str}.")
                 except Exception as e:
-                    logging.error(f"Failed to send 'unagreed resolution item' notification for item {item.id}: {e}")
+                    logging.error(f"Failed to queue 'unagreed resolution item' notification for item {item.id}: {e}")
+        db.session.commit()
+
 
+ARCHIVE_JOB_NAME = 'transfer_and_archive_todos'
 
-def transfer_and_archive_todos(app, db, Todo, ArchivedTodo):
+def transfer_and_archive_todos(app, db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, chunk_size=ARCHIVE_CHUNK_SIZE):
     """每週任務轉移和歸檔的排程任務"""
     with app.app_context():
         logging.info(f"Running weekly todo transfer and archive job...")
@@ -246,186 +290,330 @@ def transfer_and_archive_todos(app, db, Todo, ArchivedTodo):
         for todo in todos_to_transfer:
             todo.todo_type = TodoType.CURRENT.value
             # 記錄自動轉移事件
-            history = json.loads(todo.history_log or '[]')
-            history.append({
-                'event_type': 'auto_transfer',
-                'timestamp': datetime.now(utc).isoformat(),
-                'actor': {'name': 'System', 'user_key': 'system'},
-                'details': {'from_type': 'next', 'to_type': 'current', 'due_date': todo.due_date.isoformat()}
-            })
-            todo.history_log = json.dumps(history)
+            TodoEvent.record(
+                HistoryEntityType.TODO, todo.id, 'auto_transfer',
+                actor={'name': 'System', 'user_key': 'system'},
+                details={'from_type': 'next', 'to_type': 'current', 'due_date': todo.due_date.isoformat()}
+            )
             db.session.add(todo)
         db.session.commit()
+        record_job_stats(rows_scanned=len(todos_to_transfer))
         logging.info(f"Transferred {len(todos_to_transfer)} future todos to current based on due_date.")
 
         # 2. 歸檔或刪除所有已完成的任務 (本週與未來)
-        completed_todos = Todo.query.filter(
-            Todo.status == TodoStatus.COMPLETED.value,
-            Todo.todo_type.in_([TodoType.CURRENT.value, TodoType.NEXT.value])
-        ).all()
-        archived_count = 0
-        deleted_count = 0
-
-        for todo in completed_todos:
-            # 如果是從會議任務來的，直接刪除，因為資訊已回填
-            if todo.meeting_task_id:
-                db.session.delete(todo)
-                deleted_count += 1
-            # 如果是一般任務，則歸檔
-            else:
-                history = json.loads(todo.history_log or '[]')
-                history.append({
-                    'event_type': 'archived',
-                    'timestamp': datetime.now(utc).isoformat(),
-                    'actor': {'name': 'System', 'user_key': 'system'},
-                    'details': {}
-                })
-                todo.history_log = json.dumps(history)
-
-                archived_todo = ArchivedTodo(
-                    original_todo_id=todo.id,
-                    title=todo.title,
-                    description=todo.description,
-                    status=todo.status,
-                    todo_type=todo.todo_type,
-                    user_id=todo.user_id,
-                    assigned_by_user_id=todo.assigned_by_user_id,
-                    history_log=todo.history_log,
-                    created_at=todo.created_at,
-                    updated_at=todo.updated_at,
-                    archived_at=datetime.now(utc),
-                    due_date=todo.due_date
-                )
-                db.session.add(archived_todo)
-                db.session.delete(todo)
-                archived_count += 1
-        
-        db.session.commit()
+        archived_count, deleted_count = archive_completed_todos(
+            db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, start_of_week_date.isoformat(), chunk_size
+        )
         logging.info(f"Archived {archived_count} general completed todos.")
         logging.info(f"Deleted {deleted_count} completed todos from meeting tasks.")
         logging.info(f"Weekly todo job finished.")
 
-def check_and_trigger_reports(app, db, User, Todo, ReportSchedule):
+
+def archive_completed_todos(db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, run_key, chunk_size=ARCHIVE_CHUNK_SIZE):
     """
-    Checks for scheduled weekly reports and triggers them if conditions are met.
-    This function runs at a set interval.
+    Archives completed todos in id order, chunk_size rows per transaction.
+
+    Each chunk is handled with set-based statements (INSERT ... SELECT into
+    archived_todo and todo_event, one bulk UPDATE moving the history, DELETE)
+    and commits together with the checkpoint, so the SQLite write lock is only
+    held for one chunk and a run interrupted for the same run_key resumes after
+    the last committed todo id. A run that finishes resets the position, so a
+    later run with the same run_key (manual re-run, catch-up) scans from the start. Todos that came from meeting tasks are deleted
+    along with their history, since it is already kept on the MeetingTask;
+    MeetingTask.todo_id is cleared first (as the ORM delete did through the
+    meeting_task_link backref), so a reused todo id is never linked to a stale task.
+    The per-user task counters of the affected users are refreshed in the same
+    transaction, since the bulk DELETE bypasses the ORM listener.
+
+    Returns:
+        tuple: (archived_count, deleted_count)
     """
-    with app.app_context():
-        logging.info("Running 'check_and_trigger_reports'...")
-        now_taipei = datetime.now(TAIPEI_TZ)
-        
-        active_schedules = ReportSchedule.query.filter_by(is_active=True).all()
+    todo_table = Todo.__table__
+    archived_table = ArchivedTodo.__table__
+    event_table = TodoEvent.__table__
+
+    checkpoint = db.session.get(JobCheckpoint, ARCHIVE_JOB_NAME)
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(name=ARCHIVE_JOB_NAME)
+        db.session.add(checkpoint)
+    if checkpoint.run_key != run_key:
+        checkpoint.run_key = run_key
+        checkpoint.position = 0
+    elif checkpoint.position:
+        logging.info(f"Resuming archive run {run_key} after todo id {checkpoint.position}.")
+    position = checkpoint.position
+    db.session.commit()
+
+    system_actor = json.dumps({'name': 'System', 'user_key': 'system'})
+    archived_count = 0
+    deleted_count = 0
+    while True:
+        started = time.monotonic()
+        rows = db.session.execute(
+            select(todo_table.c.id, todo_table.c.meeting_task_id, todo_table.c.user_id)
+            .where(
+                todo_table.c.status == TodoStatus.COMPLETED.value,
+                todo_table.c.todo_type.in_([TodoType.CURRENT.value, TodoType.NEXT.value]),
+                todo_table.c.id > position
+            )
+            .order_by(todo_table.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            # 完整跑完後清除進度：只有中斷的執行會接續，同一週再執行 (手動、補跑) 時從頭掃描
+            db.session.execute(
+                update(JobCheckpoint.__table__)
+                .where(JobCheckpoint.__table__.c.name == ARCHIVE_JOB_NAME)
+                .values(position=0, updated_at=datetime.now(utc).replace(tzinfo=None))
+            )
+            db.session.commit()
+            break
+
+        meeting_ids = [row.id for row in rows if row.meeting_task_id]
+        general_ids = [row.id for row in rows if not row.meeting_task_id]
+        now = datetime.now(utc).replace(tzinfo=None)
+
+        # 會議任務來的 Todo：資訊已回填，連同履歷直接刪除
+        if meeting_ids:
+            db.session.execute(
+                delete(event_table).where(
+                    event_table.c.entity_type == HistoryEntityType.TODO.value,
+                    event_table.c.entity_id.in_(meeting_ids)
+                )
+            )
+
+        # 一般任務：記錄歸檔事件、整批複製到 archived_todo，再將履歷轉移到新的歸檔任務
+        if general_ids:
+            db.session.execute(event_table.insert().from_select(
+                ['entity_type', 'entity_id', 'event_type', 'timestamp', 'actor', 'details'],
+                select(
+                    literal(HistoryEntityType.TODO.value), todo_table.c.id, literal('archived'),
+                    literal(now), literal(system_actor), literal('{}')
+                ).where(todo_table.c.id.in_(general_ids))
+            ))
+            last_archived_id = db.session.scalar(select(func.max(archived_table.c.id))) or 0
+            db.session.execute(archived_table.insert().from_select(
+                ['original_todo_id', 'title', 'description', 'status', 'todo_type', 'user_id',
+                 'assigned_by_user_id', 'created_at', 'updated_at', 'archived_at', 'due_date', 'completed_at'],
+                select(
+                    todo_table.c.id, todo_table.c.title, todo_table.c.description, todo_table.c.status,
+                    todo_table.c.todo_type, todo_table.c.user_id, todo_table.c.assigned_by_user_id,
+                    todo_table.c.created_at, todo_table.c.updated_at, literal(now), todo_table.c.due_date,
+                    todo_table.c.completed_at
+                ).where(todo_table.c.id.in_(general_ids)).order_by(todo_table.c.id)
+            ))
+            archived_ids = db.session.execute(
+                select(archived_table.c.id, archived_table.c.original_todo_id)
+                .where(archived_table.c.id > last_archived_id, archived_table.c.original_todo_id.in_(general_ids))
+            ).all()
+            db.session.execute(
+                update(event_table)
+                .where(
+                    event_table.c.entity_type == HistoryEntityType.TODO.value,
+                    event_table.c.entity_id == bindparam('todo_id')
+                )
+                .values(entity_type=HistoryEntityType.ARCHIVED_TODO.value, entity_id=bindparam('archived_id')),
+                [{'todo_id': row.original_todo_id, 'archived_id': row.id} for row in archived_ids]
+            )
+
+        chunk_ids = [row.id for row in rows]
+        meeting_task_table = MeetingTask.__table__
+        db.session.execute(
+            update(meeting_task_table).where(meeting_task_table.c.todo_id.in_(chunk_ids)).values(todo_id=None)
+        )
+        db.session.execute(delete(todo_table).where(todo_table.c.id.in_(chunk_ids)))
+        refresh_task_counters(db.session.connection(), Todo, UserTaskCounter, [row.user_id for row in rows])
+        position = chunk_ids[-1]
+        db.session.execute(
+            update(JobCheckpoint.__table__)
+            .where(JobCheckpoint.__table__.c.name == ARCHIVE_JOB_NAME)
+            .values(position=position, updated_at=now)
+        )
+        db.session.commit()
 
-        if not active_schedules:
-            # This log is not an error, just informational.
-            # logging.info("No active report schedules found.")
-            return
+        record_job_stats(rows_scanned=len(rows))
+        archived_count += len(general_ids)
+        deleted_count += len(meeting_ids)
+        logging.info(
+            f"Archive chunk up to todo id {position}: archived {len(general_ids)}, deleted {len(meeting_ids)} "
+            f"in {(time.monotonic() - started) * 1000:.0f} ms."
+        )
 
-        for schedule in active_schedules:
-            is_right_day = now_taipei.weekday() == schedule.schedule_day
-            is_right_time = now_taipei.time() >= schedule.schedule_time
+    return archived_count, deleted_count
 
-            if not (is_right_day and is_right_time):
-                continue
+REPORT_SCHEDULES_JOB_ID = 'check_and_trigger_reports'
+_unit_user_ids_cache = VersionedCache(CacheVersionName.USER_DIRECTORY.value)
 
-            if schedule.last_sent_at and (now_taipei - schedule.last_sent_at.astimezone(TAIPEI_TZ)) < timedelta(hours=23):
-                continue
-
-            logging.info(f"Schedule {schedule.id} for department '{schedule.department}' is due. Performing validation...")
+def get_unit_user_ids(db, User, CacheVersion):
+    """
+    Returns the cached {unit: [active user ids]} map.
 
-            users_in_dept = User.query.filter(User.unit == schedule.department, User.is_active == True).all()
-            if not users_in_dept:
-                logging.warning(f"No active users found in unit '{schedule.department}' for schedule {schedule.id}. Skipping.")
-                continue
-            
-            user_ids_in_dept = [user.id for user in users_in_dept]
-
-            start_of_this_week = now_taipei.date() - timedelta(days=now_taipei.weekday())
-            overdue_tasks_exist = db.session.query(Todo).filter(
-                Todo.user_id.in_(user_ids_in_dept),
-                db.func.date(Todo.due_date) < start_of_this_week,
-                Todo.status != TodoStatus.COMPLETED.value
-            ).first()
-
-            if overdue_tasks_exist:
-                logging.warning(f"Validation failed for schedule {schedule.id}: Found overdue tasks from before this week for department '{schedule.department}'.")
-                continue
+    The map is reloaded only when the user-directory cache version changes
+    (bumped whenever a user's unit or active flag changes), so a hit costs one
+    primary-key lookup.
+    """
+    def load():
+        unit_user_ids = {}
+        for unit, user_id in db.session.execute(
+            select(User.unit, User.id).where(User.is_active == True).order_by(User.id)
+        ):
+            unit_user_ids.setdefault(unit, []).append(user_id)
+        return unit_user_ids
+    return _unit_user_ids_cache.get(db, CacheVersion, load)
+
+
+def _users_with_tasks(db, Todo, user_ids, *criteria):
+    """Returns the set of user ids (among ``user_ids``) having at least one Todo matching ``criteria``."""
+    if not user_ids:
+        return set()
+    return set(db.session.scalars(
+        select(Todo.user_id).where(Todo.user_id.in_(user_ids), *criteria).group_by(Todo.user_id)
+    ))
+
+
+def _retry_report_later(schedule, now):
+    """Re-checks a schedule that failed validation later today, or moves it to next week's slot."""
+    retry_at = now + timedelta(minutes=REPORT_SCHEDULE_RETRY_MINUTES)
+    if retry_at.astimezone(TAIPEI_TZ).date() == now.astimezone(TAIPEI_TZ).date():
+        schedule.next_fire_at = retry_at.replace(tzinfo=None)
+    else:
+        tomorrow = TAIPEI_TZ.localize(datetime.combine(now.astimezone(TAIPEI_TZ).date() + timedelta(days=1), datetime.min.time()))
+        schedule.refresh_next_fire_at(tomorrow)
+
+
+def check_and_trigger_reports(app, db, User, Todo, ReportSchedule, CacheVersion):
+    """
+    Triggers the weekly reports whose next_fire_at has passed.
 
-            start_of_next_week = start_of_this_week + timedelta(days=7)
-            end_of_next_week = start_of_next_week + timedelta(days=6)
-            # Only apply 'require_next_week_tasks' validation if the schedule explicitly requires it
-            if schedule.require_next_week_tasks:
-                next_week_task_exists = db.session.query(Todo).filter(
-                    Todo.user_id.in_(user_ids_in_dept),
-                    db.func.date(Todo.due_date) >= start_of_next_week,
-                    db.func.date(Todo.due_date) <= end_of_next_week
-                ).first()
-
-                if not next_week_task_exists:
-                    logging.warning(f"Validation failed for schedule {schedule.id}: No tasks planned for next week for department '{schedule.department}'.")
-                    continue
-            
-            logging.info(f"Validation passed for schedule {schedule.id}. Triggering report generation.")
-            try:
-                # 呼叫新的服務函式
-                generate_and_send_weekly_report(app, db, User, Todo, ReportSchedule, schedule.id)
-            except Exception as e:
-                logging.error(f"An error occurred while generating report for schedule {schedule.id}: {e}")
+    A single indexed query returns the schedules due now or within the next
+    REPORT_SCHEDULE_MAX_SLEEP_SECONDS, so an idle run costs one lookup. Due
+    schedules are validated together with grouped queries over the cached
+    unit -> user map, and the job is re-armed for the earliest upcoming schedule.
+    """
+    with app.app_context():
+        now = datetime.now(utc)
+        horizon = now + timedelta(seconds=REPORT_SCHEDULE_MAX_SLEEP_SECONDS)
+        schedules = ReportSchedule.query.filter(
+            ReportSchedule.is_active == True,
+            ReportSchedule.next_fire_at <= horizon
+        ).order_by(ReportSchedule.next_fire_at).all()
+        record_job_stats(rows_scanned=len(schedules))
+
+        due_schedules = [schedule for schedule in schedules if utc.localize(schedule.next_fire_at) <= now]
+        if due_schedules:
+            logging.info(f"Running 'check_and_trigger_reports': {len(due_schedules)} schedule(s) due. Performing validation...")
+            _trigger_due_reports(app, db, User, Todo, ReportSchedule, CacheVersion, due_schedules, now)
+
+        # Read before commit (commit expires the rows)
+        upcoming = [utc.localize(schedule.next_fire_at) for schedule in schedules if schedule.next_fire_at is not None]
+        if due_schedules:
+            db.session.commit()
+        if upcoming:
+            wake_report_schedules(max(min(upcoming), now + timedelta(seconds=1)))
+
+
+def _trigger_due_reports(app, db, User, Todo, ReportSchedule, CacheVersion, due_schedules, now):
+    unit_user_ids = get_unit_user_ids(db, User, CacheVersion)
+    now_taipei = now.astimezone(TAIPEI_TZ)
+    start_of_this_week = now_taipei.date() - timedelta(days=now_taipei.weekday())
+    start_of_next_week = start_of_this_week + timedelta(days=7)
+    end_of_next_week = start_of_next_week + timedelta(days=6)
+
+    # Validation for every due schedule in (at most) two grouped queries
+    all_user_ids = {user_id for schedule in due_schedules for user_id in unit_user_ids.get(schedule.department, [])}
+    users_with_overdue = _users_with_tasks(
+        db, Todo, all_user_ids,
+        db.func.date(Todo.due_date) < start_of_this_week,
+        Todo.status != TodoStatus.COMPLETED.value
+    )
+    next_week_user_ids = {
+        user_id for schedule in due_schedules if schedule.require_next_week_tasks
+        for user_id in unit_user_ids.get(schedule.department, [])
+    }
+    users_with_next_week = _users_with_tasks(
+        db, Todo, next_week_user_ids,
+        db.func.date(Todo.due_date) >= start_of_next_week,
+        db.func.date(Todo.due_date) <= end_of_next_week
+    )
+
+    for schedule in due_schedules:
+        user_ids_in_dept = unit_user_ids.get(schedule.department, [])
+        if not user_ids_in_dept:
+            logging.warning(f"No active users found in unit '{schedule.department}' for schedule {schedule.id}. Skipping.")
+            _retry_report_later(schedule, now)
+            continue
+
+        if users_with_overdue.intersection(user_ids_in_dept):
+            logging.warning(f"Validation failed for schedule {schedule.id}: Found overdue tasks from before this week for department '{schedule.department}'.")
+            _retry_report_later(schedule, now)
+            continue
+
+        # Only apply 'require_next_week_tasks' validation if the schedule explicitly requires it
+        if schedule.require_next_week_tasks and not users_with_next_week.intersection(user_ids_in_dept):
+            logging.warning(f"Validation failed for schedule {schedule.id}: No tasks planned for next week for department '{schedule.department}'.")
+            _retry_report_later(schedule, now)
+            continue
+
+        logging.info(f"Validation passed for schedule {schedule.id}. Triggering report generation.")
+        try:
+            # 呼叫新的服務函式 (在自己的 app context 中更新 last_sent_at)
+            generate_and_send_weekly_report(app, db, User, Todo, ReportSchedule, schedule.id)
+            schedule.last_sent_at = now.replace(tzinfo=None)
+            schedule.refresh_next_fire_at(now)
+        except Exception as e:
+            logging.error(f"An error occurred while generating report for schedule {schedule.id}: {e}")
+            _retry_report_later(schedule, now)
+
+SCHEDULED_NOTIFICATIONS_JOB_ID = 'check_scheduled_notifications'
+_scheduler = None
 
 def check_scheduled_notifications(app, db, User, ScheduledNotification):
     """
-    Checks for user-defined scheduled notifications and sends them.
+    Sends user-defined scheduled notifications whose next_fire_at has passed.
+
+    Only rows selected by the indexed ``is_active AND next_fire_at <= now`` query are
+    touched; recipients of all due notifications are loaded with a single IN query.
+    After sending, next_fire_at is recomputed and the job is re-armed for the
+    earliest upcoming fire time.
     """
     with app.app_context():
-        logging.info("Running check_scheduled_notifications...")
-        now_taipei = datetime.now(TAIPEI_TZ)
-        
-        active_notifications = ScheduledNotification.query.filter_by(is_active=True).all()
-
-        for notification in active_notifications:
-            should_send = False
-            
-            # Convert specific_time (naive time object) to a datetime object in Taipei timezone for comparison
-            scheduled_time_taipei = TAIPEI_TZ.localize(datetime.combine(now_taipei.date(), notification.specific_time))
-
-            if notification.schedule_type == 'one_time':
-                # For one-time notifications, check if the specific date matches today and the time has passed
-                if notification.specific_date == now_taipei.date():
-                    # Check if the scheduled time is within the last 5 minutes (to account for scheduler interval)
-                    # and has not been sent recently
-                    if now_taipei >= scheduled_time_taipei and \
-                       now_taipei < scheduled_time_taipei + timedelta(minutes=5):
-                        if not notification.last_sent_at or \
-                           (now_taipei - notification.last_sent_at.astimezone(TAIPEI_TZ)) >= timedelta(hours=23):
-                            should_send = True
-                            logging.info(f"One-time notification {notification.id} is due.")
-
-            elif notification.schedule_type == 'weekly':
-                # For weekly notifications, check if the day of the week matches and the time has passed
-                if notification.weekly_day == now_taipei.weekday(): # Monday is 0, Sunday is 6
-                    if now_taipei >= scheduled_time_taipei and \
-                       now_taipei < scheduled_time_taipei + timedelta(minutes=5):
-                        if not notification.last_sent_at or \
-                           (now_taipei - notification.last_sent_at.astimezone(TAIPEI_TZ)) >= timedelta(hours=23):
-                            should_send = True
-                            logging.info(f"Weekly notification {notification.id} is due.")
-
-            if should_send:
-                recipient_ids = [int(uid) for uid in notification.recipient_user_ids.split(',') if uid.strip()]
-                recipients_to_email = []
-                for user_id in recipient_ids:
-                    user = db.session.get(User, user_id)
-                    if user and user.email and user.notification_enabled:
-                        recipients_to_email.append(user.email)
-                
-                if recipients_to_email:
-                    # Convert list of emails to a semicolon-separated string
-                    recipients_to_email_str = ";".join(recipients_to_email)
-
-                    subject = f"【任務系統定時通知】{notification.title}"
-                    # Convert plain text body to HTML for the mail service
-                    html_body_content = notification.body.replace('\n', '<br>')
-                    body = f"""
+        now = datetime.now(utc)
+        due_notifications = ScheduledNotification.query.filter(
+            ScheduledNotification.is_active == True,
+            ScheduledNotification.next_fire_at <= now
+        ).order_by(ScheduledNotification.next_fire_at).all()
+        record_job_stats(rows_scanned=len(due_notifications))
+
+        if due_notifications:
+            logging.info(f"Running check_scheduled_notifications: {len(due_notifications)} due.")
+            recipient_ids = {uid for notification in due_notifications for uid in notification.recipient_ids()}
+            users_by_id = {user.id: user for user in User.query.filter(User.id.in_(recipient_ids))} if recipient_ids else {}
+
+        for notification in due_notifications:
+            fire_at = utc.localize(notification.next_fire_at)
+            if now - fire_at > timedelta(minutes=SCHEDULED_NOTIFICATION_GRACE_MINUTES):
+                logging.warning(f"Scheduled notification {notification.id} missed its fire time {fire_at.isoformat()}, skipping to next occurrence.")
+                notification.refresh_next_fire_at(now)
+                continue
+
+            recipients_to_email = []
+            for user_id in notification.recipient_ids():
+                user = users_by_id.get(user_id)
+                if user and user.email and user.notification_enabled:
+                    recipients_to_email.append(user.email)
+
+            if not recipients_to_email:
+                logging.warning(f"Scheduled notification {notification.id} has no active or email-enabled recipients.")
+                notification.refresh_next_fire_at(now)
+                continue
+
+            # Convert list of emails to a semicolon-separated string
+            recipients_to_email_str = ";".join(recipients_to_email)
+
+            subject = f"【任務系統定時通知】{notification.title}"
+            # Convert plain text body to HTML for the mail service
+            html_body_content = notification.body.replace('\n', '<br>')
+            body = f"""
 <!DOCTYPE html>
 <html>
 <head>
@@ -460,37 +648,205 @@ def check_scheduled_notifications(app, db, User, ScheduledNotification):
 </body>
 </html>
 """
-                    try:
-                        send_mail(subject, body, recipients_to_email_str)
-                        notification.last_sent_at = datetime.now(utc) # Update last sent time in UTC
-                        db.session.commit()
-                        logging.info(f"Sent scheduled notification {notification.id} to {recipients_to_email_str}.")
-                    except Exception as e:
-                        db.session.rollback()
-                        logging.error(f"Failed to send scheduled notification {notification.id} to {recipients_to_email_str}: {e}")
+            try:
+                success, message = send_mail(subject, body, recipients_to_email_str)
+                if success:
+                    notification.last_sent_at = now.replace(tzinfo=None) # Update last sent time in UTC
+                    notification.refresh_next_fire_at(now)
+                    logging.info(f"Sent scheduled notification {notification.id} to {recipients_to_email_str}.")
                 else:
-                    logging.warning(f"Scheduled notification {notification.id} has no active or email-enabled recipients.")
+                    # next_fire_at 不變，下次執行時在寬限時間內重試
+                    logging.error(f"Failed to send scheduled notification {notification.id} to {recipients_to_email_str}: {message}")
+            except Exception as e:
+                logging.error(f"Failed to send scheduled notification {notification.id} to {recipients_to_email_str}: {e}")
+
+        # 所有到期通知處理完後一次提交，避免每筆提交後重新載入其餘通知
+        db.session.commit()
+        _arm_scheduled_notifications(db, ScheduledNotification, now)
+
 
+def _arm_scheduled_notifications(db, ScheduledNotification, now):
+    """Re-arms the notification job for the earliest upcoming next_fire_at (retrying failed sends after a minute)."""
+    next_fire_at = db.session.query(func.min(ScheduledNotification.next_fire_at)).filter(
+        ScheduledNotification.is_active == True
+    ).scalar()
+    if next_fire_at is not None:
+        next_fire_at = max(utc.localize(next_fire_at), now + timedelta(minutes=1))
+        wake_scheduled_notifications(next_fire_at)
 
-def init_app_scheduler(app, db, User, Todo, ArchivedTodo, MeetingTask, Meeting, ScheduledNotification, ReportSchedule):
+
+def wake_scheduled_notifications(run_at=None):
     """
-    Initializes and starts the background scheduler for the Flask app.
+    Moves the scheduled-notification job forward so it runs at ``run_at`` (default: now).
+
+    The job otherwise sleeps up to SCHEDULED_NOTIFICATION_MAX_SLEEP_SECONDS; this is
+    called after a notification is created, edited or re-activated, and by the job
+    itself for the next due notification. Never postpones an earlier planned run.
+
+    Args:
+        run_at (datetime, optional): aware or naive-UTC datetime
+    """
+    _wake_job(SCHEDULED_NOTIFICATIONS_JOB_ID, run_at)
+
+
+def wake_report_schedules(run_at=None):
+    """Same as wake_scheduled_notifications, for the weekly report trigger."""
+    _wake_job(REPORT_SCHEDULES_JOB_ID, run_at)
+
+
+def _wake_job(job_id, run_at):
+    if _scheduler is None or not _scheduler.running:
+        return
+    job = _scheduler.get_job(job_id)
+    if job is None:
+        return
+    now = datetime.now(utc)
+    if run_at is None:
+        run_at = now
+    elif run_at.tzinfo is None:
+        run_at = utc.localize(run_at)
+    # A time already passed would be skipped as a misfire; run it now instead
+    run_at = max(run_at, now)
+    if job.next_run_time is None or run_at < job.next_run_time:
+        _scheduler.modify_job(job_id, next_run_time=run_at)
+
+
+def rearm_event_jobs(db, ScheduledNotification, ReportSchedule):
+    """
+    Wakes the event-driven jobs for the earliest active next_fire_at.
+
+    Called on every lease heartbeat of the leading process, so schedules created or
+    edited in another process (whose wake_* calls only reach its own, paused,
+    scheduler) are picked up within SCHEDULER_LEASE_HEARTBEAT_SECONDS.
+    """
+    for job_id, Model in ((SCHEDULED_NOTIFICATIONS_JOB_ID, ScheduledNotification), (REPORT_SCHEDULES_JOB_ID, ReportSchedule)):
+        next_fire_at = db.session.scalar(
+            select(func.min(Model.next_fire_at)).where(Model.is_active == True, Model.next_fire_at.isnot(None))
+        )
+        if next_fire_at is not None:
+            _wake_job(job_id, next_fire_at)
+    db.session.commit()
+
+
+ScheduledJob = namedtuple('ScheduledJob', ['id', 'func', 'arg_names', 'trigger', 'first_run_delay'])
+_job_context = {}
+
+
+def _scheduled_jobs():
+    """
+    The jobs run by the app scheduler.
+
+    Jobs are stored as ``scheduler:run_scheduled_job(job_id)`` so they can be pickled
+    into the database job store; the app, db and models they need are resolved at
+    run time from ``arg_names`` (see init_app_scheduler).
     """
-    scheduler = BackgroundScheduler()
     taiwan_tz = timezone('Asia/Taipei')
+    return [
+        ScheduledJob(ARCHIVE_JOB_NAME, transfer_and_archive_todos, ('app', 'db', 'Todo', 'ArchivedTodo', 'TodoEvent', 'JobCheckpoint', 'UserTaskCounter', 'MeetingTask'),
+                     CronTrigger(day_of_week='mon', hour=0, minute=1, timezone=taiwan_tz), None),
+        ScheduledJob('check_due_today_tasks', check_due_today_tasks, ('app', 'db', 'User', 'Todo', 'MailOutbox'),
+                     CronTrigger(day_of_week='mon-fri', hour=7, minute=30, timezone=taiwan_tz), None),
+        ScheduledJob('check_overdue_tasks', check_overdue_tasks, ('app', 'db', 'User', 'Todo', 'MailOutbox'),
+                     CronTrigger(day_of_week='mon-fri', hour=7, minute=25, timezone=taiwan_tz), None),
+        ScheduledJob('check_unassigned_meeting_tasks', check_unassigned_meeting_tasks, ('app', 'db', 'User', 'MeetingTask', 'Meeting', 'MailOutbox'),
+                     CronTrigger(day_of_week='mon-fri', hour=7, minute=35, timezone=taiwan_tz), None),
+        ScheduledJob('check_unagreed_resolution_items', check_unagreed_resolution_items, ('app', 'db', 'User', 'MeetingTask', 'Meeting', 'MailOutbox'),
+                     CronTrigger(day_of_week='mon-fri', hour=7, minute=37, timezone=taiwan_tz), None),
+        # Weekly reports: the job sleeps until the earliest next_fire_at (re-armed by wake_report_schedules)
+        ScheduledJob(REPORT_SCHEDULES_JOB_ID, check_and_trigger_reports, ('app', 'db', 'User', 'Todo', 'ReportSchedule', 'CacheVersion'),
+                     IntervalTrigger(seconds=REPORT_SCHEDULE_MAX_SLEEP_SECONDS, timezone=taiwan_tz), timedelta(minutes=1)),
+        # User-defined scheduled notifications: the job sleeps until the next due next_fire_at
+        # (re-armed by wake_scheduled_notifications), with the interval only as an upper bound.
+        ScheduledJob(SCHEDULED_NOTIFICATIONS_JOB_ID, check_scheduled_notifications, ('app', 'db', 'User', 'ScheduledNotification'),
+                     IntervalTrigger(seconds=SCHEDULED_NOTIFICATION_MAX_SLEEP_SECONDS, timezone=taiwan_tz), timedelta(minutes=1)),
+    ]
+
+
+def run_scheduled_job(job_id):
+    """Entry point stored in the job store: runs one job through run_tracked_job (JobRun ledger)."""
+    job = next(job for job in _scheduled_jobs() if job.id == job_id)
+    args = [_job_context[name] for name in job.arg_names]
+    return run_tracked_job(_job_context['app'], _job_context['db'], _job_context['JobRun'], job_id, job.func, *args)
+
+
+def register_jobs(scheduler):
+    """
+    Reconciles the scheduler's job store with _scheduled_jobs() without losing state.
 
-    # ... (現有 cron jobs 維持不變) ...
-    scheduler.add_job(transfer_and_archive_todos, 'cron', day_of_week='mon', hour=0, minute=1, timezone=taiwan_tz, misfire_grace_time=60, args=[app, db, Todo, ArchivedTodo])
-    scheduler.add_job(check_due_today_tasks, 'cron', day_of_week='mon-fri', hour=7, minute=30, timezone=taiwan_tz, misfire_grace_time=60, args=[app, db, User, Todo])
-    scheduler.add_job(check_overdue_tasks, 'cron', day_of_week='mon-fri', hour=7, minute=25, timezone=taiwan_tz, misfire_grace_time=60, args=[app, db, User, Todo])
-    scheduler.add_job(check_unassigned_meeting_tasks, 'cron', day_of_week='mon-fri', hour=7, minute=35, timezone=taiwan_tz, misfire_grace_time=60, args=[app, db, User, MeetingTask, Meeting])
-    scheduler.add_job(check_unagreed_resolution_items, 'cron', day_of_week='mon-fri', hour=7, minute=37, timezone=taiwan_tz, misfire_grace_time=60, args=[app, db, User, MeetingTask, Meeting])
-    
-    # Add the new ticker job for weekly reports
-    scheduler.add_job(check_and_trigger_reports, 'interval', minutes=5, timezone=taiwan_tz, misfire_grace_time=60, args=[app, db, User, Todo, ReportSchedule])
+    A job already in the store keeps its next_run_time, so a run that became due
+    while no process was running is caught up (once, coalesced) within its
+    SCHEDULER_CATCH_UP_GRACE_SECONDS instead of being skipped by a fresh
+    registration. Only a changed trigger reschedules a job; jobs that are no
+    longer defined are removed.
+    """
+    jobs = _scheduled_jobs()
+    job_ids = {job.id for job in jobs}
+    for stale in scheduler.get_jobs():
+        if stale.id not in job_ids:
+            logging.info(f"Removing job '{stale.id}' that is no longer defined.")
+            scheduler.remove_job(stale.id)
+
+    for job in jobs:
+        options = dict(
+            name=job.id, args=[job.id], coalesce=True, max_instances=1,
+            misfire_grace_time=SCHEDULER_CATCH_UP_GRACE_SECONDS.get(job.id, SCHEDULER_DEFAULT_MISFIRE_GRACE_SECONDS)
+        )
+        existing = scheduler.get_job(job.id)
+        if existing is None:
+            next_run_time = datetime.now(utc) + job.first_run_delay if job.first_run_delay else undefined
+            scheduler.add_job(run_scheduled_job, job.trigger, id=job.id, next_run_time=next_run_time, **options)
+            continue
+        if str(existing.trigger) != str(job.trigger):
+            logging.info(f"Trigger of job '{job.id}' changed to {job.trigger}; rescheduling.")
+            scheduler.reschedule_job(job.id, trigger=job.trigger)
+        scheduler.modify_job(job.id, func=run_scheduled_job, **options)
+
+
+def _build_jobstore(db, jobstore):
+    if jobstore == SchedulerJobStore.DATABASE.value:
+        return SQLAlchemyJobStore(engine=db.engine, tablename=SCHEDULER_JOBSTORE_TABLE)
+    return MemoryJobStore()
+
+
+def init_app_scheduler(app, db, User, Todo, ArchivedTodo, MeetingTask, Meeting, ScheduledNotification, ReportSchedule, TodoEvent, MailOutbox, CacheVersion, SchedulerLease, JobCheckpoint, JobRun, UserTaskCounter, leader_election=True, jobstore=SCHEDULER_JOBSTORE):
+    """
+    Initializes and starts the background scheduler for the Flask app.
 
-    # New job to check and send user-defined scheduled notifications
-    scheduler.add_job(check_scheduled_notifications, 'interval', minutes=1, timezone=taiwan_tz, misfire_grace_time=60, args=[app, db, User, ScheduledNotification])
+    With leader_election every process starts its scheduler paused and only the
+    process holding the scheduler lease (see scheduler_lease.py) runs jobs, so
+    several web processes never send the same mail or archive twice.
 
-    scheduler.start()
+    With the database job store the jobs and their next run times survive restarts;
+    all processes share the same store and register_jobs() leaves existing
+    entries untouched.
+    """
+    _job_context.update(
+        app=app, db=db, User=User, Todo=Todo, ArchivedTodo=ArchivedTodo, MeetingTask=MeetingTask, Meeting=Meeting,
+        ScheduledNotification=ScheduledNotification, ReportSchedule=ReportSchedule, TodoEvent=TodoEvent,
+        MailOutbox=MailOutbox, CacheVersion=CacheVersion, JobCheckpoint=JobCheckpoint, JobRun=JobRun,
+        UserTaskCounter=UserTaskCounter
+    )
+    with app.app_context():
+        scheduler = BackgroundScheduler(jobstores={'default': _build_jobstore(db, jobstore)})
+
+    # Runs skipped because they were later than misfire_grace_time are recorded too
+    scheduler.add_listener(
+        lambda event: record_missed_run(app, db, JobRun, event.job_id, event.scheduled_run_time),
+        EVENT_JOB_MISSED
+    )
+
+    # Start paused so the (possibly persistent) store can be reconciled before anything runs
+    scheduler.start(paused=True)
+    register_jobs(scheduler)
+    if not leader_election:
+        scheduler.resume()
     atexit.register(lambda: scheduler.shutdown())
+
+    global _scheduler
+    _scheduler = scheduler
+    if leader_election:
+        start_scheduler_leader(
+            app, db, SchedulerLease, scheduler,
+            on_heartbeat=lambda: rearm_event_jobs(db, ScheduledNotification, ReportSchedule)
+        )
+    return scheduler
@@ -0,0 +1,164 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pytz import utc
+from sqlalchemy import select, update, insert, or_
+from sqlalchemy.exc import IntegrityError
+
+from config import SCHEDULER_LEASE_NAME, SCHEDULER_LEASE_TTL_SECONDS, SCHEDULER_LEASE_HEARTBEAT_SECONDS
+
+
+def make_holder_id():
+    """租約持有者識別：主機名稱、PID 與隨機字串 (同一程序重新啟動也不會沿用舊租約)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(db, SchedulerLease, name, holder, ttl_seconds=SCHEDULER_LEASE_TTL_SECONDS):
+    """
+    取得或續約租約。
+
+    以單一條件式 UPDATE 完成：只有租約由自己持有 (續約) 或已過期 (接手) 時才會更新，
+    多個程序同時嘗試時只有一個 UPDATE 會影響到資料列。租約尚不存在時以 INSERT 建立，
+    主鍵衝突表示其他程序搶先建立。
+
+    Args:
+        name (str): 租約名稱
+        holder (str): 持有者識別 (見 make_holder_id)
+        ttl_seconds (int, optional): 租約有效秒數，持有者需在到期前續約
+
+    Returns:
+        bool: 是否持有租約
+    """
+    table = SchedulerLease.__table__
+    now = datetime.now(utc)
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    try:
+        result = db.session.execute(
+            update(table)
+            .where(table.c.name == name, or_(table.c.holder == holder, table.c.expires_at < now))
+            .values(holder=holder, heartbeat_at=now, expires_at=expires_at)
+        )
+        if result.rowcount == 1:
+            db.session.commit()
+            return True
+        exists = db.session.scalar(select(table.c.name).where(table.c.name == name))
+        if exists is not None:
+            db.session.commit()
+            return False
+        db.session.execute(
+            insert(table).values(name=name, holder=holder, acquired_at=now, heartbeat_at=now, expires_at=expires_at)
+        )
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def release_lease(db, SchedulerLease, name, holder):
+    """釋放自己持有的租約 (立即到期)，讓其他程序不必等到逾時即可接手"""
+    table = SchedulerLease.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.name == name, table.c.holder == holder)
+        .values(expires_at=datetime.now(utc))
+    )
+    db.session.commit()
+
+
+class SchedulerLeader:
+    """
+    以資料庫租約選出唯一執行排程工作的程序。
+
+    每個程序的排程器都以暫停狀態啟動；背景執行緒每 heartbeat_seconds 嘗試取得或續約租約，
+    取得時恢復排程器，失去 (或無法確認) 時立即暫停。heartbeat_seconds 需小於 ttl_seconds，
+    持有者中斷後其他程序最晚在 ttl_seconds + heartbeat_seconds 內接手。
+    """
+
+    def __init__(self, app, db, SchedulerLease, scheduler, name=SCHEDULER_LEASE_NAME,
+                 ttl_seconds=SCHEDULER_LEASE_TTL_SECONDS, heartbeat_seconds=SCHEDULER_LEASE_HEARTBEAT_SECONDS,
+                 on_heartbeat=None):
+        """
+        Args:
+            scheduler: 以 paused=True 啟動的 APScheduler 排程器
+            on_heartbeat (callable, optional): 持有租約時每次續約後呼叫 (無參數，在 app context 中)
+        """
+        self.app = app
+        self.db = db
+        self.SchedulerLease = SchedulerLease
+        self.scheduler = scheduler
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.on_heartbeat = on_heartbeat
+        self.holder = make_holder_id()
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def tick(self):
+        """續約一次並依結果恢復或暫停排程器"""
+        with self.app.app_context():
+            try:
+                acquired = acquire_lease(self.db, self.SchedulerLease, self.name, self.holder, self.ttl_seconds)
+            except Exception as e:
+                # 無法確認是否仍持有租約時當作失去，避免與接手的程序重複執行
+                self.db.session.rollback()
+                logging.error(f"Scheduler lease heartbeat failed: {e}")
+                acquired = False
+
+            if acquired and not self.is_leader:
+                self.is_leader = True
+                self.scheduler.resume()
+                logging.info(f"Acquired scheduler lease '{self.name}' as {self.holder}; jobs resumed.")
+            elif not acquired and self.is_leader:
+                self.is_leader = False
+                self.scheduler.pause()
+                logging.warning(f"Lost scheduler lease '{self.name}'; jobs paused.")
+
+            if self.is_leader and self.on_heartbeat is not None:
+                try:
+                    self.on_heartbeat()
+                except Exception as e:
+                    logging.error(f"Scheduler heartbeat callback failed: {e}", exc_info=True)
+        return self.is_leader
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="scheduler-lease", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.is_leader:
+            self.is_leader = False
+            self.scheduler.pause()
+            with self.app.app_context():
+                try:
+                    release_lease(self.db, self.SchedulerLease, self.name, self.holder)
+                except Exception as e:
+                    logging.error(f"Failed to release scheduler lease: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.tick()
+            self._stop.wait(self.heartbeat_seconds)
+
+
+def start_scheduler_leader(app, db, SchedulerLease, scheduler, on_heartbeat=None):
+    """
+    啟動租約執行緒，程序結束時釋放租約。
+
+    Returns:
+        SchedulerLeader
+    """
+    leader = SchedulerLeader(app, db, SchedulerLease, scheduler, on_heartbeat=on_heartbeat)
+    leader.start()
+    atexit.register(leader.stop)
+    return leader
@@ -0,0 +1,38 @@
+"""
+獨立的排程 worker
+
+    python scheduler_worker.py
+
+在自己的程序中執行 scheduler.py 的排程工作 (歸檔、提醒、週報、定時通知)，
+避免與 Web 請求的執行緒競爭 GIL 與 SQLite 寫入鎖。Web 程序需以 SCHEDULER_MODE=web 啟動，
+兩者共用 config.py 與 .env 的設定 (DATABASE_URL 等)。
+
+worker 一律透過資料庫租約選出執行者，多開 worker 只會有一個執行排程 (其餘待命接手)；
+租約心跳可由 Web 的 /health/scheduler 查詢。
+"""
+import logging
+import os
+import signal
+import threading
+
+from config import SchedulerMode
+
+os.environ['SCHEDULER_MODE'] = SchedulerMode.WORKER.value
+
+
+def main():
+    from app import app_scheduler  # import 時即啟動排程器與租約執行緒
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop.set())
+
+    logging.info(f"Scheduler worker started (pid {os.getpid()}).")
+    while not stop.is_set():
+        stop.wait(1)
+    # 排程器與租約在 atexit 中停止並釋放
+    logging.info("Scheduler worker stopping.")
+
+
+if __name__ == '__main__':
+    main()
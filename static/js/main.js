@@ -25,6 +25,48 @@ document.addEventListener('DOMContentLoaded', function() {
         return statusMap[status] || status;
     }
 
+    function renderHistoryEntry(entry) {
+        let eventText = '';
+        // 嘗試將時間戳記解析為 UTC 時間，然後再轉換為台北時間
+        const date = new Date(entry.timestamp);
+        const timestamp = date.toLocaleString('zh-TW', { year: 'numeric', month: 'numeric', day: 'numeric', hour: 'numeric', minute: 'numeric', hour12: false, timeZone: 'Asia/Taipei' });
+
+        const getActorName = (actor) => (actor && actor.name) ? escapeHTML(actor.name) : '系統';
+        const actorName = (entry.actor && entry.actor.name) ? `由 ${escapeHTML(entry.actor.name)}` : '';
+
+        if (entry.event_type === 'assigned') {
+            const assignedToName = (entry.details.assigned_to && entry.details.assigned_to.name) ? escapeHTML(entry.details.assigned_to.name) : '未知人員';
+            if (entry.actor && entry.details.assigned_to && entry.actor.user_key === entry.details.assigned_to.user_key) {
+                eventText = `自己指派`;
+            } else if (entry.actor && entry.actor.name) {
+                eventText = `由 ${escapeHTML(entry.actor.name)} 指派給 ${assignedToName}`; 
+            } else {
+                eventText = `指派給 ${assignedToName}`;
+            }
+        } else if (entry.event_type === 'status_changed') {
+            const actorDisplayName = `由 ${getActorName(entry.actor)}`;
+            eventText = `${actorDisplayName} 狀態從 ${getStatusText(entry.details.old_status)} 變更為 ${getStatusText(entry.details.new_status)}`;
+            if (entry.details.reason) {
+                eventText += ` (原因: ${escapeHTML(entry.details.reason)})`;
+            }
+        } else if (entry.event_type === 'due_date_changed') {
+            const actorDisplayName = `由 ${getActorName(entry.actor)}`;
+            eventText = `${actorDisplayName} 預計完成日期從 ${escapeHTML(entry.details.old_due_date)} 變更為 ${escapeHTML(entry.details.new_due_date)}`;
+            if (entry.details.reason) {
+                eventText += ` (原因: ${escapeHTML(entry.details.reason)})`;
+            }
+        } else if (entry.event_type === 'assigned_from_meeting') {
+            const assignedToName = (entry.details.assigned_to && entry.details.assigned_to.name) ? escapeHTML(entry.details.assigned_to.name) : '未知人員';
+            const assignedByName = (entry.details.assigned_by && entry.details.assigned_by.name) ? escapeHTML(entry.details.assigned_by.name) : '未知人員';
+            eventText = `由 ${assignedByName} 指派給 ${assignedToName}`;
+        } else if (entry.event_type === 'auto_transfer') {
+            eventText = `系統自動從下週計畫轉移`;
+        } else if (entry.event_type === 'archived') {
+            eventText = `系統自動歸檔`;
+        }
+        return `<div class="history-item">${eventText} (${timestamp})</div>`;
+    }
+
     // --- API Fetching Functions ---
     function fetchUserDetail(userKey) {
         console.log(`Fetching user detail for: ${userKey}`);
@@ -45,6 +87,29 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    function fetchTodoHistory(todoId, cursor = null) {
+        const container = document.getElementById(`todo-history-${todoId}`);
+        const params = new URLSearchParams();
+        if (cursor) params.set('cursor', cursor);
+        fetch(`/api/todo/${todoId}/history?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) throw new Error(data.error);
+                const moreButton = container.querySelector('.history-more');
+                if (moreButton) moreButton.remove();
+                container.insertAdjacentHTML('beforeend', data.history.map(renderHistoryEntry).join(''));
+                if (data.next_cursor) {
+                    container.insertAdjacentHTML('beforeend',
+                        `<button type="button" class="history-more" data-todo-id="${todoId}" data-cursor="${escapeHTML(data.next_cursor)}">載入更多</button>`);
+                }
+                container.dataset.loaded = 'true';
+            })
+            .catch(err => {
+                console.error('Error fetching todo history:', err);
+                container.insertAdjacentHTML('beforeend', `<div class="history-item">無法載入履歷: ${escapeHTML(err.message)}</div>`);
+            });
+    }
+
     function updateDeptStats() {
         fetch('/api/dept-stats')
             .then(response => response.json())
@@ -158,50 +223,10 @@ document.addEventListener('DOMContentLoaded', function() {
                         </div>` : 
                         `<span class="status-badge status-${todo.status}">${getStatusText(todo.status)}</span>`
                     }
-                    ${todo.history_log && todo.history_log.length > 0 ? 
+                    ${todo.history_count > 0 ? 
                         `<div class="todo-history">
-                            <h6>任務履歷:</h6>
-                            ${todo.history_log.map(entry => {
-                                let eventText = '';
-                                // 嘗試將時間戳記解析為 UTC 時間，然後再轉換為台北時間
-                                const date = new Date(entry.timestamp);
-                                const timestamp = date.toLocaleString('zh-TW', { year: 'numeric', month: 'numeric', day: 'numeric', hour: 'numeric', minute: 'numeric', hour12: false, timeZone: 'Asia/Taipei' });
-                                
-                                const getActorName = (actor) => (actor && actor.name) ? escapeHTML(actor.name) : '系統';
-                                const actorName = (entry.actor && entry.actor.name) ? `由 ${escapeHTML(entry.actor.name)}` : '';
-
-                                if (entry.event_type === 'assigned') {
-                                    const assignedToName = (entry.details.assigned_to && entry.details.assigned_to.name) ? escapeHTML(entry.details.assigned_to.name) : '未知人員';
-                                    if (entry.actor && entry.details.assigned_to && entry.actor.user_key === entry.details.assigned_to.user_key) {
-                                        eventText = `自己指派`;
-                                    } else if (entry.actor && entry.actor.name) {
-                                        eventText = `由 ${escapeHTML(entry.actor.name)} 指派給 ${assignedToName}`; 
-                                    } else {
-                                        eventText = `指派給 ${assignedToName}`;
-                                    }
-                                } else if (entry.event_type === 'status_changed') {
-                                    const actorDisplayName = `由 ${getActorName(entry.actor)}`;
-                                    eventText = `${actorDisplayName} 狀態從 ${getStatusText(entry.details.old_status)} 變更為 ${getStatusText(entry.details.new_status)}`;
-                                    if (entry.details.reason) {
-                                        eventText += ` (原因: ${escapeHTML(entry.details.reason)})`;
-                                    }
-                                } else if (entry.event_type === 'due_date_changed') {
-                                    const actorDisplayName = `由 ${getActorName(entry.actor)}`;
-                                    eventText = `${actorDisplayName} 預計完成日期從 ${escapeHTML(entry.details.old_due_date)} 變更為 ${escapeHTML(entry.details.new_due_date)}`;
-                                    if (entry.details.reason) {
-                                        eventText += ` (原因: ${escapeHTML(entry.details.reason)})`;
-                                    }
-                                } else if (entry.event_type === 'assigned_from_meeting') {
-                                    const assignedToName = (entry.details.assigned_to && entry.details.assigned_to.name) ? escapeHTML(entry.details.assigned_to.name) : '未知人員';
-                                    const assignedByName = (entry.details.assigned_by && entry.details.assigned_by.name) ? escapeHTML(entry.details.assigned_by.name) : '未知人員';
-                                    eventText = `由 ${assignedByName} 指派給 ${assignedToName}`;
-                                } else if (entry.event_type === 'auto_transfer') {
-                                    eventText = `系統自動從下週計畫轉移`;
-                                } else if (entry.event_type === 'archived') {
-                                    eventText = `系統自動歸檔`;
-                                }
-                                return `<div class="history-item">${eventText} (${timestamp})</div>`;
-                            }).join('')}
+                            <button type="button" class="history-toggle" data-todo-id="${todo.id}">任務履歷 (${todo.history_count})</button>
+                            <div id="todo-history-${todo.id}" class="todo-history-items" style="display:none;"></div>
                         </div>` : ''}
                 </div>`).join('');
         };
@@ -404,6 +429,21 @@ document.addEventListener('DOMContentLoaded', function() {
         });
 
         document.body.addEventListener('click', function(e) {
+            // 展開任務履歷：第一次展開時才向伺服器載入
+            if (e.target && e.target.classList.contains('history-toggle')) {
+                const todoId = e.target.dataset.todoId;
+                const container = document.getElementById(`todo-history-${todoId}`);
+                const expanded = container.style.display !== 'none';
+                container.style.display = expanded ? 'none' : 'block';
+                if (!expanded && !container.dataset.loaded) {
+                    fetchTodoHistory(todoId);
+                }
+            }
+
+            if (e.target && e.target.classList.contains('history-more')) {
+                fetchTodoHistory(e.target.dataset.todoId, e.target.dataset.cursor);
+            }
+
             if (e.target && e.target.classList.contains('confirm-uncompleted-btn')) {
                 const todoId = e.target.dataset.todoId;
                 const reasonInput = document.getElementById(`uncompleted-reason-${todoId}`);
@@ -0,0 +1,96 @@
+"""
+排程工作執行紀錄測試
+
+確認每次執行都寫入 JobRun (耗時、讀取列數、郵件數、錯誤)，錯過的執行也有紀錄，
+以及管理員統計 API 的百分位數計算與權限。
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+
+from app import app, User, Todo, MailOutbox, JobRun
+from config import UserLevel, TodoStatus, TodoType, JobRunStatus
+from job_runs import run_tracked_job, record_missed_run, _percentile
+from mail_outbox import enqueue_mail
+from scheduler import check_overdue_tasks
+
+
+def test_run_records_rows_and_mails(app_db, make_user):
+    staff = make_user('staff', UserLevel.STAFF.value)
+    for i in range(3):
+        app_db.session.add(Todo(user_id=staff.id, title=f'逾期{i}', description='描述', status=TodoStatus.PENDING.value,
+                                todo_type=TodoType.CURRENT.value, due_date=datetime.now(utc) - timedelta(days=3)))
+    app_db.session.commit()
+
+    run_tracked_job(app, app_db, JobRun, 'check_overdue_tasks', check_overdue_tasks, app, app_db, User, Todo, MailOutbox)
+
+    run = JobRun.query.one()
+    assert (run.job_name, run.status, run.rows_scanned, run.mails_queued) == ('check_overdue_tasks', JobRunStatus.SUCCESS.value, 3, 1)
+    assert run.duration_ms is not None and run.finished_at >= run.started_at
+    assert not run.misfired
+
+
+def test_digest_mail_counts_every_queued_row(app_db):
+    def queue_digest():
+        enqueue_mail(app_db, MailOutbox, '摘要', '內容', 'a@example.com;b@example.com', mail_cc='c@example.com', digest=True)
+        app_db.session.commit()
+
+    run_tracked_job(app, app_db, JobRun, 'check_due_today_tasks', queue_digest)
+
+    assert MailOutbox.query.count() == 3
+    assert JobRun.query.one().mails_queued == 3
+
+
+def test_failed_run_is_recorded_and_reraised(app_db):
+    def broken():
+        raise ValueError('資料錯誤')
+
+    with pytest.raises(ValueError):
+        run_tracked_job(app, app_db, JobRun, 'broken', broken)
+    run = JobRun.query.one()
+    assert run.status == JobRunStatus.FAILED.value
+    assert run.error == 'ValueError: 資料錯誤'
+
+
+def test_missed_run_is_recorded(app_db):
+    scheduled = datetime.now(utc) - timedelta(minutes=5)
+    record_missed_run(app, app_db, JobRun, 'check_due_today_tasks', scheduled)
+    run = JobRun.query.one()
+    assert run.status == JobRunStatus.MISSED.value and run.misfired
+    assert utc.localize(run.started_at) == scheduled
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert (_percentile(values, 0.5), _percentile(values, 0.9), _percentile(values, 0.99)) == (50, 90, 99)
+    assert _percentile([7], 0.99) == 7
+    assert _percentile([], 0.5) is None
+
+
+def test_summary_endpoint(client, app_db, make_user, login):
+    now = datetime.now(utc)
+    for duration in range(10, 110, 10):
+        app_db.session.add(JobRun(job_name='check_due_today_tasks', status=JobRunStatus.SUCCESS.value,
+                                  started_at=now - timedelta(hours=duration), duration_ms=duration,
+                                  rows_scanned=duration * 2, mails_queued=1))
+    app_db.session.add(JobRun(job_name='check_due_today_tasks', status=JobRunStatus.MISSED.value,
+                              started_at=now - timedelta(minutes=1), misfired=True))
+    # 超出統計期間
+    app_db.session.add(JobRun(job_name='old_job', status=JobRunStatus.SUCCESS.value,
+                              started_at=now - timedelta(days=40), duration_ms=5))
+    app_db.session.commit()
+
+    staff = make_user('staff', UserLevel.STAFF.value)
+    login(staff)
+    assert client.get('/api/admin/job_runs').status_code == 302
+
+    admin = make_user('admin', UserLevel.ADMIN.value)
+    login(admin)
+    data = client.get('/api/admin/job_runs').get_json()
+    assert [job['job_name'] for job in data['jobs']] == ['check_due_today_tasks']
+    job = data['jobs'][0]
+    assert (job['runs'], job['failures'], job['missed']) == (10, 0, 1)
+    assert job['duration_ms'] == {'p50': 50, 'p90': 90, 'p99': 100, 'max': 100}
+    assert job['avg_rows_scanned'] == 110.0 and job['avg_mails_queued'] == 1.0 and job['last_status'] == JobRunStatus.MISSED.value
+    assert client.get('/api/admin/job_runs?days=0').status_code == 400
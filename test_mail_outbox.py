@@ -0,0 +1,287 @@
+"""
+郵件寄件匣測試
+
+確認請求處理只把郵件寫入 mail_outbox 而不直接呼叫郵件 API，
+並驗證 worker 的發送、指數退避重試、dead letter 與逾時認領的接手。
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+from sqlalchemy import event
+
+import mail_outbox
+from app import app, User, MailOutbox
+from config import UserLevel, TodoType, MailOutboxStatus, MAIL_OUTBOX_MAX_ATTEMPTS, MAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS
+from mail_outbox import drain_mail_outbox, claim_next, backoff_seconds
+
+
+@pytest.fixture
+def chief_and_staff(make_user):
+    return make_user('chief', UserLevel.SECTION_CHIEF.value), make_user('staff')
+
+
+def _queue(app_db, count=1):
+    for i in range(count):
+        app_db.session.add(MailOutbox(
+            subject=f'主旨{i}', body='內文', mail_to=f'user{i}@example.com',
+            next_attempt_at=datetime.now(utc)
+        ))
+    app_db.session.commit()
+
+
+class FakeSender:
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = []
+
+    def __call__(self, subject, body, mail_to, mail_cc=""):
+        self.calls.append((subject, mail_to, mail_cc))
+        return self.results.pop(0) if self.results else (True, "郵件發送成功")
+
+
+def test_assignment_enqueues_without_sending(client, app_db, chief_and_staff, monkeypatch, login):
+    chief, staff = chief_and_staff
+
+    def fail_send(*args, **kwargs):
+        raise AssertionError('request handler must not call the mail API')
+    monkeypatch.setattr('mail_service.send_mail', fail_send)
+    monkeypatch.setattr('app.send_mail', fail_send)
+
+    login(chief)
+    response = client.post('/api/todo', json={
+        'user_key': staff.user_key, 'title': '盤點', 'description': '描述',
+        'type': TodoType.CURRENT.value,
+        'due_date': (datetime.now(utc) + timedelta(days=1)).date().isoformat(),
+    })
+    assert response.status_code == 200
+
+    queued = MailOutbox.query.all()
+    assert len(queued) == 1
+    assert queued[0].mail_to == staff.email
+    assert queued[0].subject == '[新任務指派] 盤點'
+    assert queued[0].status == MailOutboxStatus.PENDING.value
+
+
+def test_drain_marks_sent(app_db):
+    _queue(app_db, 3)
+    sender = FakeSender([])
+
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 3
+    assert len(sender.calls) == 3
+    app_db.session.expire_all()
+    assert {row.status for row in MailOutbox.query.all()} == {MailOutboxStatus.SENT.value}
+    assert all(row.sent_at is not None and row.claimed_by is None for row in MailOutbox.query.all())
+
+
+def test_failure_backs_off_then_dead_letters(app_db):
+    _queue(app_db)
+    outbox_id = MailOutbox.query.one().id
+    sender = FakeSender([(False, "API 回應錯誤")] * MAIL_OUTBOX_MAX_ATTEMPTS)
+
+    drain_mail_outbox(app, app_db, MailOutbox, send=sender)
+    app_db.session.expire_all()
+    row = app_db.session.get(MailOutbox, outbox_id)
+    assert row.status == MailOutboxStatus.PENDING.value
+    assert row.attempts == 1
+    assert row.last_error == "API 回應錯誤"
+    # 退避時間未到，不會再次發送
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 0
+    assert row.next_attempt_at >= datetime.utcnow() + timedelta(seconds=backoff_seconds(1) - 5)
+
+    for attempt in range(2, MAIL_OUTBOX_MAX_ATTEMPTS + 1):
+        row.next_attempt_at = datetime.now(utc) - timedelta(seconds=1)
+        app_db.session.commit()
+        assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 1
+        app_db.session.expire_all()
+        row = app_db.session.get(MailOutbox, outbox_id)
+        assert row.attempts == attempt
+
+    assert row.status == MailOutboxStatus.DEAD.value and row.body == ''
+    assert len(sender.calls) == MAIL_OUTBOX_MAX_ATTEMPTS
+    row.next_attempt_at = datetime.now(utc) - timedelta(seconds=1)
+    app_db.session.commit()
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 0
+
+
+def test_password_reset_body_not_kept_after_delivery(client, app_db, chief_and_staff, login):
+    chief, staff = chief_and_staff
+    chief.level = UserLevel.ADMIN.value
+    app_db.session.commit()
+    login(chief)
+
+    temp_password = client.post(f'/admin/user/{staff.id}/reset-password').get_json()['temp_password']
+    row = MailOutbox.query.one()
+    # 發送前內文仍在 (重試需要)，發送後清空，臨時密碼不會留在資料庫中
+    assert temp_password in row.body
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=FakeSender([])) == 1
+    app_db.session.expire_all()
+    row = MailOutbox.query.one()
+    assert (row.status, row.body, row.subject) == (MailOutboxStatus.SENT.value, '', '[重要] 您的密碼已重設')
+
+
+def test_backoff_is_capped():
+    assert backoff_seconds(1) < backoff_seconds(2) < backoff_seconds(3)
+    assert backoff_seconds(50) == mail_outbox.MAIL_OUTBOX_BACKOFF_MAX_SECONDS
+
+
+def test_stale_claim_is_reclaimed(app_db):
+    _queue(app_db)
+    outbox_id, first_token = claim_next(app_db, MailOutbox)
+    # 已認領中的郵件不會被重複認領
+    assert claim_next(app_db, MailOutbox) is None
+
+    row = app_db.session.get(MailOutbox, outbox_id)
+    row.claimed_at = datetime.now(utc) - timedelta(seconds=MAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS + 1)
+    app_db.session.commit()
+
+    reclaimed_id, second_token = claim_next(app_db, MailOutbox)
+    assert reclaimed_id == outbox_id
+    assert second_token != first_token
+
+    # 原 worker 稍後回報結果時已失去認領權，不會覆寫
+    mail_outbox.deliver(app_db, MailOutbox, outbox_id, first_token, send=FakeSender([]))
+    app_db.session.expire_all()
+    assert app_db.session.get(MailOutbox, outbox_id).status == MailOutboxStatus.SENDING.value
+    mail_outbox.deliver(app_db, MailOutbox, outbox_id, second_token, send=FakeSender([]))
+    app_db.session.expire_all()
+    assert app_db.session.get(MailOutbox, outbox_id).status == MailOutboxStatus.SENT.value
+
+
+def test_commit_wakes_workers(app_db, monkeypatch):
+    woken = []
+
+    class Pool:
+        def wake(self):
+            woken.append(True)
+    monkeypatch.setattr(mail_outbox, '_worker_pool', Pool())
+    event.listen(app_db.session, 'after_commit', mail_outbox._wake_after_commit)
+    try:
+        app_db.session.commit()
+        assert woken == []
+        mail_outbox.enqueue_mail(app_db, MailOutbox, '主旨', '內文', 'a@example.com')
+        app_db.session.commit()
+        assert woken == [True]
+    finally:
+        event.remove(app_db.session, 'after_commit', mail_outbox._wake_after_commit)
+
+
+def _make_due(app_db):
+    for row in MailOutbox.query.filter_by(status=MailOutboxStatus.PENDING.value):
+        row.next_attempt_at = datetime.now(utc) - timedelta(seconds=1)
+    app_db.session.commit()
+
+
+def test_digest_waits_for_window_then_sends_one_mail(app_db):
+    mail_outbox.enqueue_mail(app_db, MailOutbox, '【今日任務提醒】', '今日到期', 'a@example.com', digest=True)
+    mail_outbox.enqueue_mail(app_db, MailOutbox, '【逾期任務提醒】', '已逾期', 'a@example.com', digest=True)
+    mail_outbox.enqueue_mail(app_db, MailOutbox, '【逾期任務提醒】', '已逾期', 'b@example.com', digest=True)
+    app_db.session.commit()
+    sender = FakeSender([])
+
+    # 收集期間內不發送
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 0
+
+    _make_due(app_db)
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 2
+    assert sorted(call[1] for call in sender.calls) == ['a@example.com', 'b@example.com']
+    combined = next(call for call in sender.calls if call[1] == 'a@example.com')
+    assert combined[0] == '【通知彙整】您有 2 則新通知'
+    app_db.session.expire_all()
+    assert {row.status for row in MailOutbox.query.all()} == {MailOutboxStatus.SENT.value}
+
+
+def test_digest_joins_rows_not_yet_due(app_db):
+    [first] = mail_outbox.enqueue_mail(app_db, MailOutbox, '通知一', '內文', 'a@example.com', digest=True)
+    app_db.session.commit()
+    first.next_attempt_at = datetime.now(utc) - timedelta(seconds=1)
+    mail_outbox.enqueue_mail(app_db, MailOutbox, '通知二', '內文', 'a@example.com', digest=True)
+    # 非彙整通知與其他收件人不合併
+    mail_outbox.enqueue_mail(app_db, MailOutbox, '密碼重設', '內文', 'a@example.com')
+    mail_outbox.enqueue_mail(app_db, MailOutbox, '通知三', '內文', 'c@example.com', digest=True)
+    app_db.session.commit()
+
+    sender = FakeSender([])
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 2
+    assert sorted(call[0] for call in sender.calls) == ['【通知彙整】您有 2 則新通知', '密碼重設']
+    app_db.session.expire_all()
+    assert MailOutbox.query.filter_by(subject='通知三').one().status == MailOutboxStatus.PENDING.value
+
+
+def test_digest_coalesces_per_recipient_across_cc_lists(app_db):
+    # 兩封通知都寄給 a，但副本不同：a 只收到一封彙整，副本的每位收件人各自收到自己的通知
+    mail_outbox.enqueue_mail(app_db, MailOutbox, '通知一', '內文', 'a@example.com', mail_cc='b@example.com',
+                             digest=True)
+    mail_outbox.enqueue_mail(app_db, MailOutbox, '通知二', '內文', ' A@example.com ;', mail_cc='c@example.com; b@example.com',
+                             digest=True)
+    app_db.session.commit()
+    assert MailOutbox.query.filter_by(is_digest=True).count() == 5
+    _make_due(app_db)
+
+    sender = FakeSender([])
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 3
+    assert sorted(sender.calls) == [
+        ('【通知彙整】您有 2 則新通知', 'a@example.com', ''),
+        ('【通知彙整】您有 2 則新通知', 'b@example.com', ''),
+        ('通知二', 'c@example.com', ''),
+    ]
+
+
+def test_failed_digest_retries_as_a_group(app_db):
+    for i in range(3):
+        mail_outbox.enqueue_mail(app_db, MailOutbox, f'通知{i}', '內文', 'a@example.com', digest=True)
+    app_db.session.commit()
+    _make_due(app_db)
+
+    sender = FakeSender([(False, "API 回應錯誤")])
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 1
+    app_db.session.expire_all()
+    rows = MailOutbox.query.all()
+    assert {(row.status, row.attempts) for row in rows} == {(MailOutboxStatus.PENDING.value, 1)}
+
+    _make_due(app_db)
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 1
+    assert sender.calls[-1][0] == '【通知彙整】您有 3 則新通知'
+
+
+def test_batch_assignment_coalesces_per_assignee(client, app_db, chief_and_staff, login):
+    chief, staff = chief_and_staff
+    login(chief)
+
+    due_date = (datetime.now(utc) + timedelta(days=1)).date().isoformat()
+    for title in ['盤點', '清潔']:
+        response = client.post('/api/batch_add_todo', json={
+            'user_keys': [staff.user_key], 'title': title, 'description': '描述',
+            'type': TodoType.CURRENT.value, 'due_date': due_date,
+        })
+        assert response.status_code == 200
+
+    assert MailOutbox.query.filter_by(is_digest=True).count() == 2
+    _make_due(app_db)
+    sender = FakeSender([])
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 1
+    assert sender.calls == [('【通知彙整】您有 2 則新通知', staff.email, '')]
+
+
+def test_morning_reminders_coalesce(app_db, chief_and_staff):
+    from app import Todo
+    from config import TodoStatus
+    from scheduler import check_due_today_tasks, check_overdue_tasks
+
+    _, staff = chief_and_staff
+    today_noon = datetime.now(utc).replace(hour=4, minute=0, second=0, microsecond=0)  # 台北 12:00
+    for title, due in [('今日', today_noon), ('逾期', today_noon - timedelta(days=3))]:
+        app_db.session.add(Todo(
+            user_id=staff.id, title=title, description='描述', status=TodoStatus.PENDING.value,
+            todo_type=TodoType.CURRENT.value, due_date=due
+        ))
+    app_db.session.commit()
+
+    check_overdue_tasks(app, app_db, User, Todo, MailOutbox)
+    check_due_today_tasks(app, app_db, User, Todo, MailOutbox)
+    assert MailOutbox.query.filter_by(mail_to=staff.email, is_digest=True).count() == 2
+
+    _make_due(app_db)
+    sender = FakeSender([])
+    assert drain_mail_outbox(app, app_db, MailOutbox, send=sender) == 1
+    assert sender.calls[0][:2] == ('【通知彙整】您有 2 則新通知', staff.email)
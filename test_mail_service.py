@@ -0,0 +1,143 @@
+"""
+郵件 API 用戶端測試
+
+以本機的 http.server 模擬郵件 API 的延遲與故障，確認 send_mail 重用連線、
+在 5xx 與連線失敗時有限次重試、逾時不會卡住，且連續失敗後斷路直接回傳失敗。
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import mail_service
+from mail_service import CircuitBreaker, send_mail
+from rate_limiter import TokenBucket
+
+
+class StandInMailApi(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支援 keep-alive
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server.client_ports.add(self.client_address[1])
+        server.request_count += 1
+        behaviour = server.script.pop(0) if server.script else 'ok'
+
+        if behaviour == 'slow':
+            time.sleep(server.delay)
+            behaviour = 'ok'
+        if behaviour == 'ok':
+            status, payload = 200, {'isSuccess': True, 'Message': 'OK'}
+        elif behaviour == 'rejected':
+            status, payload = 200, {'isSuccess': False, 'Message': '收件人格式錯誤'}
+        else:
+            status, payload = int(behaviour), {'Message': 'error'}
+
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mail_api(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInMailApi)
+    server.script = []
+    server.delay = 0
+    server.request_count = 0
+    server.client_ports = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(mail_service, 'MAIL_API_URL', f'http://127.0.0.1:{server.server_address[1]}/SendMail')
+    monkeypatch.setattr(mail_service, 'MAIL_API_RETRY_BACKOFF_FACTOR', 0)
+    monkeypatch.setattr(mail_service, 'MAIL_API_READ_TIMEOUT_SECONDS', 0.5)
+    monkeypatch.setattr(mail_service, 'circuit_breaker', CircuitBreaker(failure_threshold=3, reset_seconds=0.3))
+    monkeypatch.setattr(mail_service, 'mail_rate_limiter', TokenBucket(rate=1000, burst=100))
+    mail_service.reset_session()
+    yield server
+    mail_service.reset_session()
+    server.shutdown()
+    server.server_close()
+
+
+def test_reuses_pooled_connection(mail_api):
+    for i in range(5):
+        assert send_mail(f'主旨{i}', '內文', 'a@example.com') == (True, '郵件發送成功')
+    assert mail_api.request_count == 5
+    assert len(mail_api.client_ports) == 1
+
+
+def test_retries_server_errors(mail_api):
+    mail_api.script = ['503', '502']
+    assert send_mail('主旨', '內文', 'a@example.com') == (True, '郵件發送成功')
+    assert mail_api.request_count == 3
+
+
+def test_gives_up_after_bounded_retries(mail_api):
+    mail_api.script = ['500'] * 10
+    success, message = send_mail('主旨', '內文', 'a@example.com')
+    assert not success
+    assert message.startswith('HTTP 錯誤')
+    assert mail_api.request_count == mail_service.MAIL_API_MAX_RETRIES + 1
+
+
+def test_api_rejection_is_not_retried(mail_api):
+    mail_api.script = ['rejected']
+    assert send_mail('主旨', '內文', 'a@example.com') == (False, '郵件發送失敗: 收件人格式錯誤')
+    assert mail_api.request_count == 1
+    assert not mail_service.circuit_breaker.is_open
+
+
+def test_read_timeout_does_not_hang(mail_api):
+    mail_api.script = ['slow']
+    mail_api.delay = 2
+    started = time.monotonic()
+    success, message = send_mail('主旨', '內文', 'a@example.com')
+    assert not success
+    assert message == '逾時錯誤: 郵件服務 API 無響應'
+    # 逾時後不重送，避免重複寄信
+    assert time.monotonic() - started < 1.5
+    assert mail_api.request_count == 1
+
+
+def test_circuit_opens_and_recovers(mail_api):
+    mail_api.script = ['503'] * 3 * (mail_service.MAIL_API_MAX_RETRIES + 1)
+    for _ in range(3):
+        assert not send_mail('主旨', '內文', 'a@example.com')[0]
+    assert mail_service.circuit_breaker.is_open
+
+    # 斷路中直接失敗，不呼叫 API
+    count = mail_api.request_count
+    assert send_mail('主旨', '內文', 'a@example.com') == (False, '郵件服務暫時無法使用 (斷路中)')
+    assert mail_api.request_count == count
+
+    # 經過 reset 時間後放行試探請求，成功即恢復
+    time.sleep(0.35)
+    assert send_mail('主旨', '內文', 'a@example.com') == (True, '郵件發送成功')
+    assert not mail_service.circuit_breaker.is_open
+
+
+def test_connection_refused_counts_as_failure(monkeypatch):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(mail_service, 'MAIL_API_URL', f'http://127.0.0.1:{port}/SendMail')
+    monkeypatch.setattr(mail_service, 'MAIL_API_RETRY_BACKOFF_FACTOR', 0)
+    monkeypatch.setattr(mail_service, 'circuit_breaker', CircuitBreaker(failure_threshold=1, reset_seconds=60))
+    monkeypatch.setattr(mail_service, 'mail_rate_limiter', TokenBucket(rate=1000, burst=100))
+    mail_service.reset_session()
+    try:
+        assert send_mail('主旨', '內文', 'a@example.com') == (False, '連線錯誤: 無法連接到郵件服務 API')
+        assert mail_service.circuit_breaker.is_open
+    finally:
+        mail_service.reset_session()
@@ -0,0 +1,120 @@
+"""
+會議任務排行榜測試
+
+確認 ranking / ranking-full 以單一 GROUP BY 查詢計算各使用者的任務數，
+查詢次數不隨可見使用者人數增加。
+"""
+from datetime import datetime
+
+import pytest
+from pytz import utc
+
+from app import User, Meeting, MeetingTask
+from config import UserLevel, MeetingTaskStatus, MeetingTaskType
+
+STATUS_CYCLE = [
+    MeetingTaskStatus.COMPLETED.value,
+    MeetingTaskStatus.IN_PROGRESS_TODO.value,
+    MeetingTaskStatus.ASSIGNED.value,
+    MeetingTaskStatus.UNCOMPLETED_TODO.value,
+]
+
+
+def _seed(session, user_count):
+    admin = User(user_key='admin', name='管理員', role='管理員', department='製造中心', unit='製造中心',
+                 level=UserLevel.ADMIN.value, avatar='👑', email='admin@example.com', password_hash='x')
+    users = [
+        User(user_key=f'staff{i}', name=f'員工{i}', role='作業員', department='第一廠', unit='裝一課',
+             level=UserLevel.STAFF.value, avatar='👷', email=f'staff{i}@example.com', password_hash='x')
+        for i in range(user_count)
+    ]
+    session.add(admin)
+    session.add_all(users)
+    session.flush()
+
+    meeting = Meeting(subject='週會', meeting_date=datetime.now(utc), chairman_user_id=admin.id)
+    session.add(meeting)
+    session.flush()
+
+    for i, user in enumerate(users):
+        # 第 i 位使用者有 i 筆追蹤任務，另加一筆不列入統計的決議項目
+        for j in range(i):
+            session.add(MeetingTask(
+                meeting_id=meeting.id, task_type=MeetingTaskType.TRACKING.value, task_description='追蹤',
+                assigned_by_user_id=admin.id, assigned_to_user_id=user.id, status=STATUS_CYCLE[j % len(STATUS_CYCLE)]
+            ))
+        session.add(MeetingTask(
+            meeting_id=meeting.id, task_type=MeetingTaskType.RESOLUTION.value, task_description='決議',
+            assigned_by_user_id=admin.id, assigned_to_user_id=user.id,
+            status=MeetingTaskStatus.COMPLETED.value
+        ))
+    session.commit()
+    return admin.id
+
+
+@pytest.mark.parametrize('endpoint', ['ranking', 'ranking-full'])
+def test_ranking_counts(client, app_db, endpoint):
+    admin_id = _seed(app_db.session, 6)
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_id
+
+    rankings = client.get(f'/api/reports/meeting-tasks/{endpoint}').get_json()['rankings']
+    by_name = {r['user_name']: r for r in rankings}
+
+    # 員工5：5 筆追蹤任務 -> completed, in_progress_todo, assigned, uncompleted_todo, completed
+    assert by_name['員工5 (作業員)'] == {
+        'user_id': by_name['員工5 (作業員)']['user_id'],
+        'user_name': '員工5 (作業員)',
+        'total_tasks': 5,
+        'completed_tasks': 2,
+        'in_progress_tasks': 2,
+        'completion_rate': 40.0,
+    }
+    assert by_name['員工0 (作業員)']['total_tasks'] == 0
+    assert by_name['員工0 (作業員)']['completion_rate'] == 0
+    assert [r['completed_tasks'] for r in rankings] == sorted((r['completed_tasks'] for r in rankings), reverse=True)
+
+
+@pytest.mark.parametrize('user_count', [5, 50])
+def test_ranking_query_count_is_constant(client, app_db, count_queries, user_count):
+    admin_id = _seed(app_db.session, user_count)
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_id
+
+    client.get('/api/reports/meeting-tasks/ranking')  # 建立權限索引
+    with count_queries() as statements:
+        response = client.get('/api/reports/meeting-tasks/ranking')
+    assert response.status_code == 200
+    assert len(response.get_json()['rankings']) == user_count
+
+    # 登入檢查取得目前使用者、權限索引版本號 (可見使用者取自索引)、彙總查詢各一次
+    assert len(statements) == 3
+    assert not any(statement.lstrip().startswith('SELECT user.') for statement in statements[1:])
+
+
+def test_ranking_scope_from_permission_index(client, app_db):
+    _seed(app_db.session, 3)
+    session = app_db.session
+    chief = User(user_key='chief', name='課長', role='課長', department='第一廠', unit='裝一課',
+                 level=UserLevel.SECTION_CHIEF.value, avatar='👷', email='chief@example.com', password_hash='x')
+    other = User(user_key='other', name='他課', role='作業員', department='第一廠', unit='裝三課',
+                 level=UserLevel.STAFF.value, avatar='👷', email='other@example.com', password_hash='x')
+    session.add_all([chief, other])
+    session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = chief.id
+
+    rankings = client.get('/api/reports/meeting-tasks/ranking').get_json()['rankings']
+    assert sorted(r['user_name'] for r in rankings) == ['員工0 (作業員)', '員工1 (作業員)', '員工2 (作業員)', '課長 (課長)']
+
+
+def test_ranking_test_endpoint_uses_shared_format(client):
+    rankings = client.get('/api/reports/meeting-tasks/ranking-test').get_json()['rankings']
+    assert rankings[0] == {
+        'user_id': 1,
+        'user_name': '測試用戶1',
+        'total_tasks': 10,
+        'completed_tasks': 8,
+        'in_progress_tasks': 2,
+        'completion_rate': 80.0,
+    }
@@ -0,0 +1,152 @@
+"""
+首頁組織圖快取測試
+
+確認組織圖只在使用者的組織圖欄位異動時重建，任務異動不會讓快取失效；
+本週任務數隨 Todo 的新增、修改、刪除與歸檔在同一個交易中更新；
+首頁只查詢版本號與任務數，不再讀取所有任務。
+"""
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+
+import org_tree
+from app import User, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, CacheVersion
+from config import UserLevel, TodoStatus, TodoType
+from org_tree import get_org_tree, get_task_counts, TaskCounts
+from scheduler import archive_completed_todos
+
+
+@pytest.fixture(autouse=True)
+def org_cache():
+    # 每個測試都重建資料表，版本號會從頭開始，需清除程序內快取
+    org_tree._org_tree_cache.clear()
+    yield
+    org_tree._org_tree_cache.clear()
+
+
+def _todo(user, status=TodoStatus.PENDING.value, todo_type=TodoType.CURRENT.value, days=1):
+    return Todo(user_id=user.id, title='任務', description='描述', status=status, todo_type=todo_type,
+                due_date=datetime.now(utc) + timedelta(days=days))
+
+
+def _counters(session):
+    return {row.user_id: (row.current_total, row.current_completed) for row in UserTaskCounter.query}
+
+
+def _member(user_key, level, department='第一廠', unit='裝一課'):
+    return org_tree.OrgMember(id=hash(user_key), user_key=user_key, name=user_key, avatar='👷', role='職稱',
+                              department=department, unit=unit, level=level)
+
+
+def test_org_tree_placement():
+    director = _member('director', UserLevel.EXECUTIVE_MANAGER.value, department='製造中心', unit='第一廠')
+    members = [
+        director,
+        _member('staff', UserLevel.STAFF.value),
+        _member('chief', UserLevel.SECTION_CHIEF.value),
+        _member('leader', UserLevel.TEAM_LEADER.value),
+        _member('plant', UserLevel.PLANT_MANAGER.value, department='製造中心', unit='第一廠'),
+        _member('qa', UserLevel.STAFF.value, department='品保部', unit=None),
+    ]
+    tree = org_tree.build_organization_structure(members, director)
+    # 與原本的首頁相同，依 LEVEL_ORDER 由小到大排序
+    assert [m.user_key for m in tree['第一廠']['management_team']] == ['plant', 'director']
+    unit = tree['第一廠']['units']['裝一課']
+    assert [[m.user_key for m in unit[group]] for group in ('management_team', 'leaders', 'staff')] == \
+        [['chief'], ['leader'], ['staff']]
+    assert [m.user_key for m in tree['品保部']['units']['部門直屬']['staff']] == ['qa']
+
+
+def test_org_tree_invalidated_only_by_user_changes(app_db, count_queries, make_user):
+    staff = make_user('staff', UserLevel.STAFF.value)
+    make_user('admin', UserLevel.ADMIN.value)
+
+    with count_queries() as first:
+        director, departments = get_org_tree(app_db, User, CacheVersion)
+    assert director is None and len(first) == 2
+    assert [m.name for m in departments['第一廠']['units']['裝一課']['staff']] == ['staff']
+
+    # 任務異動或登入失敗次數等非組織圖欄位的變更不會讓快取失效
+    app_db.session.add(_todo(staff))
+    staff.failed_login_attempts = 2
+    app_db.session.commit()
+    with count_queries() as cached:
+        assert get_org_tree(app_db, User, CacheVersion)[1] is departments
+    assert len(cached) == 1
+
+    staff.name = '改名'
+    app_db.session.commit()
+    _, departments = get_org_tree(app_db, User, CacheVersion)
+    assert [m.name for m in departments['第一廠']['units']['裝一課']['staff']] == ['改名']
+
+
+def test_task_counters_follow_todo_writes(app_db, make_user):
+    alice = make_user('alice', UserLevel.STAFF.value)
+    bob = make_user('bob', UserLevel.STAFF.value)
+
+    todos = [_todo(alice), _todo(alice, status=TodoStatus.COMPLETED.value), _todo(alice, todo_type=TodoType.NEXT.value)]
+    app_db.session.add_all(todos)
+    app_db.session.commit()
+    assert _counters(app_db.session) == {alice.id: (2, 1)}
+
+    todos[0].status = TodoStatus.COMPLETED.value
+    todos[2].todo_type = TodoType.CURRENT.value
+    app_db.session.commit()
+    assert _counters(app_db.session) == {alice.id: (3, 2)}
+
+    # 轉給其他人：兩個人的計數都要更新
+    todos[1].user_id = bob.id
+    app_db.session.commit()
+    assert _counters(app_db.session) == {alice.id: (2, 1), bob.id: (1, 1)}
+
+    app_db.session.delete(todos[1])
+    app_db.session.commit()
+    assert _counters(app_db.session) == {alice.id: (2, 1)}
+
+    # 回滾的異動不影響計數
+    app_db.session.add(_todo(alice))
+    app_db.session.flush()
+    app_db.session.rollback()
+    assert _counters(app_db.session) == {alice.id: (2, 1)}
+
+
+def test_archive_refreshes_counters(app_db, make_user):
+    alice = make_user('alice', UserLevel.STAFF.value)
+    app_db.session.add_all([_todo(alice), _todo(alice, status=TodoStatus.COMPLETED.value),
+                            _todo(alice, status=TodoStatus.COMPLETED.value)])
+    app_db.session.commit()
+    assert _counters(app_db.session) == {alice.id: (3, 2)}
+
+    archive_completed_todos(app_db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, 'w1')
+    assert _counters(app_db.session) == {alice.id: (1, 0)}
+
+
+def test_task_counts_include_overdue(app_db, make_user):
+    alice = make_user('alice', UserLevel.STAFF.value)
+    bob = make_user('bob', UserLevel.STAFF.value)
+    app_db.session.add_all([
+        _todo(alice, days=-3), _todo(alice, status=TodoStatus.COMPLETED.value, days=-3), _todo(alice),
+        _todo(bob, todo_type=TodoType.NEXT.value, days=-3),
+    ])
+    app_db.session.commit()
+    assert get_task_counts(app_db, Todo, UserTaskCounter) == {
+        alice.id: TaskCounts(3, 1, 1), bob.id: TaskCounts(0, 0, 1)
+    }
+
+
+def test_index_reads_cached_tree_and_counters(client, app_db, count_queries, make_user, login):
+    director = make_user('director', UserLevel.EXECUTIVE_MANAGER.value, department='製造中心', unit='第一廠')
+    staff = make_user('staff', UserLevel.STAFF.value)
+    app_db.session.add_all([_todo(staff, status=TodoStatus.COMPLETED.value), _todo(staff), _todo(director, days=-2)])
+    app_db.session.commit()
+    login(staff)
+
+    assert client.get('/').status_code == 200
+    with count_queries() as statements:
+        page = client.get('/').get_data(as_text=True)
+    # 版本號、本週任務數、逾期數 (登入使用者已在 session 中)；不再讀取使用者與任務明細
+    assert len(statements) == 3
+    assert not any(re.search(r'FROM user\b', statement) for statement in statements)
+    assert '1/2' in page.replace(' ', '') and 'director' in page
@@ -0,0 +1,124 @@
+"""
+權限索引測試
+
+確認可存取、可指派的判斷與原本的規則一致，建立索引後的權限判斷只查詢版本號，
+使用者的職級、部門或單位變更時索引才重建；使用者面板的可指派清單不再逐一載入所有使用者。
+"""
+import pytest
+
+import permission_index
+from app import User, Todo, CacheVersion
+from config import UserLevel, TodoType, TodoStatus
+from permission_index import get_permission_index
+
+
+@pytest.fixture(autouse=True)
+def permission_cache():
+    # 每個測試都重建資料表，版本號會從頭開始，需清除程序內快取
+    permission_index._permission_index_cache.clear()
+    yield
+    permission_index._permission_index_cache.clear()
+
+
+@pytest.fixture
+def users(app_db):
+    specs = {
+        'admin': (UserLevel.ADMIN.value, '資訊部', None),
+        'director': (UserLevel.EXECUTIVE_MANAGER.value, '製造中心', '製造中心'),
+        'plant': (UserLevel.PLANT_MANAGER.value, '製造中心', '第一廠'),
+        'chief': (UserLevel.SECTION_CHIEF.value, '第一廠', '裝一課'),
+        'leader': (UserLevel.TEAM_LEADER.value, '第一廠', '裝一課'),
+        'staff': (UserLevel.STAFF.value, '第一廠', '裝一課'),
+        'other': (UserLevel.STAFF.value, '第三廠', '裝三課'),
+    }
+    created = {}
+    for user_key, (level, department, unit) in specs.items():
+        created[user_key] = User(user_key=user_key, name=user_key, role='職稱', department=department, unit=unit,
+                                 level=level, avatar='👷', email=f'{user_key}@example.com', password_hash='x')
+        app_db.session.add(created[user_key])
+    app_db.session.commit()
+    return created
+
+
+def _visible(users, viewer):
+    return {key for key in users if users[viewer].can_access_user_data(key)}
+
+
+def _assignable(users, viewer):
+    return {key for key, user in users.items() if users[viewer].can_assign_to(user)}
+
+
+def test_rules(users):
+    everyone = set(users)
+    assert _visible(users, 'admin') == everyone
+    assert _visible(users, 'director') == everyone - {'admin'}
+    assert _visible(users, 'plant') == {'plant', 'chief', 'leader', 'staff'}
+    assert _visible(users, 'chief') == {'chief', 'leader', 'staff'}
+    assert _visible(users, 'staff') == {'staff'}
+    assert not users['admin'].can_access_user_data('missing')
+
+    assert _assignable(users, 'director') == everyone - {'admin'}
+    assert _assignable(users, 'plant') == {'chief', 'leader', 'staff'}
+    assert _assignable(users, 'chief') == {'leader', 'staff'}
+    assert _assignable(users, 'leader') == {'leader'}
+    assert _assignable(users, 'staff') == set()
+
+    todo = Todo(user_id=users['staff'].id, title='t', description='d', status=TodoStatus.PENDING.value,
+                todo_type=TodoType.CURRENT.value)
+    assert users['chief'].can_modify_todo(todo) and not users['other'].can_modify_todo(todo)
+
+
+def test_checks_only_read_version_once_built(app_db, users, count_queries):
+    users['chief'].can_access_user_data('staff')
+    for user in users.values():
+        user.level  # 先載入 commit 後過期的欄位，只計算權限判斷本身的查詢
+    with count_queries() as statements:
+        for key in users:
+            users['director'].can_access_user_data(key)
+            users['plant'].can_assign_to(users[key])
+    assert len(statements) == 2 * len(users) - 1  # 查看自己的資料不需查詢
+    assert all('cache_version' in statement for statement in statements)
+
+
+def test_index_rebuilt_when_user_moves(app_db, users):
+    assert users['chief'].can_access_user_data('staff')
+    index = get_permission_index(app_db, User, CacheVersion)
+
+    # 非權限欄位的變更不會重建索引
+    users['staff'].failed_login_attempts = 1
+    app_db.session.commit()
+    assert get_permission_index(app_db, User, CacheVersion) is index
+
+    users['staff'].unit = '裝二課'
+    app_db.session.commit()
+    assert not users['chief'].can_access_user_data('staff')
+    assert get_permission_index(app_db, User, CacheVersion).unit_user_ids('裝一課') == \
+        [users['chief'].id, users['leader'].id]
+
+
+
+def test_rolled_back_changes_not_cached(app_db, users):
+    index = get_permission_index(app_db, User, CacheVersion)
+    staff_id = users['staff'].id
+
+    # 未提交的異動：本交易看得到，但不可以版本號 N+1 填入快取
+    users['staff'].department = 'SECRET'
+    app_db.session.flush()
+    assert get_permission_index(app_db, User, CacheVersion).unit_department_user_ids('SECRET', '裝一課') == [staff_id]
+    app_db.session.rollback()
+
+    # 另一筆提交同樣產生版本號 N+1，讀到的必須是已提交的資料
+    users['other'].department = '第二廠'
+    app_db.session.commit()
+    rebuilt = get_permission_index(app_db, User, CacheVersion)
+    assert rebuilt is not index
+    assert rebuilt.unit_department_user_ids('SECRET', '裝一課') == []
+    assert staff_id in rebuilt.unit_department_user_ids('第一廠', '裝一課')
+
+def test_user_detail_lists_assignable_users(client, users):
+    with client.session_transaction() as sess:
+        sess['user_id'] = users['chief'].id
+    data = client.get('/api/user/staff').get_json()
+    assert [u['user_key'] for u in data['permissions']['assignable_users']] == ['leader', 'staff']
+    assert data['permissions']['can_modify']
+    assert client.get('/api/user/other').status_code == 403
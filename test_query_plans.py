@@ -0,0 +1,98 @@
+"""
+EXPLAIN QUERY PLAN 回歸測試
+
+確認報告、首頁與排程器的熱門查詢都會使用複合索引，
+若有任何查詢退回全表掃描 (SCAN <table>) 即測試失敗。
+"""
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+from sqlalchemy import create_engine, select, func
+
+from app import db, User, Todo, ArchivedTodo, MeetingTask, Meeting, TodoEvent
+from config import TodoStatus, TodoType, MeetingTaskStatus, MeetingTaskType, HistoryEntityType
+
+# SQLite 對沒有索引可用的資料表會輸出 "SCAN <table>"，
+# 使用索引時則為 "SEARCH ... USING INDEX" 或 "SCAN ... USING COVERING INDEX"
+FULL_SCAN_PATTERN = re.compile(r'\bSCAN (\w+)(?! USING (COVERING )?INDEX)')
+
+NOW = datetime.now(utc)
+WEEK_AGO = NOW - timedelta(days=7)
+
+
+@pytest.fixture(scope='module')
+def connection():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with engine.connect() as conn:
+        yield conn
+    engine.dispose()
+
+
+def _query_plan(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+    return [row[-1] for row in rows]
+
+
+HOT_QUERIES = {
+    # index() / get_user_detail
+    'user_detail_todos': select(Todo).where(
+        Todo.user_id == 1, Todo.todo_type == TodoType.CURRENT.value
+    ).order_by(Todo.due_date),
+    'dashboard_current_todos': select(Todo).where(Todo.todo_type == TodoType.CURRENT.value),
+    'dashboard_overdue_todos': select(Todo).where(
+        Todo.due_date < NOW, Todo.status != TodoStatus.COMPLETED.value
+    ),
+    # scheduler.py
+    'due_today_reminder': select(User).join(Todo, User.id == Todo.user_id).where(
+        Todo.due_date >= WEEK_AGO, Todo.due_date <= NOW,
+        Todo.status != TodoStatus.COMPLETED.value, User.notification_enabled == True
+    ).distinct(),
+    'weekly_transfer': select(Todo).where(
+        Todo.todo_type == TodoType.NEXT.value, Todo.due_date >= WEEK_AGO, Todo.due_date <= NOW
+    ),
+    'weekly_archive': select(Todo).where(
+        Todo.status == TodoStatus.COMPLETED.value,
+        Todo.todo_type.in_([TodoType.CURRENT.value, TodoType.NEXT.value])
+    ),
+    'unassigned_meeting_tasks': select(MeetingTask).join(Meeting).where(
+        MeetingTask.task_type == MeetingTaskType.TRACKING.value,
+        MeetingTask.status == MeetingTaskStatus.UNASSIGNED.value,
+        Meeting.meeting_date < NOW
+    ),
+    # /api/reports/*
+    'report_archived_by_period': select(ArchivedTodo).where(
+        ArchivedTodo.archived_at >= WEEK_AGO, ArchivedTodo.status == TodoStatus.COMPLETED.value
+    ),
+    'report_archived_by_user': select(ArchivedTodo).where(
+        ArchivedTodo.user_id == 1, ArchivedTodo.archived_at >= WEEK_AGO
+    ),
+    'report_current_by_users': select(Todo).where(
+        Todo.user_id.in_([1, 2, 3]), Todo.status == TodoStatus.IN_PROGRESS.value
+    ),
+    'report_meeting_tasks_by_period': select(MeetingTask).join(Meeting).where(
+        Meeting.meeting_date >= WEEK_AGO, MeetingTask.assigned_to_user_id == 1
+    ),
+    'meeting_task_ranking': select(func.count(MeetingTask.id)).where(
+        MeetingTask.assigned_to_user_id == 1,
+        MeetingTask.task_type == MeetingTaskType.TRACKING.value
+    ),
+    'report_scope_users': select(User).where(User.unit == '裝一課', User.department == '第一廠'),
+    # 履歷事件
+    'todo_event_history': select(TodoEvent).where(
+        TodoEvent.entity_type == HistoryEntityType.TODO.value, TodoEvent.entity_id == 1
+    ).order_by(TodoEvent.timestamp, TodoEvent.id),
+    'todo_event_history_many': select(TodoEvent).where(
+        TodoEvent.entity_type == HistoryEntityType.MEETING_TASK.value, TodoEvent.entity_id.in_([1, 2, 3])
+    ).order_by(TodoEvent.entity_id, TodoEvent.timestamp, TodoEvent.id),
+}
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(connection, name):
+    plan = _query_plan(connection, HOT_QUERIES[name])
+    scans = [line for line in plan if FULL_SCAN_PATTERN.search(line)]
+    assert not scans, f"{name} falls back to a table scan: {plan}"
@@ -0,0 +1,139 @@
+"""
+Token bucket 限速器測試
+
+以假時鐘驗證 burst 內立即通過、之後依設定速率放行，以及多執行緒共用時的總速率；
+存於資料庫的限速器讓多個程序合計不超過設定速率，資料庫無法使用時退回程序內的限速器。
+"""
+import threading
+import time
+
+import pytest
+
+import mail_service
+from sqlalchemy import create_engine
+
+from rate_limiter import TokenBucket, SharedTokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_burst_then_paced():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        assert bucket.acquire()
+    assert clock.now == 0
+
+    for _ in range(4):
+        assert bucket.acquire()
+    # 超過 burst 後每 0.5 秒放行一次
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_tokens_accumulate_up_to_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=2, clock=clock, sleep=clock.sleep)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+    clock.now += 100
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_acquire_timeout():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.1, burst=1, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire()
+    assert not bucket.acquire(timeout=5)
+    assert clock.sleeps == []
+    assert bucket.acquire(timeout=10)
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, burst=1)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, burst=0)
+
+
+def test_shared_rate_across_threads():
+    bucket = TokenBucket(rate=50, burst=5)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 20 次 = 5 次 burst + 15 次以每秒 50 次放行，約 0.3 秒
+    assert time.monotonic() - started >= 0.25
+
+
+def test_send_mail_takes_a_token(monkeypatch):
+    acquired = []
+
+    class Limiter:
+        def acquire(self, timeout=None):
+            acquired.append(True)
+            return True
+    monkeypatch.setattr(mail_service, 'mail_rate_limiter', Limiter())
+    monkeypatch.setattr(mail_service.circuit_breaker, 'allow_request', lambda: True)
+
+    class Session:
+        def post(self, *args, **kwargs):
+            raise mail_service.requests.exceptions.ConnectionError('down')
+    monkeypatch.setattr(mail_service, 'get_session', lambda: Session())
+    monkeypatch.setattr(mail_service.circuit_breaker, 'record_failure', lambda: None)
+
+    assert not mail_service.send_mail('主旨', '內文', 'a@example.com')[0]
+    assert acquired == [True]
+
+
+@pytest.fixture
+def bucket_engine(tmp_path):
+    from app import RateLimitBucket
+    engine = create_engine(f"sqlite:///{tmp_path / 'bucket.db'}")
+    RateLimitBucket.__table__.create(engine)
+    yield engine, RateLimitBucket.__table__
+    engine.dispose()
+
+
+def test_database_bucket_shared_across_processes(bucket_engine):
+    engine, table = bucket_engine
+    clock = FakeClock()
+    # 兩個實例代表兩個程序，各自有程序內的狀態，只共用資料表
+    first, second = (SharedTokenBucket('mail_api', rate=2, burst=3, clock=clock, sleep=clock.sleep) for _ in range(2))
+    for bucket in (first, second):
+        bucket.use_database(engine, table)
+
+    assert first.try_acquire() and second.try_acquire() and first.try_acquire()
+    assert not second.try_acquire() and not first.try_acquire()
+
+    # 兩個程序合計仍是每 0.5 秒放行一次
+    for bucket in (first, second, first, second):
+        assert bucket.acquire()
+    assert clock.now == pytest.approx(2.0)
+    assert not first.acquire(timeout=0.1)
+
+
+def test_database_bucket_falls_back_to_local(tmp_path):
+    from app import RateLimitBucket
+    engine = create_engine(f"sqlite:///{tmp_path / 'missing.db'}")  # 沒有 rate_limit_bucket 資料表
+    clock = FakeClock()
+    bucket = SharedTokenBucket('mail_api', rate=1, burst=1, clock=clock, sleep=clock.sleep)
+    bucket.use_database(engine, RateLimitBucket.__table__)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    engine.dispose()
@@ -0,0 +1,263 @@
+"""
+報告列表分頁測試
+
+確認歷史任務與會議任務報告列表的篩選、計數與分頁都在資料庫中完成：
+查詢只載入該頁的資料 (LIMIT/OFFSET)，查詢次數不隨資料量增加；
+列表 API 的游標分頁 (limit / cursor / next_cursor) 依 (排序鍵, id) 逐頁讀完且不重複。
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+
+from app import Todo, ArchivedTodo, Meeting, MeetingTask, MeetingAttendee, DiscussionItem
+from config import UserLevel, TodoStatus, TodoType, MeetingTaskStatus, MeetingTaskType
+from pagination import encode_cursor
+
+NOW = datetime.now(utc).replace(tzinfo=None)
+
+
+@pytest.fixture
+def archived(app_db, make_user):
+    session = app_db.session
+    admin = make_user('admin', UserLevel.ADMIN.value)
+    alice = make_user('alice')
+    bob = make_user('bob', unit='裝三課')
+    for i in range(7):
+        session.add(ArchivedTodo(
+            original_todo_id=i, title=f'a{i}', description='d', todo_type=TodoType.CURRENT.value,
+            status=TodoStatus.COMPLETED.value if i % 3 else TodoStatus.UNCOMPLETED.value,
+            user_id=alice.id, created_at=NOW, updated_at=NOW, archived_at=NOW - timedelta(hours=i), due_date=NOW
+        ))
+    # 範圍外：兩年前歸檔，以及其他使用者的任務
+    session.add(ArchivedTodo(original_todo_id=99, title='old', description='d', todo_type=TodoType.CURRENT.value,
+                             status=TodoStatus.COMPLETED.value, user_id=alice.id, created_at=NOW, updated_at=NOW,
+                             archived_at=NOW - timedelta(days=730), due_date=NOW))
+    session.add(ArchivedTodo(original_todo_id=100, title='bob', description='d', todo_type=TodoType.CURRENT.value,
+                             status=TodoStatus.COMPLETED.value, user_id=bob.id, created_at=NOW, updated_at=NOW,
+                             archived_at=NOW, due_date=NOW))
+    session.commit()
+    return admin, alice, bob
+
+
+def test_historical_pages_in_sql(client, archived, count_queries, login):
+    admin, alice, bob = archived
+    login(alice)
+    client.get('/api/reports/todo/historical?period=custom')
+
+    with count_queries() as statements:
+        data = client.get('/api/reports/todo/historical?period=custom&page=2&per_page=3').get_json()
+    # 一次 COUNT + 一頁明細 (登入使用者已在 session 中)
+    assert len(statements) == 2
+    assert 'LIMIT' in statements[-1] and 'OFFSET' in statements[-1]
+
+    assert (data['total'], data['total_pages'], data['page']) == (7, 3, 2)
+    assert [t['title'] for t in data['tasks']] == ['a3', 'a4', 'a5']
+    assert data['stats'] == {'completed': 4, 'uncompleted': 3}
+    assert all(t['user_name'] == 'alice' and t['is_archived'] for t in data['tasks'])
+
+    last_page = client.get('/api/reports/todo/historical?period=custom&page=3&per_page=3').get_json()
+    assert [t['title'] for t in last_page['tasks']] == ['a6']
+
+
+def test_historical_filters_in_sql(client, archived, login):
+    admin, alice, bob = archived
+    login(admin)
+    data = client.get('/api/reports/todo/historical?period=custom').get_json()
+    assert data['total'] == 8
+
+    data = client.get(f'/api/reports/todo/historical?period=custom&user_id={alice.id}'
+                      f'&status={TodoStatus.UNCOMPLETED.value}').get_json()
+    assert data['total'] == 3 and data['stats'] == {'completed': 0, 'uncompleted': 3}
+
+    empty = client.get('/api/reports/todo/historical?period=custom&user_id=999').get_json()
+    assert (empty['total'], empty['total_pages'], empty['tasks']) == (0, 0, [])
+
+
+def test_meeting_task_list_pages_in_sql(client, app_db, count_queries, make_user, login):
+    session = app_db.session
+    admin = make_user('admin', UserLevel.ADMIN.value)
+    staff = make_user('staff')
+    meeting = Meeting(subject='週會', meeting_date=datetime.now(utc), chairman_user_id=admin.id)
+    session.add(meeting)
+    session.flush()
+    statuses = [MeetingTaskStatus.COMPLETED.value, MeetingTaskStatus.AGREED_FINALIZED.value,
+                MeetingTaskStatus.IN_PROGRESS_TODO.value]
+    for i in range(9):
+        session.add(MeetingTask(
+            meeting_id=meeting.id, task_type=MeetingTaskType.TRACKING.value, task_description=f'任務{i}',
+            assigned_by_user_id=admin.id, assigned_to_user_id=staff.id, status=statuses[i % 3],
+            expected_completion_date=NOW - timedelta(days=1)
+        ))
+    session.commit()
+    login(admin)
+    client.get('/api/reports/meeting-tasks/list?period=year')
+
+    with count_queries() as statements:
+        data = client.get('/api/reports/meeting-tasks/list?period=year&page=2&per_page=4').get_json()
+    assert len(statements) == 2
+    assert 'LIMIT' in statements[-1]
+
+    # 只列出已完成與已同意的 6 筆
+    assert (data['total'], data['total_pages']) == (6, 2)
+    assert [t['task_description'] for t in data['tasks']] == ['任務6', '任務7']
+    assert data['tasks'][0]['assigned_to_name'] == 'staff' and data['tasks'][0]['assigned_by_name'] == 'admin'
+    assert [t['is_overdue'] for t in data['tasks']] == [False, True]
+
+
+def _walk(client, url, limit):
+    """依 next_cursor 讀完所有頁，回傳每頁的任務 ID"""
+    pages = []
+    cursor = None
+    while True:
+        page_url = f'{url}{"&" if "?" in url else "?"}limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(page_url).get_json()
+        pages.append([t['id'] for t in data['tasks']])
+        cursor = data['next_cursor']
+        if not cursor:
+            return pages, data
+
+
+@pytest.fixture
+def meeting_tasks(app_db, make_user):
+    session = app_db.session
+    admin = make_user('admin', UserLevel.ADMIN.value)
+    staff = make_user('staff')
+    other = make_user('other', unit='裝三課')
+    meeting = Meeting(subject='週會', meeting_date=datetime.now(utc), chairman_user_id=admin.id)
+    session.add(meeting)
+    session.flush()
+    # 0~5 逾期 (同一天到期兩兩一組，測試同排序鍵以 id 區分)，6~8 尚未到期，9 沒有預計完成日期
+    expected = [NOW - timedelta(days=3 - i // 2) for i in range(6)] + [NOW + timedelta(days=i) for i in range(1, 4)] + [None]
+    for i, expected_date in enumerate(expected):
+        session.add(MeetingTask(
+            meeting_id=meeting.id, task_type=MeetingTaskType.TRACKING.value, task_description=f'任務{i}',
+            assigned_by_user_id=admin.id, assigned_to_user_id=staff.id,
+            status=MeetingTaskStatus.IN_PROGRESS_TODO.value, expected_completion_date=expected_date
+        ))
+    session.add(MeetingTask(
+        meeting_id=meeting.id, task_type=MeetingTaskType.TRACKING.value, task_description='其他人',
+        assigned_by_user_id=admin.id, assigned_to_user_id=other.id,
+        status=MeetingTaskStatus.IN_PROGRESS_TODO.value, expected_completion_date=NOW - timedelta(days=9)
+    ))
+    session.commit()
+    return admin, staff
+
+
+def test_meeting_task_overdue_cursor(client, meeting_tasks, count_queries, login):
+    admin, staff = meeting_tasks
+    login(staff)
+    full = client.get('/api/reports/meeting-tasks/overdue').get_json()
+    assert full['next_cursor'] is None
+    assert [t['task_description'] for t in full['tasks']] == [f'任務{i}' for i in range(6)]
+    assert [t['overdue_days'] for t in full['tasks']][::2] == [3, 2, 1]
+
+    pages, last = _walk(client, '/api/reports/meeting-tasks/overdue', 4)
+    assert pages == [[t['id'] for t in full['tasks']][:4], [t['id'] for t in full['tasks']][4:]]
+    assert last['total'] == 6
+
+    # 每一頁的查詢成本相同：COUNT + 一頁明細 (各欄位名稱在同一個查詢中 JOIN)
+    cursor = client.get('/api/reports/meeting-tasks/overdue?limit=1').get_json()['next_cursor']
+    with count_queries() as statements:
+        client.get(f'/api/reports/meeting-tasks/overdue?limit=1&cursor={cursor}')
+    assert len(statements) == 2
+
+
+def test_meeting_task_in_progress_cursor(client, meeting_tasks, login):
+    admin, staff = meeting_tasks
+    login(admin)
+    full = client.get('/api/reports/meeting-tasks/in-progress').get_json()
+    # 排除逾期，依建立順序由新到舊
+    assert [t['task_description'] for t in full['tasks']] == ['任務9', '任務8', '任務7', '任務6']
+
+    pages, last = _walk(client, '/api/reports/meeting-tasks/in-progress', 3)
+    assert sum(pages, []) == [t['id'] for t in full['tasks']] and len(pages) == 2
+    assert last['total'] == 4
+
+
+def test_todo_current_cursor(client, app_db, make_user, login):
+    session = app_db.session
+    staff = make_user('staff')
+    for i in range(5):
+        session.add(Todo(user_id=staff.id, title=f't{i}', description='d', todo_type=TodoType.CURRENT.value,
+                         status=TodoStatus.PENDING.value, due_date=NOW + timedelta(days=5 - i)))
+    session.add(Todo(user_id=staff.id, title='done', description='d', todo_type=TodoType.CURRENT.value,
+                     status=TodoStatus.COMPLETED.value, due_date=NOW))
+    session.commit()
+    login(staff)
+
+    pages, last = _walk(client, '/api/reports/todo/current', 2)
+    # 依預計完成日期排序，已完成的任務不列出
+    titles = {t['id']: t['title'] for t in client.get('/api/reports/todo/current').get_json()['tasks']}
+    assert [[titles[i] for i in page] for page in pages] == [['t4', 't3'], ['t2', 't1'], ['t0']]
+    assert last['total'] == 5 and last['stats']['pending'] == 5
+
+    assert client.get('/api/reports/todo/current?cursor=bogus').status_code == 400
+    assert client.get(f'/api/reports/todo/current?cursor={encode_cursor("x", 1)}').status_code == 400
+    assert client.get('/api/reports/todo/current?limit=0').status_code == 400
+
+
+def test_meeting_task_list_cursor(client, app_db, make_user, login):
+    session = app_db.session
+    admin = make_user('admin', UserLevel.ADMIN.value)
+    meeting = Meeting(subject='週會', meeting_date=datetime.now(utc), chairman_user_id=admin.id)
+    session.add(meeting)
+    session.flush()
+    for i in range(5):
+        session.add(MeetingTask(meeting_id=meeting.id, task_type=MeetingTaskType.RESOLUTION.value,
+                                task_description=f'決議{i}', assigned_by_user_id=admin.id,
+                                assigned_to_user_id=admin.id, status=MeetingTaskStatus.COMPLETED.value))
+    session.commit()
+    login(admin)
+
+    first = client.get('/api/reports/meeting-tasks/list?period=year&per_page=2').get_json()
+    second = client.get(f'/api/reports/meeting-tasks/list?period=year&per_page=2&cursor={first["next_cursor"]}').get_json()
+    by_page = client.get('/api/reports/meeting-tasks/list?period=year&per_page=2&page=2').get_json()
+    assert [t['id'] for t in second['tasks']] == [t['id'] for t in by_page['tasks']]
+    last = client.get(f'/api/reports/meeting-tasks/list?period=year&per_page=2&cursor={second["next_cursor"]}').get_json()
+    assert [t['task_description'] for t in last['tasks']] == ['決議4'] and last['next_cursor'] is None
+
+
+def test_meeting_tasks_list_cursor(client, app_db, count_queries, make_user, login):
+    session = app_db.session
+    admin = make_user('admin', UserLevel.ADMIN.value)
+    staff = make_user('staff')
+    meetings = []
+    # 後建立的會議日期較早，確認依會議日期而非 ID 排序
+    for days, subject in [(0, '週會'), (7, '月會')]:
+        meeting = Meeting(subject=subject, meeting_date=NOW - timedelta(days=days),
+                          chairman_user_id=admin.id, recorder_user_id=staff.id)
+        session.add(meeting)
+        session.flush()
+        session.add_all([MeetingAttendee(meeting_id=meeting.id, user_id=admin.id),
+                         MeetingAttendee(meeting_id=meeting.id, user_id=staff.id)])
+        meetings.append(meeting)
+    session.add(DiscussionItem(meeting_id=meetings[0].id, topic='議題'))
+    for meeting in meetings:
+        for i in range(3):
+            session.add(MeetingTask(meeting_id=meeting.id, task_type=MeetingTaskType.TRACKING.value,
+                                    task_description=f'{meeting.subject}{i}', assigned_by_user_id=admin.id,
+                                    assigned_to_user_id=staff.id, controller_user_id=admin.id,
+                                    status=MeetingTaskStatus.IN_PROGRESS_TODO.value))
+    session.commit()
+    login(admin)
+
+    with count_queries() as statements:
+        full = client.get('/api/meeting_tasks_list').get_json()
+    # 任務 (JOIN 會議、名稱與討論議題) + 出席人員 + 履歷，不隨任務數增加
+    assert len(statements) == 3
+    assert full['next_cursor'] is None
+    assert [t['task_description'] for t in full['tasks']] == ['月會0', '月會1', '月會2', '週會0', '週會1', '週會2']
+    first = full['tasks'][0]
+    assert (first['chairman_name'], first['recorder_name'], first['assigned_to_name'], first['assigned_by_name'],
+            first['controller_name'], first['assigned_to_user_key'], first['controller_user_key']) == \
+        ('admin', 'staff', 'staff', 'admin', 'admin', 'staff', 'admin')
+    assert first['attendees_names'] == ['admin', 'staff'] and first['discussion_topic'] == 'N/A'
+    assert full['tasks'][-1]['discussion_topic'] == '議題'
+
+    pages, last = _walk(client, '/api/meeting_tasks_list', 4)
+    assert pages == [[t['id'] for t in full['tasks']][:4], [t['id'] for t in full['tasks']][4:]]
+
+    filtered = client.get('/api/meeting_tasks_list?meeting_topic=週會').get_json()
+    assert [t['task_description'] for t in filtered['tasks']] == ['週會0', '週會1', '週會2']
+    assert client.get('/api/meeting_tasks_list?cursor=bogus').status_code == 400
@@ -0,0 +1,154 @@
+"""
+週報排程測試
+
+確認 next_fire_at 的計算、排程工作閒置時只查詢一次、到期排程的驗證查詢次數
+不隨排程數增加，驗證失敗時稍後重試、發送後排到下週；
+以及單位人員快取只在使用者單位或啟用狀態變更時失效。
+"""
+from datetime import datetime, time, timedelta
+
+import pytest
+from pytz import timezone, utc
+
+import scheduler
+from app import app, User, Todo, ReportSchedule, CacheVersion
+from config import UserLevel, TodoStatus, TodoType, CacheVersionName, REPORT_SCHEDULE_RETRY_MINUTES
+from scheduler import check_and_trigger_reports, get_unit_user_ids
+from version_cache import current_version
+
+TAIPEI_TZ = timezone('Asia/Taipei')
+# 2026-10-23 (五) 16:00 台北
+FRIDAY_4PM = TAIPEI_TZ.localize(datetime(2026, 10, 23, 16, 0))
+
+
+def _naive_utc(dt):
+    return dt.astimezone(utc).replace(tzinfo=None)
+
+
+def test_next_fire_at():
+    schedule = ReportSchedule(schedule_day=4, schedule_time=time(17, 0))
+    assert schedule.compute_next_fire_at(FRIDAY_4PM) == _naive_utc(FRIDAY_4PM.replace(hour=17))
+    # 本週時間已過但尚未發送：現在就該發送
+    late = FRIDAY_4PM.replace(hour=18)
+    assert schedule.compute_next_fire_at(late) == _naive_utc(FRIDAY_4PM.replace(hour=17))
+    # 本週已發送：排到下週
+    schedule.last_sent_at = _naive_utc(FRIDAY_4PM.replace(hour=17, minute=1))
+    assert schedule.compute_next_fire_at(late) == _naive_utc(FRIDAY_4PM.replace(hour=17) + timedelta(days=7))
+
+
+@pytest.fixture
+def unit_cache():
+    # 每個測試都重建資料表，版本號會從頭開始，需清除程序內快取
+    scheduler._unit_user_ids_cache.clear()
+    yield
+    scheduler._unit_user_ids_cache.clear()
+
+
+@pytest.fixture
+def generated(monkeypatch, unit_cache):
+    calls = []
+    monkeypatch.setattr(scheduler, 'generate_and_send_weekly_report',
+                        lambda app, db, User, Todo, ReportSchedule, schedule_id: calls.append(schedule_id))
+    return calls
+
+
+def _seed_units(session, units):
+    manager = User(user_key='mgr', name='經理', role='經理', department='第一廠', unit='廠部',
+                   level=UserLevel.MANAGER.value, avatar='👔', email='mgr@example.com', password_hash='x')
+    session.add(manager)
+    staff = {}
+    for unit in units:
+        user = User(user_key=f'staff-{unit}', name=unit, role='作業員', department='第一廠', unit=unit,
+                    level=UserLevel.STAFF.value, avatar='👷', email=f'{unit}@example.com', password_hash='x')
+        session.add(user)
+        staff[unit] = user
+    session.commit()
+    return manager, staff
+
+
+def _schedule(manager, unit, fire_at, **overrides):
+    fields = dict(manager_id=manager.id, department=unit, schedule_day=fire_at.astimezone(TAIPEI_TZ).weekday(),
+                  schedule_time=fire_at.astimezone(TAIPEI_TZ).time().replace(second=0, microsecond=0),
+                  next_fire_at=_naive_utc(fire_at))
+    fields.update(overrides)
+    return ReportSchedule(**fields)
+
+
+def test_idle_run_is_one_query(app_db, generated, count_queries):
+    manager, _ = _seed_units(app_db.session, ['裝一課'])
+    app_db.session.add(_schedule(manager, '裝一課', datetime.now(utc) + timedelta(days=2)))
+    app_db.session.commit()
+
+    with count_queries() as statements:
+        check_and_trigger_reports(app, app_db, User, Todo, ReportSchedule, CacheVersion)
+    assert len(statements) == 1
+    assert generated == []
+
+
+@pytest.mark.parametrize('unit_count', [2, 12])
+def test_due_schedules_validate_with_constant_queries(app_db, generated, count_queries, unit_count):
+    units = [f'課{i}' for i in range(unit_count)]
+    manager, staff = _seed_units(app_db.session, units)
+    now = datetime.now(utc)
+    next_monday = now.astimezone(TAIPEI_TZ).date() + timedelta(days=7 - now.astimezone(TAIPEI_TZ).weekday())
+    for unit in units:
+        app_db.session.add(_schedule(manager, unit, now - timedelta(minutes=1), require_next_week_tasks=True))
+        app_db.session.add(Todo(user_id=staff[unit].id, title='下週', description='描述', status=TodoStatus.PENDING.value,
+                                todo_type=TodoType.NEXT.value,
+                                due_date=TAIPEI_TZ.localize(datetime.combine(next_monday, time(12, 0)))))
+    app_db.session.commit()
+
+    with count_queries() as statements:
+        check_and_trigger_reports(app, app_db, User, Todo, ReportSchedule, CacheVersion)
+    # 排程、快取版本、單位人員、逾期與下週任務各一次
+    assert len(statements) == 5
+    assert len(generated) == unit_count
+
+    app_db.session.expire_all()
+    for schedule in ReportSchedule.query:
+        assert schedule.last_sent_at is not None
+        assert utc.localize(schedule.next_fire_at) > now + timedelta(days=6)
+
+
+def test_failed_validation_retries_later(app_db, generated):
+    manager, staff = _seed_units(app_db.session, ['裝一課', '裝二課'])
+    now = datetime.now(utc)
+    overdue = _schedule(manager, '裝一課', now - timedelta(minutes=1))
+    no_plan = _schedule(manager, '裝二課', now - timedelta(minutes=1), require_next_week_tasks=True)
+    app_db.session.add_all([overdue, no_plan])
+    app_db.session.add(Todo(user_id=staff['裝一課'].id, title='逾期', description='描述', status=TodoStatus.PENDING.value,
+                            todo_type=TodoType.CURRENT.value, due_date=now - timedelta(days=10)))
+    app_db.session.commit()
+
+    check_and_trigger_reports(app, app_db, User, Todo, ReportSchedule, CacheVersion)
+    assert generated == []
+    app_db.session.expire_all()
+    for schedule in (overdue, no_plan):
+        assert schedule.last_sent_at is None
+        retry_at = utc.localize(schedule.next_fire_at)
+        if retry_at.astimezone(TAIPEI_TZ).date() == now.astimezone(TAIPEI_TZ).date():
+            assert retry_at - now <= timedelta(minutes=REPORT_SCHEDULE_RETRY_MINUTES, seconds=5)
+        else:
+            # 當天已無法重試，排到下一次
+            assert retry_at - now > timedelta(days=6)
+
+
+def test_unit_cache_invalidated_by_unit_change_only(app_db, unit_cache, count_queries):
+    _, staff = _seed_units(app_db.session, ['裝一課'])
+    name = CacheVersionName.USER_DIRECTORY.value
+    version = current_version(app_db, CacheVersion, name)
+    assert get_unit_user_ids(app_db, User, CacheVersion)['裝一課'] == [staff['裝一課'].id]
+
+    # 與單位無關的欄位變更不會使快取失效
+    staff['裝一課'].failed_login_attempts = 3
+    app_db.session.commit()
+    assert current_version(app_db, CacheVersion, name) == version
+    with count_queries() as statements:
+        get_unit_user_ids(app_db, User, CacheVersion)
+    assert len(statements) == 1
+
+    staff['裝一課'].unit = '裝二課'
+    app_db.session.commit()
+    assert current_version(app_db, CacheVersion, name) == version + 1
+    unit_user_ids = get_unit_user_ids(app_db, User, CacheVersion)
+    assert '裝一課' not in unit_user_ids and unit_user_ids['裝二課'] == [staff['裝一課'].id]
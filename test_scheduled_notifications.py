@@ -0,0 +1,156 @@
+"""
+使用者自訂定時通知測試
+
+確認 next_fire_at 在建立、編輯與發送後重新計算，排程工作只處理到期的通知，
+收件人以單一 IN 查詢取得，且查詢次數不隨通知或收件人數增加。
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from pytz import timezone, utc
+
+import scheduler
+from app import app, app_scheduler, User, ScheduledNotification
+from config import UserLevel, SCHEDULED_NOTIFICATION_GRACE_MINUTES
+from scheduler import check_scheduled_notifications, wake_scheduled_notifications, SCHEDULED_NOTIFICATIONS_JOB_ID
+
+TAIPEI_TZ = timezone('Asia/Taipei')
+# 2026-10-19 (一) 08:00 台北
+MONDAY_8AM = TAIPEI_TZ.localize(datetime(2026, 10, 19, 8, 0))
+
+
+def _notification(**overrides):
+    fields = dict(user_id=1, title='週報提醒', body='請填寫週報', recipient_user_ids='1',
+                  schedule_type='weekly', specific_time=time(9, 0), weekly_day=0, is_active=True)
+    fields.update(overrides)
+    return ScheduledNotification(**fields)
+
+
+def _naive_utc(dt):
+    return dt.astimezone(utc).replace(tzinfo=None)
+
+
+def test_weekly_next_fire_at():
+    notification = _notification()
+    assert notification.compute_next_fire_at(MONDAY_8AM) == _naive_utc(MONDAY_8AM.replace(hour=9))
+    # 本週時間已過，排到下週
+    after = MONDAY_8AM.replace(hour=9, minute=1)
+    assert notification.compute_next_fire_at(after) == _naive_utc(MONDAY_8AM.replace(hour=9) + timedelta(days=7))
+    notification.weekly_day = 4
+    assert notification.compute_next_fire_at(MONDAY_8AM) == _naive_utc(MONDAY_8AM.replace(hour=9) + timedelta(days=4))
+
+
+def test_one_time_next_fire_at():
+    notification = _notification(schedule_type='one_time', weekly_day=None, specific_date=date(2026, 10, 19))
+    fire_at = _naive_utc(MONDAY_8AM.replace(hour=9))
+    assert notification.compute_next_fire_at(MONDAY_8AM) == fire_at
+    # 寬限時間內仍可發送，超過即不再發送
+    assert notification.compute_next_fire_at(MONDAY_8AM.replace(hour=9, minute=SCHEDULED_NOTIFICATION_GRACE_MINUTES)) == fire_at
+    assert notification.compute_next_fire_at(MONDAY_8AM.replace(hour=10)) is None
+    notification.last_sent_at = fire_at
+    assert notification.compute_next_fire_at(MONDAY_8AM) is None
+
+
+@pytest.fixture
+def users(app_db):
+    created = []
+    for i in range(4):
+        user = User(user_key=f'u{i}', name=f'使用者{i}', role='課長', department='第一廠', unit='裝一課',
+                    level=UserLevel.SECTION_CHIEF.value if i == 0 else UserLevel.STAFF.value, avatar='👷',
+                    email=f'u{i}@example.com', notification_enabled=(i != 3))
+        user.set_password('password123')
+        created.append(user)
+    app_db.session.add_all(created)
+    app_db.session.commit()
+    return created
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    calls = []
+
+    def fake_send(subject, body, mail_to, mail_cc=""):
+        calls.append((subject, mail_to))
+        return True, "郵件發送成功"
+    monkeypatch.setattr(scheduler, 'send_mail', fake_send)
+    return calls
+
+
+def test_create_sets_next_fire_at(client, users):
+    with client.session_transaction() as sess:
+        sess['user_id'] = users[0].id
+    response = client.post('/scheduled-notifications', data={
+        'title': '週會', 'body': '內容', 'recipient_user_ids': [str(users[1].id)],
+        'schedule_type': 'weekly', 'weekly_day': '2', 'specific_time': '09:30',
+    })
+    assert response.status_code == 302
+    notification = ScheduledNotification.query.one()
+    assert notification.next_fire_at is not None
+    fire_at = utc.localize(notification.next_fire_at).astimezone(TAIPEI_TZ)
+    assert (fire_at.weekday(), fire_at.hour, fire_at.minute) == (2, 9, 30)
+
+
+def test_job_sends_only_due_notifications(app_db, users, sent, count_queries):
+    now = datetime.now(utc)
+    recipients = ','.join(str(user.id) for user in users)
+    due_weekly = _notification(recipient_user_ids=recipients, next_fire_at=_naive_utc(now - timedelta(minutes=1)))
+    due_once = _notification(title='一次性', schedule_type='one_time', weekly_day=None,
+                             specific_date=(now - timedelta(minutes=1)).astimezone(TAIPEI_TZ).date(),
+                             specific_time=(now - timedelta(minutes=1)).astimezone(TAIPEI_TZ).time().replace(microsecond=0),
+                             recipient_user_ids=str(users[1].id), next_fire_at=_naive_utc(now - timedelta(minutes=1)))
+    later = _notification(title='未到期', next_fire_at=_naive_utc(now + timedelta(hours=1)))
+    inactive = _notification(title='停用', is_active=False, next_fire_at=_naive_utc(now - timedelta(minutes=1)))
+    app_db.session.add_all([due_weekly, due_once, later, inactive])
+    app_db.session.commit()
+
+    with count_queries() as statements:
+        check_scheduled_notifications(app, app_db, User, ScheduledNotification)
+    # 到期通知、收件人 IN 查詢、下一次發送時間各一次
+    assert len(statements) == 3
+
+    assert sorted(sent) == [
+        ('【任務系統定時通知】一次性', 'u1@example.com'),
+        ('【任務系統定時通知】週報提醒', 'u0@example.com;u1@example.com;u2@example.com'),
+    ]
+    app_db.session.expire_all()
+    assert due_once.next_fire_at is None and due_once.last_sent_at is not None
+    assert utc.localize(due_weekly.next_fire_at) > now
+    assert later.last_sent_at is None and inactive.last_sent_at is None
+
+
+def test_missed_notification_is_skipped(app_db, users, sent):
+    long_ago = datetime.now(utc) - timedelta(minutes=SCHEDULED_NOTIFICATION_GRACE_MINUTES + 10)
+    notification = _notification(next_fire_at=_naive_utc(long_ago))
+    app_db.session.add(notification)
+    app_db.session.commit()
+
+    check_scheduled_notifications(app, app_db, User, ScheduledNotification)
+    assert sent == []
+    app_db.session.expire_all()
+    assert utc.localize(notification.next_fire_at) > datetime.now(utc)
+
+
+def test_failed_send_keeps_next_fire_at(app_db, users, monkeypatch):
+    monkeypatch.setattr(scheduler, 'send_mail', lambda *args, **kwargs: (False, "連線錯誤"))
+    fire_at = _naive_utc(datetime.now(utc) - timedelta(minutes=1))
+    notification = _notification(next_fire_at=fire_at)
+    app_db.session.add(notification)
+    app_db.session.commit()
+
+    check_scheduled_notifications(app, app_db, User, ScheduledNotification)
+    app_db.session.expire_all()
+    assert notification.next_fire_at == fire_at
+    assert notification.last_sent_at is None
+
+
+def test_wake_moves_job_earlier_only():
+    job = app_scheduler.get_job(SCHEDULED_NOTIFICATIONS_JOB_ID)
+    original = job.next_run_time
+    try:
+        earlier = min(original, datetime.now(utc) + timedelta(minutes=30)) - timedelta(seconds=1)
+        wake_scheduled_notifications(earlier)
+        assert app_scheduler.get_job(SCHEDULED_NOTIFICATIONS_JOB_ID).next_run_time == earlier
+        wake_scheduled_notifications(earlier + timedelta(hours=5))
+        assert app_scheduler.get_job(SCHEDULED_NOTIFICATIONS_JOB_ID).next_run_time == earlier
+    finally:
+        app_scheduler.modify_job(SCHEDULED_NOTIFICATIONS_JOB_ID, next_run_time=original)
@@ -0,0 +1,97 @@
+"""
+排程資料庫儲存測試
+
+確認排程以可序列化的 run_scheduled_job(job_id) 存入資料庫，重新啟動註冊時保留既有的
+下次執行時間，錯過的執行在寬限時間內合併補跑一次，並移除已不存在的排程。
+"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from pytz import utc
+
+import scheduler as scheduler_module
+from scheduler import register_jobs, run_scheduled_job, ARCHIVE_JOB_NAME
+
+
+@pytest.fixture
+def make_scheduler(tmp_path):
+    url = f"sqlite:///{tmp_path / 'jobs.db'}"
+    started = []
+
+    def _make():
+        sched = BackgroundScheduler(jobstores={'default': SQLAlchemyJobStore(url=url)})
+        sched.start(paused=True)
+        started.append(sched)
+        return sched
+    yield _make
+    for sched in started:
+        if sched.running:
+            # 先移除排程，避免 shutdown 喚醒主迴圈時送出已到期的工作
+            sched.remove_all_jobs()
+            sched.shutdown(wait=False)
+
+
+def test_jobs_are_stored_by_reference(make_scheduler):
+    sched = make_scheduler()
+    register_jobs(sched)
+    jobs = {job.id: job for job in sched.get_jobs()}
+    assert set(jobs) == {job.id for job in scheduler_module._scheduled_jobs()}
+    archive = jobs[ARCHIVE_JOB_NAME]
+    assert archive.func is run_scheduled_job and archive.args == (ARCHIVE_JOB_NAME,)
+    assert archive.coalesce and archive.misfire_grace_time == 6 * 24 * 3600
+
+
+def test_restart_keeps_next_run_time(make_scheduler):
+    first = make_scheduler()
+    register_jobs(first)
+    missed_at = datetime.now(utc).replace(microsecond=0) - timedelta(minutes=10)
+    first.modify_job(ARCHIVE_JOB_NAME, next_run_time=missed_at)
+    first.add_job(print, 'interval', hours=1, id='removed_job')
+
+    # 另一個程序以同一個資料庫儲存重新註冊
+    second = make_scheduler()
+    register_jobs(second)
+    assert second.get_job(ARCHIVE_JOB_NAME).next_run_time == missed_at
+    assert second.get_job('removed_job') is None
+
+
+def test_changed_trigger_is_rescheduled(make_scheduler, monkeypatch):
+    sched = make_scheduler()
+    register_jobs(sched)
+    original = scheduler_module._scheduled_jobs
+
+    def moved():
+        from apscheduler.triggers.cron import CronTrigger
+        jobs = original()
+        return [job._replace(trigger=CronTrigger(day_of_week='tue', hour=1, minute=0, timezone='Asia/Taipei'))
+                if job.id == ARCHIVE_JOB_NAME else job for job in jobs]
+    monkeypatch.setattr(scheduler_module, '_scheduled_jobs', moved)
+    register_jobs(sched)
+    next_run = sched.get_job(ARCHIVE_JOB_NAME).next_run_time
+    assert (next_run.weekday(), next_run.hour) == (1, 1)
+
+
+def test_missed_run_is_caught_up_once(make_scheduler, monkeypatch):
+    calls = []
+    done = threading.Event()
+
+    def fake_run(app, db, JobRun, job_id, func, *args):
+        calls.append(job_id)
+        done.set()
+    monkeypatch.setattr(scheduler_module, 'run_tracked_job', fake_run)
+    monkeypatch.setattr(scheduler_module, '_job_context', {name: None for name in (
+        'app', 'db', 'JobRun', 'Todo', 'ArchivedTodo', 'TodoEvent', 'JobCheckpoint', 'UserTaskCounter', 'MeetingTask')})
+
+    sched = make_scheduler()
+    register_jobs(sched)
+    # 停機期間錯過了兩次 (例如兩週)，只補跑一次
+    sched.modify_job(ARCHIVE_JOB_NAME, next_run_time=datetime.now(utc) - timedelta(days=8))
+    sched.modify_job(ARCHIVE_JOB_NAME, next_run_time=datetime.now(utc) - timedelta(hours=2))
+    sched.resume()
+    assert done.wait(5)
+    sched.pause()
+    assert calls == [ARCHIVE_JOB_NAME]
+    assert sched.get_job(ARCHIVE_JOB_NAME).next_run_time > datetime.now(utc)
@@ -0,0 +1,136 @@
+"""
+排程器租約測試
+
+確認同一時間只有一個程序持有租約並執行排程工作，持有者續約不會被搶走，
+租約過期或釋放後由其他程序接手，原持有者隨即暫停排程器。
+"""
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+
+from app import app, SchedulerLease
+from scheduler_lease import SchedulerLeader, acquire_lease, release_lease
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.paused = True
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+
+@pytest.fixture
+def leaders(app_db):
+    created = [SchedulerLeader(app, app_db, SchedulerLease, FakeScheduler(), name='test', ttl_seconds=60)
+               for _ in range(3)]
+    return created
+
+
+def _expire(app_db, name='test'):
+    lease = app_db.session.get(SchedulerLease, name)
+    lease.expires_at = datetime.now(utc) - timedelta(seconds=1)
+    app_db.session.commit()
+
+
+def test_only_one_holder(app_db):
+    assert acquire_lease(app_db, SchedulerLease, 'test', 'a')
+    assert not acquire_lease(app_db, SchedulerLease, 'test', 'b')
+    # 持有者續約
+    assert acquire_lease(app_db, SchedulerLease, 'test', 'a')
+    assert not acquire_lease(app_db, SchedulerLease, 'test', 'b')
+    assert app_db.session.get(SchedulerLease, 'test').holder == 'a'
+
+
+def test_expired_lease_is_taken_over(app_db):
+    assert acquire_lease(app_db, SchedulerLease, 'test', 'a')
+    _expire(app_db)
+    assert acquire_lease(app_db, SchedulerLease, 'test', 'b')
+    assert not acquire_lease(app_db, SchedulerLease, 'test', 'a')
+
+
+def test_release_hands_over_immediately(app_db):
+    assert acquire_lease(app_db, SchedulerLease, 'test', 'a')
+    release_lease(app_db, SchedulerLease, 'test', 'b')  # 非持有者不能釋放
+    assert not acquire_lease(app_db, SchedulerLease, 'test', 'b')
+    release_lease(app_db, SchedulerLease, 'test', 'a')
+    assert acquire_lease(app_db, SchedulerLease, 'test', 'b')
+
+
+def test_single_leader_resumes_jobs(leaders):
+    assert [leader.tick() for leader in leaders] == [True, False, False]
+    assert [leader.scheduler.paused for leader in leaders] == [False, True, True]
+    # 之後的心跳維持不變
+    assert [leader.tick() for leader in leaders] == [True, False, False]
+
+
+def test_takeover_pauses_previous_leader(app_db, leaders):
+    first, second, _ = leaders
+    first.tick()
+    _expire(app_db)
+
+    assert second.tick()
+    assert not second.scheduler.paused
+    # 原持有者下次心跳發現租約已被接手，立即暫停
+    assert not first.tick()
+    assert first.scheduler.paused and not first.is_leader
+
+
+def test_stop_releases_lease(leaders):
+    first, second, _ = leaders
+    first.tick()
+    first.stop()
+    assert first.scheduler.paused
+    assert second.tick()
+
+
+def test_heartbeat_callback_runs_only_on_leader(leaders):
+    calls = []
+    for leader in leaders:
+        leader.on_heartbeat = lambda leader=leader: calls.append(leader.holder)
+        leader.tick()
+    assert calls == [leaders[0].holder]
+
+
+def test_health_reports_lease_heartbeat(client, app_db, monkeypatch):
+    import app as app_module
+    from config import SCHEDULER_LEASE_NAME
+    monkeypatch.setattr(app_module, 'scheduler_leader_election', True)
+
+    assert client.get('/health/scheduler').status_code == 503
+    assert acquire_lease(app_db, SchedulerLease, SCHEDULER_LEASE_NAME, 'worker-1')
+    response = client.get('/health/scheduler')
+    assert response.status_code == 200
+    assert response.get_json()['healthy'] and response.get_json()['holder'] == 'worker-1'
+
+    _expire(app_db, SCHEDULER_LEASE_NAME)
+    response = client.get('/health/scheduler')
+    assert response.status_code == 503 and not response.get_json()['healthy']
+
+
+def test_web_mode_does_not_start_scheduler():
+    env = dict(os.environ, SCHEDULER_MODE='web', DATABASE_URL='sqlite://', MAIL_OUTBOX_WORKERS='0')
+    result = subprocess.run(
+        [sys.executable, '-c', 'import app; print(app.app_scheduler is None)'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.stdout.strip().splitlines()[-1] == 'True'
+
+
+def test_flask_cli_does_not_start_scheduler():
+    # flask CLI 會設定 FLASK_RUN_FROM_CLI；未設定 SCHEDULER_MODE 時不啟動排程器、lease 與郵件 worker
+    env = {key: value for key, value in os.environ.items() if key not in ('SCHEDULER_MODE', 'MAIL_OUTBOX_WORKERS')}
+    env.update(FLASK_RUN_FROM_CLI='true', DATABASE_URL='sqlite://')
+    result = subprocess.run(
+        [sys.executable, '-c',
+         'import app, mail_outbox; print(app.app_scheduler is None and mail_outbox._worker_pool is None)'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.stdout.strip().splitlines()[-1] == 'True'
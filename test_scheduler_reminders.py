@@ -0,0 +1,149 @@
+"""
+晨間提醒排程測試
+
+確認到期與逾期提醒以單一排序查詢取得所有使用者的任務，
+查詢次數不隨使用者人數增加，且每位使用者只產生一封內容正確的通知；
+會議任務提醒一次載入會議、主席與相關使用者，查詢次數不隨待處理任務數增加。
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+
+from app import app, User, Todo, Meeting, MeetingTask, MailOutbox
+from config import UserLevel, TodoStatus, TodoType, MeetingTaskStatus, MeetingTaskType
+from scheduler import (
+    check_due_today_tasks, check_overdue_tasks, check_unassigned_meeting_tasks, check_unagreed_resolution_items
+)
+
+
+def _seed_users(session, count, tasks_per_user):
+    today_noon = datetime.now(utc).replace(hour=4, minute=0, second=0, microsecond=0)  # 台北 12:00
+    users = []
+    for i in range(count):
+        user = User(
+            user_key=f'staff{i}', name=f'員工{i}', role='作業員', department='第一廠', unit='裝一課',
+            level=UserLevel.STAFF.value, avatar='👷', email=f'staff{i}@example.com', password_hash='x',
+            notification_enabled=True
+        )
+        session.add(user)
+        users.append(user)
+    muted = User(
+        user_key='muted', name='關閉通知', role='作業員', department='第一廠', unit='裝一課',
+        level=UserLevel.STAFF.value, avatar='👷', email='muted@example.com', password_hash='x',
+        notification_enabled=False
+    )
+    session.add(muted)
+    session.flush()
+
+    for user in users + [muted]:
+        for j in range(tasks_per_user):
+            for title, due, status in [
+                (f'今日{j}', today_noon, TodoStatus.PENDING.value),
+                (f'逾期{j}', today_noon - timedelta(days=j + 1), TodoStatus.IN_PROGRESS.value),
+                (f'已完成{j}', today_noon, TodoStatus.COMPLETED.value),
+            ]:
+                session.add(Todo(
+                    user_id=user.id, title=title, description='描述', status=status,
+                    todo_type=TodoType.CURRENT.value, due_date=due
+                ))
+    session.commit()
+    return users
+
+
+@pytest.mark.parametrize('job, prefix', [
+    (check_due_today_tasks, '【今日任務提醒】您有 2 項任務今日到期！'),
+    (check_overdue_tasks, '【逾期任務提醒】您有 2 項任務已逾期！'),
+])
+def test_one_notification_per_user(app_db, job, prefix):
+    users = _seed_users(app_db.session, 3, 2)
+
+    job(app, app_db, User, Todo, MailOutbox)
+
+    queued = MailOutbox.query.order_by(MailOutbox.mail_to).all()
+    assert [row.mail_to for row in queued] == sorted(user.email for user in users)
+    assert {row.subject for row in queued} == {prefix}
+    assert '已完成' not in queued[0].body
+    assert queued[0].body.startswith('您好 員工0，')
+
+
+@pytest.mark.parametrize('job', [check_due_today_tasks, check_overdue_tasks])
+def test_query_count_is_constant(app_db, count_queries, job):
+    _seed_users(app_db.session, 2, 1)
+    with count_queries() as few:
+        job(app, app_db, User, Todo, MailOutbox)
+
+    MailOutbox.query.delete()
+    app_db.session.commit()
+    for i in range(2, 25):
+        app_db.session.add(User(
+            user_key=f'extra{i}', name=f'加{i}', role='作業員', department='第一廠', unit='裝一課',
+            level=UserLevel.STAFF.value, avatar='👷', email=f'extra{i}@example.com', password_hash='x'
+        ))
+    app_db.session.commit()
+    for user in User.query.filter(User.user_key.like('extra%')):
+        app_db.session.add(Todo(
+            user_id=user.id, title='任務', description='描述', status=TodoStatus.PENDING.value,
+            todo_type=TodoType.CURRENT.value, due_date=datetime.now(utc) - timedelta(days=2)
+        ))
+        app_db.session.add(Todo(
+            user_id=user.id, title='任務', description='描述', status=TodoStatus.PENDING.value,
+            todo_type=TodoType.CURRENT.value, due_date=datetime.now(utc).replace(hour=4, minute=0)
+        ))
+    app_db.session.commit()
+
+    with count_queries() as many:
+        job(app, app_db, User, Todo, MailOutbox)
+    assert MailOutbox.query.count() > 2
+    assert len(many) == len(few) == 1
+
+
+def _seed_meeting_tasks(session, count):
+    admin = User(user_key='chair', name='主席', role='經理', department='第一廠', unit='裝一課',
+                 level=UserLevel.MANAGER.value, avatar='👔', email='chair@example.com', password_hash='x')
+    session.add(admin)
+    session.flush()
+    past = datetime.now(utc) - timedelta(days=2)
+    meeting = Meeting(subject='週會', meeting_date=past, chairman_user_id=admin.id)
+    session.add(meeting)
+    session.flush()
+
+    for i in range(count):
+        assignee = User(user_key=f'mt{i}', name=f'負責{i}', role='作業員', department='第一廠', unit='裝一課',
+                        level=UserLevel.STAFF.value, avatar='👷', email=f'mt{i}@example.com', password_hash='x')
+        controller = User(user_key=f'ctl{i}', name=f'管制{i}', role='課長', department='第一廠', unit='裝一課',
+                          level=UserLevel.SECTION_CHIEF.value, avatar='👷', email=f'ctl{i}@example.com', password_hash='x')
+        session.add_all([assignee, controller])
+        session.flush()
+        common = dict(meeting_id=meeting.id, assigned_by_user_id=admin.id, assigned_to_user_id=assignee.id,
+                      controller_user_id=controller.id, expected_completion_date=past)
+        session.add(MeetingTask(task_type=MeetingTaskType.TRACKING.value, task_description=f'追蹤{i}',
+                                status=MeetingTaskStatus.UNASSIGNED.value, **common))
+        session.add(MeetingTask(task_type=MeetingTaskType.RESOLUTION.value, task_description=f'決議{i}',
+                                status=MeetingTaskStatus.RESOLVED_EXECUTING.value, **common))
+    session.commit()
+    # 清空 identity map，確保關聯物件需由查詢載入
+    session.expunge_all()
+
+
+@pytest.mark.parametrize('job, subject_prefix', [
+    (check_unassigned_meeting_tasks, '【未指派會議任務提醒】'),
+    (check_unagreed_resolution_items, '【未同意決議提醒】'),
+])
+@pytest.mark.parametrize('task_count', [2, 20])
+def test_meeting_task_reminders_use_constant_queries(app_db, count_queries, job, subject_prefix, task_count):
+    _seed_meeting_tasks(app_db.session, task_count)
+
+    with count_queries() as statements:
+        job(app, app_db, User, MeetingTask, Meeting, MailOutbox)
+    assert len(statements) == 1
+
+    # 彙整通知每位收件人一筆：負責人與副本的管制者
+    queued = MailOutbox.query.order_by(MailOutbox.id).all()
+    assert len(queued) == task_count * 2
+    assert all(row.subject.startswith(subject_prefix) for row in queued)
+    assert [(row.mail_to, row.mail_cc) for row in queued[:2]] == [('mt0@example.com', ''), ('ctl0@example.com', '')]
+    if job is check_unassigned_meeting_tasks:
+        assert '主席: 主席' in queued[0].body and '創建者: 主席' in queued[0].body
+    else:
+        assert '負責人員: 負責0' in queued[0].body
@@ -0,0 +1,276 @@
+"""
+TodoEvent 履歷事件測試
+
+確認狀態變更只新增事件列、會同步到關聯的 MeetingTask，
+使用者面板只回傳履歷筆數，完整履歷由游標分頁的履歷 API 載入，且歸檔時履歷會轉移到 ArchivedTodo；
+歸檔分批提交，中斷後從檢查點繼續且不會重複歸檔；刪除會議任務來的 Todo 時會清除 MeetingTask 的連結；刪除使用者時其任務履歷一併刪除。
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+from sqlalchemy import event
+
+from app import app, User, Todo, ArchivedTodo, Meeting, MeetingTask, TodoEvent, JobCheckpoint, UserTaskCounter
+from config import UserLevel, TodoStatus, TodoType, MeetingTaskStatus, MeetingTaskType, HistoryEntityType
+from scheduler import transfer_and_archive_todos, archive_completed_todos, ARCHIVE_JOB_NAME
+
+
+@pytest.fixture
+def user(app_db):
+    user = User(
+        user_key='staff_test', name='測試員', role='作業員', department='第一廠', unit='裝一課',
+        level=UserLevel.STAFF.value, avatar='👷', email='staff.test@example.com', notification_enabled=False
+    )
+    user.set_password('password123')
+    app_db.session.add(user)
+    app_db.session.commit()
+    return user
+
+
+@pytest.fixture
+def logged_in(client, user):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    return client
+
+
+def _add_todo(client, **overrides):
+    payload = {
+        'title': '測試任務',
+        'description': '描述',
+        'type': TodoType.CURRENT.value,
+        'due_date': (datetime.now(utc) + timedelta(days=1)).date().isoformat(),
+    }
+    payload.update(overrides)
+    response = client.post('/api/todo', json=payload)
+    assert response.status_code == 200
+    return response.get_json()['id']
+
+
+def test_status_changes_append_events(logged_in, app_db):
+    todo_id = _add_todo(logged_in)
+
+    response = logged_in.put(f'/api/todo/{todo_id}/status', json={'status': TodoStatus.IN_PROGRESS.value})
+    assert response.status_code == 200
+
+    history = TodoEvent.history_for(HistoryEntityType.TODO, todo_id)
+    assert [entry['event_type'] for entry in history] == ['assigned', 'status_changed']
+    assert history[1]['details'] == {'old_status': TodoStatus.PENDING.value, 'new_status': TodoStatus.IN_PROGRESS.value}
+    assert history[1]['actor']['user_key'] == 'staff_test'
+    assert app_db.session.get(Todo, todo_id).history_log is None
+
+    # 分頁讀取
+    assert [e['event_type'] for e in TodoEvent.history_for(HistoryEntityType.TODO, todo_id, limit=1, offset=1)] == ['status_changed']
+
+
+def test_user_detail_returns_history_count(logged_in, count_queries):
+    todo_id = _add_todo(logged_in)
+    logged_in.put(f'/api/todo/{todo_id}/status', json={'status': TodoStatus.COMPLETED.value})
+
+    with count_queries() as statements:
+        data = logged_in.get('/api/user/staff_test').get_json()
+    todo = data['todos']['current'][0]
+    assert todo['history_count'] == 2 and 'history_log' not in todo
+    # 只計算筆數，不載入事件內容
+    assert not any('todo_event.details' in statement for statement in statements)
+
+
+def test_history_endpoint_pages_with_cursor(logged_in, app_db):
+    todo_id = _add_todo(logged_in)
+    # 同一時間的事件依 id 排序，分頁不會重複或遺漏
+    same_time = datetime.now(utc)
+    for i in range(4):
+        TodoEvent.record(HistoryEntityType.TODO, todo_id, 'status_changed', details={'n': i}, timestamp=same_time)
+    app_db.session.commit()
+
+    pages = []
+    cursor = None
+    while True:
+        query = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+        data = logged_in.get(f'/api/todo/{todo_id}/history', query_string=query).get_json()
+        pages.append([entry['event_type'] for entry in data['history']])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert pages == [['assigned', 'status_changed'], ['status_changed'] * 2, ['status_changed']]
+    datetime.fromisoformat(data['history'][0]['timestamp'])
+
+    assert logged_in.get(f'/api/todo/{todo_id}/history?cursor=garbage').status_code == 400
+    assert logged_in.get(f'/api/todo/{todo_id}/history?limit=0').status_code == 400
+
+
+def test_history_endpoint_requires_access(client, user, app_db):
+    other = User(user_key='other', name='他人', role='作業員', department='第三廠', unit='裝三課',
+                 level=UserLevel.STAFF.value, avatar='👷', email='other@example.com', password_hash='x')
+    app_db.session.add(other)
+    app_db.session.commit()
+    todo = Todo(user_id=user.id, title='t', description='d', status=TodoStatus.PENDING.value,
+                todo_type=TodoType.CURRENT.value, due_date=datetime.now(utc))
+    app_db.session.add(todo)
+    app_db.session.commit()
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = other.id
+    assert client.get(f'/api/todo/{todo.id}/history').status_code == 403
+
+
+def test_meeting_task_receives_mirrored_events(logged_in, user, app_db):
+    meeting = Meeting(subject='週會', meeting_date=datetime.now(utc), chairman_user_id=user.id)
+    app_db.session.add(meeting)
+    app_db.session.flush()
+    meeting_task = MeetingTask(
+        meeting_id=meeting.id, task_type=MeetingTaskType.TRACKING.value, task_description='追蹤',
+        assigned_by_user_id=user.id, assigned_to_user_id=user.id, status=MeetingTaskStatus.ASSIGNED.value
+    )
+    app_db.session.add(meeting_task)
+    app_db.session.commit()
+    todo_id = _add_todo(logged_in)
+    todo = app_db.session.get(Todo, todo_id)
+    todo.meeting_task_id = meeting_task.id
+    app_db.session.commit()
+
+    new_due_date = (datetime.now(utc) + timedelta(days=7)).isoformat()
+    response = logged_in.put(f'/api/todo/{todo_id}/status', json={
+        'status': TodoStatus.UNCOMPLETED.value, 'uncompleted_reason': '缺料', 'new_due_date': new_due_date
+    })
+    assert response.status_code == 200
+
+    todo_history = TodoEvent.history_for(HistoryEntityType.TODO, todo_id)
+    task_history = TodoEvent.history_for(HistoryEntityType.MEETING_TASK, meeting_task.id)
+    assert [e['event_type'] for e in task_history] == ['due_date_changed', 'status_changed']
+    assert task_history == todo_history[1:]
+
+
+def test_archive_moves_history_to_archived_todo(logged_in, app_db):
+    todo_id = _add_todo(logged_in)
+    logged_in.put(f'/api/todo/{todo_id}/status', json={'status': TodoStatus.COMPLETED.value})
+
+    transfer_and_archive_todos(app, app_db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask)
+
+    archived = ArchivedTodo.query.filter_by(original_todo_id=todo_id).one()
+    assert archived.completed_at is not None
+    assert TodoEvent.history_for(HistoryEntityType.TODO, todo_id) == []
+    history = TodoEvent.history_for(HistoryEntityType.ARCHIVED_TODO, archived.id)
+    assert [e['event_type'] for e in history] == ['assigned', 'status_changed', 'archived']
+
+
+def _seed_completed(app_db, user, general, from_meeting):
+    ids = []
+    for i in range(general + from_meeting):
+        todo = Todo(user_id=user.id, title=f'完成{i}', description='描述', status=TodoStatus.COMPLETED.value,
+                    todo_type=TodoType.CURRENT.value, due_date=datetime.now(utc),
+                    meeting_task_id=1 if i >= general else None)
+        app_db.session.add(todo)
+        app_db.session.flush()
+        TodoEvent.record(HistoryEntityType.TODO, todo.id, 'assigned')
+        ids.append(todo.id)
+    app_db.session.add(Todo(user_id=user.id, title='進行中', description='描述', status=TodoStatus.IN_PROGRESS.value,
+                            todo_type=TodoType.CURRENT.value, due_date=datetime.now(utc)))
+    app_db.session.commit()
+    return ids
+
+
+def test_archive_runs_in_chunks(app_db, user):
+    ids = _seed_completed(app_db, user, general=7, from_meeting=2)
+
+    assert archive_completed_todos(app_db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, 'w1', chunk_size=3) == (7, 2)
+
+    assert [todo.title for todo in Todo.query.all()] == ['進行中']
+    archived = ArchivedTodo.query.order_by(ArchivedTodo.id).all()
+    assert [row.original_todo_id for row in archived] == ids[:7]
+    for row in archived:
+        history = TodoEvent.history_for(HistoryEntityType.ARCHIVED_TODO, row.id)
+        assert [e['event_type'] for e in history] == ['assigned', 'archived']
+        assert history[1]['actor']['user_key'] == 'system'
+    # 會議任務來的 Todo 連同履歷刪除
+    assert TodoEvent.query.filter_by(entity_type=HistoryEntityType.TODO.value).count() == 0
+    # 完整跑完後進度歸零
+    assert app_db.session.get(JobCheckpoint, ARCHIVE_JOB_NAME).position == 0
+
+
+def test_interrupted_archive_resumes_from_checkpoint(app_db, user):
+    ids = _seed_completed(app_db, user, general=6, from_meeting=0)
+
+    deletes = []
+
+    def crash_on_second_chunk(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('DELETE FROM todo '):
+            deletes.append(statement)
+            if len(deletes) == 2:
+                raise RuntimeError('crash')
+    event.listen(app_db.engine, 'before_cursor_execute', crash_on_second_chunk)
+    try:
+        with pytest.raises(Exception):
+            archive_completed_todos(app_db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, 'w1', chunk_size=2)
+    finally:
+        event.remove(app_db.engine, 'before_cursor_execute', crash_on_second_chunk)
+    app_db.session.rollback()
+
+    # 只有第一批已提交
+    assert app_db.session.get(JobCheckpoint, ARCHIVE_JOB_NAME).position == ids[1]
+    assert ArchivedTodo.query.count() == 2
+
+    assert archive_completed_todos(app_db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, 'w1', chunk_size=2) == (4, 0)
+    assert sorted(row.original_todo_id for row in ArchivedTodo.query) == ids
+    assert TodoEvent.query.filter_by(entity_type=HistoryEntityType.ARCHIVED_TODO.value, event_type='archived').count() == 6
+
+
+
+def test_finished_archive_rerun_same_week(app_db, user):
+    todo = Todo(user_id=user.id, title='稍後完成', description='描述', status=TodoStatus.IN_PROGRESS.value,
+                todo_type=TodoType.CURRENT.value, due_date=datetime.now(utc))
+    app_db.session.add(todo)
+    app_db.session.commit()
+    _seed_completed(app_db, user, general=3, from_meeting=0)
+    assert archive_completed_todos(app_db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, 'w1', chunk_size=2) == (3, 0)
+
+    # 同一週再完成一筆 ID 較小的任務，再次以相同 run_key 執行 (手動、補跑) 仍會歸檔
+    todo.status = TodoStatus.COMPLETED.value
+    app_db.session.commit()
+    assert archive_completed_todos(app_db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, 'w1', chunk_size=2) == (1, 0)
+    assert Todo.query.filter_by(status=TodoStatus.COMPLETED.value).count() == 0
+
+def test_archive_clears_meeting_task_link(app_db, user):
+    meeting = Meeting(subject='週會', meeting_date=datetime.now(utc), chairman_user_id=user.id)
+    app_db.session.add(meeting)
+    app_db.session.flush()
+    meeting_task = MeetingTask(
+        meeting_id=meeting.id, task_type=MeetingTaskType.TRACKING.value, task_description='追蹤',
+        assigned_by_user_id=user.id, assigned_to_user_id=user.id, status=MeetingTaskStatus.COMPLETED.value
+    )
+    app_db.session.add(meeting_task)
+    app_db.session.flush()
+    todo = Todo(user_id=user.id, title='會議任務', description='描述', status=TodoStatus.COMPLETED.value,
+                todo_type=TodoType.CURRENT.value, due_date=datetime.now(utc), meeting_task_id=meeting_task.id)
+    app_db.session.add(todo)
+    app_db.session.flush()
+    meeting_task.todo_id = todo.id
+    app_db.session.commit()
+
+    assert archive_completed_todos(app_db, Todo, ArchivedTodo, TodoEvent, JobCheckpoint, UserTaskCounter, MeetingTask, 'w1') == (0, 1)
+
+    # 刪除的 Todo 不能仍被會議任務連結，否則 SQLite 重用 ID 時會接到新的任務
+    app_db.session.expire_all()
+    assert app_db.session.get(MeetingTask, meeting_task.id).todo_id is None
+
+
+def test_delete_user_removes_todo_history(client, app_db, user):
+    admin = User(user_key='admin', name='管理員', role='管理員', department='資訊部', unit=None,
+                 level=UserLevel.ADMIN.value, avatar='👑', email='admin@example.com', password_hash='x')
+    app_db.session.add(admin)
+    todo = Todo(user_id=user.id, title='任務', description='描述', status=TodoStatus.PENDING.value,
+                todo_type=TodoType.CURRENT.value, due_date=datetime.now(utc))
+    app_db.session.add(todo)
+    app_db.session.flush()
+    TodoEvent.record(HistoryEntityType.TODO, todo.id, 'assigned')
+    app_db.session.commit()
+    todo_id = todo.id
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin.id
+
+    assert client.post(f'/delete_user/{user.id}').status_code == 302
+
+    assert app_db.session.get(Todo, todo_id) is None
+    # 履歷需一併刪除，否則重用 ID 的新任務會接到舊履歷
+    assert TodoEvent.history_for(HistoryEntityType.TODO, todo_id) == []
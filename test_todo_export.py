@@ -0,0 +1,93 @@
+"""
+串流匯出測試
+
+確認 /api/export 以單一查詢逐列輸出 NDJSON 或 CSV，
+單位、日期範圍與是否包含已歸檔任務的篩選在 SQL 中完成，且只匯出可存取的使用者。
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+
+from app import Todo, ArchivedTodo
+from config import UserLevel, TodoStatus, TodoType
+
+NOW = datetime.now(utc).replace(tzinfo=None)
+
+
+@pytest.fixture
+def seeded(app_db, make_user):
+    session = app_db.session
+    users = {
+        user_key: make_user(user_key, level, unit=unit)
+        for user_key, level, unit in [('admin', UserLevel.ADMIN.value, '資訊課'),
+                                      ('chief', UserLevel.SECTION_CHIEF.value, '裝一課'),
+                                      ('staff', UserLevel.STAFF.value, '裝一課'),
+                                      ('other', UserLevel.STAFF.value, '裝三課')]
+    }
+    for user_key in ('staff', 'other'):
+        session.add_all([
+            Todo(user_id=users[user_key].id, title=f'{user_key}-now', description='描述, 含逗號',
+                 status=TodoStatus.PENDING.value, todo_type=TodoType.CURRENT.value, due_date=NOW),
+            Todo(user_id=users[user_key].id, title=f'{user_key}-later', description='d',
+                 status=TodoStatus.PENDING.value, todo_type=TodoType.NEXT.value, due_date=NOW + timedelta(days=30)),
+            ArchivedTodo(original_todo_id=0, title=f'{user_key}-archived', description='d',
+                         status=TodoStatus.COMPLETED.value, todo_type=TodoType.CURRENT.value,
+                         user_id=users[user_key].id, created_at=NOW, updated_at=NOW, archived_at=NOW, due_date=NOW),
+        ])
+    session.commit()
+    return users
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_ndjson_streams_from_one_query(client, seeded, count_queries, login):
+    login(seeded['admin'])
+    with count_queries() as statements:
+        response = client.get('/api/export?include_archived=true')
+        assert response.is_streamed and response.mimetype == 'application/x-ndjson'
+        records = _ndjson(response)
+    assert len(statements) == 1
+    assert sorted(r['title'] for r in records) == sorted(
+        f'{u}-{kind}' for u in ('staff', 'other') for kind in ('now', 'later', 'archived'))
+    archived = next(r for r in records if r['source'] == 'archived')
+    assert archived['archived_at'].endswith('+00:00') and archived['unit']
+
+
+def test_filters(client, seeded, login):
+    login(seeded['admin'])
+    today = (datetime.now(utc) + timedelta(hours=8)).strftime('%Y-%m-%d')
+    records = _ndjson(client.get(f'/api/export?unit=裝一課&start_date={today}&end_date={today}'))
+    assert [r['title'] for r in records] == ['staff-now']
+
+    records = _ndjson(client.get(f'/api/export?unit=裝一課&start_date={today}&include_archived=true'))
+    assert sorted(r['title'] for r in records) == ['staff-archived', 'staff-later', 'staff-now']
+
+    assert client.get('/api/export?start_date=2024-13-01').status_code == 400
+    assert client.get('/api/export?format=xml').status_code == 400
+
+
+def test_export_limited_to_visible_users(client, seeded, login):
+    login(seeded['chief'])
+    records = _ndjson(client.get('/api/export'))
+    assert {r['user_key'] for r in records} == {'staff'}
+
+    with client.session_transaction() as sess:
+        sess.clear()
+    assert client.get('/api/export').status_code == 302
+
+
+def test_csv(client, seeded, login):
+    login(seeded['admin'])
+    response = client.get('/api/export?format=csv&unit=裝三課')
+    assert response.mimetype == 'text/csv' and 'attachment' in response.headers['Content-Disposition']
+    text = response.get_data(as_text=True)
+    assert text.startswith('\ufeff')
+    rows = list(csv.DictReader(io.StringIO(text.lstrip('\ufeff'))))
+    assert sorted(row['title'] for row in rows) == ['other-later', 'other-now']
+    assert next(row for row in rows if row['title'] == 'other-now')['description'] == '描述, 含逗號'
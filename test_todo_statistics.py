@@ -0,0 +1,223 @@
+"""
+Todo 統計引擎測試
+
+確認狀態計數、逾期與完成率由單一彙總查詢算出，
+當前任務會依 due_date 套用日期範圍 (期間開始前到期的逾期任務仍列入)，且只有需要時才查詢任務明細。
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+
+from app import User, Todo, ArchivedTodo, _get_todo_statistics, _get_todo_statistics_multi_users, _get_user_ranking
+from config import UserLevel, TodoStatus, TodoType
+
+NOW = datetime.now(utc).replace(tzinfo=None)
+
+
+@pytest.fixture
+def seeded(app_db):
+    session = app_db.session
+    users = [
+        User(user_key=f'user{i}', name=f'使用者{i}', role='作業員', department='第一廠', unit='裝一課',
+             level=UserLevel.STAFF.value, avatar='👷', email=f'user{i}@example.com', password_hash='x')
+        for i in range(2)
+    ]
+    session.add_all(users)
+    session.flush()
+    alice, bob = users
+
+    def todo(user, status, due_in_days):
+        return Todo(title='t', description='d', status=status, todo_type=TodoType.CURRENT.value,
+                    user_id=user.id, due_date=NOW + timedelta(days=due_in_days))
+
+    def archived(user, status, archived_days_ago):
+        return ArchivedTodo(original_todo_id=0, title='a', description='d', status=status,
+                            todo_type=TodoType.CURRENT.value, user_id=user.id,
+                            created_at=NOW - timedelta(days=30), updated_at=NOW,
+                            archived_at=NOW - timedelta(days=archived_days_ago), due_date=NOW)
+
+    session.add_all([
+        todo(alice, TodoStatus.PENDING.value, 3),
+        todo(alice, TodoStatus.IN_PROGRESS.value, -2),     # 逾期
+        todo(alice, TodoStatus.COMPLETED.value, -1),       # 已完成不算逾期
+        todo(bob, TodoStatus.UNCOMPLETED.value, -40),      # 逾期，且 due_date 在一個月前
+        archived(alice, TodoStatus.COMPLETED.value, 1),
+        archived(bob, TodoStatus.COMPLETED.value, 2),
+        archived(bob, TodoStatus.UNCOMPLETED.value, 60),
+    ])
+    session.commit()
+    return alice, bob
+
+
+def test_counts_without_date_range(seeded, count_queries):
+    with count_queries() as statements:
+        stats = _get_todo_statistics()
+
+    assert len(statements) == 1
+    assert stats['tasks'] == []
+    assert stats['total'] == 7
+    assert stats['completed'] == 3
+    assert stats['in_progress'] == 1
+    assert stats['pending'] == 1
+    assert stats['uncompleted'] == 2
+    assert stats['overdue'] == 2
+    assert stats['completion_rate'] == round(3 / 7 * 100, 2)
+
+
+def test_date_range_applies_to_current_todos(seeded):
+    start = datetime.now(utc) - timedelta(days=7)
+    stats = _get_todo_statistics(start_date=start)
+
+    # 排除 60 天前歸檔的任務；due_date 在 40 天前但仍未完成的當前任務屬於逾期，仍列入
+    assert stats['total'] == 6
+    assert stats['uncompleted'] == 1
+    assert stats['overdue'] == 2
+
+
+def test_overdue_from_last_week_stays_in_weekly_overview(app_db):
+    session = app_db.session
+    user = User(user_key='late', name='拖延', role='作業員', department='第一廠', unit='裝一課',
+                level=UserLevel.STAFF.value, avatar='👷', email='late@example.com', password_hash='x')
+    session.add(user)
+    session.flush()
+    last_week = NOW - timedelta(days=10)
+    session.add_all([
+        Todo(title='上週逾期', description='d', status=TodoStatus.IN_PROGRESS.value, todo_type=TodoType.CURRENT.value,
+             user_id=user.id, due_date=last_week),
+        Todo(title='上週完成', description='d', status=TodoStatus.COMPLETED.value, todo_type=TodoType.CURRENT.value,
+             user_id=user.id, due_date=last_week),
+        Todo(title='本週', description='d', status=TodoStatus.PENDING.value, todo_type=TodoType.CURRENT.value,
+             user_id=user.id, due_date=NOW + timedelta(days=1)),
+    ])
+    session.commit()
+
+    stats = _get_todo_statistics(start_date=datetime.now(utc) - timedelta(days=7), user_id=user.id, include_tasks=True)
+    # 上週已完成的任務不在本週範圍；上週到期仍在進行中的任務計入本週概況與逾期數
+    assert sorted(t['title'] for t in stats['tasks']) == ['上週逾期', '本週']
+    assert (stats['total'], stats['in_progress'], stats['pending'], stats['overdue']) == (2, 1, 1, 1)
+
+
+def test_multi_user_tasks_fetched_with_user_names(seeded, count_queries):
+    alice, bob = seeded
+    bob_id = bob.id
+    with count_queries() as statements:
+        stats = _get_todo_statistics_multi_users(user_ids=[bob_id], include_tasks=True)
+
+    # 一次彙總 + 歸檔明細 + 當前明細
+    assert len(statements) == 3
+    assert stats['total'] == 3
+    assert {t['user_name'] for t in stats['tasks']} == {'使用者1'}
+    assert [t['is_archived'] for t in stats['tasks']] == [True, True, False]
+    assert stats['tasks'][-1]['is_overdue'] is True
+
+
+def test_empty_result(app_db):
+    stats = _get_todo_statistics(user_id=999, include_tasks=True)
+    assert stats['total'] == 0
+    assert stats['completion_rate'] == 0
+    assert stats['tasks'] == []
+
+
+def test_user_ranking_avg_days_and_top_k(app_db):
+    session = app_db.session
+    users = [
+        User(user_key=f'rank{i}', name=f'排名{i}', role='作業員', department='第一廠', unit='裝一課',
+             level=UserLevel.STAFF.value, avatar='👷', email=f'rank{i}@example.com', password_hash='x')
+        for i in range(3)
+    ]
+    session.add_all(users)
+    session.flush()
+    fast, slow, idle = users
+
+    def completed(user, days_taken, model=ArchivedTodo):
+        # 完成後又編輯過 (updated_at 晚於完成時間)，完成天數仍以 completed_at 計算
+        created = NOW - timedelta(days=40)
+        completed_at = created + timedelta(days=days_taken) if days_taken is not None else None
+        if model is ArchivedTodo:
+            return ArchivedTodo(original_todo_id=0, title='a', description='d', status=TodoStatus.COMPLETED.value,
+                                todo_type=TodoType.CURRENT.value, user_id=user.id, created_at=created,
+                                updated_at=NOW, archived_at=NOW, due_date=NOW, completed_at=completed_at)
+        return Todo(title='t', description='d', status=TodoStatus.COMPLETED.value, todo_type=TodoType.CURRENT.value,
+                    user_id=user.id, due_date=NOW, created_at=created, updated_at=NOW, completed_at=completed_at)
+
+    session.add_all([
+        completed(fast, 1), completed(fast, 3, model=Todo),
+        completed(slow, 10), completed(slow, 20), completed(slow, 30),
+        completed(slow, None),  # 沒有完成時間的舊資料不計入平均
+        Todo(title='t', description='d', status=TodoStatus.PENDING.value, todo_type=TodoType.CURRENT.value,
+             user_id=idle.id, due_date=NOW + timedelta(days=1)),
+    ])
+    session.commit()
+
+    by_completed = _get_user_ranking(period='month', metric='completed', limit=2)
+    assert [r['user_name'] for r in by_completed] == ['排名1', '排名0']
+    assert by_completed[0]['completed_tasks'] == 4
+    assert by_completed[0]['avg_days'] == 20.0
+
+    by_avg_days = _get_user_ranking(period='month', metric='avg_days', limit=3)
+    assert [r['user_name'] for r in by_avg_days] == ['排名0', '排名1', '排名2']
+    assert by_avg_days[0]['avg_days'] == 2.0
+    assert by_avg_days[2]['completion_rate'] == 0
+
+
+def test_completed_at_follows_status_changes(client, app_db):
+    session = app_db.session
+    user = User(user_key='owner', name='負責人', role='作業員', department='第一廠', unit='裝一課',
+                level=UserLevel.STAFF.value, avatar='👷', email='owner@example.com', password_hash='x')
+    session.add(user)
+    session.flush()
+    todo = Todo(title='t', description='d', status=TodoStatus.PENDING.value, todo_type=TodoType.CURRENT.value,
+                user_id=user.id, due_date=NOW + timedelta(days=1))
+    session.add(todo)
+    session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+
+    assert client.put(f'/api/todo/{todo.id}/status', json={'status': TodoStatus.COMPLETED.value}).status_code == 200
+    session.refresh(todo)
+    assert todo.completed_at is not None and abs(todo.completed_at - datetime.utcnow()) < timedelta(minutes=1)
+
+    assert client.put(f'/api/todo/{todo.id}/status', json={'status': TodoStatus.PENDING.value}).status_code == 200
+    session.refresh(todo)
+    assert todo.completed_at is None
+
+
+def test_user_ranking_counts_overdue_from_before_window(app_db):
+    session = app_db.session
+    user = User(user_key='late', name='拖延', role='作業員', department='第一廠', unit='裝一課',
+                level=UserLevel.STAFF.value, avatar='👷', email='late@example.com', password_hash='x')
+    session.add(user)
+    session.flush()
+    session.add_all([
+        Todo(title='本週完成', description='d', status=TodoStatus.COMPLETED.value, todo_type=TodoType.CURRENT.value,
+             user_id=user.id, due_date=NOW, created_at=NOW - timedelta(days=2), completed_at=NOW),
+        # 上週到期仍未完成：與概況相同列入本週排行，完成率不會被拉高
+        Todo(title='上週逾期', description='d', status=TodoStatus.IN_PROGRESS.value, todo_type=TodoType.CURRENT.value,
+             user_id=user.id, due_date=NOW - timedelta(days=10)),
+    ])
+    session.commit()
+
+    [ranking] = _get_user_ranking(period='week', metric='completion_rate', limit=1)
+    assert (ranking['total_tasks'], ranking['completed_tasks'], ranking['completion_rate']) == (2, 1, 50.0)
+
+
+def test_user_ranking_scope_from_permission_index(app_db, count_queries):
+    session = app_db.session
+
+    def user(user_key, level, unit, is_active=True):
+        return User(user_key=user_key, name=user_key, role='職稱', department='第一廠', unit=unit, level=level,
+                    avatar='👷', email=f'{user_key}@example.com', password_hash='x', is_active=is_active)
+
+    plant = user('plant', UserLevel.PLANT_MANAGER.value, '第一廠')
+    session.add_all([plant, user('member', UserLevel.STAFF.value, '第一廠'),
+                     user('left', UserLevel.STAFF.value, '第一廠', is_active=False),
+                     user('other', UserLevel.STAFF.value, '裝三課')])
+    session.commit()
+
+    _get_user_ranking(current_user=plant)
+    with count_queries() as statements:
+        ranking = _get_user_ranking(current_user=plant)
+    # 範圍內在職的使用者取自權限索引：只查詢版本號與排行統計
+    assert sorted(r['user_name'] for r in ranking) == ['member', 'plant']
+    assert len(statements) == 2
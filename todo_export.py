@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+
+from pytz import utc
+from sqlalchemy import select, literal, union_all
+
+from config import EXPORT_BATCH_SIZE
+
+# 匯出的欄位 (NDJSON 的鍵與 CSV 的標題列)
+EXPORT_FIELDS = (
+    'user_key', 'user_name', 'role', 'department', 'unit',
+    'source', 'todo_type', 'title', 'description', 'status', 'due_date', 'archived_at'
+)
+
+_DATETIME_FIELDS = ('due_date', 'archived_at')
+
+
+def build_export_query(User, Todo, ArchivedTodo, user_ids=None, unit=None, start_date=None, end_date=None,
+                       include_archived=False):
+    """
+    匯出查詢：當前任務與 (選擇性的) 已歸檔任務 UNION ALL，各自 JOIN 使用者。
+
+    與報告相同，當前任務以 due_date 篩選日期範圍，已歸檔任務以 archived_at 篩選。
+
+    Args:
+        user_ids (iterable, optional): 可匯出的使用者 ID，None 表示不限
+        unit (str, optional): 使用者單位
+        start_date: 開始時間 (UTC，含)
+        end_date: 結束時間 (UTC，不含)
+        include_archived (bool): 是否包含已歸檔任務
+
+    Returns:
+        Select: 欄位依 EXPORT_FIELDS 排列
+    """
+    def _source(model, source, date_column, archived_at):
+        conditions = []
+        if user_ids is not None:
+            conditions.append(model.user_id.in_(user_ids))
+        if unit:
+            conditions.append(User.unit == unit)
+        if start_date:
+            conditions.append(date_column >= start_date)
+        if end_date:
+            conditions.append(date_column < end_date)
+        return (
+            select(User.user_key, User.name, User.role, User.department, User.unit,
+                   literal(source), model.todo_type, model.title, model.description, model.status,
+                   model.due_date, archived_at)
+            .join(User, User.id == model.user_id)
+            .where(*conditions)
+        )
+
+    # UNION 的欄位型別取自第一個 SELECT，當前任務沒有歸檔時間也需標明為 DateTime
+    current = _source(Todo, 'current', Todo.due_date, literal(None, type_=ArchivedTodo.archived_at.type))
+    if not include_archived:
+        return current
+    return union_all(current, _source(ArchivedTodo, 'archived', ArchivedTodo.archived_at, ArchivedTodo.archived_at))
+
+
+def iter_export_rows(db, query):
+    """
+    以單一資料庫游標逐批讀取匯出資料，一次只保留 EXPORT_BATCH_SIZE 列在記憶體中。
+
+    Yields:
+        dict: 依 EXPORT_FIELDS 的一筆任務，時間為 ISO 8601 (UTC)
+    """
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    try:
+        for row in result:
+            record = dict(zip(EXPORT_FIELDS, row))
+            for field in _DATETIME_FIELDS:
+                value = record[field]
+                if value is not None:
+                    record[field] = (utc.localize(value) if value.tzinfo is None else value).isoformat()
+            yield record
+    finally:
+        # 用戶端中途斷線時 generator 會被關閉，需釋放游標
+        result.close()
+
+
+def to_ndjson(records):
+    """每筆資料一行 JSON"""
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def to_csv(records):
+    """CSV 標題列與資料列；開頭加上 BOM 讓 Excel 以 UTF-8 開啟中文"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(EXPORT_FIELDS)
+    yield '\ufeff' + flush()
+    for record in records:
+        writer.writerow([record[field] for field in EXPORT_FIELDS])
+        yield flush()
@@ -0,0 +1,111 @@
+import threading
+
+from sqlalchemy import event, inspect, select, update, insert
+
+# session.info 中記錄本交易遞增過的版本：{名稱: 交易}
+_BUMPED_KEY = 'cache_versions_bumped'
+
+
+def current_version(db, CacheVersion, name):
+    """
+    讀取快取版本號 (以主鍵查詢)。
+
+    Returns:
+        int: 版本號，尚未有資料列時為 0
+    """
+    version = db.session.scalar(select(CacheVersion.version).where(CacheVersion.name == name))
+    return version or 0
+
+
+def bump_version(session, CacheVersion, name):
+    """
+    在目前的交易中將版本號加一 (資料列不存在時建立)，並記錄在 session.info 中。
+
+    交易回滾時版本號也會回滾，下一次提交會再產生同一個版本號；
+    因此本交易在提交前讀到的 (未提交的) 資料不可填入快取，見 VersionedCache.get。
+    """
+    table = CacheVersion.__table__
+    connection = session.connection()
+    result = connection.execute(
+        update(table).where(table.c.name == name).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(name=name, version=1))
+    session.info.setdefault(_BUMPED_KEY, {})[name] = session.get_transaction()
+
+
+def _bumped_in_current_transaction(session, name):
+    transaction = session.get_transaction()
+    return transaction is not None and session.info.get(_BUMPED_KEY, {}).get(name) is transaction
+
+
+def track_model_changes(db, CacheVersion, name, Model, attributes=None):
+    """
+    Model 有新增、刪除或指定欄位變更時，在同一個 flush 中遞增快取版本號。
+
+    版本號與資料異動一起提交，其他程序或執行緒下次讀取版本號即可得知快取已失效。
+    以 Query.update() 等大量更新方式修改資料不會觸發，需自行呼叫 bump_version。
+
+    Args:
+        name (str): 快取版本名稱
+        Model: 要追蹤的 model
+        attributes (tuple, optional): 只追蹤這些欄位的變更，None 表示任何變更
+    """
+    def _changed(obj):
+        if not isinstance(obj, Model):
+            return False
+        if attributes is None:
+            return True
+        state = inspect(obj)
+        return any(state.attrs[attr].history.has_changes() for attr in attributes)
+
+    def before_flush(session, flush_context, instances):
+        if any(isinstance(obj, Model) for obj in session.new) or \
+           any(isinstance(obj, Model) for obj in session.deleted) or \
+           any(_changed(obj) for obj in session.dirty):
+            bump_version(session, CacheVersion, name)
+
+    event.listen(db.session, 'before_flush', before_flush)
+    return before_flush
+
+
+class VersionedCache:
+    """
+    以資料庫版本號驗證的程序內快取。
+
+    每次讀取只查詢一次版本號；版本號與快取時相同就直接回傳快取值，
+    否則呼叫 loader 重新載入。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+
+    def get(self, db, CacheVersion, loader):
+        """
+        Args:
+            loader (callable): 無參數，回傳要快取的值
+
+        Returns:
+            快取值
+        """
+        version = current_version(db, CacheVersion, self.name)
+        if _bumped_in_current_transaction(db.session(), self.name):
+            # 本交易的異動尚未提交 (可能回滾，版本號會被重複使用)，直接載入且不快取
+            return loader()
+        with self._lock:
+            if self._version == version:
+                return self._value
+        # 先讀版本號再載入：載入期間若有異動，下次讀取時版本號不同會再重新載入
+        value = loader()
+        with self._lock:
+            self._version = version
+            self._value = value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._value = None